@@ -2,7 +2,7 @@ try:
     from . import env_loader
 except ImportError:
     import env_loader
-from flask import Flask, render_template, request, redirect, url_for, flash, session, g, jsonify, has_request_context
+from flask import Flask, render_template, request, redirect, url_for, flash, session, g, jsonify, has_request_context, Response, stream_with_context
 from flask_wtf.csrf import CSRFProtect, CSRFError
 from datetime import datetime, timedelta
 import os
@@ -19,10 +19,25 @@ import secrets
 import uuid
 import logging
 from logging.handlers import RotatingFileHandler
+from flask.json.provider import DefaultJSONProvider
+from .query_stats import get_request_db_stats, get_top_queries
+from .rows import CompactRow
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 
+
+class AppJSONProvider(DefaultJSONProvider):
+    """Serializes CompactRow results (query_db row_format='compact') as JSON objects."""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, CompactRow):
+            return o._asdict()
+        return DefaultJSONProvider.default(o)
+
+
 app = Flask(__name__)
+app.json = AppJSONProvider(app)
 
 # Environment flags
 is_production = (os.environ.get('APP_ENV', '').lower() == 'production') or (os.environ.get('FLASK_ENV') == 'production')
@@ -119,6 +134,9 @@ def set_security_headers(response):
     if hasattr(g, 'start_time'):
         duration = (datetime.now() - g.start_time).total_seconds()
         response.headers['X-Response-Time'] = f"{duration:.3f}s"
+        db_time_ms, db_query_count = get_request_db_stats()
+        response.headers['X-DB-Time'] = f"{db_time_ms / 1000:.3f}s"
+        response.headers['X-DB-Queries'] = str(db_query_count)
     return response
 
 # === Global Error Handlers for Debugging ===
@@ -159,26 +177,18 @@ def track_user_activity():
                 ip_address = ip_address.split(',')[0].strip()
             ip_address = anonymize_ip(ip_address)
             
-            # Update or create user activity record
-            if user_id not in _active_users:
-                _active_users[user_id] = {
+            # Update or create user activity record; it expires after the
+            # inactivity timeout, which takes the user offline
+            data = state_store.get(_active_user_key(user_id))
+            if data is None:
+                data = {
+                    'user_id': user_id,
                     'username': username,
                     'login_time': now,
-                    'last_activity': now,
-                    'ip_address': ip_address
                 }
-            else:
-                _active_users[user_id]['last_activity'] = now
-                _active_users[user_id]['ip_address'] = ip_address
-            
-            # Clean up inactive users (older than timeout)
-            inactive_users = []
-            for uid, data in _active_users.items():
-                if now - data['last_activity'] > _ACTIVITY_TIMEOUT:
-                    inactive_users.append(uid)
-            
-            for uid in inactive_users:
-                del _active_users[uid]
+            data['last_activity'] = now
+            data['ip_address'] = ip_address
+            _set_active_user(user_id, data)
     except Exception as e:
         print(f"Error tracking user activity: {e}")
 
@@ -188,52 +198,50 @@ def scheduled_daily_status_update():
         try:
             cairo_now = get_cairo_now()
             print(f"[{cairo_now.strftime('%Y-%m-%d %H:%M:%S')}] Running scheduled daily membership status update (Cairo Time)...")
-            updated_count = update_all_membership_statuses()
-            print(f"[{cairo_now.strftime('%Y-%m-%d %H:%M:%S')}] Daily status update completed. Updated {updated_count} member(s).")
+            result = run_membership_status_engine()
+            print(f"[{cairo_now.strftime('%Y-%m-%d %H:%M:%S')}] Daily status update completed. "
+                  f"Updated {result['updated']} member(s) in {result['elapsed_ms']}ms. Deltas: {result['deltas']}")
         except Exception as e:
             cairo_now = get_cairo_now()
             print(f"[{cairo_now.strftime('%Y-%m-%d %H:%M:%S')}] Error in scheduled status update: {e}")
             import traceback
             traceback.print_exc()
 
+def scheduled_member_visit_stats_refresh():
+    """Nightly recount of the members' rolling visit counters (visits_30d / visits_90d)"""
+    with app.app_context():
+        try:
+            changed = refresh_member_visit_stats()
+            cairo_now = get_cairo_now()
+            print(f"[{cairo_now.strftime('%Y-%m-%d %H:%M:%S')}] Member visit counters refreshed. Updated {changed} member(s).")
+        except Exception as e:
+            cairo_now = get_cairo_now()
+            print(f"[{cairo_now.strftime('%Y-%m-%d %H:%M:%S')}] Error refreshing member visit counters: {e}")
+            import traceback
+            traceback.print_exc()
+
 def perform_attendance_backup_and_clear(performed_by='System'):
     """
     Moves all attendance data to backup and clears the active table.
     Returns: (success, rows_moved, error_message)
     """
     try:
-        # 1) Get current row count
-        count_result = query_db("SELECT COUNT(*) as count FROM attendance", one=True)
-        rows_to_move = count_result['count'] if count_result else 0
-        
-        if rows_to_move == 0:
-            return True, 0, "No attendance data to move"
+        # Move and clear on one pooled connection in a single transaction
+        with transaction() as cur:
+            # 1) Move rows into the monthly archive partitions and reset numbering
+            rows_moved = archive_attendance_in_transaction(cur)
 
-        # Use one connection for transaction safety
-        conn = psycopg2.connect(DATABASE_URL)
-        cur = conn.cursor()
-        
-        try:
-            # 1) Copy data to backup
-            cur.execute("""
-                INSERT INTO attendance_backup 
-                (member_id, name, end_date, membership_status, attendance_time, attendance_date, day)
-                SELECT member_id, name, end_date, membership_status, attendance_time, attendance_date, day
-                FROM attendance
-            """)
-            
-            # 2) Clear table and reset numbering
-            cur.execute("TRUNCATE TABLE attendance RESTART IDENTITY")
-            
-            conn.commit()
-            return True, rows_to_move, None
+            # 2) Drop old deletion tombstones of the incremental attendance feed
+            #    and expired kiosk event IDs
+            prune_attendance_deletions_in_transaction(cur)
+            prune_attendance_ingest_events_in_transaction(cur)
 
-        except Exception as e:
-            conn.rollback()
-            return False, 0, str(e)
-        finally:
-            cur.close()
-            conn.close()
+        # This worker's "checked in today" set is rebuilt on the next scan
+        reset_checked_in_today()
+
+        if rows_moved == 0:
+            return True, 0, "No attendance data to move"
+        return True, rows_moved, None
     except Exception as e:
         return False, 0, str(e)
 
@@ -277,17 +285,8 @@ def get_online_users():
     now = datetime.now()
     online_users = []
     
-    # Clean up inactive users first
-    inactive_users = []
-    for user_id, data in _active_users.items():
-        if now - data['last_activity'] > _ACTIVITY_TIMEOUT:
-            inactive_users.append(user_id)
-    
-    for uid in inactive_users:
-        del _active_users[uid]
-    
-    # Return active users
-    for user_id, data in _active_users.items():
+    # Inactive users have already expired from the store
+    for user_id, data in _get_active_users():
         time_online = now - data['login_time']
         time_since_activity = now - data['last_activity']
         online_users.append({
@@ -389,11 +388,39 @@ from .queries import (
     add_supplement_sale, get_supplement_sales, get_supplement_statistics,
     add_staff, get_staff, get_all_staff, update_staff, delete_staff,
     add_staff_purchase, get_staff_purchases, get_staff_statistics,
-    log_renewal, get_renewal_logs, get_daily_totals, get_monthly_total,
+    log_renewal, get_renewal_logs, get_renewal_fees_total, get_daily_totals, get_monthly_total,
     create_invoice, get_invoice, get_invoice_by_number, get_all_invoices,
-    get_attendance_backup_runs
+    get_attendance_backup, get_attendance_backup_runs, warm_up_connection_pool, get_pool_stats,
+    transaction, PoolTimeoutError
 )
 from .queries import delete_all_data as delete_all_data_from_db
+from .cache import app_cache, state_store
+from .current_user import get_current_user, forget_current_user, get_default_permissions_for_username, _load_permissions
+from .dashboard import DashboardSnapshot, DASHBOARD_SNAPSHOT_TAGS, DASHBOARD_SNAPSHOT_TTL, DASHBOARD_SNAPSHOT_STALE_TTL
+from .membership_status import (
+    active_predicate, expired_predicate, view_predicate, expiring_within_predicate,
+    no_visit_predicate, min_visits_predicate, MEMBER_VISIT_COUNTERS, MAX_NO_VISIT_DAYS,
+)
+from .status_engine import run_membership_status_engine
+from .pagination import encode_cursor, decode_cursor, keyset_predicate, split_page
+from .counts import count_rows
+from .attendance_services import (
+    check_in_member, CHECK_IN_ALREADY, CHECK_IN_NOT_FOUND,
+    get_attendance_rows, get_attendance_feed, get_last_attendance_deletion_id,
+    prune_attendance_deletions_in_transaction, ingest_attendance_batch,
+    prune_attendance_ingest_events_in_transaction, ATTENDANCE_BATCH_LIMIT, INGEST_ACCEPTED,
+    load_checked_in_today, forget_checked_in, reset_checked_in_today,
+    archive_attendance_in_transaction, get_member_visits, get_member_visit_heatmap, MEMBER_VISITS_PAGE_SIZE,
+    refresh_member_visit_stats,
+)
+
+@app.errorhandler(PoolTimeoutError)
+def handle_pool_timeout(e):
+    """Every pooled database connection stayed busy past DB_POOL_TIMEOUT"""
+    print(f"Database pool exhausted: {e}")
+    return render_template('error.html',
+                          error_code=503,
+                          error_message="The server is busy. Please try again in a moment."), 503
 
 # ==============================================================================
 # Environment Safety Guards and Startup Print Information
@@ -441,6 +468,15 @@ if not is_production or os.environ.get('RUN_DB_MIGRATIONS', '').lower() == 'true
             print(f"Warning: Could not create tables on startup: {e}")
             print("Tables may already exist or database connection failed.")
 
+# Open the pool's minimum connections before the first request arrives
+warm_up_connection_pool()
+
+# Build this worker's "checked in today" set before the first scan
+try:
+    load_checked_in_today()
+except Exception as e:
+    print(f"Warning: Could not load today's check-ins: {e}")
+
 # Initialize scheduler for daily updates at midnight
 if os.environ.get('RUN_SCHEDULER', '').lower() == 'true':
     # Use Cairo timezone for the scheduler as requested
@@ -463,6 +499,15 @@ if os.environ.get('RUN_SCHEDULER', '').lower() == 'true':
         name='Daily Attendance Backup and Clear',
         replace_existing=True
     )
+
+    # Job 3: Nightly recount of the members' visit counters
+    scheduler.add_job(
+        func=scheduled_member_visit_stats_refresh,
+        trigger=CronTrigger(hour=0, minute=15),
+        id='member_visit_stats_refresh',
+        name='Nightly Member Visit Counters Refresh',
+        replace_existing=True
+    )
     
     scheduler.start()
     print("Scheduler started: Daily status updates and attendance backup scheduled for 12:00 AM (Cairo Time)")
@@ -491,136 +536,6 @@ if os.environ.get('RUN_SCHEDULER', '').lower() == 'true':
 
 # === Authorization Helpers & Decorators ===
 
-def _load_permissions(raw_permissions):
-    """Safely load permissions from DB (JSONB or TEXT) into a dict."""
-    if not raw_permissions:
-        perms = {}
-    elif isinstance(raw_permissions, dict):
-        perms = raw_permissions
-    else:
-        try:
-            perms = json.loads(raw_permissions)
-        except Exception:
-            perms = {}
-    
-    # Backward compatibility for invitations
-    if perms.get('invitations'):
-        if 'invitations_view' not in perms:
-            perms['invitations_view'] = True
-        if 'invitations_use' not in perms:
-            perms['invitations_use'] = True
-            
-    return perms
-
-
-def get_default_permissions_for_username(username):
-    """
-    Default permission sets:
-    - rino: super admin (access to everything)
-    - ahmed_adel: everything except delete_member, undo_action, data_management,
-                  online_users, training_templates, offers, renewal_log
-    - malit_deng: everything except undo_action, data_management, online_users,
-                  training_templates, offers, renewal_log, supplements_water,
-                  attendance_backup, delete_member
-    - others (new accounts): attendance only
-    """
-    username = (username or '').strip()
-
-    # Super admin
-    if username == 'rino':
-        return {'super_admin': True}
-
-    # Base full-access set
-    base = {
-        'index': True,
-        'attendance': True,
-        'delete_attendance': True,
-        'members_view': True,
-        'members_edit': True,
-        'delete_member': True,
-        'training_templates': True,
-        'offers': True,
-        'renewal_log': True,
-        'supplements_water': True,
-        'attendance_backup': True,
-        'undo_action': True,
-        'data_management': True,
-        'online_users': True,
-        'invoices': True,
-        'invitations': True,
-        'invitations_view': True,
-        'invitations_use': True,
-    }
-
-    if username == 'ahmed_adel':
-        perms = base.copy()
-        perms.update({
-            'delete_member': False,
-            'undo_action': False,
-            'data_management': False,
-            'online_users': False,
-            'training_templates': False,
-            'offers': False,
-            'renewal_log': False,
-            'delete_attendance': False,
-        })
-        return perms
-
-    if username == 'malit_deng':
-        perms = base.copy()
-        perms.update({
-            'delete_member': False,
-            'undo_action': False,
-            'data_management': False,
-            'online_users': False,
-            'training_templates': False,
-            'offers': False,
-            'renewal_log': False,
-            'supplements_water': False,
-            'attendance_backup': False,
-            'delete_attendance': False,
-        })
-        return perms
-
-    # Default for any new / normal account → attendance only
-    return {
-        'attendance': True,
-    }
-
-
-def get_current_user():
-    """Return current user dict with 'permissions' (dict) included."""
-    try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return None
-
-        user = query_db(
-            'SELECT id, username, email, is_approved, permissions FROM users WHERE id = %s',
-            (user_id,),
-            one=True,
-        )
-        if not user:
-            return None
-
-        # Super admin shortcut
-        if user.get('username') == 'rino':
-            user['permissions'] = {'super_admin': True}
-            return user
-
-        perms = _load_permissions(user.get('permissions'))
-        # If permissions are empty, get defaults for this username
-        if not perms:
-            perms = get_default_permissions_for_username(user.get('username'))
-        user['permissions'] = perms
-        return user
-    except Exception as e:
-        print(f"Error in get_current_user: {e}")
-        import traceback
-        traceback.print_exc()
-        return None
-
-
 def login_required(f):
     """Basic authentication check (no specific permission)."""
     @wraps(f)
@@ -740,187 +655,38 @@ def get_common_template_context():
         except Exception as e:
             app.logger.error(f"Context Helper: Error getting user permissions: {e}")
         
-        # 2. Pending approvals count
-        if username in ['rino', 'ahmed_adel', 'malit_deng']:
-            try:
-                count_result = query_db(
-                    'SELECT COUNT(*) as count FROM pending_member_edits WHERE status = %s',
-                    ('pending',),
-                    one=True
-                )
-                if count_result:
-                    context['pending_approvals_count'] = count_result['count']
-                    context['pending_edits_count'] = count_result['count']
-            except Exception as e:
-                app.logger.error(f"Context Helper: Error getting pending count: {e}")
-                
-        # 3. Monthly Statistics (New and Renewed)
+        # 2. Member counts and revenue: one snapshot, two aggregate queries on a cold cache
         try:
-            current_month = today.month
-            current_year = today.year
-            current_month_start = datetime(current_year, current_month, 1)
-            
-            # New members this month
-            new_members_count = get_cached('new_members_count', timeout=300)
-            if new_members_count is None:
-                month_name = today.strftime('%B')
-                month_num_str = f'{current_month:02d}'
-                year_str = str(current_year)
-                year_month_pattern = f'{current_year}-{month_num_str}'
-                
-                new_res = query_db("""
-                    SELECT COUNT(*) as count FROM members 
-                    WHERE actual_starting_date IS NOT NULL AND actual_starting_date != ''
-                    AND (
-                        (LENGTH(TRIM(actual_starting_date)) >= 10 
-                         AND SUBSTRING(TRIM(actual_starting_date), 1, 7) = %s)
-                        OR (actual_starting_date LIKE %s)
-                        OR (actual_starting_date LIKE %s)
-                        OR (actual_starting_date ILIKE %s AND actual_starting_date ILIKE %s)
+            # One request per process loads an expired snapshot, in the background;
+            # the rest keep the previous one meanwhile instead of all recomputing it
+            loaded = []
+
+            def load_snapshot():
+                loaded.append(DashboardSnapshot.load(today))
+                return loaded[-1]
+
+            snapshot = app_cache.get_or_compute(
+                f'dashboard_snapshot:{today}', load_snapshot,
+                ttl=DASHBOARD_SNAPSHOT_TTL, stale_ttl=DASHBOARD_SNAPSHOT_STALE_TTL,
+                tags=DASHBOARD_SNAPSHOT_TAGS, background=True,
+            )
+            fresh = bool(loaded) and loaded[-1] is snapshot
+            context.update(snapshot.template_context())
+
+            # 3. Pending approvals count (never served from the cached snapshot)
+            if username in ['rino', 'ahmed_adel', 'malit_deng']:
+                pending_count = snapshot.pending_approvals_count
+                if not fresh:
+                    count_result = query_db(
+                        'SELECT COUNT(*) as count FROM pending_member_edits WHERE status = %s',
+                        ('pending',),
+                        one=True
                     )
-                """, (year_month_pattern, f'{year_month_pattern}-%', f'%,{month_num_str},{year_str}%', f'%{month_name}%', f'%{year_str}%'), one=True)
-                new_members_count = new_res['count'] if new_res else 0
-                set_cached('new_members_count', new_members_count, timeout=300)
-            context['new_members_count'] = new_members_count
-                
-            # Updated members this month
-            updated_count = get_cached('updated_members_count', timeout=300)
-            if updated_count is None:
-                upd_res = query_db("""
-                    SELECT COUNT(DISTINCT member_id) as count FROM member_logs 
-                    WHERE field_name = 'starting_date' 
-                    AND edit_time >= %s
-                """, (current_month_start,), one=True)
-                updated_count = upd_res['count'] if upd_res else 0
-                set_cached('updated_members_count', updated_count, timeout=300)
-            context['updated_starting_date_count'] = updated_count
-        except Exception as e:
-            app.logger.error(f"Context Helper: Error calculating monthly stats: {e}")
-
-        # 4. Expiring memberships (7, 14, 30 days)
-        try:
-            for days in [7, 14, 30]:
-                cache_key = f'expiring_{days}_days'
-                val = get_cached(cache_key, timeout=60)
-                if val is None:
-                    future_date = (today + timedelta(days=days)).strftime('%Y-%m-%d')
-                    prev_date_7 = (today + timedelta(days=7)).strftime('%Y-%m-%d')
-                    prev_date_14 = (today + timedelta(days=14)).strftime('%Y-%m-%d')
-                    
-                    if days == 7:
-                        # Urgent: today <= end_date <= today+7
-                        query = """
-                            SELECT COUNT(*) as count FROM members 
-                            WHERE end_date IS NOT NULL AND end_date != ''
-                            AND LENGTH(TRIM(end_date)) >= 10
-                            AND SUBSTRING(TRIM(end_date), 1, 10) ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}'
-                            AND CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE) >= (CURRENT_TIMESTAMP AT TIME ZONE 'Africa/Cairo')::DATE
-                            AND CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE) <= %s
-                        """
-                        params = (future_date,)
-                    elif days == 14:
-                        query = """
-                            SELECT COUNT(*) as count FROM members 
-                            WHERE end_date IS NOT NULL AND end_date != ''
-                            AND LENGTH(TRIM(end_date)) >= 10
-                            AND SUBSTRING(TRIM(end_date), 1, 10) ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}'
-                            AND CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE) >= (CURRENT_TIMESTAMP AT TIME ZONE 'Africa/Cairo')::DATE
-                            AND CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE) <= %s
-                            AND CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE) > %s
-                        """
-                        params = (future_date, prev_date_7)
-                    else: # 30 days
-                        query = """
-                            SELECT COUNT(*) as count FROM members 
-                            WHERE end_date IS NOT NULL AND end_date != ''
-                            AND LENGTH(TRIM(end_date)) >= 10
-                            AND SUBSTRING(TRIM(end_date), 1, 10) ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}'
-                            AND CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE) >= (CURRENT_TIMESTAMP AT TIME ZONE 'Africa/Cairo')::DATE
-                            AND CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE) <= %s
-                            AND CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE) > %s
-                        """
-                        params = (future_date, prev_date_14)
-                        
-                    res = query_db(query, params, one=True)
-                    val = res['count'] if res else 0
-                    set_cached(cache_key, val, timeout=60)
-                context[cache_key] = val
-        except Exception as e:
-            app.logger.error(f"Context Helper: Error getting expiring counts: {e}")
-        
-        # 5. Get total active members
-        try:
-            total_active = get_cached('total_active_members', timeout=300)
-            if total_active is None:
-                active_result = query_db("""
-                    SELECT COUNT(*) as count FROM members 
-                    WHERE end_date IS NOT NULL 
-                    AND end_date != ''
-                    AND LENGTH(TRIM(end_date)) >= 10
-                    AND SUBSTRING(TRIM(end_date), 1, 10) ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}'
-                    AND CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE) >= (CURRENT_TIMESTAMP AT TIME ZONE 'Africa/Cairo')::DATE
-                """, one=True)
-                total_active = active_result['count'] if active_result else 0
-                set_cached('total_active_members', total_active, timeout=300)
-            context['total_active_members'] = total_active
-            context['active_count'] = total_active
-        except Exception as e:
-            app.logger.error(f"Context Helper: Error getting active members: {e}")
-                
-        # 6. Get expired count
-        try:
-            expired_count = get_cached('total_expired_members', timeout=300)
-            if expired_count is None:
-                expired_result = query_db("""
-                    SELECT COUNT(*) as count FROM members 
-                    WHERE (end_date IS NULL OR end_date = '' OR 
-                          (LENGTH(TRIM(end_date)) >= 10 AND 
-                           SUBSTRING(TRIM(end_date), 1, 10) ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}' AND 
-                           CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE) < (CURRENT_TIMESTAMP AT TIME ZONE 'Africa/Cairo')::DATE))
-                """, one=True)
-                expired_count = expired_result['count'] if expired_result else 0
-                set_cached('total_expired_members', expired_count, timeout=300)
-            context['expired_count'] = expired_count
-        except Exception as e:
-            app.logger.error(f"Context Helper: Error getting expired members: {e}")
-
-        # 7. Revenue analytics
-        try:
-            revenue_this_month = get_cached('revenue_this_month', timeout=300)
-            if revenue_this_month is None:
-                from .queries import get_monthly_total
-                revenue_this_month = get_monthly_total(current_year, current_month)
-                set_cached('revenue_this_month', revenue_this_month, timeout=300)
-            context['revenue_this_month'] = revenue_this_month
-                
-            revenue_last_month = get_cached('revenue_last_month', timeout=300)
-            if revenue_last_month is None:
-                from .queries import get_monthly_total
-                last_month = current_month - 1 if current_month > 1 else 12
-                last_year = current_year if current_month > 1 else current_year - 1
-                revenue_last_month = get_monthly_total(last_year, last_month)
-                set_cached('revenue_last_month', revenue_last_month, timeout=300)
-            context['revenue_last_month'] = revenue_last_month
-                
-            if context['revenue_last_month'] > 0:
-                context['revenue_growth'] = ((context['revenue_this_month'] - context['revenue_last_month']) / context['revenue_last_month']) * 100
-            elif context['revenue_this_month'] > 0:
-                context['revenue_growth'] = 100.0
-                
-            revenue_by_package = get_cached('revenue_by_package', timeout=300)
-            if revenue_by_package is None:
-                package_revenue = query_db("""
-                    SELECT 
-                        package_name, COUNT(*) as count, SUM(fees) as total_revenue
-                    FROM renewal_logs
-                    WHERE EXTRACT(YEAR FROM renewal_date) = %s AND EXTRACT(MONTH FROM renewal_date) = %s
-                    GROUP BY package_name ORDER BY total_revenue DESC LIMIT 5
-                """, (current_year, current_month))
-                revenue_by_package = package_revenue or []
-                set_cached('revenue_by_package', revenue_by_package, timeout=300)
-            context['revenue_by_package'] = revenue_by_package
+                    pending_count = count_result['count'] if count_result else 0
+                context['pending_approvals_count'] = pending_count
+                context['pending_edits_count'] = pending_count
         except Exception as e:
-            app.logger.error(f"Context Helper: Error getting revenue stats: {e}")
+            app.logger.error(f"Context Helper: Error loading dashboard snapshot: {e}")
 
     except Exception as e:
         app.logger.error(f"Critical error in get_common_template_context: {e}")
@@ -984,6 +750,9 @@ def user_permissions():
                     (is_approved, Json(perms_dict), user_id),
                     commit=True
                 )
+                # The commit already dropped every cached user row (tag 'users');
+                # this also clears the memo if rino edited their own row
+                forget_current_user(user_id)
                 flash('User permissions updated successfully.', 'success')
             except Exception as e:
                 print(f"Error updating user permissions: {e}")
@@ -1144,6 +913,7 @@ TRANSLATIONS = {
         'page': 'Page',
         'of': 'of',
         'total': 'total',
+        'about': 'about',
         'members': 'members',
         'download': 'Download',
         'download_csv': 'Download CSV',
@@ -1246,6 +1016,7 @@ TRANSLATIONS = {
         'page': 'صفحة',
         'of': 'من',
         'total': 'إجمالي',
+        'about': 'حوالي',
         'members': 'أعضاء',
         'download': 'تحميل',
         'download_csv': 'تحميل CSV',
@@ -1297,32 +1068,13 @@ def toggle_language():
 # Health endpoints for platform health checks
 @app.route('/health', methods=['GET', 'HEAD'])
 def health():
-    return jsonify(status='ok'), 200
+    # In-memory counters only: no database round trip on the platform probe
+    return jsonify(status='ok', cache=app_cache.stats()), 200
 
 @app.route('/healthz', methods=['GET', 'HEAD'])
 def healthz():
     return jsonify(status='ok'), 200
 
-# Simple in-memory cache for expensive queries
-_cache = {}
-_cache_timeout = {}
-
-def get_cached(key, timeout=300):
-    """Get cached value if not expired"""
-    if key in _cache:
-        if key in _cache_timeout:
-            if datetime.now() < _cache_timeout[key]:
-                return _cache[key]
-            else:
-                # Expired, remove it
-                del _cache[key]
-                del _cache_timeout[key]
-    return None
-
-def set_cached(key, value, timeout=300):
-    """Set cached value with timeout"""
-    _cache[key] = value
-    _cache_timeout[key] = datetime.now() + timedelta(seconds=timeout)
 
 @app.route('/')
 @app.route('/home')
@@ -1334,15 +1086,19 @@ def index():
         cache_key_attendance = 'index_attendance_data'
         cache_key_members = 'index_members_data'
         
-        attendance_data = get_cached(cache_key_attendance, timeout=60)  # Cache for 1 minute
-        if attendance_data is None:
-            attendance_data = query_db('SELECT * FROM attendance ORDER BY num DESC LIMIT 50')
-            set_cached(cache_key_attendance, attendance_data, timeout=60)
+        # Cached for 1 minute or until this process writes to the table; for a
+        # minute after that the old list is served while one thread reloads it
+        attendance_data = app_cache.get_or_compute(
+            cache_key_attendance,
+            lambda: query_db('SELECT * FROM attendance ORDER BY num DESC LIMIT 50'),
+            ttl=60, stale_ttl=60, tags=['attendance'], background=True,
+        )
         
-        members_data = get_cached(cache_key_members, timeout=60)  # Cache for 1 minute
-        if members_data is None:
-            members_data = query_db('SELECT * FROM members ORDER BY id DESC LIMIT 50')
-            set_cached(cache_key_members, members_data, timeout=60)
+        members_data = app_cache.get_or_compute(
+            cache_key_members,
+            lambda: query_db('SELECT * FROM members ORDER BY id DESC LIMIT 50'),
+            ttl=60, stale_ttl=60, tags=['members'], background=True,
+        )
         
         # Use the common context helper for dashboard variables
         common_context = get_common_template_context()
@@ -1363,50 +1119,57 @@ def index():
                             **common_context)
 
 
-# Rate limiting for login (simple in-memory implementation)
-_login_attempts = {}
+# Rate limiting for login: ip_address -> [attempts, lockout_until] in state_store
+# (shared by the workers with CACHE_BACKEND=sqlite), forgotten after the lockout time
 _MAX_LOGIN_ATTEMPTS = 5
 _LOGIN_LOCKOUT_TIME = timedelta(minutes=15)
+_LOGIN_ATTEMPTS_PREFIX = 'login_attempts:'
 
-# Online users tracking (simple in-memory implementation)
-_active_users = {}  # user_id -> {'username': str, 'last_activity': datetime, 'ip_address': str, 'login_time': datetime}
+# Online users tracking: user_id -> {'username': str, 'last_activity': datetime, 'ip_address': str, 'login_time': datetime}
+# in state_store, expiring after the inactivity timeout
+_ACTIVE_USER_PREFIX = 'active_user:'
 _ACTIVITY_TIMEOUT = timedelta(minutes=5)  # Consider user offline after 5 minutes of inactivity
 
+def _active_user_key(user_id):
+    return f'{_ACTIVE_USER_PREFIX}{user_id}'
+
+def _set_active_user(user_id, data):
+    state_store.set(_active_user_key(user_id), data, ttl=_ACTIVITY_TIMEOUT.total_seconds())
+
+def _get_active_users():
+    """(user_id, activity record) of every user active within the timeout"""
+    return [(data.get('user_id', key[len(_ACTIVE_USER_PREFIX):]), data)
+            for key, data in state_store.items(_ACTIVE_USER_PREFIX)]
+
 def check_rate_limit(ip_address):
     """Check if IP is rate limited"""
     now = datetime.now()
-    if ip_address in _login_attempts:
-        attempts, lockout_until = _login_attempts[ip_address]
+    record = state_store.get(f'{_LOGIN_ATTEMPTS_PREFIX}{ip_address}')
+    if record:
+        attempts, lockout_until = record
         if lockout_until and now < lockout_until:
             return False, f"Too many login attempts. Please try again after {lockout_until.strftime('%H:%M:%S')}"
         # Reset if lockout expired
         if lockout_until and now >= lockout_until:
-            del _login_attempts[ip_address]
+            clear_login_attempts(ip_address)
     return True, None
 
 def record_failed_login(ip_address):
     """Record a failed login attempt"""
     now = datetime.now()
-    if ip_address not in _login_attempts:
-        _login_attempts[ip_address] = [1, None]
-    else:
-        attempts, _ = _login_attempts[ip_address]
-        attempts += 1
-        if attempts >= _MAX_LOGIN_ATTEMPTS:
-            lockout_until = now + _LOGIN_LOCKOUT_TIME
-            _login_attempts[ip_address] = [attempts, lockout_until]
-        else:
-            _login_attempts[ip_address] = [attempts, None]
+    key = f'{_LOGIN_ATTEMPTS_PREFIX}{ip_address}'
+    record = state_store.get(key)
+    attempts = (record[0] if record else 0) + 1
+    lockout_until = now + _LOGIN_LOCKOUT_TIME if attempts >= _MAX_LOGIN_ATTEMPTS else None
+    state_store.set(key, [attempts, lockout_until], ttl=_LOGIN_LOCKOUT_TIME.total_seconds())
 
 def clear_login_attempts(ip_address):
     """Clear login attempts on successful login"""
-    if ip_address in _login_attempts:
-        del _login_attempts[ip_address]
+    state_store.delete(f'{_LOGIN_ATTEMPTS_PREFIX}{ip_address}')
 
 def reset_all_login_attempts():
     """Reset all login attempt lockouts"""
-    global _login_attempts
-    _login_attempts.clear()
+    state_store.delete_prefix(_LOGIN_ATTEMPTS_PREFIX)
     return True
 
 @app.route('/admin/reset_login_lockout', methods=['GET'])
@@ -1540,12 +1303,13 @@ def login():
                 
                 # Track user as online
                 now = datetime.now()
-                _active_users[user['id']] = {
+                _set_active_user(user['id'], {
+                    'user_id': user['id'],
                     'username': user['username'],
                     'login_time': now,
                     'last_activity': now,
                     'ip_address': ip_address
-                }
+                })
                 
                 flash('Login successful!', 'success')
                 
@@ -1585,8 +1349,8 @@ def login():
 def logout():
     # Remove user from online tracking
     user_id = session.get('user_id')
-    if user_id and user_id in _active_users:
-        del _active_users[user_id]
+    if user_id:
+        state_store.delete(_active_user_key(user_id))
     
     session.clear()
     flash('Logout successful', 'success')
@@ -1610,57 +1374,13 @@ def online_users():
         flash(f'Error loading online users: {str(e)}', 'error')
         return redirect(url_for('index'))
 
-def update_all_membership_statuses():
+def update_all_membership_statuses(dry_run=False):
     """Update all membership statuses in the database based on current end dates using Cairo time"""
     try:
-        today = get_cairo_date()
-        all_members = query_db('SELECT id, end_date, membership_status FROM members WHERE end_date IS NOT NULL AND end_date != %s', ('',))
-        
-        updated_count = 0
-        for member in all_members:
-            end_date_str = member.get('end_date', '').strip()
-            if not end_date_str:
-                continue
-            
-            # Parse end date
-            try:
-                # Try different date formats
-                date_formats = [
-                    '%Y-%m-%d',      # 2024-12-31
-                    '%m/%d/%Y',       # 12/31/2024
-                    '%d/%m/%Y',       # 31/12/2024
-                    '%m-%d-%Y',       # 12-31-2024
-                    '%d-%m-%Y',       # 31-12-2024
-                    '%Y/%m/%d',       # 2024/12/31
-                ]
-                
-                end_date_parsed = None
-                for fmt in date_formats:
-                    try:
-                        end_date_parsed = datetime.strptime(end_date_str[:10], fmt).date()
-                        break
-                    except (ValueError, IndexError):
-                        continue
-                
-                if end_date_parsed:
-                    # Calculate correct status
-                    new_status = "VAL" if end_date_parsed >= today else "EX"
-                    old_status = member.get('membership_status', '')
-                    
-                    # Only update if status changed
-                    if new_status != old_status:
-                        query_db(
-                            'UPDATE members SET membership_status = %s WHERE id = %s',
-                            (new_status, member['id']),
-                            commit=True
-                        )
-                        updated_count += 1
-                        print(f"Updated member {member['id']}: {old_status} -> {new_status}")
-            except Exception as e:
-                print(f"Error updating status for member {member.get('id')}: {e}")
-                continue
-        
-        return updated_count
+        result = run_membership_status_engine(dry_run=dry_run)
+        print(f"Membership status engine: {result['updated']} change(s) {result['transitions']} in {result['elapsed_ms']}ms"
+              f"{' (dry run)' if dry_run else ''}")
+        return result['updated']
     except Exception as e:
         print(f"Error in update_all_membership_statuses: {e}")
         import traceback
@@ -1672,6 +1392,11 @@ def update_all_membership_statuses():
 def update_all_statuses():
     """Update all membership statuses in database (Rino only)"""
     try:
+        if request.args.get('dry_run') in ('1', 'true'):
+            result = run_membership_status_engine(dry_run=True)
+            changes = ', '.join(f'{k}: {v}' for k, v in result['transitions'].items()) or 'no changes'
+            flash(f"Dry run: {result['updated']} membership status(es) would change ({changes}).", 'info')
+            return redirect(url_for('all_members'))
         updated_count = update_all_membership_statuses()
         flash(f'Successfully updated {updated_count} membership status(es) in the database.', 'success')
     except Exception as e:
@@ -2070,6 +1795,94 @@ def add_member_done():
     
     
 
+def _member_dynamic_status(end_date_value, today):
+    """Returns (is_expired, dynamic_status, end_date_only) for a member's raw end_date."""
+    is_expired = False
+    dynamic_status = 'unknown'  # Will be calculated dynamically
+    end_date_only = ''
+    if end_date_value:
+        # Extract date part only (first 10 characters)
+        end_date_only = str(end_date_value).strip()[:10]
+
+        # Validate date format (should be YYYY-MM-DD or similar)
+        if len(end_date_only) >= 10:
+            end_date_parsed = None
+            for fmt in ('%Y-%m-%d', '%m/%d/%Y', '%d/%m/%Y', '%m-%d-%Y', '%d-%m-%Y', '%Y/%m/%d'):
+                try:
+                    end_date_parsed = datetime.strptime(end_date_only, fmt).date()
+                    break
+                except ValueError:
+                    continue
+
+            if end_date_parsed:
+                if end_date_parsed < today:
+                    is_expired = True
+                    dynamic_status = 'ex'
+                else:
+                    dynamic_status = 'val'
+    return is_expired, dynamic_status, end_date_only
+
+
+# all_members sort columns -> (ORDER BY expression, value standing in for NULL). NULLs are
+# folded into a sortable value so keyset cursors compare exactly what ORDER BY sorts on.
+MEMBER_SORT_KEYS = {
+    'id': ('id', None),
+    'name': ("COALESCE(name, '')", ''),
+    'email': ("COALESCE(email, '')", ''),
+    'phone': ("COALESCE(phone, '')", ''),
+    'age': ('COALESCE(age, -1)', -1),
+    'gender': ("COALESCE(gender, '')", ''),
+    'actual_starting_date': ("COALESCE(actual_starting_date, '')", ''),
+    'starting_date': ("COALESCE(starting_date, '')", ''),
+    'end_date': ("COALESCE(end_date, '')", ''),
+    'membership_packages': ("COALESCE(membership_packages, '')", ''),
+    'membership_fees': ('COALESCE(membership_fees, -1)', -1),
+    'membership_status': ("COALESCE(membership_status, '')", ''),
+}
+
+
+# Sort keys whose cursor value must be bound as the column type: a fee such as 12.3
+# round-trips through JSON as a double, which is not equal to the stored REAL
+MEMBER_SORT_PARAM_TYPES = {'membership_fees': 'real'}
+
+
+def _member_keyset(sort_by):
+    """Returns the keyset expressions (sort key, then id as tie-breaker) for a member sort column."""
+    sort_expr = MEMBER_SORT_KEYS[sort_by][0]
+    return [sort_expr] if sort_by == 'id' else [sort_expr, 'id']
+
+
+def _member_keyset_types(sort_by):
+    """SQL types the keyset values are cast to, matching _member_keyset(sort_by)."""
+    sort_type = MEMBER_SORT_PARAM_TYPES.get(sort_by)
+    return [sort_type] if sort_by == 'id' else [sort_type, None]
+
+
+def _member_cursor_values(member, sort_by):
+    """Key values of a member row matching _member_keyset(sort_by)."""
+    if sort_by == 'id':
+        return [member['id']]
+    value = member.get(sort_by)
+    return [MEMBER_SORT_KEYS[sort_by][1] if value is None else value, member['id']]
+
+
+def _annotate_member_rows(members_data, today):
+    """Adds is_expired, dynamic_status and end_date_only to compact member rows."""
+    processed_members = []
+    for member in members_data or []:
+        is_expired, dynamic_status, end_date_only = _member_dynamic_status(member.get('end_date'), today)
+        extra = {
+            'is_expired': is_expired,
+            'dynamic_status': dynamic_status,  # For template use
+            'end_date_only': end_date_only,
+        }
+        # Ensure freeze_used is included (default to False if not present)
+        if 'freeze_used' not in member:
+            extra['freeze_used'] = False
+        processed_members.append(member.extend(**extra))
+    return processed_members
+
+
 @app.route("/all_members")
 @login_required
 def all_members():
@@ -2096,144 +1909,72 @@ def all_members():
         if sort_dir not in ['asc', 'desc']:
             sort_dir = 'asc'
         
-        # Calculate counts for active and expired members (for statistics box)
-        today = get_cairo_date()
-        today_str = today.strftime('%Y-%m-%d')
-        
-        # Get active count - based on end_date >= today
-        active_count_result = query_db("""
-            SELECT COUNT(*) as count FROM members 
-            WHERE end_date IS NOT NULL 
-            AND end_date != ''
-            AND LENGTH(TRIM(end_date)) >= 10
-            AND SUBSTRING(TRIM(end_date), 1, 10) ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}'
-            AND CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE) >= (CURRENT_TIMESTAMP AT TIME ZONE 'Africa/Cairo')::DATE
-        """, one=True)
-        active_count = active_count_result['count'] if active_count_result else 0
-        
-        # Get expired count - based on end_date < today OR end_date is NULL/empty/invalid
-        expired_count_result = query_db("""
-            SELECT COUNT(*) as count FROM members 
-            WHERE (
-                -- end_date is NULL or empty
-                (end_date IS NULL OR end_date = '')
-                OR
-                -- end_date format is invalid (less than 10 characters)
-                (LENGTH(TRIM(end_date)) < 10)
-                OR
-                -- end_date format is invalid (doesn't match YYYY-MM-DD pattern)
-                (LENGTH(TRIM(end_date)) >= 10 AND SUBSTRING(TRIM(end_date), 1, 10) !~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}')
-                OR
-                -- end_date is valid but < today (expired)
-                (LENGTH(TRIM(end_date)) >= 10 
-                 AND SUBSTRING(TRIM(end_date), 1, 10) ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}'
-                 AND CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE) < (CURRENT_TIMESTAMP AT TIME ZONE 'Africa/Cairo')::DATE)
-            )
-        """, one=True)
-        expired_count = expired_count_result['count'] if expired_count_result else 0
-        
-        # Build query with sorting from database
-        order_clause = f'ORDER BY {sort_by} {sort_dir.upper()}'
-        
-        # Get total count
-        total_count = query_db('SELECT COUNT(*) as count FROM members', one=True)
-        total_pages = (total_count['count'] + per_page - 1) // per_page if total_count else 1
+        wants_json = request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.args.get('format') == 'json'
+
+        # Keyset pagination: a cursor token from a previous page replaces OFFSET and the COUNT(*)
+        key_sql = _member_keyset(sort_by)
+        cursor_scope = f'all_members:{sort_by}:{sort_dir}'
+        after = decode_cursor(request.args.get('cursor', '').strip(), cursor_scope, len(key_sql))
+        order_clause = 'ORDER BY ' + ', '.join(f'{expr} {sort_dir.upper()}' for expr in key_sql)
         
-        # Get paginated data with sorting from database
-        members_data = query_db(
-            f'SELECT * FROM members {order_clause} LIMIT %s OFFSET %s',
-            (per_page, offset)
-        )
+        if after is not None:
+            members_data = query_db(
+                f'SELECT * FROM members WHERE {keyset_predicate(key_sql, sort_dir == "desc", _member_keyset_types(sort_by))} '
+                f'{order_clause} LIMIT %s',
+                tuple(after) + (per_page + 1,),
+                row_format='compact'
+            )
+            total_count = None
+            total_pages = None
+        else:
+            # Total from planner statistics for large tables, exact (and cached) otherwise
+            total_count = count_rows('members')
+            total_pages = (total_count['count'] + per_page - 1) // per_page if total_count else 1
+            
+            # Get paginated data with sorting from database (one extra row tells us if there is more)
+            members_data = query_db(
+                f'SELECT * FROM members {order_clause} LIMIT %s OFFSET %s',
+                (per_page + 1, offset),
+                row_format='compact'
+            )
+        members_data, has_more = split_page(members_data, per_page)
+        next_cursor = encode_cursor(_member_cursor_values(members_data[-1], sort_by), cursor_scope) if has_more else None
         
-        # Process members to add is_expired flag for freeze button logic
-        # Also calculate dynamic status based on current date (like attendance_table)
+        # Add is_expired / dynamic_status / end_date_only for the template and freeze button logic
         today = get_cairo_date()
         today_str = today.strftime('%Y-%m-%d')  # Format for template comparison
-        
-        processed_members = []
-        if members_data:
-            for member in members_data:
-                member_dict = dict(member) if hasattr(member, 'keys') else member
-                is_expired = False
-                dynamic_status = 'unknown'  # Will be calculated dynamically
-                end_date_only = ''  # Initialize
-                
-                # Check if end_date is expired and calculate dynamic status
-                end_date_str = member_dict.get('end_date')
-                if end_date_str:
-                    try:
-                        # Extract date part only (first 10 characters)
-                        end_date_only = str(end_date_str).strip()[:10] if end_date_str else ''
-                        
-                        # Validate date format (should be YYYY-MM-DD or similar)
-                        if end_date_only and len(end_date_only) >= 10:
-                            try:
-                                # Try to parse as YYYY-MM-DD
-                                end_date_parsed = datetime.strptime(end_date_only, '%Y-%m-%d').date()
-                                
-                                if end_date_parsed < today:
-                                    is_expired = True
-                                    dynamic_status = 'ex'
-                                elif end_date_parsed > today:
-                                    dynamic_status = 'val'
-                                else:  # end_date == today
-                                    dynamic_status = 'val'
-                            except ValueError:
-                                # Try other date formats
-                                date_formats = [
-                                    '%m/%d/%Y', '%d/%m/%Y', '%m-%d-%Y', 
-                                    '%d-%m-%Y', '%Y/%m/%d'
-                                ]
-                                end_date_parsed = None
-                                for fmt in date_formats:
-                                    try:
-                                        end_date_parsed = datetime.strptime(end_date_only, fmt).date()
-                                        break
-                                    except ValueError:
-                                        continue
-                                
-                                if end_date_parsed:
-                                    if end_date_parsed < today:
-                                        is_expired = True
-                                        dynamic_status = 'ex'
-                                    elif end_date_parsed > today:
-                                        dynamic_status = 'val'
-                                    else:
-                                        dynamic_status = 'val'
-                    except Exception as e:
-                        print(f"Error parsing end_date for member {member_dict.get('id')}: {e}")
-                        dynamic_status = 'unknown'
-                
-                member_dict['is_expired'] = is_expired
-                member_dict['dynamic_status'] = dynamic_status  # For template use
-                member_dict['end_date_only'] = end_date_only
-                # Ensure freeze_used is included (default to False if not present)
-                if 'freeze_used' not in member_dict:
-                    member_dict['freeze_used'] = False
-                processed_members.append(member_dict)
+        processed_members = _annotate_member_rows(members_data, today)
         
         # Check if this is an AJAX request for infinite scroll
-        if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.args.get('format') == 'json':
+        if wants_json:
             # Return JSON for AJAX requests
             from flask import jsonify
             return jsonify({
                 'members': processed_members,
                 'page': page,
                 'total_pages': total_pages,
-                'total_count': total_count['count'] if total_count else 0,
-                'has_more': page < total_pages
+                'total_count': total_count['count'] if total_count else None,
+                'count_approximate': bool(total_count and total_count['approximate']),
+                'has_more': has_more,
+                'next_cursor': next_cursor
             })
         
+        # Active / expired card counts (exact, cached until the next members write)
+        active_count = count_rows('members', active_predicate(), exact=True)['count']
+        expired_count = count_rows('members', expired_predicate(include_unknown=True), exact=True)['count']
+        
         return render_template("all_members.html", 
                             members_data=processed_members,
                             page=page,
-                            total_pages=total_pages,
+                            total_pages=total_pages or 1,
                             total_count=total_count['count'] if total_count else 0,
+                            count_approximate=bool(total_count and total_count['approximate']),
                             today=today_str,
                             active_count=active_count,
                             expired_count=expired_count,
                             sort_by=sort_by,
-                            sort_dir=sort_dir)
+                            sort_dir=sort_dir,
+                            next_cursor=next_cursor)
     except Exception as e:
         print(f"Error in all_members route: {e}")
         import traceback
@@ -2268,47 +2009,22 @@ def filtered_members():
         # Expiry bucket filter: 7 = Urgent, 14 = Warning, 30 = Upcoming
         expires_within_raw = request.args.get('expires_within', '').strip()
         expires_within = expires_within_raw if expires_within_raw in ('7', '14', '30') else ''
+
+        # Visit filters on the denormalized members columns: no visit in N days, at least N visits
+        no_visit_days = request.args.get('no_visit_days', type=int)
+        if not no_visit_days or not 1 <= no_visit_days <= MAX_NO_VISIT_DAYS:
+            no_visit_days = None
+        min_visits = {}
+        for key in MEMBER_VISIT_COUNTERS:
+            value = request.args.get(key, type=int)
+            if value and value > 0:
+                min_visits[key] = value
         
         # Pagination: 50 items per page
         page = request.args.get('page', 1, type=int)
         per_page = 50
         offset = (page - 1) * per_page
         
-        # Calculate counts for active and expired members (for statistics box)
-        today = get_cairo_date()
-        today_str = today.strftime('%Y-%m-%d')
-        
-        # Get active count - based on end_date >= today
-        active_count_result = query_db("""
-            SELECT COUNT(*) as count FROM members 
-            WHERE end_date IS NOT NULL 
-            AND end_date != ''
-            AND LENGTH(TRIM(end_date)) >= 10
-            AND SUBSTRING(TRIM(end_date), 1, 10) ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}'
-            AND CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE) >= (CURRENT_TIMESTAMP AT TIME ZONE 'Africa/Cairo')::DATE
-        """, one=True)
-        active_count = active_count_result['count'] if active_count_result else 0
-        
-        # Get expired count - based on end_date < today OR end_date is NULL/empty/invalid
-        expired_count_result = query_db("""
-            SELECT COUNT(*) as count FROM members 
-            WHERE (
-                -- end_date is NULL or empty
-                (end_date IS NULL OR end_date = '')
-                OR
-                -- end_date format is invalid (less than 10 characters)
-                (LENGTH(TRIM(end_date)) < 10)
-                OR
-                -- end_date format is invalid (doesn't match YYYY-MM-DD pattern)
-                (LENGTH(TRIM(end_date)) >= 10 AND SUBSTRING(TRIM(end_date), 1, 10) !~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}')
-                OR
-                -- end_date is valid but < today (expired)
-                (LENGTH(TRIM(end_date)) >= 10 
-                 AND SUBSTRING(TRIM(end_date), 1, 10) ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}'
-                 AND CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE) < (CURRENT_TIMESTAMP AT TIME ZONE 'Africa/Cairo')::DATE)
-            )
-        """, one=True)
-        expired_count = expired_count_result['count'] if expired_count_result else 0
         
         # Build WHERE conditions for each column
         where_conditions = []
@@ -2359,69 +2075,19 @@ def filtered_members():
             params.append(f'%{search_fees}%')
         
         # Handle view filter: "active", "expired", or "all"
-        if view == 'active':
-            # Filter for active members (end_date >= today)
-            where_conditions.append("""
-                (end_date IS NOT NULL AND end_date != '' AND 
-                 LENGTH(TRIM(end_date)) >= 10 AND
-                 CASE 
-                     WHEN SUBSTRING(TRIM(end_date), 1, 10) ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}' THEN
-                         CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE) >= (CURRENT_TIMESTAMP AT TIME ZONE 'Africa/Cairo')::DATE
-                     ELSE FALSE
-                 END)
-            """)
-        elif view == 'expired':
-            # Filter for expired members (end_date < today)
-            where_conditions.append("""
-                (end_date IS NOT NULL AND end_date != '' AND 
-                 LENGTH(TRIM(end_date)) >= 10 AND
-                 CASE 
-                     WHEN SUBSTRING(TRIM(end_date), 1, 10) ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}' THEN
-                         CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE) < (CURRENT_TIMESTAMP AT TIME ZONE 'Africa/Cairo')::DATE
-                     ELSE FALSE
-                 END)
-            """)
+        status_condition = view_predicate(view)
+        if status_condition:
+            where_conditions.append(status_condition)
         # If view == 'all', don't add any status filter
 
         # expires_within filter: disjoint day-range buckets matching dashboard counts
         if expires_within:
-            from datetime import timedelta as _td
-            _today = get_cairo_date()
-            _ew = int(expires_within)
-            _upper = (_today + _td(days=_ew)).strftime('%Y-%m-%d')
-            if _ew == 7:
-                # Urgent: today <= end_date <= today+7
-                where_conditions.append("""
-                    end_date IS NOT NULL AND end_date != ''
-                    AND LENGTH(TRIM(end_date)) >= 10
-                    AND SUBSTRING(TRIM(end_date), 1, 10) ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}'
-                    AND CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE)
-                        >= (CURRENT_TIMESTAMP AT TIME ZONE 'Africa/Cairo')::DATE
-                    AND CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE) <= %s
-                """)
-                params.append(_upper)
-            elif _ew == 14:
-                # Warning: today+7 < end_date <= today+14
-                _lower = (_today + _td(days=7)).strftime('%Y-%m-%d')
-                where_conditions.append("""
-                    end_date IS NOT NULL AND end_date != ''
-                    AND LENGTH(TRIM(end_date)) >= 10
-                    AND SUBSTRING(TRIM(end_date), 1, 10) ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}'
-                    AND CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE) > %s
-                    AND CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE) <= %s
-                """)
-                params.extend([_lower, _upper])
-            else:  # 30
-                # Upcoming: today+14 < end_date <= today+30
-                _lower = (_today + _td(days=14)).strftime('%Y-%m-%d')
-                where_conditions.append("""
-                    end_date IS NOT NULL AND end_date != ''
-                    AND LENGTH(TRIM(end_date)) >= 10
-                    AND SUBSTRING(TRIM(end_date), 1, 10) ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}'
-                    AND CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE) > %s
-                    AND CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE) <= %s
-                """)
-                params.extend([_lower, _upper])
+            where_conditions.append(expiring_within_predicate(expires_within))
+
+        if no_visit_days:
+            where_conditions.append(no_visit_predicate(no_visit_days))
+        for key, value in min_visits.items():
+            where_conditions.append(min_visits_predicate(key, value))
         
         if search_invitations:
             where_conditions.append("CAST(COALESCE(invitations, 0) AS TEXT) ILIKE %s")
@@ -2431,97 +2097,36 @@ def filtered_members():
             where_conditions.append("COALESCE(comment, '') ILIKE %s")
             params.append(f'%{search_comment}%')
         
-        # Build query
-        if where_conditions:
-            where_clause = " AND ".join(where_conditions)
-            base_query = f'SELECT * FROM members WHERE {where_clause} ORDER BY id ASC'
-            count_query = f'SELECT COUNT(*) as count FROM members WHERE {where_clause}'
-            
-            # Get total count for pagination
-            total_count = query_db(count_query, tuple(params), one=True)
-            total_pages = (total_count['count'] + per_page - 1) // per_page if total_count else 1
-            
-            # Get paginated data with search
+        # Keyset pagination on id: a cursor token from a previous page replaces OFFSET and the COUNT(*)
+        after = decode_cursor(request.args.get('cursor', '').strip(), 'filtered_members', 1)
+        where_clause = " AND ".join(where_conditions) if where_conditions else "TRUE"
+        
+        if after is not None:
             members_data = query_db(
-                base_query + ' LIMIT %s OFFSET %s',
-                tuple(params) + (per_page, offset)
+                f'SELECT * FROM members WHERE {where_clause} AND {keyset_predicate(["id"])} ORDER BY id ASC LIMIT %s',
+                tuple(params) + tuple(after) + (per_page + 1,),
+                row_format='compact'
             )
+            total_count = None
+            total_pages = None
         else:
-            # No search - get all members
-            total_count = query_db('SELECT COUNT(*) as count FROM members', one=True)
+            # Get total count for pagination (estimated for large results, cached per filter)
+            total_count = count_rows('members', where_clause, params)
             total_pages = (total_count['count'] + per_page - 1) // per_page if total_count else 1
             
+            # Get paginated data with search (one extra row tells us if there is more)
             members_data = query_db(
-                'SELECT * FROM members ORDER BY id ASC LIMIT %s OFFSET %s',
-                (per_page, offset)
+                f'SELECT * FROM members WHERE {where_clause} ORDER BY id ASC LIMIT %s OFFSET %s',
+                tuple(params) + (per_page + 1, offset),
+                row_format='compact'
             )
+        members_data, has_more = split_page(members_data, per_page)
+        next_cursor = encode_cursor([members_data[-1]['id']], 'filtered_members') if has_more else None
         
-        # Process members to add is_expired flag for freeze button logic
-        # Also calculate dynamic status based on current date (like attendance_table)
+        # Add is_expired / dynamic_status / end_date_only for the template and freeze button logic
         today = get_cairo_date()
         today_str = today.strftime('%Y-%m-%d')  # Format for template comparison
-        
-        processed_members = []
-        if members_data:
-            for member in members_data:
-                member_dict = dict(member) if hasattr(member, 'keys') else member
-                is_expired = False
-                dynamic_status = 'unknown'  # Will be calculated dynamically
-                end_date_only = ''  # Initialize
-                
-                # Check if end_date is expired and calculate dynamic status
-                end_date_str = member_dict.get('end_date')
-                if end_date_str:
-                    try:
-                        # Extract date part only (first 10 characters)
-                        end_date_only = str(end_date_str).strip()[:10] if end_date_str else ''
-                        
-                        # Validate date format (should be YYYY-MM-DD or similar)
-                        if end_date_only and len(end_date_only) >= 10:
-                            try:
-                                # Try to parse as YYYY-MM-DD
-                                end_date_parsed = datetime.strptime(end_date_only, '%Y-%m-%d').date()
-                                
-                                if end_date_parsed < today:
-                                    is_expired = True
-                                    dynamic_status = 'ex'
-                                elif end_date_parsed > today:
-                                    dynamic_status = 'val'
-                                else:  # end_date == today
-                                    dynamic_status = 'val'
-                            except ValueError:
-                                # Try other date formats
-                                date_formats = [
-                                    '%m/%d/%Y', '%d/%m/%Y', '%m-%d-%Y', 
-                                    '%d-%m-%Y', '%Y/%m/%d'
-                                ]
-                                end_date_parsed = None
-                                for fmt in date_formats:
-                                    try:
-                                        end_date_parsed = datetime.strptime(end_date_only, fmt).date()
-                                        break
-                                    except ValueError:
-                                        continue
-                                
-                                if end_date_parsed:
-                                    if end_date_parsed < today:
-                                        is_expired = True
-                                        dynamic_status = 'ex'
-                                    elif end_date_parsed > today:
-                                        dynamic_status = 'val'
-                                    else:
-                                        dynamic_status = 'val'
-                    except Exception as e:
-                        print(f"Error parsing end_date for member {member_dict.get('id')}: {e}")
-                        dynamic_status = 'unknown'
-                
-                member_dict['is_expired'] = is_expired
-                member_dict['dynamic_status'] = dynamic_status  # For template use
-                member_dict['end_date_only'] = end_date_only
-                # Ensure freeze_used is included (default to False if not present)
-                if 'freeze_used' not in member_dict:
-                    member_dict['freeze_used'] = False
-                processed_members.append(member_dict)
+        processed_members = _annotate_member_rows(members_data, today)
         
         # Check if this is an AJAX request for infinite scroll
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.args.get('format') == 'json':
@@ -2531,20 +2136,31 @@ def filtered_members():
                 'members': processed_members,
                 'page': page,
                 'total_pages': total_pages,
-                'total_count': total_count['count'] if total_count else 0,
-                'has_more': page < total_pages
+                'total_count': total_count['count'] if total_count else None,
+                'count_approximate': bool(total_count and total_count['approximate']),
+                'has_more': has_more,
+                'next_cursor': next_cursor
             })
         
+        # Active / expired card counts (exact, cached until the next members write)
+        active_count = count_rows('members', active_predicate(), exact=True)['count']
+        expired_count = count_rows('members', expired_predicate(include_unknown=True), exact=True)['count']
+        
         return render_template("filtered_members.html", 
                             members_data=processed_members,
                             page=page,
-                            total_pages=total_pages,
+                            total_pages=total_pages or 1,
                             total_count=total_count['count'] if total_count else 0,
+                            count_approximate=bool(total_count and total_count['approximate']),
+                            has_more=has_more,
+                            next_cursor=next_cursor,
                             today=today_str,
                             view=view,
                             active_count=active_count,
                             expired_count=expired_count,
                             expires_within=expires_within,
+                            no_visit_days=no_visit_days,
+                            min_visits=min_visits,
                             search_id=search_id,
                             search_name=search_name,
                             search_national_id=search_national_id,
@@ -3119,75 +2735,42 @@ def change_password():
 @login_required
 def attendance_table():
     if request.method == 'POST':
-        member_id_str = request.form.get('member_id', '').strip()
+        # AJAX / kiosk callers get a small JSON result instead of the re-rendered table
+        wants_json = (request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+                      or request.args.get('format') == 'json' or request.is_json)
+        payload = request.get_json(silent=True) or {}
+        member_id_str = str(request.form.get('member_id') or payload.get('member_id') or '').strip()
         if not member_id_str.isdigit():
+            if wants_json:
+                return jsonify({'status': 'invalid', 'message': 'Enter a valid member ID!'}), 400
             flash("Enter a valid member ID!", "error")
         else:
             member_id = int(member_id_str)
             try:
-                member = query_db(
-                    "SELECT name, end_date, membership_status FROM members WHERE id = %s", 
-                    (member_id,), one=True
-                )
-
-                if not member:
-                    flash(f"Member ID {member_id} not found!", "error")
-                else:
-                    # Try to record attendance within try-except
-                    try:
-                        # Make sure the member hasn't already been recorded today
-                        today = get_cairo_date().strftime("%Y-%m-%d")
-                        already = query_db(
-                            "SELECT 1 FROM attendance WHERE member_id = %s AND attendance_date = %s", 
-                            (member_id, today), one=True
-                        )
-
-                        if already:
-                            flash(f"{member['name']} already came today!", "success")
-                        else:
-                            # Log attendance addition for undo (before adding)
-                            username = session.get('username', 'Unknown')
-                            
-                            # Add attendance
-                            add_attendance(
-                                member_id,
-                                member['name'],
-                                member['end_date'],
-                                member['membership_status']
-                            )
-                            
-                            # Get the attendance record that was just added
-                            attendance_record = query_db(
-                                'SELECT * FROM attendance WHERE member_id = %s AND attendance_date = %s ORDER BY num DESC LIMIT 1',
-                                (member_id, today), one=True
-                            )
-                            if attendance_record:
-                                log_action('add_attendance', member_id=member_id, member_name=member['name'],
-                                          action_data={'attendance_num': attendance_record.get('num'),
-                                                      'attendance_date': attendance_record.get('attendance_date'),
-                                                      'attendance_time': attendance_record.get('attendance_time')},
-                                          performed_by=username)
-                            flash(f"Attendance for {member['name']} recorded successfully!", "success")
-                    except Exception as e:
-                        print("Error adding attendance:", e)
-                        flash(f"Error recording attendance: {str(e)}", "error")
+                # Lookup, duplicate guard, insert and undo log in one transaction / round trip
+                result = check_in_member(member_id, performed_by=session.get('username', 'Unknown'))
             except Exception as e:
-                print(f"Error querying member in attendance_table: {e}")
+                print(f"Error recording attendance for member {member_id}: {e}")
                 import traceback
                 traceback.print_exc()
-                flash(f"Error loading member: {str(e)}", "error")
+                if wants_json:
+                    return jsonify({'status': 'error', 'message': f"Error recording attendance: {str(e)}"}), 500
+                flash(f"Error recording attendance: {str(e)}", "error")
+            else:
+                if wants_json:
+                    return jsonify(result), 404 if result['status'] == CHECK_IN_NOT_FOUND else 200
+                if result['status'] == CHECK_IN_NOT_FOUND:
+                    flash(f"Member ID {member_id} not found!", "error")
+                elif result['status'] == CHECK_IN_ALREADY:
+                    flash(f"{result['member']['name']} already came today!", "success")
+                else:
+                    flash(f"Attendance for {result['member']['name']} recorded successfully!", "success")
 
         try:
-            # Get all attendance data - use actual end_date from members table
-            data = query_db("""
-                SELECT a.num, a.member_id, a.name, 
-                       COALESCE(m.end_date, a.end_date) as end_date,
-                       COALESCE(m.membership_status, a.membership_status) as membership_status,
-                       a.attendance_time, a.attendance_date, a.day, m.comment 
-                FROM attendance a 
-                LEFT JOIN members m ON a.member_id = m.id 
-                ORDER BY a.num ASC
-            """)
+            # Get all attendance data - use actual end_date from members table. The tombstone
+            # position is read first so the page's feed polling cannot miss a deletion.
+            last_deletion_id = get_last_attendance_deletion_id()
+            data = get_attendance_rows()
             # Get current user permissions for template
             try:
                 user = get_current_user()
@@ -3208,7 +2791,8 @@ def attendance_table():
             return render_template("attendance_table.html", 
                                 members_data=data or [],
                                 user_permissions=user_permissions,
-                                today=today)
+                                today=today,
+                                last_deletion_id=last_deletion_id)
         except Exception as e:
             print(f"Error loading attendance data: {e}")
             import traceback
@@ -3218,15 +2802,8 @@ def attendance_table():
 
     # This part handles the GET request (default view)
     try:
-        data = query_db("""
-            SELECT a.num, a.member_id, a.name, 
-                   COALESCE(m.end_date, a.end_date) as end_date,
-                   COALESCE(m.membership_status, a.membership_status) as membership_status,
-                   a.attendance_time, a.attendance_date, a.day, m.comment 
-            FROM attendance a 
-            LEFT JOIN members m ON a.member_id = m.id 
-            ORDER BY a.num ASC
-        """)
+        last_deletion_id = get_last_attendance_deletion_id()
+        data = get_attendance_rows()
         
         user = get_current_user()
         user_permissions = {}
@@ -3243,11 +2820,111 @@ def attendance_table():
         return render_template("attendance_table.html", 
                             members_data=data or [], 
                             user_permissions=user_permissions,
-                            today=today)
+                            today=today,
+                            last_deletion_id=last_deletion_id)
     except Exception as e:
         print(f"Error in attendance_table GET: {e}")
         return render_template("attendance_table.html", members_data=[], user_permissions={})
 
+
+@app.route('/attendance_table/feed')
+@login_required
+def attendance_feed():
+    """Attendance rows added (num > after) and removed (tombstone id > deleted_after) since the last poll."""
+    after = request.args.get('after', 0, type=int)
+    deleted_after = request.args.get('deleted_after', 0, type=int)
+    try:
+        return jsonify(get_attendance_feed(max(after, 0), max(deleted_after, 0)))
+    except Exception as e:
+        print(f"Error in attendance_feed: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/attendance/batch', methods=['POST'])
+@login_required
+def attendance_batch_api():
+    """Batch check-in for kiosks / turnstiles.
+
+    Body: {"events": [{"event_id": "...", "member_id": 123, "scanned_at": "2026-03-01T07:30:00"}, ...]}
+    (or the bare list). Returns one accept/reject result per event, in order.
+    Events are idempotent by event_id, so a kiosk can resend a batch after a
+    timeout or when it comes back online.
+    """
+    payload = request.get_json(silent=True)
+    events = payload.get('events') if isinstance(payload, dict) else payload
+    if not isinstance(events, list):
+        return jsonify({'error': 'Expected a JSON list of events'}), 400
+    if len(events) > ATTENDANCE_BATCH_LIMIT:
+        return jsonify({'error': f'At most {ATTENDANCE_BATCH_LIMIT} events per batch'}), 413
+    try:
+        results = ingest_attendance_batch(events, performed_by=session.get('username', 'Unknown'))
+    except Exception as e:
+        print(f"Error in attendance_batch_api: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+    accepted = sum(1 for result in results if result['status'] == INGEST_ACCEPTED)
+    return jsonify({'results': results, 'accepted': accepted, 'rejected': len(results) - accepted})
+
+
+def _visit_date_range():
+    """Reads ?from=&to= (YYYY-MM-DD) for the visit history; raises ValueError on bad dates."""
+    date_from = request.args.get('from', '').strip()
+    date_to = request.args.get('to', '').strip()
+    return (datetime.strptime(date_from, '%Y-%m-%d').date() if date_from else None,
+            datetime.strptime(date_to, '%Y-%m-%d').date() if date_to else None)
+
+
+@app.route('/member_visits/<int:member_id>')
+@login_required
+def member_visits(member_id):
+    """A member's full visit history (today's table and the archive) with a one-year heatmap."""
+    try:
+        member = query_db('SELECT id, name, end_date, membership_status FROM members WHERE id = %s',
+                          (member_id,), one=True)
+        if not member:
+            flash('Member not found!', 'error')
+            return redirect(url_for('all_members'))
+        try:
+            date_from, date_to = _visit_date_range()
+        except ValueError:
+            flash('Dates must be in YYYY-MM-DD format.', 'error')
+            date_from = date_to = None
+        page = get_member_visits(member_id, date_from, date_to)
+        heatmap = get_member_visit_heatmap(member_id)
+        return render_template('member_visits.html', member=member, page=page, heatmap=heatmap,
+                               date_from=date_from, date_to=date_to)
+    except Exception as e:
+        print(f"Error loading member visits: {e}")
+        import traceback
+        traceback.print_exc()
+        flash(f"Error loading visit history: {str(e)}", "error")
+        return redirect(url_for('all_members'))
+
+
+@app.route('/api/member_visits/<int:member_id>')
+@login_required
+def member_visits_api(member_id):
+    """One page of a member's visits (?from=&to=&cursor=&limit=); the first page also carries the heatmap."""
+    try:
+        date_from, date_to = _visit_date_range()
+    except ValueError:
+        return jsonify({'error': 'Dates must be in YYYY-MM-DD format'}), 400
+    cursor = request.args.get('cursor', '').strip() or None
+    try:
+        data = get_member_visits(member_id, date_from, date_to, cursor=cursor,
+                                 limit=request.args.get('limit', MEMBER_VISITS_PAGE_SIZE, type=int))
+        if not cursor:
+            data['heatmap'] = get_member_visit_heatmap(member_id)
+        return jsonify(data)
+    except Exception as e:
+        print(f"Error in member_visits_api: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/delete_attendance_data', methods=['POST'])
 @login_required
 def delete_attendance_data():
@@ -3321,6 +2998,7 @@ def delete_attendance_route(attendance_num):
             
             # Delete the record
             delete_attendance(attendance_num)
+            forget_checked_in([attendance_num])
             flash("Attendance record deleted successfully!", "success")
         else:
             flash("Attendance record not found!", "error")
@@ -3337,8 +3015,9 @@ def delete_attendance_route(attendance_num):
 @rino_required
 def attendance_backup_table():
     try:
-        # Pull all data from the backup table
-        data = query_db("SELECT * FROM attendance_backup ORDER BY id ASC")
+        # Pull the backup rows; optional ?from=&to= dates only scan those months' partitions
+        data = get_attendance_backup(date_from=request.args.get('from') or None,
+                                     date_to=request.args.get('to') or None)
         return render_template("attendance_backup.html", backup_data=data)
 
     except Exception as e:
@@ -3347,6 +3026,67 @@ def attendance_backup_table():
         flash("An error occurred while loading the backup!", "error")
         return redirect(url_for('attendance_table'))
 
+
+# === Streaming CSV exports ===
+def _stream_csv(rows, filename):
+    """Streams an iterable of dict rows as a CSV download, one row at a time.
+
+    Pair with the ``stream=True`` query helpers so large tables are exported
+    from a server-side cursor without loading them into memory.
+    """
+    import csv
+    import io
+
+    def generate():
+        buffer = io.StringIO()
+        writer = None
+        for row in rows:
+            if writer is None:
+                writer = csv.DictWriter(buffer, fieldnames=list(row.keys()))
+                writer.writeheader()
+            writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+
+@app.route('/attendance_backup/export.csv')
+@rino_required
+def export_attendance_backup_csv():
+    rows = get_attendance_backup(stream=True, date_from=request.args.get('from') or None,
+                                 date_to=request.args.get('to') or None)
+    return _stream_csv(rows, 'attendance_backup.csv')
+
+
+@app.route('/invoices/export.csv')
+@login_required
+def export_invoices_csv():
+    return _stream_csv(get_all_invoices(stream=True), 'invoices.csv')
+
+
+@app.route('/renewal_log/export.csv')
+@permission_required('renewal_log')
+def export_renewal_logs_csv():
+    return _stream_csv(get_renewal_logs(stream=True), 'renewal_logs.csv')
+
+
+@app.route('/logs/export.csv')
+@login_required
+def export_logs_csv():
+    return _stream_csv(get_all_logs(stream=True), 'member_logs.csv')
+
+
+@app.route('/invitations/export.csv')
+@permission_required('invitations_view')
+def export_invitations_csv():
+    return _stream_csv(get_all_invitations(stream=True), 'invitations.csv')
+
 @app.route('/attendance_backup_runs', methods=['GET'])
 @rino_required
 def attendance_backup_runs_page():
@@ -3488,8 +3228,8 @@ def invitations():
         per_page = 50
         offset = (page - 1) * per_page
         
-        # Get total count for pagination
-        total_count = query_db('SELECT COUNT(*) as count FROM invitations', one=True)
+        # Get total count for pagination (estimated for large tables, cached)
+        total_count = count_rows('invitations')
         total_pages = (total_count['count'] + per_page - 1) // per_page if total_count else 1
         
         # Get paginated invitations
@@ -3540,6 +3280,7 @@ def invitations():
                              page=page,
                              total_pages=total_pages,
                              total_count=total_count['count'] if total_count else 0,
+                             count_approximate=bool(total_count and total_count['approximate']),
                              user_permissions=user_permissions)
     except Exception as e:
         print(f"Error in invitations GET route: {e}")
@@ -3986,15 +3727,7 @@ def renewal_log():
         monthly_total = get_monthly_total(now.year, now.month)
         
         # Calculate total membership (all time)
-        total_membership = 0.0
-        if renewal_logs:
-            for log in renewal_logs:
-                fees = log.get('fees')
-                if fees is not None:
-                    try:
-                        total_membership += float(fees)
-                    except (ValueError, TypeError):
-                        pass
+        total_membership = get_renewal_fees_total()
         
         return render_template('renewal_log.html',
                              renewal_logs=renewal_logs,
@@ -4022,28 +3755,47 @@ def logs():
         per_page = 50
         offset = (page - 1) * per_page
         
-        if member_id:
-            # Get total count for pagination
-            total_count = query_db('SELECT COUNT(*) as count FROM member_logs WHERE member_id = %s', (member_id,), one=True)
-            total_pages = (total_count['count'] + per_page - 1) // per_page if total_count else 1
-            
-            # Get paginated logs
+        where_clause = 'WHERE member_id = %s' if member_id else ''
+        params = (member_id,) if member_id else ()
+        
+        # Keyset pagination on id: a cursor token from a previous page replaces OFFSET and the COUNT(*)
+        after = decode_cursor(request.args.get('cursor', '').strip(), 'logs', 1)
+        if after is not None:
+            keyset = keyset_predicate(['id'])
             logs_data = query_db(
-                'SELECT * FROM member_logs WHERE member_id = %s ORDER BY id ASC LIMIT %s OFFSET %s',
-                (member_id, per_page, offset)
+                f'SELECT * FROM member_logs {where_clause + " AND " if where_clause else "WHERE "}{keyset} ORDER BY id ASC LIMIT %s',
+                params + tuple(after) + (per_page + 1,)
             )
-            member = get_member(member_id)
-            member_name = member['name'] if member else f"Member ID {member_id}"
+            total_count = None
+            total_pages = None
         else:
-            # Get total count for pagination
-            total_count = query_db('SELECT COUNT(*) as count FROM member_logs', one=True)
+            # Get total count for pagination (estimated for large results, cached per filter)
+            total_count = count_rows('member_logs', where_clause.removeprefix('WHERE '), params)
             total_pages = (total_count['count'] + per_page - 1) // per_page if total_count else 1
             
-            # Get paginated logs
+            # Get paginated logs (one extra row tells us if there is more)
             logs_data = query_db(
-                'SELECT * FROM member_logs ORDER BY id ASC LIMIT %s OFFSET %s',
-                (per_page, offset)
+                f'SELECT * FROM member_logs {where_clause} ORDER BY id ASC LIMIT %s OFFSET %s',
+                params + (per_page + 1, offset)
             )
+        logs_data, has_more = split_page(logs_data, per_page)
+        next_cursor = encode_cursor([logs_data[-1]['id']], 'logs') if has_more else None
+        
+        if request.args.get('format') == 'json':
+            return jsonify({
+                'logs': logs_data,
+                'page': page,
+                'total_pages': total_pages,
+                'total_count': total_count['count'] if total_count else None,
+                'count_approximate': bool(total_count and total_count['approximate']),
+                'has_more': has_more,
+                'next_cursor': next_cursor
+            })
+        
+        if member_id:
+            member = get_member(member_id)
+            member_name = member['name'] if member else f"Member ID {member_id}"
+        else:
             member_name = None
         
         return render_template('logs.html', 
@@ -4051,8 +3803,10 @@ def logs():
                              member_id=member_id,
                              member_name=member_name,
                              page=page,
-                             total_pages=total_pages,
-                             total_count=total_count['count'] if total_count else 0)
+                             total_pages=total_pages or 1,
+                             total_count=total_count['count'] if total_count else 0,
+                             count_approximate=bool(total_count and total_count['approximate']),
+                             next_cursor=next_cursor)
     except Exception as e:
         print(f"Error in logs route: {e}")
         import traceback
@@ -4193,6 +3947,7 @@ def undo_action(action_id):
             attendance_num = action_data.get('attendance_num')
             if attendance_num:
                 query_db('DELETE FROM attendance WHERE num = %s', (attendance_num,), commit=True)
+                forget_checked_in([attendance_num])
                 flash(f"Attendance record for {member_name} removed successfully!", "success")
             else:
                 flash("Could not find attendance record to delete.", "error")
@@ -4344,15 +4099,14 @@ def data_management():
                 imported = 0
                 errors = []
                 skipped = 0
-                batch_size = 250  # Optimal batch size to prevent timeouts
+                batch_size = 2000  # Rows per COPY batch
                 total_rows = len(df)
                 
                 print(f"Starting import of {total_rows} rows in batches of {batch_size}")
                 # Flash initial message
                 flash(f'Starting import of {total_rows} rows. This may take 10-15 minutes. Please wait and do not close this page...', 'success')
                 
-                # Import bulk_add_members function
-                from .queries import bulk_add_members
+                from .queries import bulk_import_members
                 
                 # Process in batches to avoid memory/timeout issues
                 for batch_start in range(0, total_rows, batch_size):
@@ -4558,71 +4312,27 @@ def data_management():
                                 if membership_packages:
                                     invitations = calculate_invitations(membership_packages)
                                 
-                                # Add to batch list for bulk insert - store row index for detailed logging
-                                if custom_id is not None:
-                                    batch_members.append((
-                                        custom_id, name, email, phone, age, gender, birthdate,
-                                        actual_starting_date, starting_date, end_date,
-                                        membership_packages, membership_fees, membership_status,
-                                        invitations, comment, national_id, idx + 2 # Add row number for logging
-                                    ))
-                                else:
-                                    batch_members.append((
-                                        name, email, phone, age, gender, birthdate,
-                                        actual_starting_date, starting_date, end_date,
-                                        membership_packages, membership_fees, membership_status,
-                                        invitations, comment, national_id, idx + 2 # Add row number for logging
-                                    ))
+                                # Add to batch list for bulk insert - keyed by spreadsheet row number for reject reporting
+                                batch_members.append((
+                                    idx + 2, custom_id, name, email, phone, age, gender, birthdate,
+                                    actual_starting_date, starting_date, end_date,
+                                    membership_packages, membership_fees, membership_status,
+                                    invitations, comment, national_id
+                                ))
                                 
                             except Exception as e:
                                 errors.append(f"Row {idx + 2}: {str(e)[:100]}")
                                 print(f"Error processing row {idx + 2}: {e}")
                                 continue
 
-                        # Process the batch by separating members with and without custom IDs
+                        # COPY the whole batch (custom-ID and auto-ID rows together) into staging,
+                        # validate and insert in SQL, and collect per-row rejects
                         if batch_members:
-                            # Separate sub-batches to ensure consistent tuple lengths for execute_batch
-                            batch_with_id = [m[:-1] for m in batch_members if len(m) == 16] # 15 + index
-                            batch_no_id = [m[:-1] for m in batch_members if len(m) == 15]   # 14 + index
-                            
-                            for sub_batch, has_id in [(batch_with_id, True), (batch_no_id, False)]:
-                                if not sub_batch:
-                                    continue
-                                    
-                                try:
-                                    # Attempt bulk insert
-                                    batch_imported = bulk_add_members(sub_batch)
-                                    imported += batch_imported
-                                except Exception as bulk_error:
-                                    print(f"Bulk insert failed for sub-batch: {bulk_error}")
-                                    # Fall back to individual inserts with detailed logging
-                                    for member_data in sub_batch:
-                                        # Find original row index (passed in original tuple)
-                                        orig_row = next((m[-1] for m in batch_members if m[:-1] == member_data), "Unknown")
-                                        m_name = member_data[1] if has_id else member_data[0]
-                                        
-                                        try:
-                                            if has_id:
-                                                add_member(
-                                                    name=member_data[1], email=member_data[2], phone=member_data[3],
-                                                    age=member_data[4], gender=member_data[5], birthdate=member_data[6],
-                                                    actual_starting_date=member_data[7], starting_date=member_data[8],
-                                                    end_date=member_data[9], membership_packages=member_data[10],
-                                                    membership_fees=member_data[11], membership_status=member_data[12],
-                                                    invitations=member_data[13], comment=member_data[14], custom_id=member_data[0]
-                                                )
-                                            else:
-                                                add_member(
-                                                    name=member_data[0], email=member_data[1], phone=member_data[2],
-                                                    age=member_data[3], gender=member_data[4], birthdate=member_data[5],
-                                                    actual_starting_date=member_data[6], starting_date=member_data[7],
-                                                    end_date=member_data[8], membership_packages=member_data[9],
-                                                    membership_fees=member_data[10], membership_status=member_data[11],
-                                                    invitations=member_data[12], comment=member_data[13]
-                                                )
-                                            imported += 1
-                                        except Exception as individual_error:
-                                            errors.append(f"Row {orig_row} ({m_name}): {str(individual_error)}")
+                            names_by_row = {m[0]: m[2] for m in batch_members}
+                            result = bulk_import_members(batch_members)
+                            imported += result['inserted']
+                            for row_number, reason in result['rejected']:
+                                errors.append(f"Row {row_number} ({names_by_row.get(row_number, 'Unknown')}): {reason}")
                                 
                         # Log batch completion
                         if batch_num % 3 == 0:  # Log every 3 batches
@@ -6124,11 +5834,11 @@ def health_check():
             db_error = str(e)
         
         # Get active users count
-        active_users_count = len(_active_users)
+        active_users_count = len(_get_active_users())
         
         # Get cache stats
-        cache_size = len(_cache)
-        cache_keys = list(_cache.keys())[:10]  # First 10 keys
+        cache_stats = app_cache.stats()
+        cache_stats['keys'] = app_cache.keys()[:10]  # First 10 keys
         
         # Calculate database response time
         db_response_time = None
@@ -6146,13 +5856,11 @@ def health_check():
             'database': {
                 'status': db_status,
                 'error': db_error,
-                'response_time_ms': round(db_response_time * 1000, 2) if db_response_time else None
+                'response_time_ms': round(db_response_time * 1000, 2) if db_response_time else None,
+                'pool': get_pool_stats()
             },
             'active_users': active_users_count,
-            'cache': {
-                'size': cache_size,
-                'keys': cache_keys
-            },
+            'cache': cache_stats,
             'version': '1.0.0'
         }
         
@@ -6230,8 +5938,7 @@ def clear_cache():
     if not (perms.get('super_admin') or session.get('username') == 'rino'):
         return jsonify({'error': 'forbidden'}), 403
     
-    cleared_keys = list(_cache.keys())
-    _cache.clear()
+    cleared_keys = app_cache.clear()
     return jsonify({
         'status': 'ok',
         'cleared_count': len(cleared_keys),
@@ -6257,19 +5964,19 @@ def metrics():
             return jsonify({'error': f'Database error: {str(e)}'}), 500
         
         # Get cache stats
-        cache_stats = {
-            'total_keys': len(_cache),
-            'keys': list(_cache.keys())
-        }
+        cache_stats = app_cache.stats()
+        cache_stats['total_keys'] = cache_stats['entries']
+        cache_stats['keys'] = app_cache.keys()
         
         # Get active users
+        active_users = _get_active_users()
         active_users_list = [
             {
                 'username': data['username'],
                 'last_activity': data['last_activity'].isoformat() if isinstance(data['last_activity'], datetime) else str(data['last_activity']),
                 'ip_address': data.get('ip_address', 'Unknown')
             }
-            for data in _active_users.values()
+            for _, data in active_users
         ]
         
         metrics_data = {
@@ -6278,10 +5985,12 @@ def metrics():
                 'total_members': total_members['count'] if total_members else 0,
                 'total_attendance_records': total_attendance['count'] if total_attendance else 0,
                 'total_users': total_users['count'] if total_users else 0,
-                'active_members': active_members['count'] if active_members else 0
+                'active_members': active_members['count'] if active_members else 0,
+                'pool': get_pool_stats(),
+                'top_queries': get_top_queries()
             },
             'application': {
-                'active_users': len(_active_users),
+                'active_users': len(active_users),
                 'active_users_list': active_users_list,
                 'cache': cache_stats
             },
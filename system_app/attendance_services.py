@@ -0,0 +1,745 @@
+import base64
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+from system_app.func import get_cairo_date, get_cairo_now
+from system_app.membership_status import CAIRO_TODAY_SQL
+from system_app.pagination import decode_cursor, encode_cursor, split_page
+from system_app.queries import query_db, transaction
+
+CHECK_IN_RECORDED = 'recorded'
+CHECK_IN_ALREADY = 'already_checked_in'
+CHECK_IN_NOT_FOUND = 'not_found'
+
+# Rows / tombstones returned per feed call; callers ask again while has_more is set
+ATTENDANCE_FEED_LIMIT = 500
+# Attendance tombstones older than this are pruned by the daily backup
+ATTENDANCE_DELETIONS_RETENTION = '2 days'
+
+# Kiosk / turnstile batch ingestion
+ATTENDANCE_BATCH_LIMIT = 500
+# Scans this far ahead of the server clock are still accepted (kiosk clock drift)
+ATTENDANCE_SCAN_MAX_SKEW = timedelta(minutes=5)
+# Event IDs are remembered this long; a retry after that is treated as a new event
+ATTENDANCE_INGEST_RETENTION = '7 days'
+INGEST_ACCEPTED = 'accepted'
+INGEST_REJECTED = 'rejected'
+_GYM_TZ = pytz.timezone("Africa/Cairo")
+
+# Per-process "checked in today" set: member_id -> attendance snapshot. Deletions
+# made by other workers are picked up from the tombstones at most this often.
+CHECKED_IN_SYNC_SECONDS = 10
+_checked_in = {}
+_checked_in_state = {'date': None, 'deletion_id': 0, 'synced_at': 0.0}
+_checked_in_lock = threading.Lock()
+
+# Attendance rows with the member's current end date, status and comment
+_ATTENDANCE_ROWS_SQL = """
+    SELECT a.num, a.member_id, a.name,
+           COALESCE(m.end_date, a.end_date) as end_date,
+           COALESCE(m.membership_status, a.membership_status) as membership_status,
+           a.attendance_time, a.attendance_date, a.day, m.comment
+    FROM attendance a
+    LEFT JOIN members m ON a.member_id = m.id
+"""
+
+# Member lookup, duplicate guard, insert and undo log in one statement. The
+# NOT EXISTS guard covers databases where the unique (member_id, attendance_date)
+# index could not be created; ON CONFLICT covers two concurrent check-ins.
+_CHECK_IN_SQL = """
+    WITH member AS (
+        SELECT id, name, end_date, membership_status
+        FROM members
+        WHERE id = %(member_id)s
+    ), inserted AS (
+        INSERT INTO attendance
+            (member_id, name, end_date, membership_status, attendance_time, attendance_date, day, checked_in_at)
+        SELECT id, name, end_date, membership_status, %(attendance_time)s, %(attendance_date)s, %(day)s,
+               %(checked_in_at)s
+        FROM member
+        WHERE NOT EXISTS (
+            SELECT 1 FROM attendance
+            WHERE member_id = %(member_id)s AND attendance_date = %(attendance_date)s
+        )
+        ON CONFLICT DO NOTHING
+        RETURNING num, member_id, name, attendance_time, attendance_date, day
+    ), logged AS (
+        INSERT INTO action_logs (action_type, member_id, member_name, action_data, performed_by)
+        SELECT 'add_attendance', member_id, name,
+               jsonb_build_object(
+                   'attendance_num', num,
+                   'attendance_date', attendance_date,
+                   'attendance_time', attendance_time
+               ),
+               %(performed_by)s
+        FROM inserted
+    )
+    SELECT m.id AS member_id, m.name, m.end_date, m.membership_status,
+           i.num, i.attendance_time, i.attendance_date, i.day,
+           (SELECT a.num FROM attendance a
+            WHERE a.member_id = m.id AND a.attendance_date = %(attendance_date)s
+            LIMIT 1) AS existing_num
+    FROM member m
+    LEFT JOIN inserted i ON TRUE
+"""
+
+
+def check_in_member_in_transaction(cur, member_id, performed_by='Unknown', now=None):
+    """Records today's attendance for a member in a single statement on an open transaction.
+
+    Returns a small result dict: ``status`` is one of CHECK_IN_RECORDED,
+    CHECK_IN_ALREADY or CHECK_IN_NOT_FOUND; ``member`` and ``attendance`` hold
+    the member snapshot and the new attendance row (None when nothing was added).
+    For CHECK_IN_ALREADY, ``existing_num`` is the num of today's earlier row.
+    """
+    now = now or get_cairo_now()
+    if now.tzinfo is None:
+        now = _GYM_TZ.localize(now)
+    cur.execute(_CHECK_IN_SQL, {
+        'member_id': member_id,
+        'checked_in_at': now,
+        'attendance_time': now.strftime("%H:%M:%S"),
+        'attendance_date': now.strftime("%Y-%m-%d"),
+        'day': now.strftime("%A"),
+        'performed_by': performed_by,
+    })
+    row = cur.fetchone()
+    if row is None:
+        return {'status': CHECK_IN_NOT_FOUND, 'member_id': member_id, 'member': None, 'attendance': None}
+
+    member = {
+        'id': row['member_id'],
+        'name': row['name'],
+        'end_date': row['end_date'],
+        'membership_status': row['membership_status'],
+    }
+    if row['num'] is None:
+        return {'status': CHECK_IN_ALREADY, 'member_id': member_id, 'member': member, 'attendance': None,
+                'existing_num': row['existing_num']}
+
+    return {
+        'status': CHECK_IN_RECORDED,
+        'member_id': member_id,
+        'member': member,
+        'attendance': {
+            'num': row['num'],
+            'attendance_date': row['attendance_date'],
+            'attendance_time': row['attendance_time'],
+            'day': row['day'],
+        },
+    }
+
+
+def check_in_member(member_id, performed_by='Unknown', now=None):
+    """Checks a member in for today in one transaction and one round trip (see check_in_member_in_transaction).
+
+    Members already in this process's "checked in today" set are answered
+    CHECK_IN_ALREADY without touching the database. Misses always go to the
+    database, whose unique (member_id, attendance_date) index stays the source
+    of truth; the answer is then remembered. Check-ins for another date (an
+    explicit ``now``) bypass the set.
+    """
+    today = get_cairo_date()
+    use_set = now is None or now.date() == today
+    if use_set:
+        cached = lookup_checked_in_today(member_id, today)
+        if cached is not None:
+            member = {key: cached[key] for key in ('name', 'end_date', 'membership_status')}
+            member['id'] = member_id
+            return {'status': CHECK_IN_ALREADY, 'member_id': member_id, 'member': member, 'attendance': None,
+                    'existing_num': cached['num']}
+
+    with transaction() as cur:
+        result = check_in_member_in_transaction(cur, member_id, performed_by=performed_by, now=now)
+
+    if use_set and result['status'] != CHECK_IN_NOT_FOUND:
+        num = result['attendance']['num'] if result['attendance'] else result.get('existing_num')
+        if num is not None:
+            remember_checked_in(member_id, num, result['member'], today)
+    return result
+
+
+def load_checked_in_today(today=None):
+    """(Re)builds this process's "checked in today" set from the attendance table.
+
+    Runs at startup and, lazily, on the first lookup after the Cairo date
+    changes. The tombstone position is read first so a deletion committed
+    while the rows are read is applied by the next sync.
+    """
+    today = today or get_cairo_date()
+    deletion_id = get_last_attendance_deletion_id()
+    rows = query_db(
+        """
+        SELECT num, member_id, name, end_date, membership_status
+        FROM attendance WHERE attendance_date = %s
+        """,
+        (today.strftime("%Y-%m-%d"),)
+    ) or []
+    with _checked_in_lock:
+        _checked_in.clear()
+        for row in rows:
+            _checked_in.setdefault(row['member_id'], dict(row))
+        _checked_in_state.update(date=today, deletion_id=deletion_id, synced_at=time.monotonic())
+
+
+def _sync_checked_in_deletions():
+    """Drops members whose attendance row was deleted (by any process) since the last sync."""
+    with _checked_in_lock:
+        after = _checked_in_state['deletion_id']
+        today = _checked_in_state['date']
+    tombstones = query_db(
+        "SELECT id, num FROM attendance_deletions WHERE id > %s ORDER BY id ASC", (after,)
+    ) or []
+    if any(t['num'] is None for t in tombstones):
+        # The table was truncated (backup and clear)
+        load_checked_in_today(today)
+        return
+    nums = {t['num'] for t in tombstones}
+    with _checked_in_lock:
+        for member_id in [m for m, row in _checked_in.items() if row['num'] in nums]:
+            del _checked_in[member_id]
+        if tombstones:
+            _checked_in_state['deletion_id'] = max(_checked_in_state['deletion_id'], tombstones[-1]['id'])
+        _checked_in_state['synced_at'] = time.monotonic()
+
+
+def lookup_checked_in_today(member_id, today=None):
+    """Returns the cached attendance snapshot if the member already checked in today, else None.
+
+    A hit needs no database access, except for the tombstone sync at most
+    every CHECKED_IN_SYNC_SECONDS and the rebuild after the date rolls over.
+    A miss means "ask the database", not "not checked in".
+    """
+    today = today or get_cairo_date()
+    with _checked_in_lock:
+        stale = _checked_in_state['date'] != today
+    if stale:
+        load_checked_in_today(today)
+
+    with _checked_in_lock:
+        entry = _checked_in.get(member_id)
+        due = time.monotonic() - _checked_in_state['synced_at'] > CHECKED_IN_SYNC_SECONDS
+    if entry is None:
+        return None
+    if due:
+        _sync_checked_in_deletions()
+        with _checked_in_lock:
+            entry = _checked_in.get(member_id)
+    return dict(entry) if entry is not None else None
+
+
+def remember_checked_in(member_id, num, member, today=None):
+    """Adds a committed check-in to this process's set (ignored if the set is for another day)."""
+    today = today or get_cairo_date()
+    with _checked_in_lock:
+        if _checked_in_state['date'] != today:
+            return
+        _checked_in[member_id] = {
+            'num': num,
+            'member_id': member_id,
+            'name': member.get('name'),
+            'end_date': member.get('end_date'),
+            'membership_status': member.get('membership_status'),
+        }
+
+
+def forget_checked_in(nums):
+    """Drops members whose attendance rows (by num) this process just deleted."""
+    nums = set(nums)
+    with _checked_in_lock:
+        for member_id in [m for m, row in _checked_in.items() if row['num'] in nums]:
+            del _checked_in[member_id]
+
+
+def reset_checked_in_today():
+    """Empties the set; the next lookup rebuilds it (after the attendance table is cleared)."""
+    with _checked_in_lock:
+        _checked_in.clear()
+        _checked_in_state.update(date=None, deletion_id=0, synced_at=0.0)
+
+
+def get_attendance_rows():
+    """Returns every row of today's attendance table, oldest first (compact rows)."""
+    return query_db(f"{_ATTENDANCE_ROWS_SQL} ORDER BY a.num ASC", row_format='compact') or []
+
+
+def get_last_attendance_deletion_id():
+    """Returns the newest attendance tombstone id, the starting point for get_attendance_feed()."""
+    row = query_db("SELECT COALESCE(MAX(id), 0) AS last_id FROM attendance_deletions", one=True)
+    return row['last_id'] if row else 0
+
+
+def get_attendance_feed(after_num=0, after_deletion_id=0, limit=ATTENDANCE_FEED_LIMIT):
+    """Returns attendance changes since a client's last poll.
+
+    ``rows`` are attendance rows with num > after_num and ``deleted`` the nums
+    removed since tombstone after_deletion_id; both are primary-key range scans,
+    so a poll costs the same however many people came in earlier. ``reset`` is
+    set when the table was cleared (numbering restarts), in which case the
+    client should reload everything. Attendance nums are assigned before
+    commit, so clients should re-ask for a small overlap below their last num
+    and skip rows they already have.
+    """
+    with transaction() as cur:
+        cur.execute(f"{_ATTENDANCE_ROWS_SQL} WHERE a.num > %s ORDER BY a.num ASC LIMIT %s",
+                    (after_num, limit + 1))
+        rows = cur.fetchall()
+        cur.execute(
+            "SELECT id, num FROM attendance_deletions WHERE id > %s ORDER BY id ASC LIMIT %s",
+            (after_deletion_id, limit + 1)
+        )
+        tombstones = cur.fetchall()
+        # The num sequence only goes backwards when the table is truncated with RESTART IDENTITY
+        cur.execute(
+            "SELECT COALESCE(pg_sequence_last_value(pg_get_serial_sequence('attendance', 'num')::regclass), 0) AS last_num"
+        )
+        sequence_num = cur.fetchone()['last_num']
+
+    rows, more_rows = rows[:limit], len(rows) > limit
+    tombstones, more_deleted = tombstones[:limit], len(tombstones) > limit
+    reset = any(t['num'] is None for t in tombstones) or after_num > sequence_num
+    return {
+        'rows': rows,
+        'deleted': [t['num'] for t in tombstones if t['num'] is not None],
+        'reset': reset,
+        'has_more': more_rows or more_deleted,
+        'last_num': rows[-1]['num'] if rows else after_num,
+        'last_deletion_id': tombstones[-1]['id'] if tombstones else after_deletion_id,
+    }
+
+
+def prune_attendance_deletions_in_transaction(cur):
+    """Drops attendance tombstones older than ATTENDANCE_DELETIONS_RETENTION."""
+    cur.execute(
+        "DELETE FROM attendance_deletions WHERE deleted_at < CURRENT_TIMESTAMP - %s::interval",
+        (ATTENDANCE_DELETIONS_RETENTION,)
+    )
+
+
+# One multi-row check-in for a batch of validated scans (all dated today), with
+# the same duplicate guards and undo logs as _CHECK_IN_SQL.
+_BATCH_CHECK_IN_SQL = """
+    WITH scans AS (
+        SELECT *
+        FROM unnest(%(member_ids)s::int[], %(names)s::text[], %(end_dates)s::text[], %(statuses)s::text[],
+                    %(times)s::text[], %(dates)s::text[], %(days)s::text[], %(scanned_at)s::timestamptz[])
+             WITH ORDINALITY AS s(member_id, name, end_date, membership_status, attendance_time,
+                                  attendance_date, day, checked_in_at, ord)
+    ), inserted AS (
+        INSERT INTO attendance
+            (member_id, name, end_date, membership_status, attendance_time, attendance_date, day, checked_in_at)
+        SELECT member_id, name, end_date, membership_status, attendance_time, attendance_date, day, checked_in_at
+        FROM scans s
+        WHERE NOT EXISTS (
+            SELECT 1 FROM attendance a
+            WHERE a.member_id = s.member_id AND a.attendance_date = s.attendance_date
+        )
+        ORDER BY ord
+        ON CONFLICT DO NOTHING
+        RETURNING num, member_id, name, attendance_time, attendance_date
+    ), logged AS (
+        INSERT INTO action_logs (action_type, member_id, member_name, action_data, performed_by)
+        SELECT 'add_attendance', member_id, name,
+               jsonb_build_object(
+                   'attendance_num', num,
+                   'attendance_date', attendance_date,
+                   'attendance_time', attendance_time,
+                   'source', 'batch'
+               ),
+               %(performed_by)s
+        FROM inserted
+    )
+    SELECT num, member_id FROM inserted
+"""
+
+
+def _parse_scanned_at(value):
+    """Parses an ISO 8601 scan time to gym-local time; naive values are taken as local."""
+    if value in (None, ''):
+        return None
+    scanned_at = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if scanned_at.tzinfo is None:
+        return _GYM_TZ.localize(scanned_at)
+    return scanned_at.astimezone(_GYM_TZ)
+
+
+def _parse_scan_event(event, now):
+    """Returns (event_id, member_id, scanned_at, reason); reason is set when the event is malformed."""
+    if not isinstance(event, dict):
+        return None, None, None, 'invalid_event'
+    event_id = str(event.get('event_id') or '').strip()
+    if not event_id or len(event_id) > 100:
+        return None, None, None, 'invalid_event_id'
+    member_id = str(event.get('member_id') or '').strip()
+    if not member_id.isdigit():
+        return event_id, None, None, 'invalid_member_id'
+    try:
+        scanned_at = _parse_scanned_at(event.get('scanned_at')) or now
+    except (TypeError, ValueError):
+        return event_id, int(member_id), None, 'invalid_scanned_at'
+    return event_id, int(member_id), scanned_at, None
+
+
+def _ingest_result(event_id, member_id, status, reason=None, attendance_num=None, replayed=False):
+    return {
+        'event_id': event_id,
+        'member_id': member_id,
+        'status': status,
+        'reason': reason,
+        'attendance_num': attendance_num,
+        'replayed': replayed,
+    }
+
+
+def ingest_attendance_batch_in_transaction(cur, events, performed_by='Unknown', now=None):
+    """Checks in a batch of kiosk / turnstile scans on an open transaction.
+
+    ``events`` is a list of ``{'event_id', 'member_id', 'scanned_at'}`` dicts
+    (scanned_at is ISO 8601 and optional; naive times are gym-local). Each
+    event gets a result with ``status`` INGEST_ACCEPTED or INGEST_REJECTED
+    and a ``reason`` (not_found, membership_expired, already_checked_in,
+    not_today, scanned_in_future, duplicate_event or an invalid_* code).
+
+    Results are stored by event ID, so sending the same events again (a
+    retry after a timeout) returns the original results with ``replayed``
+    set instead of checking anyone in twice. A concurrent retry waits on the
+    event ID until the first batch commits. The statement count does not
+    depend on the batch size: claim IDs, read replays, look up members,
+    insert check-ins, store results.
+    """
+    now = now or get_cairo_now()
+    if now.tzinfo is None:
+        now = _GYM_TZ.localize(now)
+    today = now.date()
+
+    results = [None] * len(events)
+    parsed = {}
+    for index, event in enumerate(events):
+        event_id, member_id, scanned_at, reason = _parse_scan_event(event, now)
+        if reason:
+            results[index] = _ingest_result(event_id, member_id, INGEST_REJECTED, reason)
+        elif event_id in parsed:
+            results[index] = _ingest_result(event_id, member_id, INGEST_REJECTED, 'duplicate_event')
+        else:
+            parsed[event_id] = (index, member_id, scanned_at)
+    if not parsed:
+        return results
+
+    event_ids = list(parsed)
+    # Claim the event IDs; IDs already stored (or being stored by a concurrent retry) are replays
+    cur.execute(
+        """
+        INSERT INTO attendance_ingest_events (client_event_id, member_id, scanned_at)
+        SELECT * FROM unnest(%s::text[], %s::int[], %s::timestamp[])
+        ON CONFLICT (client_event_id) DO NOTHING
+        RETURNING client_event_id
+        """,
+        (event_ids,
+         [parsed[event_id][1] for event_id in event_ids],
+         [parsed[event_id][2].replace(tzinfo=None) for event_id in event_ids])
+    )
+    claimed = {row['client_event_id'] for row in cur.fetchall()}
+
+    replayed_ids = [event_id for event_id in event_ids if event_id not in claimed]
+    if replayed_ids:
+        cur.execute(
+            """
+            SELECT client_event_id, member_id, status, reason, attendance_num
+            FROM attendance_ingest_events
+            WHERE client_event_id = ANY(%s)
+            """,
+            (replayed_ids,)
+        )
+        for row in cur.fetchall():
+            index = parsed[row['client_event_id']][0]
+            results[index] = _ingest_result(row['client_event_id'], row['member_id'], row['status'],
+                                            row['reason'], row['attendance_num'], replayed=True)
+
+    new_events = sorted((parsed[event_id][2], event_id) for event_id in claimed)
+    if not new_events:
+        return results
+
+    cur.execute(
+        "SELECT id, name, end_date, membership_status, end_date_d FROM members WHERE id = ANY(%s)",
+        (list({parsed[event_id][1] for _, event_id in new_events}),)
+    )
+    members = {row['id']: row for row in cur.fetchall()}
+
+    # Validate in scan order; the earliest valid scan of a member wins
+    decided = {}
+    scans = {}
+    for scanned_at, event_id in new_events:
+        _, member_id, _ = parsed[event_id]
+        member = members.get(member_id)
+        if member is None:
+            decided[event_id] = (INGEST_REJECTED, 'not_found', None)
+        elif scanned_at - now > ATTENDANCE_SCAN_MAX_SKEW:
+            decided[event_id] = (INGEST_REJECTED, 'scanned_in_future', None)
+        elif scanned_at.date() != today:
+            # The attendance table only holds today; older scans were moved to the backup
+            decided[event_id] = (INGEST_REJECTED, 'not_today', None)
+        elif member['end_date_d'] is None or member['end_date_d'] < scanned_at.date():
+            decided[event_id] = (INGEST_REJECTED, 'membership_expired', None)
+        elif member_id in scans:
+            decided[event_id] = (INGEST_REJECTED, 'already_checked_in', None)
+        else:
+            scans[member_id] = event_id
+
+    checked_in = {}
+    if scans:
+        ordered = [(member_id, parsed[event_id][2]) for member_id, event_id in scans.items()]
+        cur.execute(_BATCH_CHECK_IN_SQL, {
+            'member_ids': [member_id for member_id, _ in ordered],
+            'names': [members[member_id]['name'] for member_id, _ in ordered],
+            'end_dates': [members[member_id]['end_date'] for member_id, _ in ordered],
+            'statuses': [members[member_id]['membership_status'] for member_id, _ in ordered],
+            'times': [scanned_at.strftime("%H:%M:%S") for _, scanned_at in ordered],
+            'dates': [scanned_at.strftime("%Y-%m-%d") for _, scanned_at in ordered],
+            'days': [scanned_at.strftime("%A") for _, scanned_at in ordered],
+            'scanned_at': [scanned_at for _, scanned_at in ordered],
+            'performed_by': performed_by,
+        })
+        checked_in = {row['member_id']: row['num'] for row in cur.fetchall()}
+    for member_id, event_id in scans.items():
+        if member_id in checked_in:
+            decided[event_id] = (INGEST_ACCEPTED, None, checked_in[member_id])
+        else:
+            decided[event_id] = (INGEST_REJECTED, 'already_checked_in', None)
+
+    stored_ids = list(decided)
+    outcomes = [decided[event_id] for event_id in stored_ids]
+    cur.execute(
+        """
+        UPDATE attendance_ingest_events e
+        SET status = r.status, reason = r.reason, attendance_num = r.attendance_num
+        FROM unnest(%s::text[], %s::text[], %s::text[], %s::int[]) AS r(client_event_id, status, reason, attendance_num)
+        WHERE e.client_event_id = r.client_event_id
+        """,
+        (stored_ids,
+         [outcome[0] for outcome in outcomes],
+         [outcome[1] for outcome in outcomes],
+         [outcome[2] for outcome in outcomes])
+    )
+    for event_id, (status, reason, attendance_num) in zip(stored_ids, outcomes):
+        index, member_id, _ = parsed[event_id]
+        results[index] = _ingest_result(event_id, member_id, status, reason, attendance_num)
+    return results
+
+
+def ingest_attendance_batch(events, performed_by='Unknown', now=None):
+    """Checks in a batch of scans in one transaction (see ingest_attendance_batch_in_transaction)."""
+    with transaction() as cur:
+        return ingest_attendance_batch_in_transaction(cur, events, performed_by=performed_by, now=now)
+
+
+def prune_attendance_ingest_events_in_transaction(cur):
+    """Forgets batch event IDs older than ATTENDANCE_INGEST_RETENTION."""
+    cur.execute(
+        "DELETE FROM attendance_ingest_events WHERE received_at < CURRENT_TIMESTAMP - %s::interval",
+        (ATTENDANCE_INGEST_RETENTION,)
+    )
+
+
+# Archive day of an attendance row; unparsable dates are filed under the day of the move
+_ARCHIVE_DAY_SQL = f"COALESCE(member_text_to_date(attendance_date), {CAIRO_TODAY_SQL})"
+
+
+def archive_attendance_in_transaction(cur):
+    """Moves every attendance row into the monthly attendance_backup partitions; returns the rows moved.
+
+    The move is one ``WITH moved AS (DELETE ... RETURNING) INSERT`` statement
+    under an EXCLUSIVE lock, so no check-in can land between the copy and the
+    delete. The deletion trigger records it as a single reset tombstone (like
+    the old TRUNCATE), and attendance numbering restarts at 1.
+    """
+    # Block concurrent check-ins so nothing lands while rows are moved
+    cur.execute("LOCK TABLE attendance IN EXCLUSIVE MODE")
+    cur.execute(f"""
+        SELECT ensure_attendance_backup_partition(month)
+        FROM (SELECT DISTINCT date_trunc('month', {_ARCHIVE_DAY_SQL})::DATE AS month FROM attendance) months
+    """)
+    cur.execute("SET LOCAL rival_gym.attendance_archive = 'on'")
+    cur.execute(f"""
+        WITH moved AS (
+            DELETE FROM attendance
+            RETURNING num, member_id, name, end_date, membership_status, attendance_time, attendance_date, day,
+                      checked_in_at
+        )
+        INSERT INTO attendance_backup
+            (member_id, name, end_date, membership_status, attendance_time, attendance_date, day,
+             checked_in_at, attendance_day)
+        SELECT member_id, name, end_date, membership_status, attendance_time, attendance_date, day,
+               checked_in_at, {_ARCHIVE_DAY_SQL}
+        FROM moved
+        ORDER BY num
+    """)
+    rows_moved = cur.rowcount
+    cur.execute("SET LOCAL rival_gym.attendance_archive = 'off'")
+    if rows_moved > 0:
+        cur.execute("SELECT setval(pg_get_serial_sequence('attendance', 'num'), 1, false)")
+    return rows_moved
+
+
+def attendance_backup_partition_name(month):
+    """Name of the attendance_backup partition holding the given month (a date in it)."""
+    return f"attendance_backup_y{month.year:04d}m{month.month:02d}"
+
+
+def get_attendance_backup_partitions():
+    """Lists attached attendance_backup partitions, oldest first, with their estimated row counts."""
+    return query_db("""
+        SELECT c.relname AS name,
+               pg_get_expr(c.relpartbound, c.oid) AS bounds,
+               GREATEST(c.reltuples, 0)::BIGINT AS estimated_rows
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'attendance_backup'::regclass
+        ORDER BY c.relname
+    """) or []
+
+
+def detach_attendance_backup_partition(month, drop=False):
+    """Detaches one month of the attendance archive (for export or cold storage); drop=True also deletes it.
+
+    A detached partition keeps its rows as an ordinary table named like the
+    partition. Returns False if that month has no attached partition.
+    """
+    name = attendance_backup_partition_name(month)
+    with transaction() as cur:
+        cur.execute("""
+            SELECT 1 FROM pg_inherits
+            WHERE inhparent = 'attendance_backup'::regclass AND inhrelid = to_regclass(%s)
+        """, (name,))
+        if cur.fetchone() is None:
+            return False
+        cur.execute(f'ALTER TABLE attendance_backup DETACH PARTITION "{name}"')
+        if drop:
+            cur.execute(f'DROP TABLE "{name}"')
+    return True
+
+
+# Member visit history (today's attendance + the archive)
+MEMBER_VISITS_PAGE_SIZE = 50
+MEMBER_VISITS_MAX_PAGE_SIZE = 200
+MEMBER_VISIT_HEATMAP_DAYS = 365
+
+# Visit day of a live attendance row (the archive stores it as attendance_day)
+_LIVE_VISIT_DAY_SQL = (
+    "COALESCE(member_text_to_date(attendance_date), (checked_in_at AT TIME ZONE 'Africa/Cairo')::DATE)"
+)
+
+
+def _visit_filters(day_sql, date_from, date_to, params):
+    conditions = []
+    if date_from:
+        conditions.append(f"{day_sql} >= %s")
+        params.append(date_from)
+    if date_to:
+        conditions.append(f"{day_sql} <= %s")
+        params.append(date_to)
+    return ''.join(f" AND {condition}" for condition in conditions)
+
+
+def get_member_visits(member_id, date_from=None, date_to=None, cursor=None, limit=MEMBER_VISITS_PAGE_SIZE):
+    """Returns one page of a member's visits, newest first, across attendance and attendance_backup.
+
+    Pages are keyed on (visit day, checked_in_at, source, id), so page N costs
+    the same as page 1. Each side of the union is limited on its own before
+    the merge: the archive side is an index scan on (member_id, attendance_day)
+    over the partitions in the date range, so members with years of visits
+    read one page of index entries. Returns ``{'visits', 'has_more', 'next_cursor'}``.
+    """
+    limit = max(1, min(int(limit), MEMBER_VISITS_MAX_PAGE_SIZE))
+    scope = f'member_visits:{member_id}'
+    after = decode_cursor(cursor, scope, 4)
+
+    live_params, archive_params = [member_id], [member_id]
+    live_where = _visit_filters(_LIVE_VISIT_DAY_SQL, date_from, date_to, live_params)
+    archive_where = _visit_filters('attendance_day', date_from, date_to, archive_params)
+    if after:
+        live_where += f" AND ({_LIVE_VISIT_DAY_SQL}, checked_in_at, 1, num) < (%s, %s, %s, %s)"
+        live_params.extend(after)
+        # The extra attendance_day bound lets the planner use the index and prune partitions
+        archive_where += " AND attendance_day <= %s AND (attendance_day, checked_in_at, 0, id) < (%s, %s, %s, %s)"
+        archive_params.extend([after[0]] + after)
+
+    rows = query_db(f"""
+        SELECT * FROM (
+            (SELECT 1 AS src, num AS id, {_LIVE_VISIT_DAY_SQL} AS visit_day, checked_in_at,
+                    attendance_time, day, membership_status
+             FROM attendance
+             WHERE member_id = %s{live_where}
+             ORDER BY visit_day DESC, checked_in_at DESC, id DESC
+             LIMIT %s)
+            UNION ALL
+            (SELECT 0 AS src, id, attendance_day AS visit_day, checked_in_at,
+                    attendance_time, day, membership_status
+             FROM attendance_backup
+             WHERE member_id = %s{archive_where}
+             ORDER BY attendance_day DESC, checked_in_at DESC, id DESC
+             LIMIT %s)
+        ) visits
+        ORDER BY visit_day DESC, checked_in_at DESC, src DESC, id DESC
+        LIMIT %s
+    """, tuple(live_params + [limit + 1] + archive_params + [limit + 1, limit + 1])) or []
+
+    rows, has_more = split_page(rows, limit)
+    visits = [{
+        'source': 'today' if row['src'] else 'archive',
+        'id': row['id'],
+        'visit_day': row['visit_day'].isoformat() if row['visit_day'] else None,
+        'checked_in_at': row['checked_in_at'].isoformat() if row['checked_in_at'] else None,
+        'attendance_time': row['attendance_time'],
+        'day': row['day'],
+        'membership_status': row['membership_status'],
+    } for row in rows]
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor([last['visit_day'], last['checked_in_at'], last['src'], last['id']], scope)
+    return {'visits': visits, 'has_more': has_more, 'next_cursor': next_cursor}
+
+
+def get_member_visit_heatmap(member_id, end=None, days=MEMBER_VISIT_HEATMAP_DAYS):
+    """Returns the days a member visited in the ``days`` days up to ``end`` as a compact bitmap.
+
+    Bit i (least significant bit first within each byte) is set when the
+    member came on ``start + i`` days; the bytes are base64 encoded. A year
+    fits in 46 bytes, which the page renders as a heatmap.
+    """
+    end = end or get_cairo_date()
+    start = end - timedelta(days=days - 1)
+    rows = query_db(f"""
+        SELECT DISTINCT visit_day FROM (
+            SELECT {_LIVE_VISIT_DAY_SQL} AS visit_day FROM attendance WHERE member_id = %s
+            UNION ALL
+            SELECT attendance_day FROM attendance_backup
+            WHERE member_id = %s AND attendance_day BETWEEN %s AND %s
+        ) visits
+        WHERE visit_day BETWEEN %s AND %s
+    """, (member_id, member_id, start, end, start, end)) or []
+
+    bitmap = bytearray((days + 7) // 8)
+    for row in rows:
+        index = (row['visit_day'] - start).days
+        bitmap[index // 8] |= 1 << (index % 8)
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'days': days,
+        'visit_days': len(rows),
+        'bitmap': base64.b64encode(bytes(bitmap)).decode('ascii'),
+    }
+
+
+def refresh_member_visit_stats():
+    """Recounts members.visits_30d / visits_90d (and repairs last_visit_at); returns the members changed.
+
+    Check-ins bump the counters as they happen; this nightly pass lets visits
+    age out of the rolling windows and undoes deleted check-ins.
+    """
+    row = query_db("SELECT refresh_member_visit_stats() AS changed", one=True, commit=True)
+    return row['changed'] if row else 0
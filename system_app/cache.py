@@ -0,0 +1,716 @@
+"""Cache for expensive page data (dashboard snapshot, index lists) and shared app state.
+
+Two backends share one interface (get, set, get_or_compute, delete,
+invalidate_tags, generation, items, delete_prefix, clear, keys, stats),
+chosen by Config.CACHE_BACKEND:
+
+- 'memory': TTLCache, private to each worker process.
+- 'sqlite': SQLiteCache, a SQLite file in WAL mode (Config.CACHE_SQLITE_PATH)
+  shared by every worker on the host, so N workers load a dashboard aggregate
+  once instead of N times and agree on who is online.
+
+TTLCache is a bounded LRU keyed by string with a per-entry TTL and tags:
+
+- At most Config.CACHE_MAX_ENTRIES entries and roughly Config.CACHE_MAX_BYTES
+  of values; the least recently used entries are evicted first.
+- Entries are tagged with the tables they were built from. query_db and
+  transaction() call invalidate_tags() with the tables a committed statement
+  wrote to, so in this process an add or edit is visible on the next page load;
+  the TTL bounds staleness from writes made by other processes.
+- set() can be given the tag generation read before the value was computed; if
+  a write committed in between, the stale value is not stored.
+- get_or_compute() lets one caller per key recompute a missing or expired value
+  (single flight); the others wait for it, or keep getting the expired value
+  for up to stale_ttl seconds, optionally while a background thread refreshes it.
+
+All methods are safe to call from several threads. Hit / miss / eviction
+counters are reported by /health and /metrics.
+"""
+import logging
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from system_app.config import Config
+
+CACHE_MAX_ENTRIES = Config.CACHE_MAX_ENTRIES
+CACHE_MAX_BYTES = Config.CACHE_MAX_BYTES
+CACHE_BACKEND = Config.CACHE_BACKEND
+CACHE_SQLITE_PATH = Config.CACHE_SQLITE_PATH
+CACHE_DEFAULT_TTL = 300
+# Longest a caller waits for another thread's computation before computing itself
+CACHE_WAIT_TIMEOUT = 30
+
+# Seconds a SQLiteCache call waits for another process's write lock
+SQLITE_BUSY_TIMEOUT = 5
+# Seconds between checks while another process computes a key
+SQLITE_POLL_INTERVAL = 0.05
+# Online users and login attempts: one small entry per user / IP address
+STATE_MAX_ENTRIES = 10000
+STATE_MAX_BYTES = 8 * 1024 * 1024
+
+# Objects visited when sizing one value; anything deeper is not counted
+_SIZE_WALK_LIMIT = 10000
+_COUNTER_NAMES = ('hits', 'misses', 'stale_hits', 'coalesced', 'refreshes', 'refresh_errors',
+                  'sets', 'evictions', 'expirations', 'invalidations')
+
+logger = logging.getLogger('system_app.app')
+
+
+def estimate_size(value):
+    """Approximate deep size of a cached value in bytes (containers, rows, plain objects)."""
+    seen = set()
+    stack = [value]
+    total = 0
+    visited = 0
+    while stack and visited < _SIZE_WALK_LIMIT:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        visited += 1
+        total += sys.getsizeof(item, 64)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif hasattr(item, '__dict__') and not isinstance(item, type):
+            stack.append(vars(item))
+    return total
+
+
+class _Entry:
+    __slots__ = ('value', 'expires_at', 'stale_until', 'tags', 'size')
+
+    def __init__(self, value, expires_at, stale_until, tags, size):
+        self.value = value
+        self.expires_at = expires_at
+        self.stale_until = stale_until
+        self.tags = tags
+        self.size = size
+
+
+class _Flight:
+    """One in-progress computation of a key; waiters block on done."""
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """Thread-safe bounded LRU cache with per-key TTL and tag invalidation."""
+
+    backend = 'memory'
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, default_ttl=CACHE_DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._tag_keys = {}
+        self._tag_generations = {}
+        self._flights = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(_COUNTER_NAMES, 0)
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        for tag in entry.tags:
+            keys = self._tag_keys.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tag_keys[tag]
+        return entry
+
+    def get(self, key, default=None):
+        """Returns the cached value, or default when missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters['misses'] += 1
+                return default
+            now = time.monotonic()
+            if entry.expires_at <= now:
+                # Past its stale window too: nobody can use it any more
+                if entry.stale_until <= now:
+                    self._drop(key)
+                    self._counters['expirations'] += 1
+                self._counters['misses'] += 1
+                return default
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return entry.value
+
+    def _generation(self, tags):
+        return tuple(self._tag_generations.get(tag, 0) for tag in sorted(tags))
+
+    def generation(self, tags):
+        """Token for set(generation=...): changes whenever one of the tags is invalidated."""
+        with self._lock:
+            return self._generation(_normalize_tags(tags))
+
+    def set(self, key, value, ttl=None, tags=(), generation=None, stale_ttl=0):
+        """Stores value for ttl seconds (kept stale_ttl longer for get_or_compute); returns False if it was not stored.
+
+        A value bigger than the whole byte budget, or one computed before a write
+        to one of its tags committed (generation no longer current), is skipped.
+        """
+        tags = _normalize_tags(tags)
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return False
+        expires_at = time.monotonic() + (self.default_ttl if ttl is None else ttl)
+        with self._lock:
+            if generation is not None and generation != self._generation(tags):
+                return False
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = _Entry(value, expires_at, expires_at + stale_ttl, tags, size)
+            self._bytes += size
+            for tag in tags:
+                self._tag_keys.setdefault(tag, set()).add(key)
+            self._counters['sets'] += 1
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+                self._counters['evictions'] += 1
+        return True
+
+    def get_or_compute(self, key, fn, ttl=None, stale_ttl=0, tags=(), background=False,
+                       wait_timeout=CACHE_WAIT_TIMEOUT):
+        """Returns the cached value of key, computing it with fn() at most once at a time.
+
+        - Fresh value: returned as is.
+        - Expired less than stale_ttl seconds ago: the stale value is returned to
+          everyone except the one caller that recomputes it. With background=True
+          the recompute runs in a daemon thread and that caller gets the stale
+          value too, so no request waits for fn().
+        - Missing: one caller computes while the others wait for its result (or
+          its exception); after wait_timeout seconds a waiter computes on its own.
+        """
+        tags = _normalize_tags(tags)
+        with self._lock:
+            now = time.monotonic()
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > now:
+                self._entries.move_to_end(key)
+                self._counters['hits'] += 1
+                return entry.value
+            if entry is not None and entry.stale_until <= now:
+                self._drop(key)
+                self._counters['expirations'] += 1
+                entry = None
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                generation = self._generation(tags)
+            if entry is not None:
+                self._counters['stale_hits'] += 1
+            else:
+                self._counters['misses' if leader else 'coalesced'] += 1
+
+        if entry is not None and not leader:
+            return entry.value
+        if entry is not None and background:
+            threading.Thread(
+                target=self._refresh_in_background,
+                args=(key, fn, ttl, stale_ttl, tags, generation, flight),
+                name=f'cache-refresh:{key}',
+                daemon=True,
+            ).start()
+            return entry.value
+        if leader:
+            return self._compute(key, fn, ttl, stale_ttl, tags, generation, flight)
+
+        if flight.done.wait(wait_timeout):
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        return fn()
+
+    def _compute(self, key, fn, ttl, stale_ttl, tags, generation, flight):
+        try:
+            flight.value = fn()
+            self.set(key, flight.value, ttl=ttl, tags=tags, generation=generation, stale_ttl=stale_ttl)
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._counters['refreshes'] += 1
+                if flight.error is not None:
+                    self._counters['refresh_errors'] += 1
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+
+    def _refresh_in_background(self, key, fn, ttl, stale_ttl, tags, generation, flight):
+        try:
+            self._compute(key, fn, ttl, stale_ttl, tags, generation, flight)
+        except Exception as e:
+            # The stale value stays until its stale window ends; the next caller retries
+            logger.error(f"Background refresh of cache key {key!r} failed: {e}")
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+                return True
+            return False
+
+    def invalidate_tags(self, tags):
+        """Drops every entry carrying one of the tags; returns how many were dropped."""
+        tags = _normalize_tags(tags)
+        if not tags:
+            return 0
+        with self._lock:
+            dropped = 0
+            for tag in tags:
+                self._tag_generations[tag] = self._tag_generations.get(tag, 0) + 1
+                for key in list(self._tag_keys.get(tag, ())):
+                    self._drop(key)
+                    dropped += 1
+            self._counters['invalidations'] += dropped
+            return dropped
+
+    def items(self, prefix=''):
+        """(key, value) of every unexpired entry whose key starts with prefix; not counted as hits."""
+        with self._lock:
+            now = time.monotonic()
+            return [(key, entry.value) for key, entry in self._entries.items()
+                    if key.startswith(prefix) and entry.expires_at > now]
+
+    def delete_prefix(self, prefix):
+        """Drops every entry whose key starts with prefix; returns how many were dropped."""
+        with self._lock:
+            keys = [key for key in self._entries if key.startswith(prefix)]
+            for key in keys:
+                self._drop(key)
+            return len(keys)
+
+    def clear(self):
+        """Drops every entry; returns the keys that were cached."""
+        with self._lock:
+            keys = list(self._entries)
+            self._entries.clear()
+            self._tag_keys.clear()
+            self._bytes = 0
+            return keys
+
+    def keys(self):
+        with self._lock:
+            return list(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Counters and current size, for /health and /metrics."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update(entries=len(self._entries), bytes=self._bytes)
+        return _finish_stats(self, stats)
+
+
+class SQLiteCache:
+    """TTLCache's interface over a SQLite file in WAL mode, shared by every process that opens it.
+
+    Values are pickled. Tag generations and get_or_compute's single-flight lease
+    live in the file too, so a write committed by one worker drops the entry for
+    all of them and one worker at a time recomputes a key while the others poll
+    for its result. Past the size budget the entries closest to expiry are
+    evicted (reads do not write, so there is no LRU order). Counters are per
+    process. A SQLite error is logged and treated as a miss, so the pages fall
+    back to the database rather than failing.
+    """
+
+    backend = 'sqlite'
+
+    def __init__(self, path=CACHE_SQLITE_PATH, name='cache', max_entries=CACHE_MAX_ENTRIES,
+                 max_bytes=CACHE_MAX_BYTES, default_ttl=CACHE_DEFAULT_TTL):
+        if not name.isidentifier():
+            raise ValueError(f"Invalid cache name: {name!r}")
+        self.path = path
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(_COUNTER_NAMES, 0)
+        with self._write() as conn:
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {name}_entries (
+                    key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL,
+                    stale_until REAL NOT NULL, size INTEGER NOT NULL
+                )
+            """)
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name}_entries_stale_until ON {name}_entries (stale_until)")
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {name}_entry_tags (
+                    tag TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (tag, key)
+                ) WITHOUT ROWID
+            """)
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name}_entry_tags_key ON {name}_entry_tags (key)")
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {name}_tag_generations (
+                    tag TEXT PRIMARY KEY, generation INTEGER NOT NULL
+                ) WITHOUT ROWID
+            """)
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {name}_flights (
+                    key TEXT PRIMARY KEY, lease_until REAL NOT NULL
+                ) WITHOUT ROWID
+            """)
+
+    def _connect(self):
+        # One connection per thread, reopened in a forked worker
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _write(self):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    def _delete_keys(self, conn, keys):
+        for key in keys:
+            conn.execute(f"DELETE FROM {self.name}_entries WHERE key = ?", (key,))
+            conn.execute(f"DELETE FROM {self.name}_entry_tags WHERE key = ?", (key,))
+
+    def _read(self, key):
+        """(value, expires_at) of key, or None; drops it once past its stale window."""
+        row = self._connect().execute(
+            f"SELECT value, expires_at, stale_until FROM {self.name}_entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at, stale_until = row
+        if stale_until <= time.time():
+            with self._write() as conn:
+                conn.execute(f"DELETE FROM {self.name}_entries WHERE key = ? AND stale_until <= ?", (key, time.time()))
+                conn.execute(f"""
+                    DELETE FROM {self.name}_entry_tags
+                    WHERE key = ? AND NOT EXISTS (SELECT 1 FROM {self.name}_entries WHERE key = ?)
+                """, (key, key))
+            self._count('expirations')
+            return None
+        return pickle.loads(value), expires_at
+
+    def get(self, key, default=None):
+        """Returns the cached value, or default when missing or expired."""
+        try:
+            found = self._read(key)
+        except (sqlite3.Error, pickle.UnpicklingError) as e:
+            logger.error(f"Cache read of {key!r} failed: {e}")
+            found = None
+        if found is None or found[1] <= time.time():
+            self._count('misses')
+            return default
+        self._count('hits')
+        return found[0]
+
+    def _generation(self, conn, tags):
+        tags = sorted(tags)
+        if not tags:
+            return ()
+        rows = dict(conn.execute(
+            f"SELECT tag, generation FROM {self.name}_tag_generations WHERE tag IN ({','.join('?' * len(tags))})",
+            tags,
+        ).fetchall())
+        return tuple(rows.get(tag, 0) for tag in tags)
+
+    def generation(self, tags):
+        """Token for set(generation=...): changes whenever one of the tags is invalidated (by any process)."""
+        try:
+            return self._generation(self._connect(), _normalize_tags(tags))
+        except sqlite3.Error as e:
+            logger.error(f"Cache generation read failed: {e}")
+            return None
+
+    def set(self, key, value, ttl=None, tags=(), generation=None, stale_ttl=0):
+        """Stores value for ttl seconds (kept stale_ttl longer for get_or_compute); returns False if it was not stored."""
+        tags = _normalize_tags(tags)
+        try:
+            blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            logger.error(f"Cache value for {key!r} cannot be stored: {e}")
+            return False
+        if len(blob) > self.max_bytes:
+            return False
+        expires_at = time.time() + (self.default_ttl if ttl is None else ttl)
+        try:
+            with self._write() as conn:
+                if generation is not None and generation != self._generation(conn, tags):
+                    return False
+                conn.execute(f"DELETE FROM {self.name}_entry_tags WHERE key = ?", (key,))
+                conn.execute(f"""
+                    INSERT OR REPLACE INTO {self.name}_entries (key, value, expires_at, stale_until, size)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (key, blob, expires_at, expires_at + stale_ttl, len(blob)))
+                conn.executemany(f"INSERT INTO {self.name}_entry_tags (tag, key) VALUES (?, ?)",
+                                 [(tag, key) for tag in tags])
+                self._evict(conn)
+        except sqlite3.Error as e:
+            logger.error(f"Cache write of {key!r} failed: {e}")
+            return False
+        self._count('sets')
+        return True
+
+    def _evict(self, conn):
+        now = time.time()
+        expired = [row[0] for row in conn.execute(
+            f"SELECT key FROM {self.name}_entries WHERE stale_until <= ?", (now,))]
+        self._delete_keys(conn, expired)
+        self._count('expirations', len(expired))
+        entries, total = conn.execute(f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.name}_entries").fetchone()
+        if entries <= self.max_entries and total <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in conn.execute(f"SELECT key, size FROM {self.name}_entries ORDER BY expires_at").fetchall():
+            if entries <= self.max_entries and total <= self.max_bytes:
+                break
+            evicted.append(key)
+            entries -= 1
+            total -= size
+        self._delete_keys(conn, evicted)
+        self._count('evictions', len(evicted))
+
+    def _acquire(self, key, lease):
+        """Takes key's single-flight lease unless another caller holds an unexpired one."""
+        now = time.time()
+        with self._write() as conn:
+            cur = conn.execute(f"""
+                INSERT INTO {self.name}_flights (key, lease_until) VALUES (?, ?)
+                ON CONFLICT (key) DO UPDATE SET lease_until = excluded.lease_until
+                WHERE {self.name}_flights.lease_until <= ?
+            """, (key, now + lease, now))
+            return cur.rowcount == 1
+
+    def _release(self, key):
+        with self._write() as conn:
+            conn.execute(f"DELETE FROM {self.name}_flights WHERE key = ?", (key,))
+
+    def _flight_active(self, key):
+        row = self._connect().execute(
+            f"SELECT lease_until FROM {self.name}_flights WHERE key = ?", (key,)).fetchone()
+        return row is not None and row[0] > time.time()
+
+    def get_or_compute(self, key, fn, ttl=None, stale_ttl=0, tags=(), background=False,
+                       wait_timeout=CACHE_WAIT_TIMEOUT):
+        """Same contract as TTLCache.get_or_compute, across processes.
+
+        A caller that finds another process computing the key polls for the
+        value; if that computation fails or its lease runs out, it computes
+        the value itself.
+        """
+        tags = _normalize_tags(tags)
+        try:
+            found = self._read(key)
+            if found is not None and found[1] > time.time():
+                self._count('hits')
+                return found[0]
+            generation = self._generation(self._connect(), tags)
+            leader = self._acquire(key, wait_timeout)
+        except (sqlite3.Error, pickle.UnpicklingError) as e:
+            logger.error(f"Cache read of {key!r} failed: {e}")
+            self._count('misses')
+            return fn()
+
+        if found is not None:
+            self._count('stale_hits')
+            if not leader:
+                return found[0]
+            if background:
+                threading.Thread(
+                    target=self._refresh_in_background,
+                    args=(key, fn, ttl, stale_ttl, tags, generation),
+                    name=f'cache-refresh:{key}',
+                    daemon=True,
+                ).start()
+                return found[0]
+            return self._compute(key, fn, ttl, stale_ttl, tags, generation)
+        if leader:
+            self._count('misses')
+            return self._compute(key, fn, ttl, stale_ttl, tags, generation)
+
+        self._count('coalesced')
+        deadline = time.time() + wait_timeout
+        while time.time() < deadline:
+            time.sleep(SQLITE_POLL_INTERVAL)
+            try:
+                found = self._read(key)
+                if found is not None and found[1] > time.time():
+                    return found[0]
+                if not self._flight_active(key):
+                    break
+            except (sqlite3.Error, pickle.UnpicklingError) as e:
+                logger.error(f"Cache read of {key!r} failed: {e}")
+                break
+        return fn()
+
+    def _compute(self, key, fn, ttl, stale_ttl, tags, generation):
+        try:
+            value = fn()
+            self.set(key, value, ttl=ttl, tags=tags, generation=generation, stale_ttl=stale_ttl)
+            return value
+        except BaseException:
+            self._count('refresh_errors')
+            raise
+        finally:
+            self._count('refreshes')
+            try:
+                self._release(key)
+            except sqlite3.Error as e:
+                logger.error(f"Cache lease release of {key!r} failed: {e}")
+
+    def _refresh_in_background(self, key, fn, ttl, stale_ttl, tags, generation):
+        try:
+            self._compute(key, fn, ttl, stale_ttl, tags, generation)
+        except Exception as e:
+            logger.error(f"Background refresh of cache key {key!r} failed: {e}")
+
+    def delete(self, key):
+        try:
+            with self._write() as conn:
+                deleted = conn.execute(f"DELETE FROM {self.name}_entries WHERE key = ?", (key,)).rowcount
+                conn.execute(f"DELETE FROM {self.name}_entry_tags WHERE key = ?", (key,))
+            return deleted > 0
+        except sqlite3.Error as e:
+            logger.error(f"Cache delete of {key!r} failed: {e}")
+            return False
+
+    def invalidate_tags(self, tags):
+        """Drops every entry carrying one of the tags, in every process; returns how many were dropped."""
+        tags = sorted(_normalize_tags(tags))
+        if not tags:
+            return 0
+        placeholders = ','.join('?' * len(tags))
+        try:
+            with self._write() as conn:
+                conn.executemany(f"""
+                    INSERT INTO {self.name}_tag_generations (tag, generation) VALUES (?, 1)
+                    ON CONFLICT (tag) DO UPDATE SET generation = generation + 1
+                """, [(tag,) for tag in tags])
+                keys = [row[0] for row in conn.execute(
+                    f"SELECT DISTINCT key FROM {self.name}_entry_tags WHERE tag IN ({placeholders})", tags)]
+                self._delete_keys(conn, keys)
+        except sqlite3.Error as e:
+            logger.error(f"Cache invalidation of {tags} failed: {e}")
+            return 0
+        self._count('invalidations', len(keys))
+        return len(keys)
+
+    def items(self, prefix=''):
+        """(key, value) of every unexpired entry whose key starts with prefix; not counted as hits."""
+        try:
+            rows = self._connect().execute(
+                f"SELECT key, value FROM {self.name}_entries WHERE substr(key, 1, ?) = ? AND expires_at > ?",
+                (len(prefix), prefix, time.time()),
+            ).fetchall()
+            return [(key, pickle.loads(value)) for key, value in rows]
+        except (sqlite3.Error, pickle.UnpicklingError) as e:
+            logger.error(f"Cache scan of {prefix!r} failed: {e}")
+            return []
+
+    def delete_prefix(self, prefix):
+        """Drops every entry whose key starts with prefix; returns how many were dropped."""
+        try:
+            with self._write() as conn:
+                keys = [row[0] for row in conn.execute(
+                    f"SELECT key FROM {self.name}_entries WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))]
+                self._delete_keys(conn, keys)
+            return len(keys)
+        except sqlite3.Error as e:
+            logger.error(f"Cache delete of {prefix!r} failed: {e}")
+            return 0
+
+    def clear(self):
+        """Drops every entry; returns the keys that were cached."""
+        try:
+            with self._write() as conn:
+                keys = [row[0] for row in conn.execute(f"SELECT key FROM {self.name}_entries")]
+                conn.execute(f"DELETE FROM {self.name}_entries")
+                conn.execute(f"DELETE FROM {self.name}_entry_tags")
+            return keys
+        except sqlite3.Error as e:
+            logger.error(f"Cache clear failed: {e}")
+            return []
+
+    def keys(self):
+        try:
+            return [row[0] for row in self._connect().execute(f"SELECT key FROM {self.name}_entries")]
+        except sqlite3.Error as e:
+            logger.error(f"Cache key listing failed: {e}")
+            return []
+
+    def __len__(self):
+        return len(self.keys())
+
+    def stats(self):
+        """This process's counters and the file's current size, for /health and /metrics."""
+        with self._lock:
+            stats = dict(self._counters)
+        try:
+            stats['entries'], stats['bytes'] = self._connect().execute(
+                f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.name}_entries").fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Cache stats read failed: {e}")
+            stats['entries'] = stats['bytes'] = None
+        return _finish_stats(self, stats)
+
+
+def _finish_stats(cache, stats):
+    stats.update(backend=cache.backend, max_entries=cache.max_entries, max_bytes=cache.max_bytes)
+    served = stats['hits'] + stats['stale_hits'] + stats['coalesced']
+    lookups = served + stats['misses']
+    stats['hit_rate'] = round(served / lookups, 4) if lookups else None
+    return stats
+
+
+def _normalize_tags(tags):
+    return frozenset(str(tag).lower() for tag in tags or ())
+
+
+def make_cache(name, backend=CACHE_BACKEND, path=CACHE_SQLITE_PATH, **limits):
+    """A cache of the configured backend; SQLite caches with different names share one file."""
+    if backend == 'memory':
+        return TTLCache(**limits)
+    if backend == 'sqlite':
+        return SQLiteCache(path, name=name, **limits)
+    raise ValueError(f"Unknown CACHE_BACKEND: {backend!r} (expected 'memory' or 'sqlite')")
+
+
+# Page data shared by every request (and, with the sqlite backend, every worker)
+app_cache = make_cache('page_cache')
+# Online users and login attempts, keyed 'active_user:<id>' / 'login_attempts:<ip>'
+state_store = make_cache('app_state', max_entries=STATE_MAX_ENTRIES, max_bytes=STATE_MAX_BYTES)
@@ -8,6 +8,7 @@ try:
 except ImportError:
     import env_loader
 import os
+import tempfile
 from datetime import timedelta
 
 class Config:
@@ -49,8 +50,20 @@ class Config:
     ATTENDANCE_PER_PAGE = 50
     
     # Performance
-    DB_POOL_MIN_CONN = 1
-    DB_POOL_MAX_CONN = 20
+    DB_POOL_MIN_CONN = int(os.environ.get('DB_POOL_MIN_CONN', 1))
+    DB_POOL_MAX_CONN = int(os.environ.get('DB_POOL_MAX_CONN', 20))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))  # Seconds to wait for a free connection
+    DB_POOL_MAX_AGE = int(os.environ.get('DB_POOL_MAX_AGE', 1800))  # Recycle connections older than this (seconds)
+    DB_POOL_PREPING_IDLE = int(os.environ.get('DB_POOL_PREPING_IDLE', 30))  # Ping connections idle longer than this (seconds)
+    DB_STREAM_ITERSIZE = int(os.environ.get('DB_STREAM_ITERSIZE', 2000))  # Rows per round trip for server-side cursors
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 200))  # Log statements slower than this (milliseconds)
+    N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 10))  # Flag a statement repeated more often in one request
+    COUNT_EXACT_LIMIT = int(os.environ.get('COUNT_EXACT_LIMIT', 20000))  # Listing totals estimated above this are shown as "about N"
+    COUNT_CACHE_TTL = float(os.environ.get('COUNT_CACHE_TTL', 60))  # Seconds a cached listing total is reused
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 256))  # Page data cache (system_app/cache.py) entry limit
+    CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES', 32 * 1024 * 1024))  # ...and approximate memory budget
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')  # 'memory' (per process) or 'sqlite' (shared by the workers on one host)
+    CACHE_SQLITE_PATH = os.environ.get('CACHE_SQLITE_PATH', os.path.join(tempfile.gettempdir(), 'rival_gym_cache.sqlite3'))
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -0,0 +1,106 @@
+"""Cheap total counts for paginated listings.
+
+count_rows() answers "how many rows match" without always running COUNT(*):
+
+- Unfiltered counts of large tables come from the planner statistics
+  (pg_class.reltuples scaled to the table's current size, like the planner does).
+- Filtered counts use the EXPLAIN row estimate when it is large.
+- Anything estimated below Config.COUNT_EXACT_LIMIT is counted exactly.
+
+Results (exact or estimated) live in app_cache under "count:" keys, tagged
+with the table, for Config.COUNT_CACHE_TTL seconds. query_db and transaction()
+invalidate those tags after a write commits, so in this process a write is
+visible on the next page load; the TTL bounds staleness from writes made by
+other processes. /admin/clear_cache and the cache stats cover them too.
+
+Approximate results are flagged so pages can show "about N".
+"""
+from system_app.cache import app_cache
+from system_app.config import Config
+
+COUNT_EXACT_LIMIT = Config.COUNT_EXACT_LIMIT
+COUNT_CACHE_TTL = Config.COUNT_CACHE_TTL
+COUNT_KEY_PREFIX = 'count:'
+
+
+def clear_count_cache():
+    """Drops every cached count."""
+    app_cache.delete_prefix(COUNT_KEY_PREFIX)
+
+
+def _table_estimate(table):
+    """Planner-style row estimate of a whole table, or None if it has no statistics yet."""
+    from system_app.queries import query_db
+
+    row = query_db(
+        """
+        SELECT reltuples, relpages,
+               pg_relation_size(oid) / current_setting('block_size')::int AS pages
+        FROM pg_class WHERE oid = to_regclass(%s)
+        """,
+        (table,),
+        one=True,
+    )
+    if not row or row['reltuples'] is None or row['reltuples'] < 0:
+        return None
+    if row['relpages'] > 0:
+        return int(row['reltuples'] / row['relpages'] * row['pages'])
+    # Never vacuumed/analyzed: no density to scale by unless the table is empty
+    return 0 if row['pages'] == 0 else None
+
+
+def _plan_estimate(from_sql, where, params):
+    """Row estimate of the planner for the filtered query."""
+    from system_app.queries import query_db
+
+    row = query_db(f"EXPLAIN (FORMAT JSON) SELECT 1 FROM {from_sql} WHERE {where}", params, one=True)
+    plan = row['QUERY PLAN'] if row else None
+    if not plan:
+        return None
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def _exact_count(from_sql, where, params):
+    from system_app.queries import query_db
+
+    row = query_db(f"SELECT COUNT(*) AS count FROM {from_sql} WHERE {where}", params, one=True)
+    return row['count'] if row else 0
+
+
+def count_rows(table, where='', params=(), alias='', exact=False):
+    """Returns {'count': n, 'approximate': bool} for rows of ``table`` matching ``where``.
+
+    ``where`` is a SQL predicate without the WHERE keyword (empty or "TRUE" for
+    the whole table) and may reference ``alias``. Estimates of at least
+    Config.COUNT_EXACT_LIMIT rows are returned as approximate instead of being
+    counted; exact=True always counts (the result is still cached).
+    """
+    where = (where or '').strip()
+    filtered = bool(where) and where.upper() != 'TRUE'
+    params = tuple(params or ())
+    table = table.lower()
+    key = f"{COUNT_KEY_PREFIX}{table}:{alias}:{where if filtered else ''}:{params!r}:{exact}"
+
+    cached = app_cache.get(key)
+    if cached is not None:
+        return dict(cached)
+
+    # Taken before counting: a write committed meanwhile keeps the result out of the cache
+    generation = app_cache.generation([table])
+
+    from_sql = f"{table} {alias}".strip()
+    estimate = None
+    if not exact:
+        try:
+            estimate = _plan_estimate(from_sql, where, params) if filtered else _table_estimate(table)
+        except Exception as e:
+            print(f"Error estimating count for {table}: {e}")
+
+    if estimate is not None and estimate >= COUNT_EXACT_LIMIT:
+        result = {'count': estimate, 'approximate': True}
+    else:
+        result = {'count': _exact_count(from_sql, where if filtered else 'TRUE', params), 'approximate': False}
+
+    app_cache.set(key, result, ttl=COUNT_CACHE_TTL, tags=[table], generation=generation)
+    return dict(result)
+
@@ -1,6 +1,6 @@
 from functools import wraps
 from flask import session, flash, redirect, url_for, request
-from system_app.queries import query_db
+from system_app.current_user import get_current_user
 
 # CRM Permissions List Constants
 CRM_VIEW = 'crm_view'
@@ -25,38 +25,6 @@ CRM_PERMISSIONS = {
     CRM_BULK_LEADS: "Bulk Leads"
 }
 
-def _load_permissions(permissions_val):
-    if not permissions_val:
-        return {}
-    if isinstance(permissions_val, dict):
-        return permissions_val
-    import json
-    try:
-        return json.loads(permissions_val)
-    except:
-        return {}
-
-def get_current_user():
-    """Resolves and loads the current logged-in user with permission values."""
-    user_id = session.get('user_id')
-    if not user_id:
-        return None
-
-    user = query_db(
-        'SELECT id, username, email, is_approved, permissions FROM users WHERE id = %s',
-        (user_id,),
-        one=True,
-    )
-    if not user:
-        return None
-
-    if user.get('username') == 'rino':
-        user['permissions'] = {'super_admin': True}
-        return user
-
-    user['permissions'] = _load_permissions(user.get('permissions'))
-    return user
-
 def login_required(f):
     """Decorator to enforce user login session presence."""
     @wraps(f)
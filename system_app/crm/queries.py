@@ -2,8 +2,12 @@ from datetime import date, datetime, time
 
 from psycopg2.extras import Json
 
-from system_app.queries import query_db
-from system_app.func import get_cairo_date
+from system_app.queries import query_db, transaction
+from system_app.membership_status import (
+    view_predicate, expiring_within_predicate, no_visit_predicate, min_visits_predicate, MEMBER_VISIT_COUNTERS,
+)
+from system_app.pagination import keyset_predicate, split_page
+from system_app.counts import count_rows
 
 def create_lead(member_id, name, phone, email, source, notes, created_by_user_id):
     """Inserts a new CRM Lead into the database and returns the generated ID."""
@@ -41,6 +45,18 @@ def get_lead_by_id(lead_id):
     """
     return query_db(query, (lead_id,), one=True)
 
+def get_leads_by_ids(lead_ids):
+    """Retrieves several CRM Leads by ID in a single query."""
+    if not lead_ids:
+        return []
+    query = """
+        SELECT l.*, u.username AS assigned_username
+        FROM crm_leads l
+        LEFT JOIN users u ON u.id = l.assigned_user_id
+        WHERE l.id = ANY(%s)
+    """
+    return query_db(query, (list(lead_ids),)) or []
+
 def update_lead(lead_id, **kwargs):
     """Updates selected whitelist fields on a CRM Lead."""
     if not kwargs:
@@ -112,37 +128,13 @@ def get_members_by_ids(member_ids):
 
 def _build_member_bulk_filter_components(filters):
     """Builds the same member filter semantics used by the filtered members page."""
-    from datetime import timedelta
-
     filters = filters or {}
     where_clauses = []
     args = []
-    end_date_text = "TRIM(end_date)"
-    end_date_prefix = f"SUBSTRING({end_date_text}, 1, 10)"
-    valid_end_date_clause = f"{end_date_prefix} ~ '^[0-9]{{4}}-[0-9]{{2}}-[0-9]{{2}}$'"
-    end_date_date_expr = f"CAST({end_date_prefix} AS DATE)"
-
-    view = filters.get('view', 'all')
-    if view == 'active':
-        where_clauses.append("""
-            (end_date IS NOT NULL AND end_date != '' AND
-             LENGTH(TRIM(end_date)) >= 10 AND
-             CASE
-                 WHEN SUBSTRING(TRIM(end_date), 1, 10) ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}' THEN
-                     CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE) >= (CURRENT_TIMESTAMP AT TIME ZONE 'Africa/Cairo')::DATE
-                 ELSE FALSE
-             END)
-        """)
-    elif view == 'expired':
-        where_clauses.append("""
-            (end_date IS NOT NULL AND end_date != '' AND
-             LENGTH(TRIM(end_date)) >= 10 AND
-             CASE
-                 WHEN SUBSTRING(TRIM(end_date), 1, 10) ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}' THEN
-                     CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE) < (CURRENT_TIMESTAMP AT TIME ZONE 'Africa/Cairo')::DATE
-                 ELSE FALSE
-             END)
-        """)
+
+    status_clause = view_predicate(filters.get('view', 'all'))
+    if status_clause:
+        where_clauses.append(status_clause)
 
     if filters.get('search_id'):
         where_clauses.append("CAST(m.id AS TEXT) ILIKE %s")
@@ -190,57 +182,25 @@ def _build_member_bulk_filter_components(filters):
 
     expires_month = filters.get('expires_month')
     if expires_month:
-        where_clauses.append(f"""
-            end_date IS NOT NULL AND end_date != ''
-            AND LENGTH({end_date_text}) >= 10
-            AND {valid_end_date_clause}
-            AND EXTRACT(MONTH FROM {end_date_date_expr}) = %s
-        """)
+        where_clauses.append("EXTRACT(MONTH FROM end_date_d) = %s")
         args.append(expires_month)
 
     expires_year = filters.get('expires_year')
     if expires_year:
-        where_clauses.append(f"""
-            end_date IS NOT NULL AND end_date != ''
-            AND LENGTH({end_date_text}) >= 10
-            AND {valid_end_date_clause}
-            AND EXTRACT(YEAR FROM {end_date_date_expr}) = %s
-        """)
-        args.append(expires_year)
+        where_clauses.append("end_date_d >= make_date(%s, 1, 1) AND end_date_d < make_date(%s + 1, 1, 1)")
+        args.extend([expires_year, expires_year])
 
     expires_within = filters.get('expires_within')
     if expires_within:
-        today = get_cairo_date()
-        upper = (today + timedelta(days=expires_within)).strftime('%Y-%m-%d')
-        if expires_within == 7:
-            where_clauses.append("""
-                end_date IS NOT NULL AND end_date != ''
-                AND LENGTH(TRIM(end_date)) >= 10
-                AND SUBSTRING(TRIM(end_date), 1, 10) ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}'
-                AND CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE) >= (CURRENT_TIMESTAMP AT TIME ZONE 'Africa/Cairo')::DATE
-                AND CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE) <= %s
-            """)
-            args.append(upper)
-        elif expires_within == 14:
-            lower = (today + timedelta(days=7)).strftime('%Y-%m-%d')
-            where_clauses.append("""
-                end_date IS NOT NULL AND end_date != ''
-                AND LENGTH(TRIM(end_date)) >= 10
-                AND SUBSTRING(TRIM(end_date), 1, 10) ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}'
-                AND CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE) > %s
-                AND CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE) <= %s
-            """)
-            args.extend([lower, upper])
-        elif expires_within == 30:
-            lower = (today + timedelta(days=14)).strftime('%Y-%m-%d')
-            where_clauses.append("""
-                end_date IS NOT NULL AND end_date != ''
-                AND LENGTH(TRIM(end_date)) >= 10
-                AND SUBSTRING(TRIM(end_date), 1, 10) ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}'
-                AND CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE) > %s
-                AND CAST(SUBSTRING(TRIM(end_date), 1, 10) AS DATE) <= %s
-            """)
-            args.extend([lower, upper])
+        where_clauses.append(expiring_within_predicate(expires_within))
+
+    no_visit_days = filters.get('no_visit_days')
+    if no_visit_days:
+        where_clauses.append(no_visit_predicate(no_visit_days))
+
+    for key in MEMBER_VISIT_COUNTERS:
+        if filters.get(key):
+            where_clauses.append(min_visits_predicate(key, filters[key]))
 
     if filters.get('search_invitations'):
         where_clauses.append("CAST(COALESCE(invitations, 0) AS TEXT) ILIKE %s")
@@ -265,13 +225,22 @@ def get_member_ids_by_filters(filters):
     rows = query_db(query, args) or []
     return [row['id'] for row in rows]
 
-def get_bulk_member_listing(filters, page, per_page):
-    """Returns a paginated CRM bulk-selection member listing with active lead markers."""
+def get_bulk_member_listing(filters, page, per_page, after_id=None):
+    """Returns a paginated CRM bulk-selection member listing with active lead markers.
+
+    With after_id (keyset pagination) rows continue after that member id and the
+    COUNT(*) is skipped; total_count and total_pages are then None.
+    """
     clause_str, args = _build_member_bulk_filter_components(filters)
     offset = (page - 1) * per_page
-    count_query = f"SELECT COUNT(*) AS count FROM members m {clause_str}"
-    count_row = query_db(count_query, args, one=True)
-    total_count = count_row['count'] if count_row else 0
+    if after_id is not None:
+        clause_str = f"{clause_str} AND m.id > %s" if clause_str else "WHERE m.id > %s"
+        args = args + (after_id,)
+        offset = 0
+        total_count = None
+    else:
+        total = count_rows('members', clause_str.removeprefix('WHERE '), args, alias='m')
+        total_count = total['count']
 
     query = f"""
         SELECT
@@ -298,11 +267,14 @@ def get_bulk_member_listing(filters, page, per_page):
         ORDER BY m.id ASC
         LIMIT %s OFFSET %s
     """
-    rows = query_db(query, args + (per_page, offset)) or []
+    rows = query_db(query, args + (per_page + 1, offset), row_format='compact') or []
+    rows, has_more = split_page(rows, per_page)
     return {
         "items": rows,
         "total_count": total_count,
-        "total_pages": (total_count + per_page - 1) // per_page if total_count else 1
+        "total_pages": ((total_count + per_page - 1) // per_page if total_count else 1) if total_count is not None else None,
+        "has_more": has_more,
+        "count_approximate": total['approximate'] if after_id is None else False
     }
 
 def _build_invitation_candidate_filter_components(filters):
@@ -585,8 +557,15 @@ def search_members(search_query, limit=20):
     term = f"%{search_query}%"
     return query_db(query, (term, term, term, f"{search_query}%", limit)) or []
 
-def get_leads(where_clauses, args, limit, offset):
-    """Fetches a paginated, filtered list of leads including assigned username."""
+def get_leads(where_clauses, args, limit, offset, after=None):
+    """Fetches a paginated, filtered list of leads including assigned username.
+
+    after=(created_at, id) continues after that lead (keyset pagination) instead of using offset.
+    """
+    if after is not None:
+        where_clauses = list(where_clauses) + [keyset_predicate(['l.created_at', 'l.id'], descending=True)]
+        args = list(args) + list(after)
+        offset = 0
     clause_str = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
     query = f"""
         SELECT
@@ -614,14 +593,14 @@ def get_leads(where_clauses, args, limit, offset):
         LIMIT %s OFFSET %s
     """
     full_args = list(args) + [limit, offset]
-    return query_db(query, tuple(full_args)) or []
+    return query_db(query, tuple(full_args), row_format='compact') or []
 
 def count_leads(where_clauses, args):
-    """Counts the total leads matching the given filter criteria."""
-    clause_str = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
-    query = f"SELECT COUNT(*) as count FROM crm_leads l {clause_str}"
-    res = query_db(query, tuple(args), one=True)
-    return res['count'] if res else 0
+    """Counts the leads matching the given filter criteria.
+
+    Returns count_rows() output: {'count': n, 'approximate': bool}.
+    """
+    return count_rows('crm_leads', ' AND '.join(where_clauses), args, alias='l')
 
 def get_crm_counts():
     """Returns basic counts of leads, activities, and campaigns to prove DB reachability."""
@@ -689,38 +668,19 @@ def unassign_lead(lead_id, actor_id):
 
 def create_activity(lead_id, user_id, activity_type, note=None, result=None, old_stage=None, new_stage=None, old_assigned_user_id=None, new_assigned_user_id=None, follow_up_at=None, commit=True):
     """Log an activity record."""
-    # Resolve user's username snapshot
-    username_snapshot = None
-    if user_id:
-        u = get_user_by_id(user_id)
-        if u:
-            username_snapshot = u.get('username')
-
+    # The username snapshot is resolved inside the INSERT to avoid a separate user lookup
     query = """
         INSERT INTO crm_activities (
             lead_id, user_id, user_username_snapshot, activity_type, note, result,
             old_stage, new_stage, old_assigned_user_id, new_assigned_user_id, follow_up_at
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ) VALUES (%s, %s, (SELECT username FROM users WHERE id = %s), %s, %s, %s, %s, %s, %s, %s, %s)
     """
-    query_db(query, (lead_id, user_id, username_snapshot, activity_type, note, result,
+    query_db(query, (lead_id, user_id, user_id, activity_type, note, result,
                      old_stage, new_stage, old_assigned_user_id, new_assigned_user_id, follow_up_at), commit=commit)
 
 def execute_transaction(operations):
     """Runs a batch of (query, args) inside a single transaction."""
-    import psycopg2
-    from psycopg2.extras import RealDictCursor
-    from system_app.queries import get_connection_pool, get_database_url
-
-    pool = get_connection_pool()
-    conn = None
-    if pool is None:
-        conn = psycopg2.connect(get_database_url())
-    else:
-        conn = pool.getconn()
-
-    cur = None
-    try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+    with transaction() as cur:
         results = []
         for query, args in operations:
             cur.execute(query, args)
@@ -729,65 +689,35 @@ def execute_transaction(operations):
                 results.append(cur.fetchall())
             else:
                 results.append(None)
-        conn.commit()
         return results
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            if pool:
-                pool.putconn(conn)
-            else:
-                conn.close()
 
 def run_in_transaction(callback, *args, **kwargs):
     """Acquires a pooled connection and runs a callback inside a single transaction."""
-    import psycopg2
-    from psycopg2.extras import RealDictCursor
-    from system_app.queries import get_connection_pool, get_database_url
-
-    pool = get_connection_pool()
-    conn = None
-    if pool is None:
-        conn = psycopg2.connect(get_database_url())
-    else:
-        conn = pool.getconn()
+    with transaction() as cur:
+        return callback(cur, *args, **kwargs)
 
-    cur = None
-    try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        result = callback(cur, *args, **kwargs)
-        conn.commit()
-        return result
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            if pool:
-                pool.putconn(conn)
-            else:
-                conn.close()
+def get_activities(lead_id, limit, offset, after=None):
+    """Fetches chronological list of activities for a lead.
 
-def get_activities(lead_id, limit, offset):
-    """Fetches chronological list of activities for a lead."""
-    query = """
+    after=(created_at, id) continues after that activity (keyset pagination) instead of using offset.
+    """
+    keyset_clause = ""
+    args = (lead_id,)
+    if after is not None:
+        keyset_clause = f"AND {keyset_predicate(['created_at', 'id'], descending=True)}"
+        args = args + tuple(after)
+        offset = 0
+    query = f"""
         SELECT * FROM crm_activities
-        WHERE lead_id = %s
+        WHERE lead_id = %s {keyset_clause}
         ORDER BY created_at DESC, id DESC
         LIMIT %s OFFSET %s
     """
-    return query_db(query, (lead_id, limit, offset)) or []
+    return query_db(query, args + (limit, offset), row_format='compact') or []
 
 def count_activities(lead_id):
-    """Counts total activity timeline items for a lead."""
-    res = query_db("SELECT COUNT(*) as count FROM crm_activities WHERE lead_id = %s", (lead_id,), one=True)
-    return res['count'] if res else 0
+    """Counts total activity timeline items for a lead ({'count': n, 'approximate': bool})."""
+    return count_rows('crm_activities', 'lead_id = %s', (lead_id,))
 
 def get_follow_up_leads(where_clauses, args, limit, offset, order_by_clause):
     """Retrieves lead records that have pending follow-up schedules including assigned username."""
@@ -812,7 +742,7 @@ def get_follow_up_leads(where_clauses, args, limit, offset, order_by_clause):
         LIMIT %s OFFSET %s
     """
     full_args = list(args) + [limit, offset]
-    return query_db(query, tuple(full_args)) or []
+    return query_db(query, tuple(full_args), row_format='compact') or []
 
 def count_follow_up_leads(where_clauses, args):
     """Counts total lead records that match follow-up filters."""
@@ -52,7 +52,7 @@ def list_leads_route():
     }
 
     try:
-        leads_list = services.list_leads(current_user, page, per_page, filters)
+        leads_list = services.list_leads(current_user, page, per_page, filters, cursor=request.args.get('cursor'))
         return jsonify(leads_list), 200
     except ValueError as e:
         return jsonify({"error": "invalid_input", "message": str(e)}), 400
@@ -143,6 +143,9 @@ def bulk_leads_members_route():
         'expires_within',
         'expires_month',
         'expires_year',
+        'no_visit_days',
+        'min_visits_30d',
+        'min_visits_90d',
         'search_id',
         'search_name',
         'search_national_id',
@@ -164,7 +167,7 @@ def bulk_leads_members_route():
             filters[key] = value
 
     try:
-        listing = services.list_bulk_members(current_user, page, per_page, filters)
+        listing = services.list_bulk_members(current_user, page, per_page, filters, cursor=request.args.get('cursor'))
         return jsonify(listing), 200
     except ValueError as e:
         return jsonify({"error": "invalid_input", "message": str(e)}), 400
@@ -410,7 +413,7 @@ def list_activities_route(lead_id):
     page = request.args.get('page')
     per_page = request.args.get('per_page')
     try:
-        timeline = services.list_activities(current_user, lead_id, page, per_page)
+        timeline = services.list_activities(current_user, lead_id, page, per_page, cursor=request.args.get('cursor'))
         return jsonify(timeline), 200
     except CRMNotFoundError as e:
         return jsonify({"error": "not_found", "message": str(e)}), 404
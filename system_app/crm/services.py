@@ -14,6 +14,7 @@ from system_app.crm.validators import (
 )
 from system_app.crm import queries
 from system_app.crm.queries import run_in_transaction
+from system_app.pagination import encode_cursor, decode_cursor, split_page
 from system_app.member_services import create_member_in_transaction, renew_member_in_transaction, DuplicateMemberError
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
@@ -137,19 +138,31 @@ def claim_bulk_preview_operation(token, current_user):
         )
     return operation
 
-def list_bulk_members(current_user, page_param, per_page_param, filters):
-    """Returns a paginated member list for the CRM bulk selection workspace."""
+def list_bulk_members(current_user, page_param, per_page_param, filters, cursor=None):
+    """Returns a paginated member list for the CRM bulk selection workspace.
+
+    A valid cursor continues after the last member of the previous page; totals are
+    then not recomputed and come back as None.
+    """
     page, per_page = validate_pagination(page_param, per_page_param)
     normalized_filters = validate_bulk_member_filters(filters or {})
-    listing = queries.get_bulk_member_listing(normalized_filters, page, per_page)
+    after = decode_cursor(cursor, 'crm_bulk_members', size=1)
+    listing = queries.get_bulk_member_listing(
+        normalized_filters, page, per_page,
+        after_id=after[0] if after else None
+    )
+    items = listing.get("items") or []
+    has_more = listing.get("has_more", False)
     return {
-        "items": listing.get("items") or [],
+        "items": items,
         "page": page,
         "per_page": per_page,
         "total_count": listing.get("total_count", 0),
         "total_pages": listing.get("total_pages", 1),
+        "count_approximate": listing.get("count_approximate", False),
         "filters": normalized_filters,
-        "has_more": page < listing.get("total_pages", 1)
+        "has_more": has_more,
+        "next_cursor": encode_cursor([items[-1]['id']], 'crm_bulk_members') if has_more and items else None
     }
 
 def list_filter_users(current_user):
@@ -837,8 +850,12 @@ def check_lead_visibility(current_user, lead):
 
     return False
 
-def list_leads(current_user, page_param, per_page_param, filters):
-    """Lists leads enforcing visibility logic, searches, and pagination."""
+def list_leads(current_user, page_param, per_page_param, filters, cursor=None):
+    """Lists leads enforcing visibility logic, searches, and pagination.
+
+    A valid cursor (next_cursor of the previous response) switches to keyset
+    pagination: no OFFSET and no COUNT, so total/pages come back as None.
+    """
     page, per_page = validate_pagination(page_param, per_page_param)
     offset = (page - 1) * per_page
 
@@ -886,19 +903,28 @@ def list_leads(current_user, page_param, per_page_param, filters):
             term = f"%{search_q}%"
             args.extend([term, term, term])
 
-    # Fetch results
-    items = queries.get_leads(where_clauses, args, per_page, offset)
-    total = queries.count_leads(where_clauses, args)
+    # Fetch results (one look-ahead row tells whether another page exists)
+    after = decode_cursor(cursor, 'crm_leads')
+    items = queries.get_leads(where_clauses, args, per_page + 1, offset, after=after)
+    items, has_more = split_page(items, per_page)
 
-    # Calculate pages
-    pages = (total + per_page - 1) // per_page if total > 0 else 1
+    total_approximate = False
+    if after is None:
+        counted = queries.count_leads(where_clauses, args)
+        total, total_approximate = counted['count'], counted['approximate']
+        pages = (total + per_page - 1) // per_page if total > 0 else 1
+    else:
+        total = pages = None
 
     return {
         "items": items,
         "page": page,
         "per_page": per_page,
         "total": total,
-        "pages": pages
+        "pages": pages,
+        "total_approximate": total_approximate,
+        "has_more": has_more,
+        "next_cursor": encode_cursor([items[-1]['created_at'], items[-1]['id']], 'crm_leads') if has_more else None
     }
 
 def get_lead(current_user, lead_id):
@@ -1096,16 +1122,12 @@ def bulk_assign_leads(current_user, lead_ids_raw, target_user_id):
     if target_user.get('username') != 'rino' and not target_user.get('is_approved'):
         raise CRMConflictError("user_not_approved", "Lead cannot be assigned to an unapproved user.")
 
-    # 2. Fetch and validate all leads before updating
-    invalid_lead_ids = []
-    leads_to_assign = []
-
-    for lid in lead_ids:
-        lead = queries.get_lead_by_id(lid)
-        if not lead or lead.get('is_archived'):
-            invalid_lead_ids.append(lid)
-        else:
-            leads_to_assign.append(lead)
+    # 2. Fetch and validate all leads before updating (one query for the whole batch)
+    leads_by_id = {lead['id']: lead for lead in queries.get_leads_by_ids(lead_ids)}
+    invalid_lead_ids = [
+        lid for lid in lead_ids
+        if lid not in leads_by_id or leads_by_id[lid].get('is_archived')
+    ]
 
     if invalid_lead_ids:
         raise CRMConflictError(
@@ -1114,32 +1136,31 @@ def bulk_assign_leads(current_user, lead_ids_raw, target_user_id):
             {"invalid_lead_ids": sorted(invalid_lead_ids)}
         )
 
-    # 3. Build transactional operations list
-    operations = []
-    for lead in leads_to_assign:
-        # Update lead operations
-        lead_query = """
-            UPDATE crm_leads
-            SET assigned_user_id = %s,
-                assigned_by_user_id = %s,
-                assigned_at = CURRENT_TIMESTAMP,
-                updated_at = CURRENT_TIMESTAMP
-            WHERE id = %s
-        """
-        operations.append((lead_query, (target_user_id, current_user['id'], lead['id'])))
-
-        # Insert activity operations
-        username_snapshot = current_user.get('username')
-        activity_query = """
-            INSERT INTO crm_activities (
-                lead_id, user_id, user_username_snapshot, activity_type,
-                old_assigned_user_id, new_assigned_user_id
-            ) VALUES (%s, %s, %s, 'ASSIGNED', %s, %s)
-        """
-        operations.append((activity_query, (lead['id'], current_user['id'], username_snapshot, lead.get('assigned_user_id'), target_user_id)))
-
-    if operations:
-        queries.execute_transaction(operations)
+    # 3. Set-based transactional operations: log activities (capturing the previous
+    # assignee, in request order) and then reassign every lead in one UPDATE
+    activity_query = """
+        INSERT INTO crm_activities (
+            lead_id, user_id, user_username_snapshot, activity_type,
+            old_assigned_user_id, new_assigned_user_id
+        )
+        SELECT l.id, %s, %s, 'ASSIGNED', l.assigned_user_id, %s
+        FROM unnest(%s::int[]) WITH ORDINALITY AS requested(id, position)
+        JOIN crm_leads l ON l.id = requested.id
+        ORDER BY requested.position
+    """
+    lead_query = """
+        UPDATE crm_leads
+        SET assigned_user_id = %s,
+            assigned_by_user_id = %s,
+            assigned_at = CURRENT_TIMESTAMP,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = ANY(%s)
+    """
+    operations = [
+        (activity_query, (current_user['id'], current_user.get('username'), target_user_id, lead_ids)),
+        (lead_query, (target_user_id, current_user['id'], lead_ids)),
+    ]
+    queries.execute_transaction(operations)
     return True
 
 def add_activity(current_user, lead_id, data):
@@ -1210,7 +1231,7 @@ def add_activity(current_user, lead_id, data):
     queries.execute_transaction(operations)
     return True
 
-def list_activities(current_user, lead_id, page_param, per_page_param):
+def list_activities(current_user, lead_id, page_param, per_page_param, cursor=None):
     """Retrieves chronological activity log timeline for an authorized user."""
     # 1. Fetch and validate lead
     lead = queries.get_lead_by_id(lead_id)
@@ -1225,10 +1246,17 @@ def list_activities(current_user, lead_id, page_param, per_page_param):
     page, per_page = validate_pagination(page_param, per_page_param)
     offset = (page - 1) * per_page
 
-    # Fetch
-    items = queries.get_activities(lead_id, per_page, offset)
-    total = queries.count_activities(lead_id)
-    pages = (total + per_page - 1) // per_page if total > 0 else 1
+    # Fetch (a cursor continues after the last activity seen, skipping the count)
+    after = decode_cursor(cursor, f'crm_activities:{lead_id}')
+    items = queries.get_activities(lead_id, per_page + 1, offset, after=after)
+    items, has_more = split_page(items, per_page)
+    total_approximate = False
+    if after is None:
+        counted = queries.count_activities(lead_id)
+        total, total_approximate = counted['count'], counted['approximate']
+        pages = (total + per_page - 1) // per_page if total > 0 else 1
+    else:
+        total = pages = None
 
     # Serialize items safely converting datetime objects to strings if needed
     serialized = []
@@ -1240,7 +1268,10 @@ def list_activities(current_user, lead_id, page_param, per_page_param):
         "page": page,
         "per_page": per_page,
         "total": total,
-        "pages": pages
+        "pages": pages,
+        "total_approximate": total_approximate,
+        "has_more": has_more,
+        "next_cursor": encode_cursor([items[-1]['created_at'], items[-1]['id']], f'crm_activities:{lead_id}') if has_more else None
     }
 
 def list_follow_ups(current_user, page_param, per_page_param, filters):
@@ -1,6 +1,8 @@
 import re
 from zoneinfo import ZoneInfo
 
+from system_app.membership_status import MAX_NO_VISIT_DAYS, MEMBER_VISIT_COUNTERS
+
 CAIRO_TZ = ZoneInfo("Africa/Cairo")
 
 VALID_LEAD_STAGES = [
@@ -180,6 +182,9 @@ ALLOWED_BULK_MEMBER_FILTER_KEYS = {
     'expires_within',
     'expires_month',
     'expires_year',
+    'no_visit_days',
+    'min_visits_30d',
+    'min_visits_90d',
     'search_id',
     'search_name',
     'search_national_id',
@@ -290,6 +295,27 @@ def validate_bulk_member_filters(filters):
             raise ValueError("expires_year must be a four-digit year")
         normalized['expires_year'] = expires_year_int
 
+    no_visit_days = validate_optional_string(filters.get('no_visit_days'))
+    if no_visit_days:
+        try:
+            no_visit_days_int = int(no_visit_days)
+        except (ValueError, TypeError):
+            raise ValueError(f"no_visit_days must be an integer between 1 and {MAX_NO_VISIT_DAYS}")
+        if isinstance(filters.get('no_visit_days'), bool) or not 1 <= no_visit_days_int <= MAX_NO_VISIT_DAYS:
+            raise ValueError(f"no_visit_days must be an integer between 1 and {MAX_NO_VISIT_DAYS}")
+        normalized['no_visit_days'] = no_visit_days_int
+
+    for key in MEMBER_VISIT_COUNTERS:
+        min_visits = validate_optional_string(filters.get(key))
+        if min_visits:
+            try:
+                min_visits_int = int(min_visits)
+            except (ValueError, TypeError):
+                raise ValueError(f"{key} must be a positive integer")
+            if isinstance(filters.get(key), bool) or min_visits_int < 1:
+                raise ValueError(f"{key} must be a positive integer")
+            normalized[key] = min_visits_int
+
     for key in [
         'search_id',
         'search_name',
@@ -0,0 +1,183 @@
+"""The logged-in user, resolved once per request.
+
+get_current_user() is shared by the core app's decorators and pages and the
+CRM blueprint. The first call in a request stores the user in flask.g, so
+permission_required, get_common_template_context and the view itself read the
+users table at most once between them. Across requests the row (permissions
+parsed, defaults applied) is cached in app_cache under 'user:<id>' for
+CURRENT_USER_TTL seconds, tagged 'users': any committed write to users, such
+as an approval or permission edit on /user_permissions, drops it at once.
+"""
+import json
+import traceback
+
+from flask import g, session
+
+from system_app.cache import app_cache
+from system_app.queries import query_db
+
+# Seconds a user row is reused across requests (writes to users drop it sooner)
+CURRENT_USER_TTL = 30
+CURRENT_USER_TAGS = ('users',)
+
+
+def _load_permissions(raw_permissions):
+    """Safely load permissions from DB (JSONB or TEXT) into a dict."""
+    if not raw_permissions:
+        perms = {}
+    elif isinstance(raw_permissions, dict):
+        perms = raw_permissions
+    else:
+        try:
+            perms = json.loads(raw_permissions)
+        except Exception:
+            perms = {}
+    
+    # Backward compatibility for invitations
+    if perms.get('invitations'):
+        if 'invitations_view' not in perms:
+            perms['invitations_view'] = True
+        if 'invitations_use' not in perms:
+            perms['invitations_use'] = True
+            
+    return perms
+
+
+def get_default_permissions_for_username(username):
+    """
+    Default permission sets:
+    - rino: super admin (access to everything)
+    - ahmed_adel: everything except delete_member, undo_action, data_management,
+                  online_users, training_templates, offers, renewal_log
+    - malit_deng: everything except undo_action, data_management, online_users,
+                  training_templates, offers, renewal_log, supplements_water,
+                  attendance_backup, delete_member
+    - others (new accounts): attendance only
+    """
+    username = (username or '').strip()
+
+    # Super admin
+    if username == 'rino':
+        return {'super_admin': True}
+
+    # Base full-access set
+    base = {
+        'index': True,
+        'attendance': True,
+        'delete_attendance': True,
+        'members_view': True,
+        'members_edit': True,
+        'delete_member': True,
+        'training_templates': True,
+        'offers': True,
+        'renewal_log': True,
+        'supplements_water': True,
+        'attendance_backup': True,
+        'undo_action': True,
+        'data_management': True,
+        'online_users': True,
+        'invoices': True,
+        'invitations': True,
+        'invitations_view': True,
+        'invitations_use': True,
+    }
+
+    if username == 'ahmed_adel':
+        perms = base.copy()
+        perms.update({
+            'delete_member': False,
+            'undo_action': False,
+            'data_management': False,
+            'online_users': False,
+            'training_templates': False,
+            'offers': False,
+            'renewal_log': False,
+            'delete_attendance': False,
+        })
+        return perms
+
+    if username == 'malit_deng':
+        perms = base.copy()
+        perms.update({
+            'delete_member': False,
+            'undo_action': False,
+            'data_management': False,
+            'online_users': False,
+            'training_templates': False,
+            'offers': False,
+            'renewal_log': False,
+            'supplements_water': False,
+            'attendance_backup': False,
+            'delete_attendance': False,
+        })
+        return perms
+
+    # Default for any new / normal account → attendance only
+    return {
+        'attendance': True,
+    }
+
+
+def _user_cache_key(user_id):
+    return f'user:{user_id}'
+
+
+def _load_user(user_id):
+    user = query_db(
+        'SELECT id, username, email, is_approved, permissions FROM users WHERE id = %s',
+        (user_id,),
+        one=True,
+    )
+    if not user:
+        return None
+
+    # Super admin shortcut
+    if user.get('username') == 'rino':
+        user['permissions'] = {'super_admin': True}
+        return user
+
+    perms = _load_permissions(user.get('permissions'))
+    # If permissions are empty, get defaults for this username
+    if not perms:
+        perms = get_default_permissions_for_username(user.get('username'))
+    user['permissions'] = perms
+    return user
+
+
+def get_current_user():
+    """Return current user dict with 'permissions' (dict) included."""
+    try:
+        user_id = session.get('user_id')
+        if not user_id:
+            return None
+
+        memo = g.get('_current_user')
+        if memo is not None and memo[0] == user_id:
+            return memo[1]
+
+        generation = app_cache.generation(CURRENT_USER_TAGS)
+        cached = app_cache.get(_user_cache_key(user_id))
+        if cached is None:
+            cached = _load_user(user_id)
+            if cached is None:
+                return None
+            app_cache.set(_user_cache_key(user_id), cached, ttl=CURRENT_USER_TTL,
+                          tags=CURRENT_USER_TAGS, generation=generation)
+
+        # The cached row is shared between requests: hand each one its own copy
+        user = dict(cached)
+        user['permissions'] = dict(cached['permissions'])
+        g._current_user = (user_id, user)
+        return user
+    except Exception as e:
+        print(f"Error in get_current_user: {e}")
+        traceback.print_exc()
+        return None
+
+
+def forget_current_user(user_id=None):
+    """Drops a user's cached row (default: the session's user) and this request's memo."""
+    user_id = user_id or session.get('user_id')
+    if user_id:
+        app_cache.delete(_user_cache_key(user_id))
+    g.pop('_current_user', None)
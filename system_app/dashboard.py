@@ -0,0 +1,136 @@
+"""Dashboard figures shared by every page (get_common_template_context).
+
+A DashboardSnapshot takes all of them in two round trips: one pass over
+members with a COUNT(*) FILTER (...) per bucket (the pending-approval and
+renewed-this-month counts ride along as scalar subqueries), and one pass over
+this and last month's renewal_logs grouped per package with a grand total row.
+"""
+from datetime import date
+
+from system_app.membership_status import active_predicate, expired_predicate, expiring_within_predicate
+from system_app.queries import query_db
+
+# Seconds a snapshot is reused (the expiry buckets' old cache timeout), unless
+# one of the tables it reads is written to first
+DASHBOARD_SNAPSHOT_TTL = 60
+# Seconds an expired snapshot may still be served while one request reloads it
+# in the background (a write to its tables drops it outright)
+DASHBOARD_SNAPSHOT_STALE_TTL = 120
+DASHBOARD_SNAPSHOT_TAGS = ('members', 'member_logs', 'pending_member_edits', 'renewal_logs')
+# Packages listed in the "revenue by package" card
+DASHBOARD_TOP_PACKAGES = 5
+
+_MEMBER_COUNTS_SQL = f"""
+    SELECT
+        COUNT(*) FILTER (WHERE {expiring_within_predicate(7)}) AS expiring_7_days,
+        COUNT(*) FILTER (WHERE {expiring_within_predicate(14)}) AS expiring_14_days,
+        COUNT(*) FILTER (WHERE {expiring_within_predicate(30)}) AS expiring_30_days,
+        COUNT(*) FILTER (WHERE {active_predicate()}) AS active_count,
+        COUNT(*) FILTER (WHERE {expired_predicate(include_unknown=True)}) AS expired_count,
+        COUNT(*) FILTER (
+            WHERE actual_starting_date IS NOT NULL AND actual_starting_date != ''
+            AND (
+                (LENGTH(TRIM(actual_starting_date)) >= 10
+                 AND SUBSTRING(TRIM(actual_starting_date), 1, 7) = %(year_month)s)
+                OR (actual_starting_date LIKE %(year_month_like)s)
+                OR (actual_starting_date LIKE %(comma_like)s)
+                OR (actual_starting_date ILIKE %(month_name_like)s AND actual_starting_date ILIKE %(year_like)s)
+            )
+        ) AS new_members_count,
+        (SELECT COUNT(DISTINCT member_id) FROM member_logs
+         WHERE field_name = 'starting_date' AND edit_time >= %(month_start)s) AS updated_starting_date_count,
+        (SELECT COUNT(*) FROM pending_member_edits WHERE status = 'pending') AS pending_approvals_count
+    FROM members
+"""
+
+# Per-package rows for this month plus one grand total row (is_total) carrying
+# both months' revenue
+_REVENUE_SQL = """
+    SELECT package_name,
+           GROUPING(package_name) = 1 AS is_total,
+           COUNT(*) FILTER (WHERE this_month) AS count,
+           COALESCE(SUM(fees) FILTER (WHERE this_month), 0) AS total_revenue,
+           COALESCE(SUM(fees) FILTER (WHERE NOT this_month), 0) AS last_month_revenue
+    FROM (
+        SELECT package_name, fees, renewal_date >= %(month_start)s AS this_month
+        FROM renewal_logs
+        WHERE renewal_date >= %(last_month_start)s AND renewal_date < %(next_month_start)s
+    ) logs
+    GROUP BY GROUPING SETS ((package_name), ())
+"""
+
+
+def _month_start(year, month):
+    if month < 1:
+        return date(year - 1, 12, 1)
+    if month > 12:
+        return date(year + 1, 1, 1)
+    return date(year, month, 1)
+
+
+class DashboardSnapshot:
+    """Member counts and revenue figures for the dashboard as of one day."""
+
+    def __init__(self, today, member_counts, revenue_rows):
+        self.today = today
+        self.pending_approvals_count = member_counts['pending_approvals_count']
+        self.new_members_count = member_counts['new_members_count']
+        self.updated_starting_date_count = member_counts['updated_starting_date_count']
+        self.expiring = {days: member_counts[f'expiring_{days}_days'] for days in (7, 14, 30)}
+        self.active_count = member_counts['active_count']
+        self.expired_count = member_counts['expired_count']
+
+        total = next((row for row in revenue_rows if row['is_total']), None)
+        self.revenue_this_month = float(total['total_revenue']) if total else 0.0
+        self.revenue_last_month = float(total['last_month_revenue']) if total else 0.0
+        packages = [row for row in revenue_rows if not row['is_total'] and row['count']]
+        packages.sort(key=lambda row: row['total_revenue'], reverse=True)
+        self.revenue_by_package = [
+            {'package_name': row['package_name'], 'count': row['count'], 'total_revenue': row['total_revenue']}
+            for row in packages[:DASHBOARD_TOP_PACKAGES]
+        ]
+
+    @classmethod
+    def load(cls, today):
+        """Runs the two aggregate queries for the month containing `today`."""
+        month_start = _month_start(today.year, today.month)
+        year_month = f'{today.year}-{today.month:02d}'
+        member_counts = query_db(_MEMBER_COUNTS_SQL, {
+            'year_month': year_month,
+            'year_month_like': f'{year_month}-%',
+            'comma_like': f'%,{today.month:02d},{today.year}%',
+            'month_name_like': f"%{today.strftime('%B')}%",
+            'year_like': f'%{today.year}%',
+            'month_start': month_start,
+        }, one=True)
+        revenue_rows = query_db(_REVENUE_SQL, {
+            'month_start': month_start,
+            'last_month_start': _month_start(today.year, today.month - 1),
+            'next_month_start': _month_start(today.year, today.month + 1),
+        }) or []
+        return cls(today, member_counts, revenue_rows)
+
+    @property
+    def revenue_growth(self):
+        if self.revenue_last_month > 0:
+            return ((self.revenue_this_month - self.revenue_last_month) / self.revenue_last_month) * 100
+        if self.revenue_this_month > 0:
+            return 100.0
+        return 0.0
+
+    def template_context(self):
+        """The snapshot under the template variable names (and their aliases)."""
+        return {
+            'new_members_count': self.new_members_count,
+            'updated_starting_date_count': self.updated_starting_date_count,
+            'expiring_7_days': self.expiring[7],
+            'expiring_14_days': self.expiring[14],
+            'expiring_30_days': self.expiring[30],
+            'total_active_members': self.active_count,
+            'active_count': self.active_count,
+            'expired_count': self.expired_count,
+            'revenue_this_month': self.revenue_this_month,
+            'revenue_last_month': self.revenue_last_month,
+            'revenue_growth': self.revenue_growth,
+            'revenue_by_package': self.revenue_by_package,
+        }
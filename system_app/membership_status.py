@@ -0,0 +1,77 @@
+"""Shared SQL predicates for membership status (active / expired / expiring soon)
+and visit recency.
+
+Every page and the CRM build their status filters from here so the SQL text is
+identical everywhere and the partial indexes below match all of them.
+"""
+
+# Today's date in the gym's timezone, evaluated by Postgres
+CAIRO_TODAY_SQL = "(CURRENT_TIMESTAMP AT TIME ZONE 'Africa/Cairo')::DATE"
+
+# Disjoint expiry buckets used by the dashboard cards and expires_within filters:
+# days -> (lower offset, upper offset). 7 = Urgent, 14 = Warning, 30 = Upcoming
+EXPIRING_BUCKETS = {
+    7: (0, 7),
+    14: (7, 14),
+    30: (14, 30),
+}
+
+# Denormalized visit counters on members, kept by the attendance trigger and the
+# nightly refresh: filter key -> column
+MEMBER_VISIT_COUNTERS = {
+    'min_visits_30d': 'visits_30d',
+    'min_visits_90d': 'visits_90d',
+}
+# Longest look-back accepted by the no_visit_days filter
+MAX_NO_VISIT_DAYS = 3650
+
+# Partial indexes serving the predicates above
+MEMBER_STATUS_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS idx_members_status_end_date ON members(end_date_d) WHERE end_date_d IS NOT NULL',
+    'CREATE INDEX IF NOT EXISTS idx_members_status_unknown ON members(id) WHERE end_date_d IS NULL',
+)
+
+
+def active_predicate(column='end_date_d'):
+    """Members whose end date is today or later."""
+    return f"{column} >= {CAIRO_TODAY_SQL}"
+
+
+def expired_predicate(column='end_date_d', include_unknown=False):
+    """Members whose end date has passed; optionally also those without a valid end date."""
+    if include_unknown:
+        return f"({column} IS NULL OR {column} < {CAIRO_TODAY_SQL})"
+    return f"{column} < {CAIRO_TODAY_SQL}"
+
+
+def view_predicate(view, column='end_date_d'):
+    """Returns the predicate for an active/expired/all view filter, or None for 'all'."""
+    if view == 'active':
+        return active_predicate(column)
+    if view == 'expired':
+        return expired_predicate(column)
+    return None
+
+
+def expiring_within_predicate(days, column='end_date_d'):
+    """Returns the predicate for one disjoint expiry bucket (7, 14 or 30 days)."""
+    lower, upper = EXPIRING_BUCKETS[int(days)]
+    if lower == 0:
+        return f"({column} >= {CAIRO_TODAY_SQL} AND {column} <= {CAIRO_TODAY_SQL} + {upper})"
+    return f"({column} > {CAIRO_TODAY_SQL} + {lower} AND {column} <= {CAIRO_TODAY_SQL} + {upper})"
+
+
+def no_visit_predicate(days, column='last_visit_at'):
+    """Members with no visit in the last `days` days, including members who never came."""
+    return f"({column} IS NULL OR {column} < CURRENT_TIMESTAMP - INTERVAL '{int(days)} days')"
+
+
+def min_visits_predicate(filter_key, visits):
+    """Members with at least `visits` visits in the counter's rolling window."""
+    return f"{MEMBER_VISIT_COUNTERS[filter_key]} >= {int(visits)}"
+
+
+def create_member_status_indexes(cur):
+    """Creates the partial indexes backing the status predicates."""
+    for statement in MEMBER_STATUS_INDEXES:
+        cur.execute(statement)
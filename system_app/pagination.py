@@ -0,0 +1,60 @@
+"""Keyset (cursor) pagination helpers.
+
+A cursor token encodes the sort key and id of the last row a client has
+seen. The next page is fetched with a row comparison on (sort key, id), so
+every page costs the same as the first one no matter how deep the client
+scrolls. Tokens are opaque to clients but not secret: values are always
+bound as query parameters.
+"""
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(values, scope=''):
+    """Returns an opaque token for the sort key values of the last row on a page."""
+    payload = json.dumps({'s': scope, 'k': [_json_value(value) for value in values]}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, scope='', size=2):
+    """Returns the key values stored in a token, or None if it is missing, malformed or
+    was issued for a different listing/sort (``scope``)."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except (ValueError, binascii.Error, UnicodeError):
+        return None
+    if not isinstance(payload, dict) or payload.get('s') != scope:
+        return None
+    values = payload.get('k')
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
+
+def keyset_predicate(key_sql, descending=False, param_types=None):
+    """Returns "(a, b) > (%s, %s)" for the given key expressions (``<`` when descending).
+
+    ``param_types`` optionally casts each bound value to its key's SQL type (None
+    leaves it as is), e.g. 'real' so a REAL column is not compared in double precision.
+    """
+    operator = '<' if descending else '>'
+    placeholders = ', '.join(f'%s::{sql_type}' if sql_type else '%s'
+                             for sql_type in (param_types or [None] * len(key_sql)))
+    return f"({', '.join(key_sql)}) {operator} ({placeholders})"
+
+
+def split_page(rows, limit):
+    """Trims the extra look-ahead row; returns (rows, has_more)."""
+    rows = list(rows or [])
+    return rows[:limit], len(rows) > limit
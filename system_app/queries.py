@@ -10,7 +10,15 @@ from psycopg2 import IntegrityError
 from psycopg2 import pool
 from datetime import date
 from .func import get_cairo_date
+from .membership_status import create_member_status_indexes
+from .query_stats import TimedRealDictCursor
+from .cache import app_cache
+from .rows import TimedCompactRowCursor
 import threading
+import time
+import uuid
+import io
+from contextlib import contextmanager
 
 # === Read DATABASE_URL ===
 DATABASE_URL = os.getenv("DATABASE_URL") or os.getenv("PGURL")
@@ -26,6 +34,219 @@ def get_database_url():
 _connection_pool = None
 _pool_lock = threading.Lock()
 
+
+class PoolTimeoutError(pool.PoolError):
+    """Raised when no pooled connection frees up within the checkout timeout."""
+    pass
+
+
+class BlockingConnectionPool:
+    """Bounded connection pool that waits for a free connection instead of failing.
+
+    At most ``maxconn`` connections are open at once; ``minconn`` are opened up
+    front. Connections idle longer than ``preping_idle`` seconds are validated
+    with ``SELECT 1`` before being handed out, and connections older than
+    ``max_age`` seconds are closed and replaced.
+    """
+
+    def __init__(self, minconn, maxconn, dsn, timeout=10, max_age=1800, preping_idle=30):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.dsn = dsn
+        self.timeout = timeout
+        self.max_age = max_age
+        self.preping_idle = preping_idle
+        # Guards everything below; notified whenever a connection or slot frees up
+        self._cond = threading.Condition()
+        self._idle = []  # (conn, returned_at), most recently returned last
+        self._in_use = {}  # id(conn) -> conn
+        self._created_at = {}  # id(conn) -> monotonic time it was opened
+        self._opened = 0  # idle + in use + being opened
+        self._closed = False
+        self._stats = {
+            'checkouts': 0,
+            'wait_ms_total': 0.0,
+            'wait_ms_max': 0.0,
+            'timeouts': 0,
+            'preping_failures': 0,
+            'recycled': 0,
+            'direct_fallbacks': 0,
+        }
+        for _ in range(minconn):
+            conn = self._connect()
+            with self._cond:
+                self._opened += 1
+                self._idle.append((conn, time.monotonic()))
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def _count(self, key, amount=1):
+        with self._cond:
+            self._stats[key] += amount
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn)
+        with self._cond:
+            self._created_at[id(conn)] = time.monotonic()
+        return conn
+
+    def _close(self, conn):
+        """Closes a connection and frees its slot."""
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._created_at.pop(id(conn), None)
+            self._opened -= 1
+            self._cond.notify()
+
+    def _reserve(self, timeout):
+        """Takes an idle (conn, returned_at), or (None, None) after reserving a slot for a new connection."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise pool.PoolError("connection pool is closed")
+                if self._idle:
+                    return self._idle.pop()
+                if self._opened < self.maxconn:
+                    self._opened += 1
+                    return None, None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(f"No database connection available after {timeout}s")
+                self._cond.wait(remaining)
+
+    def getconn(self, timeout=None):
+        """Checks out a healthy connection, waiting up to ``timeout`` seconds for a free slot."""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.perf_counter()
+        conn, returned_at = self._reserve(timeout)
+        if conn is not None:
+            conn = self._checked(conn, returned_at)
+        if conn is None:
+            # A replacement is brand new and needs no check
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._opened -= 1
+                    self._cond.notify()
+                raise
+        wait_ms = (time.perf_counter() - started) * 1000
+        with self._cond:
+            self._in_use[id(conn)] = conn
+            self._stats['checkouts'] += 1
+            self._stats['wait_ms_total'] += wait_ms
+            self._stats['wait_ms_max'] = max(self._stats['wait_ms_max'], wait_ms)
+        return conn
+
+    def _checked(self, conn, returned_at):
+        """Returns conn if it is still usable; otherwise closes it, keeps its slot and returns None."""
+        now = time.monotonic()
+        with self._cond:
+            created = self._created_at.get(id(conn), now)
+        if conn.closed or (self.max_age and now - created > self.max_age):
+            self._retire(conn)
+            self._count('recycled')
+            return None
+        if self.preping_idle is not None and now - returned_at > self.preping_idle:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute('SELECT 1')
+                conn.rollback()
+            except Exception:
+                self._retire(conn)
+                self._count('preping_failures')
+                return None
+        return conn
+
+    def _retire(self, conn):
+        """Closes a connection whose slot is about to be reused by a replacement."""
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._created_at.pop(id(conn), None)
+
+    def putconn(self, conn, close=False):
+        """Returns a checked-out connection to the pool and frees its slot."""
+        with self._cond:
+            if self._closed:
+                conn.close()
+                return
+            if self._in_use.pop(id(conn), None) is None:
+                raise pool.PoolError("trying to put unkeyed connection")
+        if not (close or conn.closed):
+            status = conn.info.transaction_status
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                close = True
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except Exception:
+                    close = True
+        if close or conn.closed:
+            self._close(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def warm_up(self):
+        """Opens and validates ``minconn`` connections so the first requests don't pay for TLS setup."""
+        conns = []
+        try:
+            for _ in range(self.minconn):
+                conns.append(self.getconn())
+            for conn in conns:
+                with conn.cursor() as cur:
+                    cur.execute('SELECT 1')
+                conn.rollback()
+        finally:
+            for conn in conns:
+                self.putconn(conn)
+        return len(conns)
+
+    def record_direct_fallback(self):
+        self._count('direct_fallbacks')
+
+    def stats(self):
+        """Returns checkout wait, in-use/idle counts and fallback counters."""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['in_use'] = len(self._in_use)
+            stats['idle'] = len(self._idle)
+        checkouts = stats['checkouts']
+        stats['wait_ms_avg'] = round(stats['wait_ms_total'] / checkouts, 2) if checkouts else 0.0
+        stats['wait_ms_total'] = round(stats['wait_ms_total'], 2)
+        stats['wait_ms_max'] = round(stats['wait_ms_max'], 2)
+        stats['min_conn'] = self.minconn
+        stats['max_conn'] = self.maxconn
+        return stats
+
+    def closeall(self):
+        """Closes every connection, idle or checked out; later checkouts fail."""
+        with self._cond:
+            self._closed = True
+            conns = [conn for conn, _ in self._idle] + list(self._in_use.values())
+            self._idle = []
+            self._in_use = {}
+            self._created_at = {}
+            self._opened = 0
+            self._cond.notify_all()
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
 def get_connection_pool():
     """Get or create database connection pool"""
     global _connection_pool
@@ -33,11 +254,15 @@ def get_connection_pool():
         with _pool_lock:
             if _connection_pool is None:
                 try:
+                    from .config import Config
                     db_url = get_database_url()
-                    _connection_pool = psycopg2.pool.ThreadedConnectionPool(
-                        minconn=1,
-                        maxconn=20,  # Maximum 20 connections in pool
-                        dsn=db_url
+                    _connection_pool = BlockingConnectionPool(
+                        minconn=Config.DB_POOL_MIN_CONN,
+                        maxconn=Config.DB_POOL_MAX_CONN,
+                        dsn=db_url,
+                        timeout=Config.DB_POOL_TIMEOUT,
+                        max_age=Config.DB_POOL_MAX_AGE,
+                        preping_idle=Config.DB_POOL_PREPING_IDLE
                     )
                     print("Database connection pool created successfully")
                 except Exception as e:
@@ -45,12 +270,45 @@ def get_connection_pool():
                     _connection_pool = None
     return _connection_pool
 
+
+def warm_up_connection_pool():
+    """Creates the pool and opens its minimum connections at boot."""
+    db_pool = get_connection_pool()
+    if db_pool is None:
+        return 0
+    try:
+        return db_pool.warm_up()
+    except Exception as e:
+        print(f"Error warming up connection pool: {e}")
+        return 0
+
+
+def get_pool_stats():
+    """Returns connection pool statistics, or None if the pool is unavailable."""
+    db_pool = _connection_pool
+    return db_pool.stats() if db_pool is not None else None
+
+
+def _direct_connect():
+    """Opens an unpooled connection and counts it as a pool fallback."""
+    if _connection_pool is not None:
+        _connection_pool.record_direct_fallback()
+    return psycopg2.connect(get_database_url())
+
+# Legacy TEXT date columns on members that have a typed "<column>_d" DATE mirror
+MEMBER_TYPED_DATE_COLUMNS = ('end_date', 'starting_date', 'actual_starting_date', 'birthdate')
+
 # === Create tables (once on startup) ===
 def create_table():
-    db_url = get_database_url()
-    conn = psycopg2.connect(db_url)
-    cr = conn.cursor()
+    """Creates (or migrates) all tables, triggers and indexes in one transaction."""
     try:
+        _create_schema()
+    except Exception as e:
+        print(f"Error creating tables: {e}")
+
+
+def _create_schema():
+    with transaction() as cr:
         cr.execute('''
             CREATE TABLE IF NOT EXISTS members (
                 id SERIAL PRIMARY KEY,
@@ -97,7 +355,64 @@ def create_table():
             cr.execute('ALTER TABLE members ADD COLUMN IF NOT EXISTS freeze_used BOOLEAN DEFAULT FALSE')
         except:
             pass
-        
+
+        # Typed DATE mirrors of the legacy TEXT date columns. A trigger keeps them
+        # in sync on every write path so status predicates can use plain indexes.
+        try:
+            with savepoint(cr):
+                for column in MEMBER_TYPED_DATE_COLUMNS:
+                    cr.execute(f'ALTER TABLE members ADD COLUMN IF NOT EXISTS {column}_d DATE')
+                cr.execute('''
+                    CREATE OR REPLACE FUNCTION member_text_to_date(value TEXT) RETURNS DATE AS $$
+                    DECLARE
+                        v TEXT := SUBSTRING(TRIM(value), 1, 10);
+                    BEGIN
+                        -- Same formats, in the same order, as the legacy Python status parser
+                        IF v ~ '^[0-9]{4}[-/][0-9]{2}[-/][0-9]{2}$' THEN
+                            RETURN make_date(SUBSTRING(v, 1, 4)::INT, SUBSTRING(v, 6, 2)::INT, SUBSTRING(v, 9, 2)::INT);
+                        ELSIF v ~ '^[0-9]{2}[-/][0-9]{2}[-/][0-9]{4}$' THEN
+                            BEGIN
+                                RETURN make_date(SUBSTRING(v, 7, 4)::INT, SUBSTRING(v, 1, 2)::INT, SUBSTRING(v, 4, 2)::INT);
+                            EXCEPTION WHEN others THEN
+                                RETURN make_date(SUBSTRING(v, 7, 4)::INT, SUBSTRING(v, 4, 2)::INT, SUBSTRING(v, 1, 2)::INT);
+                            END;
+                        END IF;
+                        RETURN NULL;
+                    EXCEPTION WHEN others THEN
+                        RETURN NULL;
+                    END;
+                    $$ LANGUAGE plpgsql IMMUTABLE
+                ''')
+                cr.execute('''
+                    CREATE OR REPLACE FUNCTION sync_member_typed_dates() RETURNS TRIGGER AS $$
+                    BEGIN
+                        NEW.end_date_d := member_text_to_date(NEW.end_date);
+                        NEW.starting_date_d := member_text_to_date(NEW.starting_date);
+                        NEW.actual_starting_date_d := member_text_to_date(NEW.actual_starting_date);
+                        NEW.birthdate_d := member_text_to_date(NEW.birthdate);
+                        RETURN NEW;
+                    END;
+                    $$ LANGUAGE plpgsql
+                ''')
+                cr.execute('DROP TRIGGER IF EXISTS trg_members_sync_typed_dates ON members')
+                cr.execute('''
+                    CREATE TRIGGER trg_members_sync_typed_dates
+                    BEFORE INSERT OR UPDATE OF end_date, starting_date, actual_starting_date, birthdate,
+                        end_date_d, starting_date_d, actual_starting_date_d, birthdate_d
+                    ON members
+                    FOR EACH ROW EXECUTE FUNCTION sync_member_typed_dates()
+                ''')
+                # Backfill rows written before the trigger existed
+                cr.execute('''
+                    UPDATE members SET end_date_d = member_text_to_date(end_date)
+                    WHERE end_date_d IS DISTINCT FROM member_text_to_date(end_date)
+                       OR starting_date_d IS DISTINCT FROM member_text_to_date(starting_date)
+                       OR actual_starting_date_d IS DISTINCT FROM member_text_to_date(actual_starting_date)
+                       OR birthdate_d IS DISTINCT FROM member_text_to_date(birthdate)
+                ''')
+        except Exception as e:
+            print(f"Error adding typed member date columns: {e}")
+
         cr.execute('''
             CREATE TABLE IF NOT EXISTS attendance (
                 num SERIAL PRIMARY KEY,
@@ -148,18 +463,70 @@ def create_table():
         except:
             pass
 
-        cr.execute('''
-            CREATE TABLE IF NOT EXISTS attendance_backup (
-                id SERIAL PRIMARY KEY,
-                member_id INTEGER,
-                name TEXT,
-                end_date TEXT,
-                membership_status TEXT,
-                attendance_time TEXT,
-                attendance_date TEXT,
-                day TEXT
-            )
-        ''')
+        # Attendance archive, range-partitioned by month on the typed attendance_day
+        # (partitions are created on demand by ensure_attendance_backup_partition()).
+        # An older unpartitioned attendance_backup is converted in place.
+        try:
+            with savepoint(cr):
+                cr.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('attendance_backup')")
+                existing = cr.fetchone()
+                relkind = existing['relkind'] if existing else None
+                if relkind == 'r':
+                    cr.execute('ALTER TABLE attendance_backup RENAME TO attendance_backup_legacy')
+                    cr.execute('ALTER INDEX IF EXISTS attendance_backup_pkey RENAME TO attendance_backup_legacy_pkey')
+                    cr.execute('ALTER SEQUENCE IF EXISTS attendance_backup_id_seq RENAME TO attendance_backup_legacy_id_seq')
+                if relkind != 'p':
+                    cr.execute('''
+                        CREATE TABLE attendance_backup (
+                            id SERIAL,
+                            member_id INTEGER,
+                            name TEXT,
+                            end_date TEXT,
+                            membership_status TEXT,
+                            attendance_time TEXT,
+                            attendance_date TEXT,
+                            day TEXT,
+                            attendance_day DATE NOT NULL,
+                            PRIMARY KEY (id, attendance_day)
+                        ) PARTITION BY RANGE (attendance_day)
+                    ''')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_attendance_backup_member_day ON attendance_backup(member_id, attendance_day)')
+                cr.execute('''
+                    CREATE OR REPLACE FUNCTION ensure_attendance_backup_partition(month DATE) RETURNS TEXT AS $$
+                    DECLARE
+                        start_day DATE := date_trunc('month', month)::DATE;
+                        partition_name TEXT := 'attendance_backup_' || to_char(start_day, '"y"YYYY"m"MM');
+                    BEGIN
+                        IF to_regclass(partition_name) IS NULL THEN
+                            EXECUTE format(
+                                'CREATE TABLE %I PARTITION OF attendance_backup FOR VALUES FROM (%L) TO (%L)',
+                                partition_name, start_day, (start_day + INTERVAL '1 month')::DATE
+                            );
+                        END IF;
+                        RETURN partition_name;
+                    END;
+                    $$ LANGUAGE plpgsql
+                ''')
+                if relkind == 'r':
+                    legacy_day = "COALESCE(member_text_to_date(attendance_date), (CURRENT_TIMESTAMP AT TIME ZONE 'Africa/Cairo')::DATE)"
+                    cr.execute(f'''
+                        SELECT ensure_attendance_backup_partition(month)
+                        FROM (SELECT DISTINCT date_trunc('month', {legacy_day})::DATE AS month
+                              FROM attendance_backup_legacy) months
+                    ''')
+                    cr.execute(f'''
+                        INSERT INTO attendance_backup
+                            (id, member_id, name, end_date, membership_status, attendance_time, attendance_date, day, attendance_day)
+                        SELECT id, member_id, name, end_date, membership_status, attendance_time, attendance_date, day, {legacy_day}
+                        FROM attendance_backup_legacy
+                    ''')
+                    cr.execute('''
+                        SELECT setval(pg_get_serial_sequence('attendance_backup', 'id'),
+                                      COALESCE((SELECT MAX(id) FROM attendance_backup), 0) + 1, false)
+                    ''')
+                    cr.execute('DROP TABLE attendance_backup_legacy')
+        except Exception as e:
+            print(f"Error creating partitioned attendance_backup: {e}")
 
         cr.execute('''
             CREATE TABLE IF NOT EXISTS attendance_backup_runs (
@@ -459,132 +826,393 @@ def create_table():
 
         # Create indexes for better query performance
         try:
-            # Indexes for members table (frequently queried columns)
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_members_name ON members(name)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_members_phone ON members(phone)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_members_email ON members(email)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_members_id ON members(id)')
-
-            # Indexes for CRM module (Phase 1A)
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_crm_leads_member_id ON crm_leads(member_id)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_crm_leads_assigned_user ON crm_leads(assigned_user_id)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_crm_leads_stage ON crm_leads(stage)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_crm_leads_next_follow_up ON crm_leads(next_follow_up_at)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_crm_leads_campaign ON crm_leads(campaign_id)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_crm_leads_created_at ON crm_leads(created_at)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_crm_activities_lead_id ON crm_activities(lead_id)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_crm_activities_created_at ON crm_activities(created_at)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_crm_activities_user_id ON crm_activities(user_id)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_crm_bulk_lead_operations_created_by ON crm_bulk_lead_operations(created_by_user_id)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_crm_bulk_lead_operations_status ON crm_bulk_lead_operations(status)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_crm_bulk_lead_operations_expires_at ON crm_bulk_lead_operations(expires_at)')
-            cr.execute('''
-                CREATE UNIQUE INDEX IF NOT EXISTS idx_unique_active_member_lead
-                ON crm_leads(member_id)
-                WHERE member_id IS NOT NULL
-                  AND stage IN ('NEW', 'CONTACTED', 'FOLLOW_UP', 'INTERESTED', 'TRIAL')
-                  AND is_archived = FALSE
-            ''')
+            with savepoint(cr):
+                # Indexes for members table (frequently queried columns)
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_members_name ON members(name)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_members_phone ON members(phone)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_members_email ON members(email)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_members_id ON members(id)')
+                # Partial indexes for the shared membership status predicates
+                cr.execute('DROP INDEX IF EXISTS idx_members_end_date_d')
+                create_member_status_indexes(cr)
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_members_starting_date_d ON members(starting_date_d)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_members_actual_starting_date_d ON members(actual_starting_date_d)')
+                # This / last month revenue windows of the dashboard snapshot
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_renewal_logs_renewal_date ON renewal_logs(renewal_date)')
+
+                # Indexes for CRM module (Phase 1A)
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_crm_leads_member_id ON crm_leads(member_id)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_crm_leads_assigned_user ON crm_leads(assigned_user_id)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_crm_leads_stage ON crm_leads(stage)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_crm_leads_next_follow_up ON crm_leads(next_follow_up_at)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_crm_leads_campaign ON crm_leads(campaign_id)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_crm_leads_created_at ON crm_leads(created_at)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_crm_activities_lead_id ON crm_activities(lead_id)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_crm_activities_created_at ON crm_activities(created_at)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_crm_activities_user_id ON crm_activities(user_id)')
+                # Keyset pagination order for the CRM lead list and activity timeline
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_crm_leads_created_at_id ON crm_leads(created_at DESC, id DESC)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_crm_activities_lead_created_id ON crm_activities(lead_id, created_at DESC, id DESC)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_crm_bulk_lead_operations_created_by ON crm_bulk_lead_operations(created_by_user_id)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_crm_bulk_lead_operations_status ON crm_bulk_lead_operations(status)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_crm_bulk_lead_operations_expires_at ON crm_bulk_lead_operations(expires_at)')
+                cr.execute('''
+                    CREATE UNIQUE INDEX IF NOT EXISTS idx_unique_active_member_lead
+                    ON crm_leads(member_id)
+                    WHERE member_id IS NOT NULL
+                      AND stage IN ('NEW', 'CONTACTED', 'FOLLOW_UP', 'INTERESTED', 'TRIAL')
+                      AND is_archived = FALSE
+                ''')
             
-            # Indexes for training templates and plans
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_training_templates_category ON training_templates(category)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_member_training_plans_member_id ON member_training_plans(member_id)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_member_training_plans_template_id ON member_training_plans(template_id)')
+                # Indexes for training templates and plans
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_training_templates_category ON training_templates(category)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_member_training_plans_member_id ON member_training_plans(member_id)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_member_training_plans_template_id ON member_training_plans(template_id)')
             
-            # Indexes for pending member edits
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_pending_edits_status ON pending_member_edits(status)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_pending_edits_member_id ON pending_member_edits(member_id)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_pending_edits_requested_by ON pending_member_edits(requested_by)')
+                # Indexes for pending member edits
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_pending_edits_status ON pending_member_edits(status)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_pending_edits_member_id ON pending_member_edits(member_id)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_pending_edits_requested_by ON pending_member_edits(requested_by)')
             
-            # Indexes for progress tracking
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_progress_tracking_member_id ON progress_tracking(member_id)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_progress_tracking_date ON progress_tracking(tracking_date)')
+                # Indexes for progress tracking
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_progress_tracking_member_id ON progress_tracking(member_id)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_progress_tracking_date ON progress_tracking(tracking_date)')
             
-            # Indexes for attendance table
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_attendance_member_id ON attendance(member_id)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_attendance_date ON attendance(attendance_date)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_attendance_num ON attendance(num)')
+                # Indexes for attendance table
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_attendance_member_id ON attendance(member_id)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_attendance_date ON attendance(attendance_date)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_attendance_num ON attendance(num)')
             
-            # Indexes for member_logs table
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_member_logs_member_id ON member_logs(member_id)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_member_logs_edit_time ON member_logs(edit_time)')
+                # Indexes for member_logs table
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_member_logs_member_id ON member_logs(member_id)')
+                # Insert-ordered and only range-filtered (listings sort by id): a BRIN index is
+                # a few pages instead of a btree entry per row
+                cr.execute('DROP INDEX IF EXISTS idx_member_logs_edit_time')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_member_logs_edit_time_brin ON member_logs USING brin(edit_time)')
             
-            # Indexes for invitations table
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_invitations_member_id ON invitations(member_id)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_invitations_used_date ON invitations(used_date)')
+                # Indexes for invitations table
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_invitations_member_id ON invitations(member_id)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_invitations_used_date ON invitations(used_date)')
             
-            # Indexes for action_logs table
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_action_logs_member_id ON action_logs(member_id)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_action_logs_action_time ON action_logs(action_time)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_action_logs_undone ON action_logs(undone)')
+                # Indexes for action_logs table
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_action_logs_member_id ON action_logs(member_id)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_action_logs_action_time ON action_logs(action_time)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_action_logs_undone ON action_logs(undone)')
             
-            # Indexes for supplements tables
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_supplements_name ON supplements(name)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_supplements_category ON supplements(category)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_supplement_sales_date ON supplement_sales(sale_date)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_supplement_sales_supplement_id ON supplement_sales(supplement_id)')
+                # Indexes for supplements tables
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_supplements_name ON supplements(name)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_supplements_category ON supplements(category)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_supplement_sales_date ON supplement_sales(sale_date)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_supplement_sales_supplement_id ON supplement_sales(supplement_id)')
             
-            # Indexes for staff tables
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_staff_role ON staff(role)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_staff_status ON staff(status)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_staff_purchases_staff_id ON staff_purchases(staff_id)')
-            cr.execute('CREATE INDEX IF NOT EXISTS idx_staff_purchases_date ON staff_purchases(purchase_date)')
+                # Indexes for staff tables
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_staff_role ON staff(role)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_staff_status ON staff(status)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_staff_purchases_staff_id ON staff_purchases(staff_id)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_staff_purchases_date ON staff_purchases(purchase_date)')
             
-            conn.commit()
             print("PostgreSQL tables and indexes created successfully!")
         except Exception as e:
             print(f"Error creating indexes: {e}")
             # Don't fail if indexes already exist
-            conn.rollback()
 
-        conn.commit()
+        # One check-in per member per day; check-ins rely on it for ON CONFLICT DO NOTHING.
+        # Fails (and is skipped) only if old duplicate rows exist in attendance.
+        try:
+            with savepoint(cr):
+                cr.execute('CREATE UNIQUE INDEX IF NOT EXISTS uq_attendance_member_date ON attendance(member_id, attendance_date)')
+        except Exception as e:
+            print(f"Error creating unique attendance index (duplicate check-ins in attendance?): {e}")
+
+        # Tombstones for deleted attendance rows so the incremental attendance feed can
+        # report deletions; a row with num NULL means the table was truncated.
+        try:
+            with savepoint(cr):
+                cr.execute('''
+                    CREATE TABLE IF NOT EXISTS attendance_deletions (
+                        id BIGSERIAL PRIMARY KEY,
+                        num INTEGER,
+                        deleted_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                cr.execute('''
+                    CREATE OR REPLACE FUNCTION record_attendance_deletions() RETURNS TRIGGER AS $$
+                    BEGIN
+                        -- The nightly archive move deletes every row: record it as one reset, like TRUNCATE
+                        IF TG_OP = 'TRUNCATE' OR current_setting('rival_gym.attendance_archive', true) = 'on' THEN
+                            INSERT INTO attendance_deletions (num) VALUES (NULL);
+                        ELSE
+                            INSERT INTO attendance_deletions (num) SELECT num FROM deleted_rows;
+                        END IF;
+                        RETURN NULL;
+                    END;
+                    $$ LANGUAGE plpgsql
+                ''')
+                cr.execute('DROP TRIGGER IF EXISTS trg_attendance_record_deletes ON attendance')
+                cr.execute('''
+                    CREATE TRIGGER trg_attendance_record_deletes
+                    AFTER DELETE ON attendance
+                    REFERENCING OLD TABLE AS deleted_rows
+                    FOR EACH STATEMENT EXECUTE FUNCTION record_attendance_deletions()
+                ''')
+                cr.execute('DROP TRIGGER IF EXISTS trg_attendance_record_truncate ON attendance')
+                cr.execute('''
+                    CREATE TRIGGER trg_attendance_record_truncate
+                    AFTER TRUNCATE ON attendance
+                    FOR EACH STATEMENT EXECUTE FUNCTION record_attendance_deletions()
+                ''')
+        except Exception as e:
+            print(f"Error creating attendance deletion tracking: {e}")
+
+        # Results of kiosk / turnstile scan events by client event ID, so a retried
+        # batch gets the original answers instead of new check-ins.
+        try:
+            with savepoint(cr):
+                cr.execute('''
+                    CREATE TABLE IF NOT EXISTS attendance_ingest_events (
+                        client_event_id TEXT PRIMARY KEY,
+                        member_id INTEGER,
+                        scanned_at TIMESTAMP,
+                        status TEXT,
+                        reason TEXT,
+                        attendance_num INTEGER,
+                        received_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_attendance_ingest_events_received_at ON attendance_ingest_events(received_at)')
+        except Exception as e:
+            print(f"Error creating attendance ingest events table: {e}")
+
+        # Typed check-in time for attendance and its archive. Check-in writers pass
+        # the exact instant; other inserts get it from the text date/time columns
+        # (gym-local time), like the typed member dates.
+        try:
+            with savepoint(cr):
+                cr.execute('''
+                    CREATE OR REPLACE FUNCTION attendance_text_to_timestamptz(day_text TEXT, time_text TEXT)
+                    RETURNS TIMESTAMP WITH TIME ZONE AS $$
+                    DECLARE
+                        d DATE := member_text_to_date(day_text);
+                    BEGIN
+                        IF d IS NULL THEN
+                            RETURN NULL;
+                        END IF;
+                        RETURN (d + COALESCE(NULLIF(TRIM(time_text), '')::TIME, TIME '00:00')) AT TIME ZONE 'Africa/Cairo';
+                    EXCEPTION WHEN others THEN
+                        RETURN d::TIMESTAMP AT TIME ZONE 'Africa/Cairo';
+                    END;
+                    $$ LANGUAGE plpgsql STABLE
+                ''')
+                cr.execute('ALTER TABLE attendance ADD COLUMN IF NOT EXISTS checked_in_at TIMESTAMP WITH TIME ZONE')
+                cr.execute('''
+                    CREATE OR REPLACE FUNCTION sync_attendance_checked_in_at() RETURNS TRIGGER AS $$
+                    BEGIN
+                        IF TG_OP = 'UPDATE' THEN
+                            NEW.checked_in_at := COALESCE(
+                                attendance_text_to_timestamptz(NEW.attendance_date, NEW.attendance_time), NEW.checked_in_at);
+                        ELSIF NEW.checked_in_at IS NULL THEN
+                            NEW.checked_in_at := COALESCE(
+                                attendance_text_to_timestamptz(NEW.attendance_date, NEW.attendance_time), CURRENT_TIMESTAMP);
+                        END IF;
+                        RETURN NEW;
+                    END;
+                    $$ LANGUAGE plpgsql
+                ''')
+                cr.execute('DROP TRIGGER IF EXISTS trg_attendance_sync_checked_in_at ON attendance')
+                cr.execute('''
+                    CREATE TRIGGER trg_attendance_sync_checked_in_at
+                    BEFORE INSERT OR UPDATE OF attendance_date, attendance_time ON attendance
+                    FOR EACH ROW EXECUTE FUNCTION sync_attendance_checked_in_at()
+                ''')
+                cr.execute('''
+                    UPDATE attendance
+                    SET checked_in_at = COALESCE(attendance_text_to_timestamptz(attendance_date, attendance_time), CURRENT_TIMESTAMP)
+                    WHERE checked_in_at IS NULL
+                ''')
+
+                cr.execute('ALTER TABLE attendance_backup ADD COLUMN IF NOT EXISTS checked_in_at TIMESTAMP WITH TIME ZONE')
+                cr.execute('''
+                    UPDATE attendance_backup
+                    SET checked_in_at = COALESCE(attendance_text_to_timestamptz(attendance_date, attendance_time),
+                                                 attendance_day::TIMESTAMP AT TIME ZONE 'Africa/Cairo')
+                    WHERE checked_in_at IS NULL
+                ''')
+                # The archive is only ever appended to in check-in order
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_attendance_backup_checked_in_at_brin ON attendance_backup USING brin(checked_in_at)')
+        except Exception as e:
+            print(f"Error adding attendance checked_in_at: {e}")
+
+        # Denormalized visit recency / frequency on members: bumped by every attendance
+        # insert, recounted nightly by refresh_member_visit_stats()
+        try:
+            with savepoint(cr):
+                cr.execute("""
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_name = 'members' AND column_name = 'last_visit_at'
+                """)
+                needs_backfill = cr.fetchone() is None
+                cr.execute('ALTER TABLE members ADD COLUMN IF NOT EXISTS last_visit_at TIMESTAMP WITH TIME ZONE')
+                cr.execute('ALTER TABLE members ADD COLUMN IF NOT EXISTS visits_30d INTEGER NOT NULL DEFAULT 0')
+                cr.execute('ALTER TABLE members ADD COLUMN IF NOT EXISTS visits_90d INTEGER NOT NULL DEFAULT 0')
+                cr.execute('''
+                    CREATE OR REPLACE FUNCTION record_member_visits() RETURNS TRIGGER AS $$
+                    BEGIN
+                        UPDATE members m
+                        SET last_visit_at = GREATEST(m.last_visit_at, v.last_visit_at),
+                            visits_30d = m.visits_30d + v.visits_30d,
+                            visits_90d = m.visits_90d + v.visits_90d
+                        FROM (
+                            SELECT member_id, MAX(checked_in_at) AS last_visit_at,
+                                   COUNT(*) FILTER (WHERE checked_in_at >= CURRENT_TIMESTAMP - INTERVAL '30 days') AS visits_30d,
+                                   COUNT(*) FILTER (WHERE checked_in_at >= CURRENT_TIMESTAMP - INTERVAL '90 days') AS visits_90d
+                            FROM inserted_rows
+                            WHERE member_id IS NOT NULL
+                            GROUP BY member_id
+                        ) v
+                        WHERE m.id = v.member_id;
+                        RETURN NULL;
+                    END;
+                    $$ LANGUAGE plpgsql
+                ''')
+                cr.execute('DROP TRIGGER IF EXISTS trg_attendance_member_visits ON attendance')
+                cr.execute('''
+                    CREATE TRIGGER trg_attendance_member_visits
+                    AFTER INSERT ON attendance
+                    REFERENCING NEW TABLE AS inserted_rows
+                    FOR EACH STATEMENT EXECUTE FUNCTION record_member_visits()
+                ''')
+                # Recounts the rolling windows from today's table and the archive
+                # partitions of the last 90 days and only rewrites members that changed.
+                # last_visit_at is looked up further back only when the visit it pointed
+                # at has disappeared from the window (a deleted check-in).
+                cr.execute('''
+                    CREATE OR REPLACE FUNCTION refresh_member_visit_stats() RETURNS INTEGER AS $$
+                    DECLARE
+                        window_start TIMESTAMP WITH TIME ZONE := CURRENT_TIMESTAMP - INTERVAL '90 days';
+                        changed INTEGER;
+                    BEGIN
+                        WITH recent AS (
+                            SELECT member_id, checked_in_at FROM attendance
+                            WHERE checked_in_at >= window_start
+                            UNION ALL
+                            SELECT member_id, checked_in_at FROM attendance_backup
+                            WHERE attendance_day >= (window_start AT TIME ZONE 'Africa/Cairo')::DATE
+                              AND checked_in_at >= window_start
+                        ), stats AS (
+                            SELECT member_id, MAX(checked_in_at) AS last_visit_at,
+                                   COUNT(*) FILTER (WHERE checked_in_at >= CURRENT_TIMESTAMP - INTERVAL '30 days')::INTEGER AS visits_30d,
+                                   COUNT(*)::INTEGER AS visits_90d
+                            FROM recent
+                            WHERE member_id IS NOT NULL
+                            GROUP BY member_id
+                        ), target AS (
+                            SELECT m.id,
+                                   COALESCE(s.visits_30d, 0) AS visits_30d,
+                                   COALESCE(s.visits_90d, 0) AS visits_90d,
+                                   CASE
+                                       WHEN s.member_id IS NOT NULL THEN s.last_visit_at
+                                       WHEN m.last_visit_at >= window_start THEN (
+                                           SELECT MAX(b.checked_in_at) FROM attendance_backup b WHERE b.member_id = m.id)
+                                       ELSE m.last_visit_at
+                                   END AS last_visit_at
+                            FROM members m
+                            LEFT JOIN stats s ON s.member_id = m.id
+                        )
+                        UPDATE members m
+                        SET visits_30d = t.visits_30d, visits_90d = t.visits_90d, last_visit_at = t.last_visit_at
+                        FROM target t
+                        WHERE m.id = t.id
+                          AND (m.visits_30d, m.visits_90d, m.last_visit_at)
+                              IS DISTINCT FROM (t.visits_30d, t.visits_90d, t.last_visit_at);
+                        GET DIAGNOSTICS changed = ROW_COUNT;
+                        RETURN changed;
+                    END;
+                    $$ LANGUAGE plpgsql
+                ''')
+                if needs_backfill:
+                    cr.execute('''
+                        UPDATE members m SET last_visit_at = v.last_visit_at
+                        FROM (
+                            SELECT member_id, MAX(checked_in_at) AS last_visit_at
+                            FROM (
+                                SELECT member_id, checked_in_at FROM attendance
+                                UNION ALL
+                                SELECT member_id, checked_in_at FROM attendance_backup
+                            ) visits
+                            GROUP BY member_id
+                        ) v
+                        WHERE m.id = v.member_id
+                    ''')
+                    cr.execute('SELECT refresh_member_visit_stats()')
+                # "No visit in N days" and "at least N visits" member filters
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_members_last_visit_at ON members(last_visit_at)')
+                cr.execute('CREATE INDEX IF NOT EXISTS idx_members_visits_30d ON members(visits_30d)')
+        except Exception as e:
+            print(f"Error adding member visit counters: {e}")
+
         print("PostgreSQL tables created successfully!")
-    except Exception as e:
-        print(f"Error creating tables: {e}")
-        conn.rollback()
-    finally:
-        cr.close()
-        conn.close()
 
 
 # === Execute queries - Using connection pool for better performance ===
-def query_db(query, args=(), one=False, commit=False):
-    """Execute query using connection pool for better performance"""
+# Cursor classes for query_db(row_format=...); 'compact' returns CompactRow objects
+ROW_FORMATS = {
+    'dict': TimedRealDictCursor,
+    'compact': TimedCompactRowCursor,
+}
+
+
+def _checkout_connection():
+    """Returns (conn, pool) from the pool, or a direct connection (pool None) if the pool could not be created."""
     pool = get_connection_pool()
-    conn = None
-    cur = None
-    
-    # Fallback to direct connection if pool fails
-    if pool is None:
+    if pool is not None:
+        # A saturated pool raises PoolTimeoutError: opening more connections
+        # would defeat its bound, so only a missing pool falls back
+        return pool.getconn(), pool
+    try:
+        return _direct_connect(), None
+    except Exception as e:
+        print(f"Error creating direct connection: {e}")
+        raise e
+
+
+def _release_connection(conn, pool):
+    """Returns a connection from _checkout_connection to the pool, or closes a direct one."""
+    if pool:
         try:
-            db_url = get_database_url()
-            conn = psycopg2.connect(db_url)
+            pool.putconn(conn)
         except Exception as e:
-            print(f"Error creating direct connection: {e}")
-            raise e
+            print(f"Error returning connection to pool: {e}")
+            conn.close()  # Close if can't return to pool
     else:
-        try:
-            conn = pool.getconn()
-        except Exception as e:
-            print(f"Error getting connection from pool: {e}")
-            # Fallback to direct connection
-            try:
-                db_url = get_database_url()
-                conn = psycopg2.connect(db_url)
-            except Exception as fallback_error:
-                print(f"Fallback connection also failed: {fallback_error}")
-                raise fallback_error
-    
+        conn.close()
+
+
+def _invalidate_written(cur):
+    """Drops cached counts and page data built from the tables a committed cursor wrote to."""
+    app_cache.invalidate_tags(getattr(cur, 'written_tables', ()))
+
+
+def query_db(query, args=(), one=False, commit=False, row_format='dict'):
+    """Execute query using connection pool for better performance
+
+    row_format='compact' returns slot-based CompactRow objects instead of dicts,
+    for pages that materialize many rows (see system_app/rows.py).
+    """
+    cursor_factory = ROW_FORMATS[row_format]
+    conn, pool = _checkout_connection()
+    cur = None
+
     try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur = conn.cursor(cursor_factory=cursor_factory)
         cur.execute(query, args)
 
         if commit:
             conn.commit()
+            _invalidate_written(cur)
 
-        # Only fetch results if the query returns rows (SELECT or INSERT/UPDATE with RETURNING)
+        # Only fetch results if the query returns rows (SELECT, EXPLAIN or INSERT/UPDATE with RETURNING)
         query_upper = query.strip().upper()
-        if query_upper.startswith('SELECT') or 'RETURNING' in query_upper:
+        if query_upper.startswith(('SELECT', 'EXPLAIN')) or 'RETURNING' in query_upper:
             rv = cur.fetchall()
             return (rv[0] if rv else None) if one else rv
         else:
@@ -606,17 +1234,103 @@ def query_db(query, args=(), one=False, commit=False):
     finally:
         if cur:
             cur.close()
-        if conn:
-            if pool:
-                # Return connection to pool
-                try:
-                    pool.putconn(conn)
-                except Exception as e:
-                    print(f"Error returning connection to pool: {e}")
-                    conn.close()  # Close if can't return to pool
-            else:
-                # Direct connection - close it
-                conn.close()
+        _release_connection(conn, pool)
+
+
+def stream_query(query, args=(), itersize=None, row_format='dict'):
+    """Yields rows one at a time from a server-side (named) cursor.
+
+    Rows are fetched from Postgres in batches of ``itersize``, so memory stays
+    flat no matter how large the result is. The connection is held until the
+    generator is exhausted or closed, then rolled back and returned to the pool.
+    """
+    from .config import Config
+
+    conn, pool = _checkout_connection()
+    cur = None
+    try:
+        cur = conn.cursor(name=f"stream_{uuid.uuid4().hex}", cursor_factory=ROW_FORMATS[row_format])
+        cur.itersize = itersize or Config.DB_STREAM_ITERSIZE
+        cur.execute(query, args)
+        for row in cur:
+            yield row
+    finally:
+        if cur is not None:
+            try:
+                cur.close()
+            except Exception:
+                pass
+        try:
+            # Named cursors live inside a transaction; end it before reuse
+            conn.rollback()
+        except Exception:
+            pass
+        _release_connection(conn, pool)
+
+
+# === Transactions ===
+# Cursor of the transaction currently open on this thread (nested calls become savepoints)
+_transaction_state = threading.local()
+
+
+@contextmanager
+def savepoint(cur):
+    """Runs a block inside a SAVEPOINT on an open transaction's cursor.
+
+    On error only the block's statements are rolled back and the exception is
+    re-raised, so the caller can log it and carry on with the same transaction.
+    """
+    name = f"sp_{uuid.uuid4().hex}"
+    cur.execute(f"SAVEPOINT {name}")
+    try:
+        yield cur
+    except BaseException:
+        cur.execute(f"ROLLBACK TO SAVEPOINT {name}")
+        raise
+    else:
+        cur.execute(f"RELEASE SAVEPOINT {name}")
+
+
+@contextmanager
+def transaction(row_format='dict'):
+    """Yields a cursor on one pooled connection; commits on success, rolls back on error.
+
+    Usage::
+
+        with transaction() as cur:
+            cur.execute("INSERT ...")
+            cur.execute("UPDATE ...")
+
+    A transaction() opened inside another on the same thread reuses the outer
+    cursor and runs as a savepoint. Use savepoint(cur) for per-statement
+    recovery inside a transaction. query_db() calls inside the block use their
+    own connection and do not see uncommitted changes.
+    """
+    outer = getattr(_transaction_state, 'cursor', None)
+    if outer is not None:
+        with savepoint(outer):
+            yield outer
+        return
+
+    conn, pool = _checkout_connection()
+    cur = None
+    try:
+        cur = conn.cursor(cursor_factory=ROW_FORMATS[row_format])
+        _transaction_state.cursor = cur
+        yield cur
+        conn.commit()
+        _invalidate_written(cur)
+    except BaseException:
+        try:
+            conn.rollback()
+        except Exception as rollback_error:
+            print(f"Error rolling back transaction: {rollback_error}")
+        raise
+    finally:
+        _transaction_state.cursor = None
+        if cur:
+            cur.close()
+        _release_connection(conn, pool)
 
 
 # === Rest of functions (as they are, because they're excellent) ===
@@ -654,110 +1368,252 @@ def add_member(name, email, phone, age, gender, birthdate,
         raise e
 
 
+# Columns of a bulk import row after its row number and optional custom ID
+MEMBER_IMPORT_COLUMNS = (
+    'name', 'email', 'phone', 'age', 'gender', 'birthdate', 'actual_starting_date',
+    'starting_date', 'end_date', 'membership_packages', 'membership_fees', 'membership_status',
+    'invitations', 'comment', 'national_id',
+)
+
+# Patterns are bounded so every value that passes casts without overflow
+_IMPORT_ID_PATTERN = r'^\s*0*[1-9]\d{0,8}\s*$'
+_IMPORT_INT_PATTERN = r'^\s*-?\d{1,9}\s*$'
+_IMPORT_NUMBER_PATTERN = r'^\s*-?\d{1,15}(\.\d+)?([eE][-+]?\d{1,2})?\s*$'
+
+# Validation steps run in order on the staging table; the first failing check is the row's reject reason
+_IMPORT_VALIDATIONS = (
+    ("NULLIF(BTRIM(name), '') IS NULL", 'Name is required'),
+    (f"id IS NOT NULL AND id !~ '{_IMPORT_ID_PATTERN}'", 'Invalid member ID'),
+    (f"age IS NOT NULL AND age !~ '{_IMPORT_INT_PATTERN}'", 'Invalid age'),
+    (f"membership_fees IS NOT NULL AND membership_fees !~ '{_IMPORT_NUMBER_PATTERN}'", 'Invalid membership fees'),
+    (f"invitations IS NOT NULL AND invitations !~ '{_IMPORT_INT_PATTERN}'", 'Invalid invitations'),
+)
+
+
+def _copy_text_value(value):
+    """Encodes one value for COPY ... FROM STDIN in text format."""
+    if value is None:
+        return '\\N'
+    text = str(value)
+    return text.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def _copy_import_rows(cur, rows):
+    """Streams import rows into the member_import_staging temp table with COPY."""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(_copy_text_value(value) for value in row))
+        buffer.write('\n')
+    buffer.seek(0)
+    columns = ', '.join(('row_number', 'id') + MEMBER_IMPORT_COLUMNS)
+    cur.copy_expert(f"COPY member_import_staging ({columns}) FROM STDIN", buffer)
+
+
+def _reject_import_duplicates(cur, key, reason):
+    """Rejects every row after the first that repeats the key expression within the file."""
+    cur.execute(f'''
+        UPDATE member_import_staging s SET reject_reason = %s
+        FROM (
+            SELECT row_number,
+                   ROW_NUMBER() OVER (PARTITION BY import_key ORDER BY row_number) AS occurrence
+            FROM (
+                SELECT row_number, {key} AS import_key
+                FROM member_import_staging
+                WHERE reject_reason IS NULL
+            ) keyed
+            WHERE import_key IS NOT NULL
+        ) d
+        WHERE s.row_number = d.row_number AND d.occurrence > 1
+    ''', (reason,))
+
+
+def bulk_import_members(rows, update_existing=False):
+    """
+    Imports members through COPY into a staging table, validated and merged in SQL.
+    rows: iterable of tuples (row_number, custom_id or None, name, email, phone, age, gender,
+          birthdate, actual_starting_date, starting_date, end_date, membership_packages,
+          membership_fees, membership_status, invitations, comment, national_id)
+    Custom-ID and auto-ID rows are handled in the same pass; auto IDs are drawn from the
+    members sequence, skipping IDs already taken, without moving it. Rows whose custom
+    ID already exists are rejected, or updated in place with update_existing=True.
+    Returns: {'inserted': n, 'updated': n, 'rejected': [(row_number, reason), ...]}
+    """
+    rows = list(rows)
+    result = {'inserted': 0, 'updated': 0, 'rejected': []}
+    if not rows:
+        return result
+
+    with transaction() as cur:
+        cur.execute('''
+            CREATE TEMP TABLE member_import_staging (
+                row_number INTEGER, id TEXT, name TEXT, email TEXT, phone TEXT, age TEXT,
+                gender TEXT, birthdate TEXT, actual_starting_date TEXT, starting_date TEXT,
+                end_date TEXT, membership_packages TEXT, membership_fees TEXT,
+                membership_status TEXT, invitations TEXT, comment TEXT, national_id TEXT,
+                member_id INTEGER, new_id INTEGER, is_update BOOLEAN DEFAULT FALSE, reject_reason TEXT
+            ) ON COMMIT DROP
+        ''')
+        _copy_import_rows(cur, rows)
+
+        # 1) Per-row value checks
+        for condition, reason in _IMPORT_VALIDATIONS:
+            cur.execute(
+                f"UPDATE member_import_staging SET reject_reason = %s WHERE reject_reason IS NULL AND {condition}",
+                (reason,)
+            )
+        cur.execute('''
+            UPDATE member_import_staging SET member_id = id::INTEGER
+            WHERE reject_reason IS NULL AND id IS NOT NULL
+        ''')
+
+        # 2) Duplicates within the file (first occurrence wins)
+        _reject_import_duplicates(cur, 'member_id', 'Duplicate member ID in file')
+        _reject_import_duplicates(cur, "LOWER(NULLIF(BTRIM(email), ''))", 'Duplicate email in file')
+        _reject_import_duplicates(cur, "NULLIF(BTRIM(national_id), '')", 'Duplicate National ID in file')
+
+        # 3) Conflicts with existing members
+        cur.execute('''
+            UPDATE member_import_staging s
+            SET is_update = %s,
+                reject_reason = CASE WHEN %s THEN NULL ELSE 'Member ID already exists' END
+            FROM members m
+            WHERE s.reject_reason IS NULL AND m.id = s.member_id
+        ''', (update_existing, update_existing))
+        cur.execute('''
+            UPDATE member_import_staging s SET reject_reason = 'Email already exists'
+            WHERE s.reject_reason IS NULL AND NULLIF(BTRIM(s.email), '') IS NOT NULL
+              AND EXISTS (
+                  SELECT 1 FROM members m
+                  WHERE LOWER(m.email) = LOWER(BTRIM(s.email))
+                    AND m.id IS DISTINCT FROM s.member_id
+              )
+        ''')
+        cur.execute('''
+            UPDATE member_import_staging s SET reject_reason = 'National ID already exists'
+            WHERE s.reject_reason IS NULL AND NULLIF(BTRIM(s.national_id), '') IS NOT NULL
+              AND EXISTS (
+                  SELECT 1 FROM members m
+                  WHERE m.national_id = BTRIM(s.national_id)
+                    AND m.id IS DISTINCT FROM s.member_id
+              )
+        ''')
+
+        # 4) Assign IDs: custom IDs are kept; auto-ID rows draw from the members sequence in
+        #    file order, skipping values an existing member or a custom ID in this file already
+        #    holds, so a high custom ID never moves the shared sequence
+        cur.execute('''
+            UPDATE member_import_staging SET new_id = member_id
+            WHERE reject_reason IS NULL AND member_id IS NOT NULL
+        ''')
+        cur.execute('''
+            SELECT row_number FROM member_import_staging
+            WHERE reject_reason IS NULL AND member_id IS NULL
+            ORDER BY row_number
+        ''')
+        auto_rows = [row['row_number'] for row in cur.fetchall()]
+        new_ids = []
+        while len(new_ids) < len(auto_rows):
+            cur.execute('''
+                SELECT drawn.id FROM (
+                    SELECT nextval(pg_get_serial_sequence('members', 'id'))::INTEGER AS id
+                    FROM generate_series(1, %s)
+                ) drawn
+                WHERE NOT EXISTS (SELECT 1 FROM members m WHERE m.id = drawn.id)
+                  AND NOT EXISTS (
+                      SELECT 1 FROM member_import_staging s
+                      WHERE s.reject_reason IS NULL AND s.member_id = drawn.id
+                  )
+                ORDER BY drawn.id
+            ''', (len(auto_rows) - len(new_ids),))
+            new_ids.extend(row['id'] for row in cur.fetchall())
+        if auto_rows:
+            cur.execute('''
+                UPDATE member_import_staging s SET new_id = a.new_id
+                FROM UNNEST(%s::INTEGER[], %s::INTEGER[]) AS a(row_number, new_id)
+                WHERE s.row_number = a.row_number
+            ''', (auto_rows, new_ids))
+
+        # 5) Merge: insert new members, update existing ones when requested
+        cur.execute('''
+            WITH inserted AS (
+                INSERT INTO members
+                (id, name, email, phone, age, gender, birthdate, actual_starting_date,
+                starting_date, end_date, membership_packages, membership_fees, membership_status,
+                invitations, comment, national_id)
+                SELECT new_id, BTRIM(name), NULLIF(BTRIM(email), ''), phone, age::INTEGER, gender,
+                       birthdate, actual_starting_date, starting_date, end_date, membership_packages,
+                       membership_fees::REAL, membership_status, COALESCE(invitations::INTEGER, 0),
+                       comment, NULLIF(BTRIM(national_id), '')
+                FROM member_import_staging
+                WHERE reject_reason IS NULL AND NOT is_update
+                ORDER BY row_number
+                ON CONFLICT DO NOTHING
+                RETURNING id
+            )
+            UPDATE member_import_staging s SET reject_reason = 'Conflicts with an existing member'
+            WHERE s.reject_reason IS NULL AND NOT s.is_update
+              AND NOT EXISTS (SELECT 1 FROM inserted i WHERE i.id = s.new_id)
+        ''')
+        if update_existing:
+            cur.execute('''
+                UPDATE members m
+                SET name = BTRIM(s.name), email = NULLIF(BTRIM(s.email), ''), phone = s.phone,
+                    age = s.age::INTEGER, gender = s.gender, birthdate = s.birthdate,
+                    actual_starting_date = s.actual_starting_date, starting_date = s.starting_date,
+                    end_date = s.end_date, membership_packages = s.membership_packages,
+                    membership_fees = s.membership_fees::REAL, membership_status = s.membership_status,
+                    invitations = COALESCE(s.invitations::INTEGER, 0), comment = s.comment,
+                    national_id = NULLIF(BTRIM(s.national_id), '')
+                FROM member_import_staging s
+                WHERE s.reject_reason IS NULL AND s.is_update AND m.id = s.new_id
+            ''')
+
+        cur.execute('''
+            SELECT
+                COUNT(*) FILTER (WHERE reject_reason IS NULL AND NOT is_update) AS inserted,
+                COUNT(*) FILTER (WHERE reject_reason IS NULL AND is_update) AS updated
+            FROM member_import_staging
+        ''')
+        counts = cur.fetchone()
+        cur.execute('''
+            SELECT row_number, reject_reason FROM member_import_staging
+            WHERE reject_reason IS NOT NULL
+            ORDER BY row_number
+        ''')
+        result['inserted'] = counts['inserted']
+        result['updated'] = counts['updated']
+        result['rejected'] = [(row['row_number'], row['reject_reason']) for row in cur.fetchall()]
+
+    return result
+
+
 def bulk_add_members(members_list):
     """
     Bulk insert members for faster import.
     members_list: List of tuples, each tuple contains member data in order:
     (custom_id, name, email, phone, age, gender, birthdate, actual_starting_date,
      starting_date, end_date, membership_packages, membership_fees, membership_status, invitations, comment, national_id)
+    Tuples without the leading custom_id (15 or 14 values) get an auto ID.
     Returns: number of successfully inserted members
     """
-    if not members_list:
-        return 0
-    
-    conn = None
-    cur = None
-    inserted = 0
-    
-    try:
-        db_url = get_database_url()
-        conn = psycopg2.connect(db_url)
-        cur = conn.cursor()
-        
-        # Check if first member has custom_id
-        has_custom_id = members_list[0][0] is not None if len(members_list) > 0 else False
-        
-        if has_custom_id:
-            # Bulk insert with custom_id
-            insert_query = '''
-                INSERT INTO members 
-                (id, name, email, phone, age, gender, birthdate, actual_starting_date, 
-                starting_date, end_date, membership_packages, membership_fees, membership_status, invitations, comment, national_id)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            '''
+    rows = []
+    for row_number, member_data in enumerate(members_list or [], start=1):
+        member_data = tuple(member_data)
+        if len(member_data) == 16:
+            custom_id, values = member_data[0], member_data[1:]
         else:
-            # Bulk insert without custom_id
-            insert_query = '''
-                INSERT INTO members 
-                (name, email, phone, age, gender, birthdate, actual_starting_date, 
-                starting_date, end_date, membership_packages, membership_fees, membership_status, invitations, comment, national_id)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            '''
-        
-        # Use execute_batch for efficient bulk insert
-        from psycopg2.extras import execute_batch
-        execute_batch(cur, insert_query, members_list, page_size=len(members_list))
-        
-        conn.commit()
-        inserted = len(members_list)
-        
+            custom_id, values = None, member_data
+        values = values + (None,) * (len(MEMBER_IMPORT_COLUMNS) - len(values))
+        rows.append((row_number, custom_id) + values)
+
+    try:
+        result = bulk_import_members(rows)
     except Exception as e:
-        if conn:
-            conn.rollback()
         print(f"Bulk insert error: {e}")
-        # Fall back to individual inserts if bulk fails
-        print("Falling back to individual inserts...")
-        for member_data in members_list:
-            try:
-                # Check length of each individual tuple to handle mixed batches correctly
-                if len(member_data) == 16:
-                    add_member(
-                        name=member_data[1],
-                        email=member_data[2],
-                        phone=member_data[3],
-                        age=member_data[4],
-                        gender=member_data[5],
-                        birthdate=member_data[6],
-                        actual_starting_date=member_data[7],
-                        starting_date=member_data[8],
-                        end_date=member_data[9],
-                        membership_packages=member_data[10],
-                        membership_fees=member_data[11],
-                        membership_status=member_data[12],
-                        invitations=member_data[13],
-                        comment=member_data[14],
-                        national_id=member_data[15],
-                        custom_id=member_data[0]
-                    )
-                else:
-                    add_member(
-                        name=member_data[0],
-                        email=member_data[1],
-                        phone=member_data[2],
-                        age=member_data[3],
-                        gender=member_data[4],
-                        birthdate=member_data[5],
-                        actual_starting_date=member_data[6],
-                        starting_date=member_data[7],
-                        end_date=member_data[8],
-                        membership_packages=member_data[9],
-                        membership_fees=member_data[10],
-                        membership_status=member_data[11],
-                        invitations=member_data[12],
-                        comment=member_data[13],
-                        national_id=member_data[14] if len(member_data) > 14 else None
-                    )
-                inserted += 1
-            except Exception as individual_error:
-                print(f"Error inserting individual member: {individual_error}")
-                continue
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
-    
-    return inserted
+        return 0
+    for row_number, reason in result['rejected']:
+        print(f"Bulk insert rejected row {row_number}: {reason}")
+    return result['inserted']
 
 
 def get_member(member_id):
@@ -786,7 +1642,7 @@ def update_member(member_id, **kwargs):
     query_db(query, tuple(values), commit=True)
     
     # Log the changes
-    from datetime import datetime
+    log_entries = []
     for field, new_value in kwargs.items():
         old_value = old_member.get(field)
         
@@ -796,7 +1652,8 @@ def update_member(member_id, **kwargs):
         
         # Only log if value actually changed
         if old_str != new_str:
-            add_member_log(member_id, member_name, field, old_str, new_str, edited_by)
+            log_entries.append((member_id, member_name, field, old_str, new_str, edited_by))
+    add_member_logs(log_entries)
 
 
 def delete_member(member_id):
@@ -805,30 +1662,23 @@ def delete_member(member_id):
 
 def delete_all_data():
     """Delete all data from all tables (except users table)"""
-    db_url = get_database_url()
-    conn = psycopg2.connect(db_url)
-    cur = conn.cursor()
     try:
-        # Use CASCADE to truncate members table and all child tables that reference it
-        # This will automatically truncate: attendance, member_logs, invitations
-        cur.execute('TRUNCATE TABLE members RESTART IDENTITY CASCADE')
-        
-        # Truncate attendance_backup separately (it has no foreign keys to members)
-        cur.execute('TRUNCATE TABLE attendance_backup RESTART IDENTITY')
-        
-        conn.commit()
+        with transaction() as cur:
+            # Use CASCADE to truncate members table and all child tables that reference it
+            # This will automatically truncate: attendance, member_logs, invitations
+            cur.execute('TRUNCATE TABLE members RESTART IDENTITY CASCADE')
+
+            # Truncate attendance_backup separately (it has no foreign keys to members)
+            cur.execute('TRUNCATE TABLE attendance_backup RESTART IDENTITY')
+
         print("All data deleted successfully!")
         print("Deleted: All Members, All Attendance Records, All Edit Logs, All Invitation Records, All Attendance Backup Records")
         return True
     except Exception as e:
-        conn.rollback()
         print(f"Error deleting all data: {e}")
         import traceback
         traceback.print_exc()
         raise e
-    finally:
-        cur.close()
-        conn.close()
 
 
 def search_members(name=None, phone=None, national_id=None):
@@ -921,6 +1771,23 @@ def add_member_log(member_id, member_name, field_name, old_value, new_value, edi
         # Don't raise - logging failure shouldn't break the update
 
 
+def add_member_logs(entries):
+    """Add several member edit log entries in one INSERT"""
+    if not entries:
+        return
+    try:
+        placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(entries))
+        args = tuple(value for entry in entries for value in entry)
+        query_db(f'''
+            INSERT INTO member_logs 
+            (member_id, member_name, field_name, old_value, new_value, edited_by)
+            VALUES {placeholders}
+        ''', args, commit=True)
+    except Exception as e:
+        print(f"Error adding logs: {e}")
+        # Don't raise - logging failure shouldn't break the update
+
+
 def get_member_logs(member_id=None):
     """Get logs for a specific member or all logs"""
     if member_id:
@@ -936,12 +1803,10 @@ def get_member_logs(member_id=None):
         ''')
 
 
-def get_all_logs():
-    """Get all logs ordered by ID ascending"""
-    return query_db('''
-        SELECT * FROM member_logs 
-        ORDER BY id ASC
-    ''')
+def get_all_logs(stream=False):
+    """Get all logs ordered by ID ascending (stream=True yields rows from a server-side cursor)"""
+    sql = 'SELECT * FROM member_logs ORDER BY id ASC'
+    return stream_query(sql) if stream else query_db(sql)
 
 
 # === Action Logging for Undo ===
@@ -1078,12 +1943,10 @@ def use_invitation(member_id, friend_name, friend_phone=None, friend_email=None,
         raise e
 
 
-def get_all_invitations():
-    """Get all invitation records ordered by ID ascending"""
-    return query_db('''
-        SELECT * FROM invitations 
-        ORDER BY id ASC
-    ''')
+def get_all_invitations(stream=False):
+    """Get all invitation records ordered by ID ascending (stream=True yields rows from a server-side cursor)"""
+    sql = 'SELECT * FROM invitations ORDER BY id ASC'
+    return stream_query(sql) if stream else query_db(sql)
 
 
 def get_member_invitations(member_id):
@@ -1129,12 +1992,16 @@ def log_renewal(member_id, package_name, renewal_date, fees, edited_by=None):
         return False
 
 
-def get_renewal_logs():
-    """Get all renewal logs ordered by ID ascending"""
-    return query_db(
-        'SELECT * FROM renewal_logs ORDER BY id ASC',
-        ()
-    )
+def get_renewal_logs(stream=False):
+    """Get all renewal logs ordered by ID ascending (stream=True yields rows from a server-side cursor)"""
+    sql = 'SELECT * FROM renewal_logs ORDER BY id ASC'
+    return stream_query(sql) if stream else query_db(sql, ())
+
+
+def get_renewal_fees_total():
+    """Total fees across all renewal logs, summed in the database"""
+    row = query_db('SELECT COALESCE(SUM(fees), 0) AS total FROM renewal_logs', one=True)
+    return float(row['total']) if row else 0.0
 
 
 def get_daily_totals():
@@ -1247,15 +2114,14 @@ def get_invoice_by_number(invoice_number):
     return query_db('SELECT * FROM invoices WHERE invoice_number = %s', (invoice_number,), one=True)
 
 
-def get_all_invoices():
-    """Get all invoices ordered by ID ascending, including member phone number"""
-    return query_db(
-        '''SELECT i.*, m.phone as member_phone 
+def get_all_invoices(stream=False):
+    """Get all invoices ordered by ID ascending, including member phone number
+    (stream=True yields rows from a server-side cursor)"""
+    sql = '''SELECT i.*, m.phone as member_phone 
            FROM invoices i 
            LEFT JOIN members m ON i.member_id = m.id 
-           ORDER BY i.id ASC''',
-        ()
-    )
+           ORDER BY i.id ASC'''
+    return stream_query(sql) if stream else query_db(sql, ())
 
 
 # === Supplement/Product Management Functions ===
@@ -1355,15 +2221,17 @@ def get_supplement_statistics():
         print(f"Error getting low stock: {e}")
         stats['low_stock'] = 0
     
-    # Total sales today
-    from datetime import datetime
-    today = datetime.now().strftime('%Y-%m-%d')
+    # Total sales today. Day windows are half-open ranges on sale_date (not
+    # sale_date::date) so they can use the index.
+    from datetime import datetime, timedelta
+    today = datetime.now().date()
+    tomorrow = today + timedelta(days=1)
     try:
         today_sales = query_db('''
             SELECT COALESCE(SUM(total_price), 0) as total 
             FROM supplement_sales 
-            WHERE sale_date::date = %s
-        ''', (today,), one=True)
+            WHERE sale_date >= %s AND sale_date < %s
+        ''', (today, tomorrow), one=True)
         stats['today_sales'] = float(today_sales['total']) if today_sales else 0
     except:
         stats['today_sales'] = 0
@@ -1373,8 +2241,8 @@ def get_supplement_statistics():
         cash_sales_today = query_db('''
             SELECT COALESCE(SUM(total_price), 0) as total 
             FROM supplement_sales 
-            WHERE sale_date::date = %s AND payment_method = 'cash'
-        ''', (today,), one=True)
+            WHERE sale_date >= %s AND sale_date < %s AND payment_method = 'cash'
+        ''', (today, tomorrow), one=True)
         stats['cash_sales_today'] = float(cash_sales_today['total']) if cash_sales_today else 0
     except:
         stats['cash_sales_today'] = 0
@@ -1384,19 +2252,19 @@ def get_supplement_statistics():
         visa_sales_today = query_db('''
             SELECT COALESCE(SUM(total_price), 0) as total 
             FROM supplement_sales 
-            WHERE sale_date::date = %s AND (payment_method = 'card' OR payment_method = 'visa')
-        ''', (today,), one=True)
+            WHERE sale_date >= %s AND sale_date < %s AND (payment_method = 'card' OR payment_method = 'visa')
+        ''', (today, tomorrow), one=True)
         stats['visa_sales_today'] = float(visa_sales_today['total']) if visa_sales_today else 0
     except:
         stats['visa_sales_today'] = 0
     
     # Total sales this month
-    month_start = datetime.now().replace(day=1).strftime('%Y-%m-%d')
+    month_start = today.replace(day=1)
     try:
         month_sales = query_db('''
             SELECT COALESCE(SUM(total_price), 0) as total 
             FROM supplement_sales 
-            WHERE sale_date::date >= %s
+            WHERE sale_date >= %s
         ''', (month_start,), one=True)
         stats['month_sales'] = float(month_sales['total']) if month_sales else 0
     except:
@@ -1500,16 +2368,37 @@ def get_supplement_statistics():
                 SUM(quantity) as total_quantity,
                 SUM(total_price) as total_revenue
             FROM supplement_sales
-            WHERE sold_by IS NOT NULL AND sale_date::date = %s
+            WHERE sold_by IS NOT NULL AND sale_date >= %s AND sale_date < %s
             GROUP BY sold_by
             ORDER BY total_revenue DESC
-        ''', (today,))
+        ''', (today, tomorrow))
         stats['user_sales_today'] = user_sales_today or []
     except:
         stats['user_sales_today'] = []
     
     return stats
 
+def get_attendance_backup(stream=False, date_from=None, date_to=None):
+    """Get archived attendance rows ordered by ID ascending (stream=True yields rows from a server-side cursor).
+
+    date_from / date_to (inclusive dates) limit the scan to the matching monthly partitions.
+    """
+    conditions, params = [], []
+    if date_from:
+        conditions.append('attendance_day >= %s')
+        params.append(date_from)
+    if date_to:
+        conditions.append('attendance_day <= %s')
+        params.append(date_to)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    sql = f'''
+        SELECT id, member_id, name, end_date, membership_status, attendance_time, attendance_date, day
+        FROM attendance_backup {where}
+        ORDER BY id ASC
+    '''
+    return stream_query(sql, tuple(params)) if stream else query_db(sql, tuple(params))
+
+
 def get_attendance_backup_runs():
     """Get all attendance backup runs ordered by execution time DESC"""
     return query_db('''
@@ -1686,11 +2575,11 @@ def get_staff_statistics():
     try:
         # Staff purchases this month
         from datetime import datetime
-        month_start = datetime.now().replace(day=1).strftime('%Y-%m-%d')
+        month_start = datetime.now().date().replace(day=1)
         month_staff_purchases = query_db('''
             SELECT COALESCE(SUM(total_price), 0) as total 
             FROM staff_purchases 
-            WHERE purchase_date::date >= %s
+            WHERE purchase_date >= %s
         ''', (month_start,), one=True)
         stats['month_staff_purchases'] = float(month_staff_purchases['total']) if month_staff_purchases else 0
     except Exception as e:
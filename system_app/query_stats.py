@@ -0,0 +1,254 @@
+"""Per-query timing, slow-query logging and per-request DB time accounting.
+
+Every cursor handed out by query_db, execute_transaction and
+run_in_transaction uses TimedCursorMixin (TimedRealDictCursor, or
+TimedCompactRowCursor for row_format='compact'), so each statement records
+its wall time, row count and a normalized fingerprint. Cursors also collect the
+tables their statements write to (``written_tables``), so callers can invalidate
+derived caches such as cached row counts once the transaction commits.
+"""
+import logging
+import re
+import threading
+import time
+from contextlib import ContextDecorator
+from functools import lru_cache
+
+from flask import g, has_app_context, has_request_context
+from psycopg2.extras import RealDictCursor
+
+from system_app.config import Config
+
+SLOW_QUERY_MS = Config.SLOW_QUERY_MS
+N_PLUS_ONE_THRESHOLD = Config.N_PLUS_ONE_THRESHOLD
+MAX_TRACKED_FINGERPRINTS = 500
+
+logger = logging.getLogger('system_app.app')
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+_WRITE_TARGET = re.compile(
+    r'\b(?:INSERT\s+INTO|DELETE\s+FROM|UPDATE|TRUNCATE(?:\s+TABLE)?|COPY)\s+(?:ONLY\s+)?"?([A-Za-z_][\w.]*)',
+    re.IGNORECASE,
+)
+_TRUNCATE_LIST = re.compile(r'\bTRUNCATE(?:\s+TABLE)?\s+([\w\s.,"]+)', re.IGNORECASE)
+
+# Tables written by the database itself and invisible in the statement text:
+# trg_attendance_member_visits bumps members.last_visit_at / visits_30d / visits_90d
+# on every attendance insert, and refresh_member_visit_stats() recounts them
+INSERT_TRIGGER_WRITES = {'attendance': frozenset({'members'})}
+_INSERT_TARGET = re.compile(r'\bINSERT\s+INTO\s+(?:ONLY\s+)?"?([A-Za-z_][\w.]*)', re.IGNORECASE)
+FUNCTION_WRITES = {'refresh_member_visit_stats': frozenset({'members'})}
+_FUNCTION_CALL = re.compile(r'\b(' + '|'.join(FUNCTION_WRITES) + r')\s*\(', re.IGNORECASE)
+
+_fingerprint_stats = {}
+_fingerprint_lock = threading.Lock()
+
+# Active query budgets for the current thread (innermost last)
+_budget_state = threading.local()
+
+
+@lru_cache(maxsize=2048)
+def _fingerprint_text(query):
+    text = _STRING_LITERAL.sub('?', query)
+    text = _PLACEHOLDER.sub('?', text)
+    text = _NUMBER_LITERAL.sub('?', text)
+    text = _VALUE_LIST.sub('(?, ...)', text)
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def fingerprint(query):
+    """Normalizes a statement so calls differing only in literals/parameters group together."""
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    elif not isinstance(query, str):
+        query = str(query)
+    return _fingerprint_text(query)
+
+
+@lru_cache(maxsize=2048)
+def _written_tables_text(query):
+    tables = {match.lower().split('.')[-1] for match in _WRITE_TARGET.findall(query)}
+    for target_list in _TRUNCATE_LIST.findall(query):
+        tables.update(name.strip(' "').lower().split('.')[-1] for name in target_list.split(','))
+    # "DO UPDATE SET" / "FOR UPDATE OF" are not targets; extra names only cost a cache miss
+    tables.discard('set')
+    for target in _INSERT_TARGET.findall(query):
+        tables.update(INSERT_TRIGGER_WRITES.get(target.lower().split('.')[-1], ()))
+    for function in _FUNCTION_CALL.findall(query):
+        tables.update(FUNCTION_WRITES[function.lower()])
+    return frozenset(table for table in tables if table)
+
+
+def written_tables(query):
+    """Returns the (lower-case, unqualified) names of tables a statement inserts into, updates,
+    deletes from, truncates or copies into, plus those its triggers or functions write (INSERT_TRIGGER_WRITES, FUNCTION_WRITES)."""
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    elif not isinstance(query, str):
+        query = str(query)
+    return _written_tables_text(query)
+
+
+def record_query(query, elapsed_ms, rowcount):
+    """Records one executed statement against the current request and the process totals."""
+    fp = fingerprint(query)
+    rows = rowcount if rowcount is not None and rowcount >= 0 else 0
+
+    if has_request_context():
+        g.db_time_ms = getattr(g, 'db_time_ms', 0.0) + elapsed_ms
+        g.db_query_count = getattr(g, 'db_query_count', 0) + 1
+        if not hasattr(g, 'db_queries'):
+            g.db_queries = []
+        g.db_queries.append({'fingerprint': fp, 'ms': round(elapsed_ms, 2), 'rows': rows})
+        _track_repeats(fp)
+
+    for budget in getattr(_budget_state, 'stack', ()):
+        budget.fingerprints.append(fp)
+
+    with _fingerprint_lock:
+        stats = _fingerprint_stats.get(fp)
+        if stats is None and len(_fingerprint_stats) < MAX_TRACKED_FINGERPRINTS:
+            stats = _fingerprint_stats[fp] = {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0}
+        if stats is not None:
+            stats['calls'] += 1
+            stats['total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+            stats['rows'] += rows
+
+    if elapsed_ms >= SLOW_QUERY_MS:
+        request_id = getattr(g, 'request_id', '-') if has_app_context() else '-'
+        logger.warning(f"Slow query ({elapsed_ms:.1f}ms, {rows} rows) [req={request_id}]: {fp}")
+
+
+def _track_repeats(fp):
+    """Flags a likely N+1 pattern once a fingerprint repeats past the threshold in one request."""
+    if not hasattr(g, 'db_fingerprint_counts'):
+        g.db_fingerprint_counts = {}
+    count = g.db_fingerprint_counts.get(fp, 0) + 1
+    g.db_fingerprint_counts[fp] = count
+    if count == N_PLUS_ONE_THRESHOLD + 1:
+        if not hasattr(g, 'db_repeated_fingerprints'):
+            g.db_repeated_fingerprints = []
+        g.db_repeated_fingerprints.append(fp)
+        request_id = getattr(g, 'request_id', '-')
+        logger.warning(f"Possible N+1: statement ran more than {N_PLUS_ONE_THRESHOLD} times [req={request_id}]: {fp}")
+
+
+def get_request_repeated_queries():
+    """Returns the fingerprints flagged as repeated (likely N+1) in the current request."""
+    if not has_request_context():
+        return []
+    return list(getattr(g, 'db_repeated_fingerprints', []))
+
+
+def get_request_db_stats():
+    """Returns (db time in ms, query count) for the current request."""
+    if not has_request_context():
+        return 0.0, 0
+    return getattr(g, 'db_time_ms', 0.0), getattr(g, 'db_query_count', 0)
+
+
+def get_top_queries(limit=20):
+    """Returns the fingerprints with the highest total time since process start."""
+    with _fingerprint_lock:
+        items = [dict(stats, fingerprint=fp) for fp, stats in _fingerprint_stats.items()]
+    items.sort(key=lambda item: item['total_ms'], reverse=True)
+    for item in items:
+        item['total_ms'] = round(item['total_ms'], 2)
+        item['max_ms'] = round(item['max_ms'], 2)
+        item['avg_ms'] = round(item['total_ms'] / item['calls'], 2) if item['calls'] else 0.0
+    return items[:limit]
+
+
+class TimedCursorMixin:
+    """Cursor mixin that records timing, row count and fingerprint for each statement."""
+
+    def _note_writes(self, query):
+        tables = written_tables(query)
+        if tables:
+            if not hasattr(self, 'written_tables'):
+                self.written_tables = set()
+            self.written_tables.update(tables)
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query(query, (time.perf_counter() - started) * 1000, self.rowcount)
+            self._note_writes(query)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_query(query, (time.perf_counter() - started) * 1000, self.rowcount)
+            self._note_writes(query)
+
+
+class TimedRealDictCursor(TimedCursorMixin, RealDictCursor):
+    """RealDictCursor that records timing, row count and fingerprint for each statement."""
+    pass
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a block runs more statements than its query budget allows."""
+    pass
+
+
+class query_budget(ContextDecorator):
+    """Asserts a query budget for a block or function, e.g. a test client call.
+
+    Usage::
+
+        with query_budget(5):
+            client.post('/crm/leads/bulk-assign', json=payload)
+
+        @query_budget(max_queries=10, max_repeats=2)
+        def test_listing(self): ...
+
+    ``max_repeats`` caps how often a single fingerprint may run, which catches
+    N+1 loops even when the total stays under budget.
+    """
+
+    def __init__(self, max_queries=None, max_repeats=None):
+        self.max_queries = max_queries
+        self.max_repeats = max_repeats
+        self.fingerprints = []
+
+    @property
+    def count(self):
+        return len(self.fingerprints)
+
+    def repeats(self):
+        counts = {}
+        for fp in self.fingerprints:
+            counts[fp] = counts.get(fp, 0) + 1
+        return counts
+
+    def __enter__(self):
+        self.fingerprints = []
+        if not hasattr(_budget_state, 'stack'):
+            _budget_state.stack = []
+        _budget_state.stack.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _budget_state.stack.remove(self)
+        if exc_type is not None:
+            return False
+        if self.max_queries is not None and self.count > self.max_queries:
+            raise QueryBudgetExceeded(
+                f"Query budget exceeded: {self.count} statements > {self.max_queries}\n" + "\n".join(self.fingerprints)
+            )
+        if self.max_repeats is not None:
+            repeated = {fp: n for fp, n in self.repeats().items() if n > self.max_repeats}
+            if repeated:
+                details = "\n".join(f"{n}x {fp}" for fp, n in repeated.items())
+                raise QueryBudgetExceeded(f"Repeated statements exceed {self.max_repeats}:\n{details}")
+        return False
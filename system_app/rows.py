@@ -0,0 +1,161 @@
+"""Compact row objects for large result sets.
+
+RealDictCursor builds a full dict per row. Passing ``row_format='compact'`` to
+query_db / stream_query returns CompactRow instances instead: one ``__slots__``
+object per row whose class (and field names) are shared by every row of the
+same column set. Rows still support ``row.name``, ``row['name']``, ``.get()``,
+``.keys()``, ``dict(row)`` and JSON serialization, so templates and most
+callers need no changes.
+"""
+import keyword
+import re
+from collections.abc import Mapping
+from functools import lru_cache
+
+from psycopg2.extensions import cursor as _cursor
+
+from system_app.query_stats import TimedCursorMixin
+
+_NON_IDENTIFIER = re.compile(r'\W|^(?=\d)')
+
+
+class CompactRow:
+    """Read-mostly mapping over a fixed set of columns stored in slots."""
+    __slots__ = ()
+    _fields = ()
+    _field_set = frozenset()
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return getattr(self, self._fields[key])
+        if key not in self._field_set:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self._field_set:
+            raise KeyError(f"{key} is not a column of this row; use extend() to add fields")
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self._field_set
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __eq__(self, other):
+        if isinstance(other, (CompactRow, Mapping)):
+            return self._asdict() == dict(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"CompactRow({self._asdict()!r})"
+
+    def get(self, key, default=None):
+        if key in self._field_set:
+            return getattr(self, key)
+        return default
+
+    def keys(self):
+        return self._fields
+
+    def values(self):
+        return [getattr(self, field) for field in self._fields]
+
+    def items(self):
+        return [(field, getattr(self, field)) for field in self._fields]
+
+    def _asdict(self):
+        return {field: getattr(self, field) for field in self._fields}
+
+    def extend(self, **fields):
+        """Returns a new row with extra (or overridden) fields, e.g. values computed in a route."""
+        extra = tuple(name for name in fields if name not in self._field_set)
+        cls = row_class(self._fields + extra)
+        values = [fields.get(field, getattr(self, field)) for field in self._fields]
+        values.extend(fields[name] for name in extra)
+        return cls._make(values)
+
+
+def _clean_field(name):
+    field = _NON_IDENTIFIER.sub('_', name)
+    if field.startswith('_') or keyword.iskeyword(field):
+        field = 'f' + field
+    return field
+
+
+@lru_cache(maxsize=1024)
+def row_class(fields):
+    """Builds (once per column set) the CompactRow subclass for the given column names."""
+    columns = tuple(_clean_field(name) for name in fields)
+    # Duplicate column names keep the last value, like RealDictCursor
+    fields = tuple(dict.fromkeys(columns))
+    cls = type('CompactRow', (CompactRow,), {
+        '__slots__': fields,
+        '_fields': fields,
+        '_field_set': frozenset(fields),
+    })
+    # Generated like collections.namedtuple: a single unpacking assignment per row
+    targets = ''.join(f'row.{column}, ' for column in columns)
+    source = f"def _make(values):\n    row = _new(cls)\n"
+    if fields:
+        source += f"    {targets}= values\n"
+    source += "    return row\n"
+    namespace = {'_new': object.__new__, 'cls': cls}
+    exec(source, namespace)
+    cls._make = staticmethod(namespace['_make'])
+    return cls
+
+
+class CompactRowCursor(_cursor):
+    """Cursor returning CompactRow objects instead of tuples."""
+    Row = None
+
+    def execute(self, query, vars=None):
+        self.Row = None
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        self.Row = None
+        return super().executemany(query, vars_list)
+
+    def _row_class(self):
+        if self.Row is None:
+            self.Row = row_class(tuple(column[0] for column in self.description or ()))
+        return self.Row
+
+    def fetchone(self):
+        values = super().fetchone()
+        if values is not None:
+            return self._row_class()._make(values)
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(size) if size is not None else super().fetchmany()
+        make = self._row_class()._make
+        return [make(values) for values in rows]
+
+    def fetchall(self):
+        rows = super().fetchall()
+        make = self._row_class()._make
+        return [make(values) for values in rows]
+
+    def __iter__(self):
+        iterator = super().__iter__()
+        try:
+            first = next(iterator)
+        except StopIteration:
+            return
+        make = self._row_class()._make
+        yield make(first)
+        for values in iterator:
+            yield make(values)
+
+
+class TimedCompactRowCursor(TimedCursorMixin, CompactRowCursor):
+    """CompactRowCursor that records timing, row count and fingerprint for each statement."""
+    pass
@@ -17,6 +17,8 @@ document.addEventListener("DOMContentLoaded", () => {
     const bulkExpiresWithin = document.getElementById("bulkExpiresWithin");
     const bulkExpiresMonth = document.getElementById("bulkExpiresMonth");
     const bulkExpiresYear = document.getElementById("bulkExpiresYear");
+    const bulkNoVisitDays = document.getElementById("bulkNoVisitDays");
+    const bulkMinVisits30d = document.getElementById("bulkMinVisits30d");
     const bulkReloadMembersBtn = document.getElementById("bulkReloadMembersBtn");
     const selectVisibleBtn = document.getElementById("selectVisibleBtn");
     const clearVisibleBtn = document.getElementById("clearVisibleBtn");
@@ -72,12 +74,15 @@ document.addEventListener("DOMContentLoaded", () => {
         page: 1,
         totalPages: 1,
         totalCount: 0,
+        countApproximate: false,
         members: [],
         filters: {
             view: "all",
             expires_within: "",
             expires_month: "",
             expires_year: "",
+            no_visit_days: "",
+            min_visits_30d: "",
             search_id: "",
             search_name: "",
             search_phone: ""
@@ -146,6 +151,8 @@ document.addEventListener("DOMContentLoaded", () => {
             expires_within: bulkExpiresWithin ? bulkExpiresWithin.value || "" : "",
             expires_month: bulkExpiresMonth ? bulkExpiresMonth.value || "" : "",
             expires_year: bulkExpiresYear ? bulkExpiresYear.value || "" : "",
+            no_visit_days: bulkNoVisitDays ? bulkNoVisitDays.value || "" : "",
+            min_visits_30d: bulkMinVisits30d ? bulkMinVisits30d.value || "" : "",
             search_id: bulkSearchId ? bulkSearchId.value.trim() : "",
             search_name: bulkSearchName ? bulkSearchName.value.trim() : "",
             search_phone: bulkSearchPhone ? bulkSearchPhone.value.trim() : ""
@@ -172,6 +179,11 @@ document.addEventListener("DOMContentLoaded", () => {
         return state.selectedIds.size;
     }
 
+    function formatMatchingCount() {
+        const count = String(state.totalCount || 0);
+        return state.countApproximate ? `about ${count}` : count;
+    }
+
     function effectiveModeLabel() {
         if (state.locked && state.status) {
             return "Frozen Preview";
@@ -190,7 +202,7 @@ document.addEventListener("DOMContentLoaded", () => {
             if (state.locked && state.previewState && state.previewState.summary) {
                 matchingCount.textContent = String(state.previewState.summary.selected_count || 0);
             } else {
-                matchingCount.textContent = String(state.totalCount || 0);
+                matchingCount.textContent = formatMatchingCount();
             }
         }
         if (selectionModeLabel) {
@@ -203,7 +215,7 @@ document.addEventListener("DOMContentLoaded", () => {
         }
 
         if (state.allFilteredSelected) {
-            setNotice(selectionInfo, `All ${state.totalCount || 0} members matching the current filters are selected.`, "success");
+            setNotice(selectionInfo, `All ${formatMatchingCount()} members matching the current filters are selected.`, "success");
             return;
         }
 
@@ -253,6 +265,8 @@ document.addEventListener("DOMContentLoaded", () => {
             bulkExpiresWithin,
             bulkExpiresMonth,
             bulkExpiresYear,
+            bulkNoVisitDays,
+            bulkMinVisits30d,
             bulkReloadMembersBtn,
             selectVisibleBtn,
             clearVisibleBtn,
@@ -688,6 +702,7 @@ document.addEventListener("DOMContentLoaded", () => {
             }
             state.members = data.items || [];
             state.totalCount = Number(data.total_count || 0);
+            state.countApproximate = Boolean(data.count_approximate);
             state.totalPages = Number(data.total_pages || 1);
             if (membersPageIndicator) {
                 membersPageIndicator.textContent = `Page ${state.page} of ${state.totalPages}`;
@@ -918,7 +933,7 @@ document.addEventListener("DOMContentLoaded", () => {
                 input.addEventListener("input", debouncedHandler);
             }
         });
-        [bulkViewFilter, bulkExpiresWithin, bulkExpiresMonth, bulkExpiresYear].forEach((input) => {
+        [bulkViewFilter, bulkExpiresWithin, bulkExpiresMonth, bulkExpiresYear, bulkNoVisitDays, bulkMinVisits30d].forEach((input) => {
             if (input) {
                 input.addEventListener("change", handler);
             }
@@ -1222,7 +1222,7 @@ document.addEventListener("DOMContentLoaded", () => {
 
                 // Update count badge
                 if (countBadge) {
-                    countBadge.textContent = data.total;
+                    countBadge.textContent = data.total_approximate ? `~${data.total}` : data.total;
                     countBadge.style.display = "inline-block";
                 }
 
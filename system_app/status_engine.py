@@ -0,0 +1,101 @@
+"""Set-based nightly membership status engine.
+
+Flips members.membership_status between VAL and EX from the typed end_date_d
+column in a few chunked UPDATE ... FROM statements inside one transaction,
+one per chunk_size members taken in id order.
+"""
+import time
+
+from system_app.membership_status import active_predicate
+
+STATUS_ENGINE_CHUNK_SIZE = 5000
+
+# Computes the desired status for the next chunk of members after last_id (keyset
+# order, so the statement count follows the row count, not the id span)
+_TARGET_STATUS_SQL = f"""
+    SELECT id,
+           membership_status AS old_status,
+           CASE WHEN {active_predicate()} THEN 'VAL' ELSE 'EX' END AS new_status
+    FROM members
+    WHERE end_date_d IS NOT NULL
+      AND (%(last_id)s::bigint IS NULL OR id > %(last_id)s::bigint)
+    ORDER BY id
+    LIMIT %(limit)s
+"""
+
+# One row per transition in the chunk (or one row with NULL statuses when none),
+# each carrying the chunk's last id and row count
+_CHUNK_RESULT_SQL = """
+    SELECT s.last_id, s.scanned, c.old_status, c.new_status, c.count
+    FROM (SELECT MAX(id) AS last_id, COUNT(*) AS scanned FROM target) s
+    LEFT JOIN (
+        SELECT old_status, new_status, COUNT(*) AS count
+        FROM {source}
+        GROUP BY old_status, new_status
+    ) c ON TRUE
+"""
+
+_APPLY_CHUNK_SQL = f"""
+    WITH target AS ({_TARGET_STATUS_SQL}),
+    changed AS (
+        UPDATE members m
+        SET membership_status = t.new_status
+        FROM target t
+        WHERE m.id = t.id
+          AND m.membership_status IS DISTINCT FROM t.new_status
+        RETURNING t.old_status, t.new_status
+    )
+    {_CHUNK_RESULT_SQL.format(source='changed')}
+"""
+
+_PREVIEW_CHUNK_SQL = f"""
+    WITH target AS ({_TARGET_STATUS_SQL})
+    {_CHUNK_RESULT_SQL.format(source='target WHERE old_status IS DISTINCT FROM new_status')}
+"""
+
+
+def _run_status_engine(cur, dry_run, chunk_size):
+    """Walks members in id order, chunk_size rows at a time, and applies (or previews) status flips."""
+    statement = _PREVIEW_CHUNK_SQL if dry_run else _APPLY_CHUNK_SQL
+    transitions = {}
+    chunks = 0
+    last_id = None
+    while True:
+        cur.execute(statement, {'last_id': last_id, 'limit': chunk_size})
+        rows = cur.fetchall()
+        chunks += 1
+        for row in rows:
+            if row['new_status'] is not None:
+                key = (row['old_status'] or 'UNKNOWN', row['new_status'])
+                transitions[key] = transitions.get(key, 0) + row['count']
+        if not rows or rows[0]['scanned'] < chunk_size:
+            break
+        last_id = rows[0]['last_id']
+    return transitions, chunks
+
+
+def run_membership_status_engine(dry_run=False, chunk_size=STATUS_ENGINE_CHUNK_SIZE):
+    """Recomputes all membership statuses; with dry_run=True returns the diff without writing.
+
+    Returns a summary dict with the number of changed members, per-transition
+    counts ("VAL->EX"), per-status net deltas and elapsed time in milliseconds.
+    """
+    from system_app.queries import transaction
+
+    started = time.perf_counter()
+    with transaction() as cur:
+        transitions, chunks = _run_status_engine(cur, dry_run, chunk_size)
+
+    deltas = {}
+    for (old_status, new_status), count in transitions.items():
+        deltas[old_status] = deltas.get(old_status, 0) - count
+        deltas[new_status] = deltas.get(new_status, 0) + count
+
+    return {
+        "dry_run": dry_run,
+        "updated": sum(transitions.values()),
+        "transitions": {f"{old}->{new}": count for (old, new), count in sorted(transitions.items())},
+        "deltas": deltas,
+        "chunks": chunks,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
@@ -0,0 +1,136 @@
+"""
+test_app_cache.py
+
+Tests for the bounded TTL / LRU page data cache (system_app.cache).
+
+Coverage:
+  - Least recently used entries are evicted past the entry and byte budgets
+  - Entries expire after their own TTL
+  - Tag invalidation drops every tagged entry; stale generations are not stored
+  - Concurrent readers and writers keep the counters consistent
+  - A committed write through query_db refreshes the dashboard counts immediately
+  - /health and /metrics report hit / miss / eviction counters
+"""
+
+import threading
+import time
+import unittest
+from datetime import timedelta
+from system_app.app import app, get_common_template_context
+from system_app.cache import TTLCache, app_cache
+from system_app.func import get_cairo_date
+from system_app.queries import query_db
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_01_lru_eviction(self):
+        cache = TTLCache(max_entries=3, max_bytes=10 ** 6)
+        for key in 'abc':
+            cache.set(key, key.upper())
+        self.assertEqual(cache.get('a'), 'A')  # a is now the most recently used
+        cache.set('d', 'D')
+        self.assertEqual(cache.keys(), ['c', 'a', 'd'])
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+        small = TTLCache(max_entries=100, max_bytes=3000)
+        small.set('first', 'x' * 1000)
+        small.set('second', 'y' * 1000)
+        small.set('third', 'z' * 1000)
+        self.assertNotIn('first', small.keys())
+        self.assertLessEqual(small.stats()['bytes'], 3000)
+        self.assertFalse(small.set('huge', 'h' * 5000))
+
+    def test_02_ttl(self):
+        cache = TTLCache()
+        cache.set('short', 1, ttl=0.05)
+        cache.set('long', 2, ttl=60)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('short'))
+        self.assertEqual(cache.get('long'), 2)
+        self.assertEqual(cache.stats()['expirations'], 1)
+
+    def test_03_tags_and_generations(self):
+        cache = TTLCache()
+        cache.set('dashboard', 1, tags=['members', 'renewal_logs'])
+        cache.set('attendance_list', 2, tags=['attendance'])
+        self.assertEqual(cache.invalidate_tags({'MEMBERS'}), 1)
+        self.assertIsNone(cache.get('dashboard'))
+        self.assertEqual(cache.get('attendance_list'), 2)
+
+        generation = cache.generation(['members'])
+        cache.invalidate_tags(['members'])  # a write commits while the value is computed
+        self.assertFalse(cache.set('dashboard', 3, tags=['members'], generation=generation))
+        self.assertTrue(cache.set('dashboard', 4, tags=['members'], generation=cache.generation(['members'])))
+
+    def test_04_concurrent_access(self):
+        cache = TTLCache(max_entries=50)
+
+        def worker(offset):
+            for i in range(500):
+                key = f'k{(i + offset) % 80}'
+                if cache.get(key) is None:
+                    cache.set(key, i, tags=[f't{i % 5}'])
+                if i % 100 == 0:
+                    cache.invalidate_tags([f't{offset % 5}'])
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = cache.stats()
+        self.assertEqual(stats['hits'] + stats['misses'], 8 * 500)
+        self.assertLessEqual(stats['entries'], 50)
+        self.assertEqual(stats['entries'], len(cache.keys()))
+
+
+class TestAppCacheWiring(unittest.TestCase):
+
+    MEMBER_ID = 90401
+
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        query_db("DELETE FROM members WHERE id = %s", (self.MEMBER_ID,), commit=True)
+        query_db(
+            """
+            INSERT INTO users (id, username, email, password, is_approved, permissions)
+            VALUES (90401, 'app_cache_user', 'app_cache@test.com', 'pwd', TRUE, '{"super_admin": true}')
+            ON CONFLICT (id) DO NOTHING
+            """,
+            commit=True,
+        )
+
+    def tearDown(self):
+        query_db("DELETE FROM members WHERE id = %s", (self.MEMBER_ID,), commit=True)
+        query_db("DELETE FROM users WHERE id = 90401", commit=True)
+
+    def test_05_write_refreshes_dashboard(self):
+        with app.test_request_context('/'):
+            before = get_common_template_context()['expiring_7_days']
+            self.assertIsNotNone(app_cache.get(f'dashboard_snapshot:{get_cairo_date()}'))
+
+            end_date = (get_cairo_date() + timedelta(days=2)).isoformat()
+            query_db("INSERT INTO members (id, name, end_date) VALUES (%s, 'App Cache Member', %s)",
+                     (self.MEMBER_ID, end_date), commit=True)
+            self.assertIsNone(app_cache.get(f'dashboard_snapshot:{get_cairo_date()}'))
+            self.assertEqual(get_common_template_context()['expiring_7_days'], before + 1)
+
+    def test_06_health_and_metrics_report_counters(self):
+        health = self.client.get('/health').get_json()
+        for key in ('hits', 'misses', 'evictions', 'entries', 'bytes', 'hit_rate'):
+            self.assertIn(key, health['cache'])
+
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = 90401
+            sess['username'] = 'app_cache_user'
+        metrics = self.client.get('/metrics').get_json()
+        self.assertIn('evictions', metrics['application']['cache'])
+        self.assertEqual(metrics['application']['cache']['total_keys'], metrics['application']['cache']['entries'])
+
+
+if __name__ == '__main__':
+    unittest.main()
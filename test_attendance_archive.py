@@ -0,0 +1,118 @@
+"""
+test_attendance_archive.py
+
+Tests for the monthly partitioned attendance archive (attendance_backup).
+
+Coverage:
+  - attendance_backup is range-partitioned with a (member_id, attendance_day) index
+  - The nightly move files rows into per-month partitions, clears attendance and restarts numbering
+  - The move is recorded as one reset tombstone, not one per row
+  - Date-bounded archive reads only scan the matching partitions
+  - Old partitions can be detached (and dropped)
+"""
+
+import unittest
+from datetime import date
+from system_app.app import perform_attendance_backup_and_clear
+from system_app.attendance_services import (
+    detach_attendance_backup_partition, get_attendance_backup_partitions,
+)
+from system_app.queries import query_db, get_attendance_backup
+
+
+class TestAttendanceArchive(unittest.TestCase):
+
+    MEMBER_IDS = [89901, 89902]
+    # Months far in the past so the test never touches real archive partitions
+    PARTITIONS = ['attendance_backup_y1990m01', 'attendance_backup_y1990m02']
+
+    def setUp(self):
+        self._cleanup()
+        query_db("INSERT INTO members (id, name) VALUES (89901, 'Archive One'), (89902, 'Archive Two')",
+                 commit=True)
+
+    def tearDown(self):
+        self._cleanup()
+
+    def _cleanup(self):
+        query_db("DELETE FROM attendance_backup WHERE member_id = ANY(%s)", (self.MEMBER_IDS,), commit=True)
+        for name in self.PARTITIONS:
+            query_db(f'DROP TABLE IF EXISTS "{name}"', commit=True)
+        query_db("DELETE FROM attendance WHERE member_id = ANY(%s)", (self.MEMBER_IDS,), commit=True)
+        query_db("DELETE FROM members WHERE id = ANY(%s)", (self.MEMBER_IDS,), commit=True)
+
+    def _archive(self):
+        if query_db("SELECT COUNT(*) AS count FROM attendance", one=True)['count']:
+            self.skipTest("attendance table is not empty")
+        query_db(
+            """
+            INSERT INTO attendance (member_id, name, attendance_date) VALUES
+            (89901, 'Archive One', '1990-01-15'),
+            (89902, 'Archive Two', '1990-01-16'),
+            (89901, 'Archive One', '1990-02-03')
+            """,
+            commit=True,
+        )
+        success, rows_moved, error = perform_attendance_backup_and_clear(performed_by='test')
+        self.assertTrue(success, error)
+        self.assertEqual(rows_moved, 3)
+
+    def test_01_partitioned_table(self):
+        row = query_db("SELECT relkind FROM pg_class WHERE oid = 'attendance_backup'::regclass", one=True)
+        self.assertEqual(row['relkind'], 'p')
+        index = query_db("SELECT indexdef FROM pg_indexes WHERE indexname = 'idx_attendance_backup_member_day'",
+                         one=True)
+        self.assertIn('(member_id, attendance_day)', index['indexdef'])
+
+    def test_02_move_into_monthly_partitions(self):
+        last_tombstone = query_db("SELECT COALESCE(MAX(id), 0) AS id FROM attendance_deletions", one=True)['id']
+        self._archive()
+
+        rows = query_db(
+            """
+            SELECT tableoid::regclass::text AS partition, attendance_date, attendance_day
+            FROM attendance_backup WHERE member_id = ANY(%s) ORDER BY id
+            """,
+            (self.MEMBER_IDS,),
+        )
+        self.assertEqual([r['partition'] for r in rows], [self.PARTITIONS[0], self.PARTITIONS[0], self.PARTITIONS[1]])
+        self.assertEqual(rows[0]['attendance_day'], date(1990, 1, 15))
+        self.assertEqual(query_db("SELECT COUNT(*) AS count FROM attendance", one=True)['count'], 0)
+
+        tombstones = query_db("SELECT num FROM attendance_deletions WHERE id > %s", (last_tombstone,))
+        self.assertEqual([t['num'] for t in tombstones], [None])
+
+        query_db("INSERT INTO attendance (member_id, name, attendance_date) VALUES (89901, 'Archive One', '1990-03-01')",
+                 commit=True)
+        self.assertEqual(query_db("SELECT num FROM attendance WHERE member_id = 89901", one=True)['num'], 1)
+
+    def test_03_date_range_prunes_partitions(self):
+        self._archive()
+        january = get_attendance_backup(date_from=date(1990, 1, 1), date_to=date(1990, 1, 31))
+        self.assertEqual(len(january), 2)
+        self.assertNotIn('attendance_day', january[0])
+
+        plan = query_db(
+            "EXPLAIN SELECT * FROM attendance_backup WHERE attendance_day >= %s AND attendance_day <= %s",
+            (date(1990, 1, 1), date(1990, 1, 31)),
+        )
+        plan_text = '\n'.join(row['QUERY PLAN'] for row in plan)
+        self.assertIn(self.PARTITIONS[0], plan_text)
+        self.assertNotIn(self.PARTITIONS[1], plan_text)
+
+    def test_04_detach_partition(self):
+        self._archive()
+        self.assertIn(self.PARTITIONS[1], [p['name'] for p in get_attendance_backup_partitions()])
+
+        self.assertTrue(detach_attendance_backup_partition(date(1990, 2, 1)))
+        self.assertNotIn(self.PARTITIONS[1], [p['name'] for p in get_attendance_backup_partitions()])
+        detached = query_db(f'SELECT COUNT(*) AS count FROM "{self.PARTITIONS[1]}"', one=True)
+        self.assertEqual(detached['count'], 1)
+        self.assertFalse(detach_attendance_backup_partition(date(1990, 2, 1)))
+
+        self.assertTrue(detach_attendance_backup_partition(date(1990, 1, 1), drop=True))
+        self.assertIsNone(query_db("SELECT to_regclass(%s) AS oid", (self.PARTITIONS[0],), one=True)['oid'])
+
+
+if __name__ == '__main__':
+    unittest.main()
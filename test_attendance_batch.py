@@ -0,0 +1,169 @@
+"""
+test_attendance_batch.py
+
+Tests for kiosk / turnstile batch check-ins (ingest_attendance_batch, /api/attendance/batch).
+
+Coverage:
+  - A mixed batch returns one accept/reject result per event, in order
+  - Membership lookup and the check-in insert are set-based (statement count independent of batch size)
+  - Resending a batch replays the stored results without new attendance rows
+  - Members already checked in today are rejected as already_checked_in
+  - The endpoint validates the body, caps the batch size and needs a login
+  - Old event IDs are pruned
+"""
+
+import unittest
+from datetime import datetime
+from system_app import attendance_services
+from system_app.app import app
+from system_app.attendance_services import (
+    check_in_member, ingest_attendance_batch, prune_attendance_ingest_events_in_transaction,
+)
+from system_app.queries import query_db, transaction
+from system_app.query_stats import query_budget
+
+
+class TestAttendanceBatch(unittest.TestCase):
+
+    MEMBER_IDS = [89701, 89702, 89703, 89704]
+    MISSING_ID = 89799
+    NOW = datetime(2026, 3, 3, 9, 0, 0)
+
+    def setUp(self):
+        self._old_csrf_enabled = app.config.get('WTF_CSRF_ENABLED')
+        app.config['TESTING'] = True
+        app.config['WTF_CSRF_ENABLED'] = False
+        self.client = app.test_client()
+        self._cleanup()
+        query_db(
+            """
+            INSERT INTO users (id, username, email, password, is_approved, permissions)
+            VALUES (89701, 'batch_user', 'batch@test.com', 'pwd', TRUE, '{"super_admin": true}')
+            ON CONFLICT (id) DO NOTHING
+            """,
+            commit=True,
+        )
+        query_db(
+            """
+            INSERT INTO members (id, name, end_date, membership_status) VALUES
+            (89701, 'Batch One', '2030-01-01', 'VAL'),
+            (89702, 'Batch Two', '2030-01-01', 'VAL'),
+            (89703, 'Batch Expired', '2026-03-02', 'EX'),
+            (89704, 'Batch Four', '2030-01-01', 'VAL')
+            """,
+            commit=True,
+        )
+
+    def tearDown(self):
+        app.config['WTF_CSRF_ENABLED'] = self._old_csrf_enabled
+        self._cleanup()
+        query_db("DELETE FROM users WHERE id = 89701", commit=True)
+
+    def _cleanup(self):
+        ids = self.MEMBER_IDS + [self.MISSING_ID]
+        query_db("DELETE FROM attendance_ingest_events WHERE client_event_id LIKE 'batch-test-%%'", commit=True)
+        query_db("DELETE FROM action_logs WHERE member_id = ANY(%s)", (ids,), commit=True)
+        query_db("DELETE FROM attendance WHERE member_id = ANY(%s)", (ids,), commit=True)
+        query_db("DELETE FROM members WHERE id = ANY(%s)", (ids,), commit=True)
+
+    def _attendance(self):
+        return query_db("SELECT * FROM attendance WHERE member_id = ANY(%s) ORDER BY num", (self.MEMBER_IDS,))
+
+    def _events(self):
+        return [
+            {'event_id': 'batch-test-1', 'member_id': 89702, 'scanned_at': '2026-03-03T08:10:00'},
+            {'event_id': 'batch-test-2', 'member_id': 89701, 'scanned_at': '2026-03-03T06:05:00Z'},
+            {'event_id': 'batch-test-3', 'member_id': self.MISSING_ID, 'scanned_at': '2026-03-03T08:00:00'},
+            {'event_id': 'batch-test-4', 'member_id': 89703, 'scanned_at': '2026-03-03T08:00:00'},
+            {'event_id': 'batch-test-5', 'member_id': 89702, 'scanned_at': '2026-03-03T08:30:00'},
+            {'event_id': 'batch-test-6', 'member_id': 'abc'},
+            {'event_id': 'batch-test-1', 'member_id': 89704},
+            {'event_id': 'batch-test-7', 'member_id': 89704, 'scanned_at': '2026-03-02T21:00:00'},
+            {'event_id': 'batch-test-8', 'member_id': 89704, 'scanned_at': '2026-03-03T12:00:00'},
+            {'member_id': 89704},
+        ]
+
+    def test_01_mixed_batch(self):
+        with query_budget(5):
+            results = ingest_attendance_batch(self._events(), performed_by='kiosk', now=self.NOW)
+
+        outcome = [(r['event_id'], r['status'], r['reason']) for r in results]
+        self.assertEqual(outcome, [
+            ('batch-test-1', 'accepted', None),
+            ('batch-test-2', 'accepted', None),
+            ('batch-test-3', 'rejected', 'not_found'),
+            ('batch-test-4', 'rejected', 'membership_expired'),
+            ('batch-test-5', 'rejected', 'already_checked_in'),
+            ('batch-test-6', 'rejected', 'invalid_member_id'),
+            ('batch-test-1', 'rejected', 'duplicate_event'),
+            ('batch-test-7', 'rejected', 'not_today'),
+            ('batch-test-8', 'rejected', 'scanned_in_future'),
+            (None, 'rejected', 'invalid_event_id'),
+        ])
+
+        rows = self._attendance()
+        # Inserted in scan order: 06:05 UTC is 08:05 in Cairo, before member 89702's 08:10
+        self.assertEqual([row['member_id'] for row in rows], [89701, 89702])
+        self.assertEqual(rows[0]['attendance_time'], '08:05:00')
+        self.assertEqual(rows[0]['attendance_date'], '2026-03-03')
+        self.assertEqual(rows[0]['day'], 'Tuesday')
+        self.assertEqual(results[1]['attendance_num'], rows[0]['num'])
+
+        logs = query_db("SELECT * FROM action_logs WHERE member_id = ANY(%s)", (self.MEMBER_IDS,))
+        self.assertEqual(len(logs), 2)
+        self.assertTrue(all(log['performed_by'] == 'kiosk' for log in logs))
+
+    def test_02_retry_replays_results(self):
+        first = ingest_attendance_batch(self._events(), now=self.NOW)
+        with query_budget(2):
+            again = ingest_attendance_batch(self._events(), now=self.NOW)
+        self.assertEqual([(r['status'], r['reason'], r['attendance_num']) for r in again],
+                         [(r['status'], r['reason'], r['attendance_num']) for r in first])
+        self.assertTrue(again[0]['replayed'])
+        self.assertFalse(again[5]['replayed'])
+        self.assertEqual(len(self._attendance()), 2)
+
+    def test_03_already_checked_in(self):
+        check_in_member(89704, now=self.NOW)
+        results = ingest_attendance_batch(
+            [{'event_id': 'batch-test-9', 'member_id': 89704, 'scanned_at': '2026-03-03T08:59:00'}], now=self.NOW)
+        self.assertEqual(results[0]['reason'], 'already_checked_in')
+        self.assertEqual(len(self._attendance()), 1)
+
+    def test_04_endpoint(self):
+        self.assertEqual(self.client.post('/api/attendance/batch', json=[]).status_code, 302)
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = 89701
+            sess['username'] = 'batch_user'
+
+        self.assertEqual(self.client.post('/api/attendance/batch', json={'events': 'x'}).status_code, 400)
+        too_many = [{'event_id': f'batch-test-x{i}', 'member_id': 1}
+                    for i in range(attendance_services.ATTENDANCE_BATCH_LIMIT + 1)]
+        self.assertEqual(self.client.post('/api/attendance/batch', json=too_many).status_code, 413)
+
+        data = self.client.post('/api/attendance/batch', json={'events': [
+            {'event_id': 'batch-test-10', 'member_id': 89701},
+            {'event_id': 'batch-test-11', 'member_id': self.MISSING_ID},
+        ]}).get_json()
+        self.assertEqual(data['accepted'], 1)
+        self.assertEqual(data['rejected'], 1)
+        self.assertEqual(data['results'][0]['status'], 'accepted')
+        log = query_db("SELECT performed_by FROM action_logs WHERE member_id = 89701", one=True)
+        self.assertEqual(log['performed_by'], 'batch_user')
+
+    def test_05_prune_old_event_ids(self):
+        query_db(
+            """
+            INSERT INTO attendance_ingest_events (client_event_id, status, received_at)
+            VALUES ('batch-test-old', 'accepted', CURRENT_TIMESTAMP - INTERVAL '8 days')
+            """,
+            commit=True,
+        )
+        with transaction() as cur:
+            prune_attendance_ingest_events_in_transaction(cur)
+        row = query_db("SELECT 1 FROM attendance_ingest_events WHERE client_event_id = 'batch-test-old'", one=True)
+        self.assertIsNone(row)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+"""
+test_attendance_check_in.py
+
+Tests for the single-statement attendance check-in (check_in_member).
+
+Coverage:
+  - A check-in is one statement: attendance row and undo log written together
+  - A second check-in the same day is reported as already_checked_in, no new row
+  - Unknown member IDs return not_found without writing anything
+  - The unique (member_id, attendance_date) index rejects duplicate rows
+  - POST /attendance_table returns small JSON for AJAX callers and flashes for forms
+"""
+
+import unittest
+from datetime import datetime
+from system_app.app import app
+from system_app.attendance_services import check_in_member
+from system_app.queries import query_db
+from system_app.query_stats import query_budget
+
+
+class TestAttendanceCheckIn(unittest.TestCase):
+
+    MEMBER_IDS = [89501, 89502]
+    MISSING_ID = 89599
+    NOW = datetime(2026, 3, 1, 7, 30, 0)
+
+    def setUp(self):
+        self._old_csrf_enabled = app.config.get('WTF_CSRF_ENABLED')
+        app.config['TESTING'] = True
+        app.config['WTF_CSRF_ENABLED'] = False
+        self.client = app.test_client()
+        self._cleanup()
+        query_db(
+            """
+            INSERT INTO users (id, username, email, password, is_approved, permissions)
+            VALUES (89501, 'check_in_user', 'check_in@test.com', 'pwd', TRUE, '{"super_admin": true}')
+            ON CONFLICT (id) DO NOTHING
+            """,
+            commit=True,
+        )
+        query_db(
+            """
+            INSERT INTO members (id, name, end_date, membership_status) VALUES
+            (89501, 'Check In One', '2030-01-01', 'VAL'),
+            (89502, 'Check In Two', '2030-01-01', 'VAL')
+            """,
+            commit=True,
+        )
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = 89501
+            sess['username'] = 'check_in_user'
+
+    def tearDown(self):
+        app.config['WTF_CSRF_ENABLED'] = self._old_csrf_enabled
+        self._cleanup()
+        query_db("DELETE FROM users WHERE id = 89501", commit=True)
+
+    def _cleanup(self):
+        ids = self.MEMBER_IDS + [self.MISSING_ID]
+        query_db("DELETE FROM action_logs WHERE member_id = ANY(%s)", (ids,), commit=True)
+        query_db("DELETE FROM attendance WHERE member_id = ANY(%s)", (ids,), commit=True)
+        query_db("DELETE FROM members WHERE id = ANY(%s)", (ids,), commit=True)
+
+    def _attendance(self, member_id):
+        return query_db("SELECT * FROM attendance WHERE member_id = %s", (member_id,))
+
+    def test_01_check_in_is_one_statement(self):
+        with query_budget(1):
+            result = check_in_member(89501, performed_by='tester', now=self.NOW)
+        self.assertEqual(result['status'], 'recorded')
+        self.assertEqual(result['member']['name'], 'Check In One')
+        self.assertEqual(result['attendance']['attendance_date'], '2026-03-01')
+        self.assertEqual(result['attendance']['attendance_time'], '07:30:00')
+        self.assertEqual(result['attendance']['day'], 'Sunday')
+
+        rows = self._attendance(89501)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['num'], result['attendance']['num'])
+        self.assertEqual(rows[0]['membership_status'], 'VAL')
+
+        log = query_db("SELECT * FROM action_logs WHERE member_id = 89501", one=True)
+        self.assertEqual(log['action_type'], 'add_attendance')
+        self.assertEqual(log['performed_by'], 'tester')
+        self.assertEqual(log['action_data']['attendance_num'], result['attendance']['num'])
+
+    def test_02_second_check_in_same_day(self):
+        check_in_member(89501, now=self.NOW)
+        result = check_in_member(89501, now=self.NOW.replace(hour=9))
+        self.assertEqual(result['status'], 'already_checked_in')
+        self.assertIsNone(result['attendance'])
+        self.assertEqual(len(self._attendance(89501)), 1)
+        self.assertEqual(query_db("SELECT COUNT(*) AS count FROM action_logs WHERE member_id = 89501",
+                                  one=True)['count'], 1)
+
+        next_day = check_in_member(89501, now=self.NOW.replace(day=2))
+        self.assertEqual(next_day['status'], 'recorded')
+
+    def test_03_unknown_member(self):
+        result = check_in_member(self.MISSING_ID, now=self.NOW)
+        self.assertEqual(result['status'], 'not_found')
+        self.assertEqual(self._attendance(self.MISSING_ID), [])
+
+    def test_04_unique_index_rejects_duplicates(self):
+        check_in_member(89502, now=self.NOW)
+        with self.assertRaises(ValueError):
+            query_db(
+                "INSERT INTO attendance (member_id, name, attendance_date) VALUES (89502, 'Check In Two', '2026-03-01')",
+                commit=True,
+            )
+        self.assertEqual(len(self._attendance(89502)), 1)
+
+    def test_05_route_json_and_form(self):
+        response = self.client.post('/attendance_table?format=json', data={'member_id': '89502'})
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data['status'], 'recorded')
+        self.assertEqual(data['member']['id'], 89502)
+
+        again = self.client.post('/attendance_table', json={'member_id': 89502})
+        self.assertEqual(again.get_json()['status'], 'already_checked_in')
+
+        missing = self.client.post('/attendance_table?format=json', data={'member_id': str(self.MISSING_ID)})
+        self.assertEqual(missing.status_code, 404)
+        invalid = self.client.post('/attendance_table?format=json', data={'member_id': 'abc'})
+        self.assertEqual(invalid.status_code, 400)
+
+        html = self.client.post('/attendance_table', data={'member_id': '89501'}).get_data(as_text=True)
+        self.assertIn('Attendance for Check In One recorded successfully!', html)
+        self.assertEqual(len(self._attendance(89501)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
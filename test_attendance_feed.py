@@ -0,0 +1,127 @@
+"""
+test_attendance_feed.py
+
+Tests for the incremental attendance feed (get_attendance_feed, /attendance_table/feed).
+
+Coverage:
+  - Only rows with num > after are returned, in a fixed number of statements
+  - Deleted rows are reported once through tombstones (deleted / last_deletion_id)
+  - An `after` beyond the num sequence (table cleared) sets reset
+  - Old tombstones are pruned
+  - The page exposes the feed cursor and the JSON endpoint requires login
+"""
+
+import unittest
+from datetime import datetime
+from system_app.app import app
+from system_app.attendance_services import (
+    check_in_member, get_attendance_feed, get_last_attendance_deletion_id,
+    prune_attendance_deletions_in_transaction,
+)
+from system_app.queries import query_db, transaction
+from system_app.query_stats import query_budget
+
+
+class TestAttendanceFeed(unittest.TestCase):
+
+    MEMBER_IDS = [89601, 89602, 89603]
+    NOW = datetime(2026, 3, 2, 8, 0, 0)
+
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        self._cleanup()
+        query_db(
+            """
+            INSERT INTO users (id, username, email, password, is_approved, permissions)
+            VALUES (89601, 'feed_user', 'feed@test.com', 'pwd', TRUE, '{"super_admin": true}')
+            ON CONFLICT (id) DO NOTHING
+            """,
+            commit=True,
+        )
+        query_db(
+            """
+            INSERT INTO members (id, name, end_date, membership_status, comment) VALUES
+            (89601, 'Feed One', '2030-01-01', 'VAL', 'front desk note'),
+            (89602, 'Feed Two', '2030-01-01', 'VAL', NULL),
+            (89603, 'Feed Three', '2020-01-01', 'EX', NULL)
+            """,
+            commit=True,
+        )
+
+    def tearDown(self):
+        self._cleanup()
+        query_db("DELETE FROM users WHERE id = 89601", commit=True)
+
+    def _cleanup(self):
+        query_db("DELETE FROM action_logs WHERE member_id = ANY(%s)", (self.MEMBER_IDS,), commit=True)
+        query_db("DELETE FROM attendance WHERE member_id = ANY(%s)", (self.MEMBER_IDS,), commit=True)
+        query_db("DELETE FROM members WHERE id = ANY(%s)", (self.MEMBER_IDS,), commit=True)
+
+    def _login(self):
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = 89601
+            sess['username'] = 'feed_user'
+
+    def test_01_rows_after_last_seen(self):
+        first = check_in_member(89601, now=self.NOW)['attendance']['num']
+        second = check_in_member(89602, now=self.NOW)['attendance']['num']
+
+        mark = get_last_attendance_deletion_id()
+        with query_budget(3):
+            feed = get_attendance_feed(after_num=first, after_deletion_id=mark)
+        self.assertEqual([row['num'] for row in feed['rows']], [second])
+        self.assertEqual(feed['rows'][0]['name'], 'Feed Two')
+        self.assertEqual(feed['last_num'], second)
+        self.assertFalse(feed['reset'])
+        self.assertEqual(feed['deleted'], [])
+
+        full = get_attendance_feed(after_num=first - 1)
+        row = next(r for r in full['rows'] if r['num'] == first)
+        self.assertEqual(row['comment'], 'front desk note')
+        self.assertEqual(row['end_date'], '2030-01-01')
+
+    def test_02_deletions_reported_once(self):
+        num = check_in_member(89603, now=self.NOW)['attendance']['num']
+        mark = get_last_attendance_deletion_id()
+        query_db("DELETE FROM attendance WHERE num = %s", (num,), commit=True)
+
+        feed = get_attendance_feed(after_num=num, after_deletion_id=mark)
+        self.assertEqual(feed['deleted'], [num])
+        self.assertGreater(feed['last_deletion_id'], mark)
+        self.assertFalse(feed['reset'])
+
+        again = get_attendance_feed(after_num=num, after_deletion_id=feed['last_deletion_id'])
+        self.assertEqual(again['deleted'], [])
+
+    def test_03_reset_when_numbering_restarted(self):
+        feed = get_attendance_feed(after_num=10 ** 9, after_deletion_id=get_last_attendance_deletion_id())
+        self.assertTrue(feed['reset'])
+
+    def test_04_prune_old_tombstones(self):
+        query_db(
+            "INSERT INTO attendance_deletions (num, deleted_at) VALUES (-1, CURRENT_TIMESTAMP - INTERVAL '3 days')",
+            commit=True,
+        )
+        with transaction() as cur:
+            prune_attendance_deletions_in_transaction(cur)
+        row = query_db("SELECT COUNT(*) AS count FROM attendance_deletions WHERE num = -1", one=True)
+        self.assertEqual(row['count'], 0)
+
+    def test_05_page_and_endpoint(self):
+        response = self.client.get('/attendance_table/feed?after=0')
+        self.assertEqual(response.status_code, 302)
+
+        self._login()
+        num = check_in_member(89601, now=self.NOW)['attendance']['num']
+        html = self.client.get('/attendance_table').get_data(as_text=True)
+        self.assertIn(f'data-num="{num}"', html)
+        self.assertIn('attendanceFeed', html)
+
+        data = self.client.get(f'/attendance_table/feed?after={num - 1}').get_json()
+        self.assertIn(num, [row['num'] for row in data['rows']])
+        self.assertIn('last_deletion_id', data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+"""
+test_bulk_import_members.py
+
+Tests for the COPY-based member import (bulk_import_members).
+
+Coverage:
+  - Custom-ID and auto-ID rows are inserted in one pass without ID collisions
+  - Auto IDs skip IDs already taken, and a high custom ID does not move the members sequence
+  - Per-row rejects: missing name, bad ID/age/fees, duplicates in file, existing ID / National ID
+  - Values containing tabs, newlines and backslashes survive COPY unchanged
+  - update_existing=True updates members whose ID already exists
+  - bulk_add_members keeps its tuple interface and returns the inserted count
+"""
+
+import unittest
+from system_app.app import app
+from system_app.queries import query_db, bulk_import_members, bulk_add_members
+
+
+def _row(row_number, custom_id, name, age=30, fees=100.0, national_id=None, comment=None):
+    return (row_number, custom_id, name, None, '0100088800', age, 'male', None, None, None,
+            '2030-01-01', '1 Month', fees, 'VAL', 0, comment, national_id)
+
+
+class TestBulkImportMembers(unittest.TestCase):
+
+    NAME_PREFIX = 'BulkImport '
+    HIGH_ID = 900000123
+
+    def setUp(self):
+        app.config['TESTING'] = True
+        self._cleanup()
+
+    def tearDown(self):
+        self._cleanup()
+
+    def _cleanup(self):
+        query_db("DELETE FROM members WHERE name LIKE %s OR id BETWEEN 88801 AND 88899 OR id = %s",
+                 (self.NAME_PREFIX + '%', self.HIGH_ID), commit=True)
+
+    def _imported(self):
+        return query_db(
+            "SELECT id, name, age, membership_fees, comment FROM members WHERE name LIKE %s ORDER BY name",
+            (self.NAME_PREFIX + '%',),
+        )
+
+    def test_01_custom_and_auto_ids_in_one_pass(self):
+        result = bulk_import_members([
+            _row(2, 88801, 'BulkImport A'),
+            _row(3, None, 'BulkImport B'),
+            _row(4, 88802, 'BulkImport C'),
+            _row(5, None, 'BulkImport D'),
+        ])
+        self.assertEqual(result['inserted'], 4)
+        self.assertEqual(result['rejected'], [])
+        rows = {row['name']: row['id'] for row in self._imported()}
+        self.assertEqual(rows['BulkImport A'], 88801)
+        self.assertEqual(rows['BulkImport C'], 88802)
+        self.assertNotIn(rows['BulkImport B'], (88801, 88802))
+        self.assertGreater(rows['BulkImport D'], rows['BulkImport B'])
+
+    def test_02_per_row_rejects(self):
+        query_db(
+            "INSERT INTO members (id, name, national_id) VALUES (88810, 'BulkImport Existing', '29001010100001')",
+            commit=True,
+        )
+        result = bulk_import_members([
+            _row(2, None, '   '),
+            _row(3, 'abc', 'BulkImport BadId'),
+            _row(4, None, 'BulkImport BadAge', age='old'),
+            _row(5, None, 'BulkImport BadFees', fees='ten'),
+            _row(6, 88811, 'BulkImport First'),
+            _row(7, 88811, 'BulkImport Second'),
+            _row(8, 88810, 'BulkImport Taken'),
+            _row(9, None, 'BulkImport NidTaken', national_id='29001010100001'),
+            _row(10, None, 'BulkImport Good'),
+        ])
+        self.assertEqual(result['inserted'], 2)
+        self.assertEqual(dict(result['rejected']), {
+            2: 'Name is required',
+            3: 'Invalid member ID',
+            4: 'Invalid age',
+            5: 'Invalid membership fees',
+            7: 'Duplicate member ID in file',
+            8: 'Member ID already exists',
+            9: 'National ID already exists',
+        })
+        names = {row['name'] for row in self._imported()}
+        self.assertEqual(names, {'BulkImport Existing', 'BulkImport First', 'BulkImport Good'})
+
+    def test_03_special_characters_round_trip(self):
+        comment = 'tab\there\nnew line \\ backslash'
+        bulk_import_members([_row(2, 88820, 'BulkImport Special', comment=comment)])
+        row = query_db("SELECT comment FROM members WHERE id = 88820", one=True)
+        self.assertEqual(row['comment'], comment)
+
+    def test_04_update_existing(self):
+        query_db("INSERT INTO members (id, name, age) VALUES (88830, 'BulkImport Old', 20)", commit=True)
+        result = bulk_import_members([_row(2, 88830, 'BulkImport New', age=41)], update_existing=True)
+        self.assertEqual((result['inserted'], result['updated'], result['rejected']), (0, 1, []))
+        row = query_db("SELECT name, age FROM members WHERE id = 88830", one=True)
+        self.assertEqual((row['name'], row['age']), ('BulkImport New', 41))
+
+    def test_05_bulk_add_members_wrapper(self):
+        with_id = (88840, 'BulkImport Wrapped', None, '01000', 25, 'female', None, None, None,
+                   '2030-01-01', '1 Month', 100.0, 'VAL', 0, None, None)
+        no_id = with_id[1:]
+        self.assertEqual(bulk_add_members([with_id, with_id]), 1)
+        self.assertEqual(bulk_add_members([tuple(no_id)]), 1)
+        self.assertEqual(len(self._imported()), 2)
+
+    def test_06_auto_ids_skip_taken_ids_without_jumping(self):
+        next_id = query_db("SELECT nextval(pg_get_serial_sequence('members', 'id')) AS id", one=True)['id'] + 1
+        query_db("INSERT INTO members (id, name) VALUES (%s, 'BulkImport Existing')", (next_id + 1,), commit=True)
+        result = bulk_import_members([
+            _row(2, next_id, 'BulkImport Custom'),
+            _row(3, self.HIGH_ID, 'BulkImport High'),
+            _row(4, None, 'BulkImport Auto'),
+        ])
+        self.assertEqual((result['inserted'], result['rejected']), (3, []))
+        rows = {row['name']: row['id'] for row in self._imported()}
+        self.assertEqual(rows['BulkImport Auto'], next_id + 2)
+
+        bulk_import_members([_row(2, None, 'BulkImport Later')])
+        later = query_db("SELECT id FROM members WHERE name = 'BulkImport Later'", one=True)['id']
+        self.assertEqual(later, next_id + 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+"""
+test_cache_backends.py
+
+Tests for the pluggable cache backends (system_app.cache.make_cache / SQLiteCache)
+and the online-user and login-attempt state kept in state_store.
+
+Coverage:
+  - make_cache picks the backend by name and rejects unknown ones
+  - SQLiteCache keeps TTLCache's contract: TTL, stale window, tags, generations, prefixes, budget
+  - Two SQLiteCache handles on one file (two workers) share values and invalidations
+  - Concurrent processes missing one key compute it once
+  - Login lockout and online users go through state_store
+"""
+
+import multiprocessing
+import os
+import tempfile
+import time
+import unittest
+from system_app.app import (app, check_rate_limit, record_failed_login, reset_all_login_attempts,
+                            get_online_users)
+from system_app.cache import SQLiteCache, TTLCache, make_cache, state_store
+
+
+def _compute_in_worker(path, log_path, barrier):
+    # Runs in a forked process with its own SQLite connection
+    cache = SQLiteCache(path, name='shared')
+
+    def compute():
+        with open(log_path, 'a') as log:
+            log.write('computed\n')
+        time.sleep(0.5)
+        return 'value'
+
+    barrier.wait()
+    assert cache.get_or_compute('key', compute, ttl=60) == 'value'
+
+
+class TestSQLiteCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'cache.sqlite3')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_01_make_cache(self):
+        self.assertIsInstance(make_cache('page_cache', backend='memory'), TTLCache)
+        cache = make_cache('page_cache', backend='sqlite', path=self.path, max_entries=10)
+        self.assertIsInstance(cache, SQLiteCache)
+        self.assertEqual(cache.stats()['backend'], 'sqlite')
+        with self.assertRaises(ValueError):
+            make_cache('page_cache', backend='redis')
+
+    def test_02_contract(self):
+        cache = SQLiteCache(self.path, name='contract', max_entries=3)
+        cache.set('short', 1, ttl=0.05)
+        cache.set('stale', 2, ttl=0.05, stale_ttl=60)
+        cache.set('dashboard', {'count': 3}, ttl=60, tags=['Members'])
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('short'))
+        self.assertIsNone(cache.get('stale'))
+        self.assertEqual(cache.get_or_compute('stale', lambda: 'new', stale_ttl=60, background=True), 2)
+        deadline = time.monotonic() + 5
+        while cache.get('stale') != 'new' and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(cache.get('stale'), 'new')
+        self.assertEqual(cache.get('dashboard'), {'count': 3})
+
+        generation = cache.generation(['members'])
+        self.assertEqual(cache.invalidate_tags(['members']), 1)
+        self.assertIsNone(cache.get('dashboard'))
+        self.assertFalse(cache.set('dashboard', 4, tags=['members'], generation=generation))
+
+        cache.clear()
+        for n in range(5):
+            cache.set(f'user:{n}', n, ttl=60 + n)
+        self.assertLessEqual(len(cache), 3)
+        self.assertEqual(sorted(value for _, value in cache.items('user:')), [2, 3, 4])
+        self.assertEqual(cache.delete_prefix('user:'), 3)
+        self.assertEqual(cache.items('user:'), [])
+
+    def test_03_handles_share_one_file(self):
+        worker_a = SQLiteCache(self.path, name='shared')
+        worker_b = SQLiteCache(self.path, name='shared')
+        other = SQLiteCache(self.path, name='other')
+        worker_a.set('dashboard', 'snapshot', ttl=60, tags=['renewal_logs'])
+        self.assertEqual(worker_b.get('dashboard'), 'snapshot')
+        self.assertIsNone(other.get('dashboard'))
+
+        worker_b.invalidate_tags(['renewal_logs'])  # a write committed by the other worker
+        self.assertIsNone(worker_a.get('dashboard'))
+        self.assertNotEqual(worker_a.generation(['renewal_logs']), (0,))
+
+    def test_04_processes_compute_once(self):
+        log_path = os.path.join(self.tmpdir.name, 'computed.log')
+        SQLiteCache(self.path, name='shared')  # create the schema before the workers race
+        ctx = multiprocessing.get_context('fork')
+        barrier = ctx.Barrier(4)
+        workers = [ctx.Process(target=_compute_in_worker, args=(self.path, log_path, barrier)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(30)
+        self.assertEqual([worker.exitcode for worker in workers], [0] * 4)
+        with open(log_path) as log:
+            self.assertEqual(log.read().count('computed'), 1)
+
+
+class TestStateStore(unittest.TestCase):
+
+    IP = '203.0.113.77'
+
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        reset_all_login_attempts()
+
+    def tearDown(self):
+        reset_all_login_attempts()
+        state_store.delete('active_user:90501')
+
+    def test_05_login_lockout(self):
+        for _ in range(4):
+            record_failed_login(self.IP)
+        self.assertTrue(check_rate_limit(self.IP)[0])
+        record_failed_login(self.IP)
+        allowed, message = check_rate_limit(self.IP)
+        self.assertFalse(allowed)
+        self.assertIn('Too many login attempts', message)
+        reset_all_login_attempts()
+        self.assertTrue(check_rate_limit(self.IP)[0])
+
+    def test_06_online_users(self):
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = 90501
+            sess['username'] = 'state_store_user'
+        self.client.get('/health')
+        online = {user['user_id']: user for user in get_online_users()}
+        self.assertEqual(online[90501]['username'], 'state_store_user')
+
+        self.client.get('/logout')
+        self.assertNotIn(90501, [user['user_id'] for user in get_online_users()])
+
+
+if __name__ == '__main__':
+    unittest.main()
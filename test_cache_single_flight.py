@@ -0,0 +1,189 @@
+"""
+test_cache_single_flight.py
+
+Tests for TTLCache.get_or_compute (single flight and stale-while-revalidate).
+
+Coverage:
+  - Concurrent misses on one key run the computation once; the others get its result
+  - A failed computation is raised to every waiter and nothing is cached
+  - An expired value inside its stale window is served while one caller refreshes it
+  - background=True refreshes in a thread without the caller waiting; errors keep the stale value
+  - A write to a tag during the computation keeps the result out of the cache
+  - get_common_template_context loads one dashboard snapshot for concurrent requests
+"""
+
+import threading
+import time
+import unittest
+from system_app.app import app, get_common_template_context
+from system_app.cache import TTLCache, app_cache
+from system_app.dashboard import DashboardSnapshot
+from system_app.func import get_cairo_date
+
+
+class TestGetOrCompute(unittest.TestCase):
+
+    def _run_concurrently(self, target, count=8):
+        results, errors = [], []
+        barrier = threading.Barrier(count)
+
+        def worker():
+            barrier.wait()
+            try:
+                results.append(target())
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def test_01_concurrent_misses_compute_once(self):
+        cache = TTLCache()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results, errors = self._run_concurrently(lambda: cache.get_or_compute('key', compute, ttl=60))
+        self.assertEqual(errors, [])
+        self.assertEqual(results, ['value'] * 8)
+        self.assertEqual(len(calls), 1)
+        stats = cache.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['coalesced'], 7)
+        self.assertEqual(cache.get_or_compute('key', compute, ttl=60), 'value')
+        self.assertEqual(len(calls), 1)
+
+    def test_02_errors_reach_waiters(self):
+        cache = TTLCache()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            raise ValueError('database down')
+
+        results, errors = self._run_concurrently(lambda: cache.get_or_compute('key', compute, ttl=60))
+        self.assertEqual(results, [])
+        self.assertEqual(len(errors), 8)
+        self.assertTrue(all(isinstance(e, ValueError) for e in errors))
+        self.assertEqual(len(calls), 1)
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(cache.stats()['refresh_errors'], 1)
+
+    def test_03_stale_value_served_while_one_refreshes(self):
+        cache = TTLCache()
+        cache.get_or_compute('key', lambda: 'old', ttl=0.05, stale_ttl=60)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('key'))  # plain get never returns a stale value
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'new'
+
+        results, errors = self._run_concurrently(
+            lambda: cache.get_or_compute('key', compute, ttl=60, stale_ttl=60))
+        self.assertEqual(errors, [])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), ['new'] + ['old'] * 7)
+        self.assertEqual(cache.get('key'), 'new')
+
+        cache.set('gone', 'old', ttl=0.05, stale_ttl=0.05)
+        time.sleep(0.15)
+        self.assertEqual(cache.get_or_compute('gone', lambda: 'new'), 'new')
+
+    def test_04_background_refresh(self):
+        cache = TTLCache()
+        cache.set('key', 'old', ttl=0.05, stale_ttl=60)
+        time.sleep(0.1)
+        started, release = threading.Event(), threading.Event()
+
+        def compute():
+            started.set()
+            release.wait(5)
+            return 'new'
+
+        self.assertEqual(cache.get_or_compute('key', compute, ttl=60, stale_ttl=60, background=True), 'old')
+        self.assertTrue(started.wait(5))
+        self.assertEqual(cache.get_or_compute('key', compute, ttl=60, stale_ttl=60, background=True), 'old')
+        release.set()
+        deadline = time.monotonic() + 5
+        while cache.get('key') != 'new' and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(cache.get('key'), 'new')
+
+        cache.set('broken', 'old', ttl=0.05, stale_ttl=60)
+        time.sleep(0.1)
+
+        def fail():
+            raise RuntimeError('refresh failed')
+
+        with self.assertLogs('system_app.app', level='ERROR'):
+            self.assertEqual(cache.get_or_compute('broken', fail, stale_ttl=60, background=True), 'old')
+            deadline = time.monotonic() + 5
+            while cache.stats()['refresh_errors'] == 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(cache.get_or_compute('broken', lambda: 'new', stale_ttl=60), 'new')
+
+    def test_05_write_during_compute_is_not_cached(self):
+        cache = TTLCache()
+
+        def compute():
+            cache.invalidate_tags(['members'])
+            return 'computed'
+
+        self.assertEqual(cache.get_or_compute('key', compute, ttl=60, tags=['members']), 'computed')
+        self.assertIsNone(cache.get('key'))
+
+
+class TestDashboardSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        self.key = f'dashboard_snapshot:{get_cairo_date()}'
+        app_cache.delete(self.key)
+
+    def tearDown(self):
+        app_cache.delete(self.key)
+
+    def test_06_concurrent_requests_load_one_snapshot(self):
+        original_load = DashboardSnapshot.load.__func__
+        loads = []
+
+        def counting_load(cls, today):
+            loads.append(today)
+            time.sleep(0.2)
+            return original_load(cls, today)
+
+        DashboardSnapshot.load = classmethod(counting_load)
+        try:
+            contexts = []
+            barrier = threading.Barrier(6)
+
+            def request():
+                with app.test_request_context('/'):
+                    barrier.wait()
+                    contexts.append(get_common_template_context())
+
+            threads = [threading.Thread(target=request) for _ in range(6)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            DashboardSnapshot.load = classmethod(original_load)
+
+        self.assertEqual(len(loads), 1)
+        self.assertEqual(len(contexts), 6)
+        self.assertEqual(len({ctx['expiring_7_days'] for ctx in contexts}), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
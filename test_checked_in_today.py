@@ -0,0 +1,119 @@
+"""
+test_checked_in_today.py
+
+Tests for the per-process "checked in today" set (attendance_services).
+
+Coverage:
+  - A repeat check-in today is answered from the set without touching the DB
+  - The set is built from today's attendance rows (startup / date rollover)
+  - Deletions in this process (forget_checked_in) and in others (tombstone sync) drop members
+  - With an empty set the unique index still reports already_checked_in and the answer is remembered
+  - Check-ins for another date bypass the set
+"""
+
+import unittest
+from datetime import timedelta
+from system_app import attendance_services
+from system_app.attendance_services import (
+    check_in_member, forget_checked_in, load_checked_in_today, lookup_checked_in_today,
+    reset_checked_in_today,
+)
+from system_app.func import get_cairo_date, get_cairo_now
+from system_app.queries import query_db
+from system_app.query_stats import query_budget
+
+
+class TestCheckedInToday(unittest.TestCase):
+
+    MEMBER_IDS = [89801, 89802, 89803]
+
+    def setUp(self):
+        self._old_sync = attendance_services.CHECKED_IN_SYNC_SECONDS
+        self.today = get_cairo_date()
+        self._cleanup()
+        query_db(
+            """
+            INSERT INTO members (id, name, end_date, membership_status) VALUES
+            (89801, 'Today One', '2030-01-01', 'VAL'),
+            (89802, 'Today Two', '2030-01-01', 'VAL'),
+            (89803, 'Today Three', '2030-01-01', 'VAL')
+            """,
+            commit=True,
+        )
+        reset_checked_in_today()
+
+    def tearDown(self):
+        attendance_services.CHECKED_IN_SYNC_SECONDS = self._old_sync
+        self._cleanup()
+        reset_checked_in_today()
+
+    def _cleanup(self):
+        query_db("DELETE FROM action_logs WHERE member_id = ANY(%s)", (self.MEMBER_IDS,), commit=True)
+        query_db("DELETE FROM attendance WHERE member_id = ANY(%s)", (self.MEMBER_IDS,), commit=True)
+        query_db("DELETE FROM members WHERE id = ANY(%s)", (self.MEMBER_IDS,), commit=True)
+
+    def _attendance_count(self, member_id):
+        return query_db("SELECT COUNT(*) AS count FROM attendance WHERE member_id = %s",
+                        (member_id,), one=True)['count']
+
+    def test_01_repeat_check_in_without_db(self):
+        first = check_in_member(89801)
+        self.assertEqual(first['status'], 'recorded')
+
+        with query_budget(0):
+            again = check_in_member(89801)
+        self.assertEqual(again['status'], 'already_checked_in')
+        self.assertEqual(again['member']['name'], 'Today One')
+        self.assertEqual(again['existing_num'], first['attendance']['num'])
+        self.assertEqual(self._attendance_count(89801), 1)
+
+    def test_02_built_from_attendance(self):
+        query_db(
+            "INSERT INTO attendance (member_id, name, attendance_date) VALUES (89802, 'Today Two', %s)",
+            (self.today.strftime('%Y-%m-%d'),), commit=True,
+        )
+        self.assertIsNotNone(lookup_checked_in_today(89802, self.today))
+        self.assertIsNone(lookup_checked_in_today(89803, self.today))
+
+        # Rolling over to another day rebuilds the set for that day
+        self.assertIsNone(lookup_checked_in_today(89802, self.today + timedelta(days=1)))
+        load_checked_in_today(self.today)
+        self.assertIsNotNone(lookup_checked_in_today(89802, self.today))
+
+    def test_03_deletions(self):
+        num = check_in_member(89801)['attendance']['num']
+        query_db("DELETE FROM attendance WHERE num = %s", (num,), commit=True)
+        forget_checked_in([num])
+        self.assertEqual(check_in_member(89801)['status'], 'recorded')
+
+        # A delete made elsewhere (no forget_checked_in) is applied by the tombstone sync
+        num = check_in_member(89802)['attendance']['num']
+        query_db("DELETE FROM attendance WHERE num = %s", (num,), commit=True)
+        self.assertIsNotNone(lookup_checked_in_today(89802, self.today))
+        attendance_services.CHECKED_IN_SYNC_SECONDS = 0
+        self.assertIsNone(lookup_checked_in_today(89802, self.today))
+        self.assertEqual(check_in_member(89802)['status'], 'recorded')
+
+    def test_04_database_remains_source_of_truth(self):
+        # Checked in by another worker after this process built its set
+        load_checked_in_today(self.today)
+        query_db(
+            "INSERT INTO attendance (member_id, name, attendance_date) VALUES (89803, 'Today Three', %s)",
+            (self.today.strftime('%Y-%m-%d'),), commit=True,
+        )
+        result = check_in_member(89803)
+        self.assertEqual(result['status'], 'already_checked_in')
+        self.assertIsNotNone(result['existing_num'])
+        with query_budget(0):
+            self.assertEqual(check_in_member(89803)['status'], 'already_checked_in')
+        self.assertEqual(self._attendance_count(89803), 1)
+
+    def test_05_other_dates_bypass_the_set(self):
+        check_in_member(89801)
+        tomorrow = get_cairo_now() + timedelta(days=1)
+        self.assertEqual(check_in_member(89801, now=tomorrow)['status'], 'recorded')
+        self.assertEqual(self._attendance_count(89801), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
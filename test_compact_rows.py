@@ -0,0 +1,106 @@
+"""
+test_compact_rows.py
+
+Tests for the compact (slot-based) row format of query_db.
+
+Coverage:
+  - row_format='compact' returns the same data as the default dict rows
+  - CompactRow supports attribute, key, .get(), dict() and `in` access
+  - extend() adds computed fields without mutating the source row
+  - Compact rows are smaller than RealDictRow rows
+  - /all_members JSON and HTML render compact rows unchanged
+"""
+
+import sys
+import unittest
+from system_app.app import app
+from system_app.queries import query_db
+from system_app.rows import CompactRow, row_class
+
+
+class TestCompactRows(unittest.TestCase):
+
+    MEMBER_ID = 88601
+
+    def setUp(self):
+        self.app = app
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        self._cleanup()
+        query_db(
+            """
+            INSERT INTO users (id, username, email, password, is_approved, permissions)
+            VALUES (88601, 'compact_rows_user', 'compact_rows@test.com', 'pwd', TRUE,
+                    '{"super_admin": true}')
+            ON CONFLICT (id) DO NOTHING
+            """,
+            commit=True,
+        )
+        query_db(
+            "INSERT INTO members (id, name, phone, end_date) VALUES (%s, 'Compact Row Member', '0100088601', '2030-01-01')",
+            (self.MEMBER_ID,),
+            commit=True,
+        )
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = 88601
+            sess['username'] = 'compact_rows_user'
+
+    def tearDown(self):
+        self._cleanup()
+        query_db("DELETE FROM users WHERE id = 88601", commit=True)
+
+    def _cleanup(self):
+        query_db("DELETE FROM members WHERE id = %s", (self.MEMBER_ID,), commit=True)
+
+    def test_01_compact_matches_dict_rows(self):
+        sql = "SELECT * FROM members WHERE id = %s"
+        as_dict = query_db(sql, (self.MEMBER_ID,), one=True)
+        compact = query_db(sql, (self.MEMBER_ID,), one=True, row_format='compact')
+        self.assertIsInstance(compact, CompactRow)
+        self.assertEqual(dict(compact), dict(as_dict))
+        self.assertEqual(compact, as_dict)
+
+    def test_02_mapping_and_attribute_access(self):
+        row = query_db(
+            "SELECT id, name, end_date FROM members WHERE id = %s", (self.MEMBER_ID,),
+            one=True, row_format='compact',
+        )
+        self.assertEqual(row.name, 'Compact Row Member')
+        self.assertEqual(row['name'], 'Compact Row Member')
+        self.assertEqual(row.get('missing', 'fallback'), 'fallback')
+        self.assertIn('end_date', row)
+        self.assertNotIn('phone', row)
+        self.assertEqual(list(row.keys()), ['id', 'name', 'end_date'])
+        with self.assertRaises(KeyError):
+            row['phone']
+
+    def test_03_extend_adds_fields(self):
+        row = row_class(('id', 'name'))._make((1, 'A'))
+        extended = row.extend(is_expired=True, name='B')
+        self.assertEqual(extended._asdict(), {'id': 1, 'name': 'B', 'is_expired': True})
+        self.assertEqual(row.name, 'A')
+        self.assertIs(type(extended), type(row.extend(is_expired=False, name='C')))
+
+    def test_04_compact_rows_are_smaller(self):
+        sql = "SELECT * FROM members WHERE id = %s"
+        as_dict = query_db(sql, (self.MEMBER_ID,), one=True)
+        compact = query_db(sql, (self.MEMBER_ID,), one=True, row_format='compact')
+        self.assertNotIn('__dict__', dir(compact))
+        self.assertLess(sys.getsizeof(compact), sys.getsizeof(as_dict))
+
+    def test_05_all_members_json_and_html(self):
+        response = self.client.get('/all_members?format=json&sort_by=id&sort_dir=desc')
+        self.assertEqual(response.status_code, 200)
+        members = response.get_json()['members']
+        ours = [m for m in members if m['id'] == self.MEMBER_ID]
+        self.assertEqual(len(ours), 1)
+        self.assertEqual(ours[0]['name'], 'Compact Row Member')
+        self.assertEqual(ours[0]['dynamic_status'], 'val')
+        self.assertFalse(ours[0]['is_expired'])
+
+        html = self.client.get('/all_members?sort_by=id&sort_dir=desc').get_data(as_text=True)
+        self.assertIn('Compact Row Member', html)
+
+
+if __name__ == '__main__':
+    unittest.main()
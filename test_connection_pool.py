@@ -0,0 +1,121 @@
+"""
+test_connection_pool.py
+
+Regression tests for the blocking, bounded, instrumented connection pool.
+
+Coverage:
+  - Checkout blocks and times out when every connection is in use
+  - A waiting checkout succeeds as soon as a connection is returned
+  - Connections past max_age are recycled
+  - Broken idle connections are replaced by the pre-ping
+  - Stats report in-use / idle counts and checkout waits
+  - Warm-up opens the minimum connections
+  - A saturated shared pool raises (503 in the app) instead of opening direct connections
+"""
+
+import threading
+import time
+import unittest
+from system_app import queries
+from system_app.app import app
+from system_app.queries import (
+    BlockingConnectionPool, PoolTimeoutError, get_database_url, get_connection_pool, get_pool_stats, query_db
+)
+
+
+class TestBlockingConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = BlockingConnectionPool(
+            minconn=1, maxconn=2, dsn=get_database_url(), timeout=0.2, max_age=1800, preping_idle=0
+        )
+
+    def tearDown(self):
+        self.pool.closeall()
+
+    def test_01_checkout_times_out_when_exhausted(self):
+        a = self.pool.getconn()
+        b = self.pool.getconn()
+        with self.assertRaises(PoolTimeoutError):
+            self.pool.getconn()
+        self.assertEqual(self.pool.stats()['timeouts'], 1)
+        self.assertEqual(self.pool.stats()['in_use'], 2)
+        self.pool.putconn(a)
+        self.pool.putconn(b)
+        self.assertEqual(self.pool.stats()['in_use'], 0)
+        self.assertEqual(self.pool.stats()['idle'], 2)
+
+    def test_02_waiting_checkout_gets_returned_connection(self):
+        a = self.pool.getconn()
+        b = self.pool.getconn()
+        threading.Timer(0.05, self.pool.putconn, args=(a,)).start()
+        c = self.pool.getconn(timeout=2)
+        self.assertIs(c, a)
+        self.assertGreater(self.pool.stats()['wait_ms_max'], 0)
+        self.pool.putconn(b)
+        self.pool.putconn(c)
+
+    def test_03_old_connections_are_recycled(self):
+        self.pool.max_age = 0.01
+        a = self.pool.getconn()
+        self.pool.putconn(a)
+        time.sleep(0.05)
+        b = self.pool.getconn()
+        self.assertGreaterEqual(self.pool.stats()['recycled'], 1)
+        with b.cursor() as cur:
+            cur.execute('SELECT 1')
+            self.assertEqual(cur.fetchone()[0], 1)
+        self.pool.putconn(b)
+
+    def test_04_preping_replaces_broken_connection(self):
+        a = self.pool.getconn()
+        killer = self.pool.getconn()
+        with a.cursor() as cur:
+            cur.execute('SELECT pg_backend_pid()')
+            pid = cur.fetchone()[0]
+        self.pool.putconn(a)
+        with killer.cursor() as cur:
+            cur.execute('SELECT pg_terminate_backend(%s)', (pid,))
+        killer.commit()
+        time.sleep(0.05)
+        b = self.pool.getconn()
+        with b.cursor() as cur:
+            cur.execute('SELECT 1')
+            self.assertEqual(cur.fetchone()[0], 1)
+        self.assertGreaterEqual(self.pool.stats()['preping_failures'], 1)
+        self.pool.putconn(b)
+        self.pool.putconn(killer)
+
+    def test_05_warm_up_opens_min_connections(self):
+        self.assertEqual(self.pool.warm_up(), 1)
+        stats = self.pool.stats()
+        self.assertEqual(stats['in_use'], 0)
+        self.assertGreaterEqual(stats['idle'], 1)
+
+    def test_06_shared_pool_exposes_stats(self):
+        self.assertIsNotNone(get_connection_pool())
+        stats = get_pool_stats()
+        for key in ('checkouts', 'wait_ms_avg', 'in_use', 'idle', 'direct_fallbacks', 'max_conn'):
+            self.assertIn(key, stats)
+
+    def test_07_saturated_pool_does_not_fall_back(self):
+        shared = get_connection_pool()
+        self.pool.timeout = 0.1
+        held = [self.pool.getconn(), self.pool.getconn()]
+        queries._connection_pool = self.pool
+        try:
+            with self.assertRaises(PoolTimeoutError):
+                query_db('SELECT 1 AS one', one=True)
+        finally:
+            queries._connection_pool = shared
+            for conn in held:
+                self.pool.putconn(conn)
+        self.assertEqual(self.pool.stats()['direct_fallbacks'], 0)
+
+        with app.test_request_context('/'):
+            response = app.make_response(app.handle_user_exception(PoolTimeoutError('busy')))
+        self.assertEqual(response.status_code, 503)
+
+
+if __name__ == '__main__':
+    unittest.main()
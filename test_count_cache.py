@@ -0,0 +1,144 @@
+"""
+test_count_cache.py
+
+Tests for cached / approximate listing totals (system_app.counts).
+
+Coverage:
+  - written_tables() finds INSERT/UPDATE/DELETE/TRUNCATE targets, including CTE writes
+  - Exact counts are cached per filter and reused without a query
+  - A committed query_db() or transaction() write invalidates the cached count
+  - Above COUNT_EXACT_LIMIT the planner estimate is returned as approximate
+  - /all_members shows "about N" when the total is approximate
+  - Counts live in app_cache: its stats and /admin/clear_cache cover them
+"""
+
+import unittest
+from system_app import counts
+from system_app.app import app
+from system_app.cache import app_cache
+from system_app.counts import count_rows, clear_count_cache
+from system_app.queries import query_db, transaction, _direct_connect
+from system_app.query_stats import query_budget, written_tables
+
+
+class TestCountCache(unittest.TestCase):
+
+    NAME_PREFIX = 'CountCache '
+    MEMBER_IDS = [88951, 88952, 88953]
+    WHERE = "name LIKE 'CountCache %%'"
+
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        self._old_limit = counts.COUNT_EXACT_LIMIT
+        self._cleanup()
+        clear_count_cache()
+        query_db(
+            """
+            INSERT INTO users (id, username, email, password, is_approved, permissions)
+            VALUES (88951, 'count_cache_user', 'count_cache@test.com', 'pwd', TRUE, '{"super_admin": true}')
+            ON CONFLICT (id) DO NOTHING
+            """,
+            commit=True,
+        )
+        query_db("INSERT INTO members (id, name) VALUES (88951, 'CountCache A')", commit=True)
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = 88951
+            sess['username'] = 'count_cache_user'
+
+    def tearDown(self):
+        counts.COUNT_EXACT_LIMIT = self._old_limit
+        self._cleanup()
+        query_db("DELETE FROM users WHERE id = 88951", commit=True)
+        clear_count_cache()
+
+    def _cleanup(self):
+        query_db("DELETE FROM members WHERE id = ANY(%s) OR name LIKE 'CountCache %%'", (self.MEMBER_IDS,), commit=True)
+
+    def test_01_written_tables(self):
+        self.assertEqual(written_tables("INSERT INTO members (id) VALUES (1) ON CONFLICT (id) DO UPDATE SET id = 1"),
+                         {'members'})
+        self.assertEqual(written_tables("WITH moved AS (DELETE FROM attendance RETURNING *) "
+                                        "INSERT INTO attendance_backup SELECT * FROM moved"),
+                         {'attendance', 'attendance_backup'})
+        self.assertEqual(written_tables("TRUNCATE TABLE attendance, member_logs"), {'attendance', 'member_logs'})
+        self.assertEqual(written_tables("UPDATE public.members SET name = 'x'"), {'members'})
+        self.assertEqual(written_tables("SELECT * FROM members WHERE id = 1 FOR UPDATE"), frozenset())
+
+    def test_02_exact_count_is_cached(self):
+        first = count_rows('members', self.WHERE)
+        self.assertEqual(first, {'count': 1, 'approximate': False})
+        with query_budget(0):
+            self.assertEqual(count_rows('members', self.WHERE), first)
+
+        # A write that bypasses query_db/transaction() is not seen until the TTL expires
+        conn = _direct_connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("INSERT INTO members (id, name) VALUES (88952, 'CountCache B')")
+            conn.commit()
+        finally:
+            conn.close()
+        self.assertEqual(count_rows('members', self.WHERE)['count'], 1)
+
+    def test_03_writes_invalidate(self):
+        self.assertEqual(count_rows('members', self.WHERE)['count'], 1)
+        query_db("INSERT INTO members (id, name) VALUES (88952, 'CountCache B')", commit=True)
+        self.assertEqual(count_rows('members', self.WHERE)['count'], 2)
+
+        with transaction() as cur:
+            cur.execute("INSERT INTO members (id, name) VALUES (88953, 'CountCache C')")
+        self.assertEqual(count_rows('members', self.WHERE)['count'], 3)
+
+        # Rolled back writes keep the cached value valid
+        with self.assertRaises(RuntimeError):
+            with transaction() as cur:
+                cur.execute("DELETE FROM members WHERE id = 88953")
+                raise RuntimeError("rollback")
+        with query_budget(0):
+            self.assertEqual(count_rows('members', self.WHERE)['count'], 3)
+
+    def test_04_estimate_above_limit(self):
+        query_db("ANALYZE members", commit=True)
+        exact = query_db("SELECT COUNT(*) AS count FROM members", one=True)['count']
+        counts.COUNT_EXACT_LIMIT = 1
+        clear_count_cache()
+        result = count_rows('members')
+        self.assertTrue(result['approximate'])
+        self.assertAlmostEqual(result['count'], exact, delta=max(5, exact // 10))
+
+        filtered = count_rows('members', 'id >= %s', (0,))
+        self.assertTrue(filtered['approximate'])
+        self.assertEqual(count_rows('members', 'id >= %s', (0,), exact=True),
+                         {'count': exact, 'approximate': False})
+
+    def test_05_all_members_shows_about(self):
+        query_db(
+            "INSERT INTO members (id, name) SELECT g, 'CountCache Page ' || g FROM generate_series(89301, 89420) AS g",
+            commit=True,
+        )
+        query_db("ANALYZE members", commit=True)
+        counts.COUNT_EXACT_LIMIT = 1
+        clear_count_cache()
+        data = self.client.get('/all_members?format=json').get_json()
+        self.assertTrue(data['count_approximate'])
+        self.assertGreater(data['total_pages'], 1)
+        html = self.client.get('/all_members').get_data(as_text=True)
+        self.assertIn('(about ', html)
+
+    def test_06_counts_live_in_app_cache(self):
+        hits = app_cache.stats()['hits']
+        count_rows('members', self.WHERE)
+        count_rows('members', self.WHERE)
+        self.assertEqual(len(app_cache.items(counts.COUNT_KEY_PREFIX)), 1)
+        self.assertEqual(app_cache.stats()['hits'], hits + 1)
+
+        with self.client.session_transaction() as sess:
+            sess['user_permissions'] = {'super_admin': True}
+        response = self.client.post('/admin/clear_cache')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(app_cache.items(counts.COUNT_KEY_PREFIX), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,7 @@ import unittest
 from flask import session
 from system_app.app import app
 from system_app.queries import query_db
+from system_app.query_stats import query_budget
 
 class TestCRMPhase1D(unittest.TestCase):
     def setUp(self):
@@ -168,8 +169,9 @@ class TestCRMPhase1D(unittest.TestCase):
 
         ids = [r1.get_json()['id'], r2.get_json()['id'], r3.get_json()['id']]
 
-        # 1. Successful bulk assignment
-        response = self.client.post('/crm/leads/bulk-assign', json={"lead_ids": ids, "user_id": 20003})
+        # 1. Successful bulk assignment (set-based: no per-lead queries)
+        with query_budget(max_queries=8, max_repeats=2):
+            response = self.client.post('/crm/leads/bulk-assign', json={"lead_ids": ids, "user_id": 20003})
         self.assertEqual(response.status_code, 200)
 
         # Verify all assigned
@@ -0,0 +1,108 @@
+"""
+test_current_user.py
+
+Tests for the shared, request-memoized current user (system_app.current_user).
+
+Coverage:
+  - Repeated get_current_user() calls in one request run one users query
+  - The row is reused by the next request and each request gets its own copy
+  - A permission edit on /user_permissions is seen by the very next request
+  - The core app and the CRM blueprint share one get_current_user
+  - A full CRM page reads the users table at most once
+"""
+
+import unittest
+from flask import session
+from system_app.app import app
+from system_app.cache import app_cache
+from system_app.crm import permissions as crm_permissions
+from system_app.current_user import get_current_user, _user_cache_key
+from system_app import app as core_app
+from system_app.queries import query_db
+from system_app.query_stats import query_budget
+
+
+class TestCurrentUser(unittest.TestCase):
+
+    USER_ID = 90601
+
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['WTF_CSRF_ENABLED'] = False
+        self.client = app.test_client()
+        query_db("DELETE FROM users WHERE id = %s", (self.USER_ID,), commit=True)
+        query_db(
+            """
+            INSERT INTO users (id, username, email, password, is_approved, permissions)
+            VALUES (%s, 'current_user_test', 'current_user@test.com', 'pwd', TRUE,
+                    '{"attendance": true, "crm_view": true, "crm_all_leads": true}')
+            """,
+            (self.USER_ID,),
+            commit=True,
+        )
+        app_cache.delete(_user_cache_key(self.USER_ID))
+
+    def tearDown(self):
+        query_db("DELETE FROM users WHERE id = %s", (self.USER_ID,), commit=True)
+        app_cache.delete(_user_cache_key(self.USER_ID))
+
+    def _user_queries(self, budget):
+        return [fp for fp in budget.fingerprints if 'from users' in fp.lower()]
+
+    def test_01_memoized_per_request(self):
+        with app.test_request_context('/'):
+            session['user_id'] = self.USER_ID
+            with query_budget() as budget:
+                for _ in range(3):
+                    user = get_current_user()
+            self.assertEqual(user['username'], 'current_user_test')
+            self.assertTrue(user['permissions']['crm_view'])
+            self.assertEqual(budget.count, 1)
+
+    def test_02_cached_across_requests_as_copies(self):
+        with app.test_request_context('/'):
+            session['user_id'] = self.USER_ID
+            get_current_user()['permissions']['super_admin'] = True  # a caller scribbling on its copy
+        with app.test_request_context('/'):
+            session['user_id'] = self.USER_ID
+            with query_budget(0):
+                user = get_current_user()
+            self.assertNotIn('super_admin', user['permissions'])
+
+    def test_03_permission_edit_visible_immediately(self):
+        with app.test_request_context('/'):
+            session['user_id'] = self.USER_ID
+            self.assertTrue(get_current_user()['permissions']['attendance'])
+
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['username'] = 'rino'
+        response = self.client.post('/user_permissions', data={
+            'user_id': str(self.USER_ID),
+            'is_approved': 'on',
+            'perms': ['attendance', 'members_view'],
+        })
+        self.assertEqual(response.status_code, 302)
+
+        with app.test_request_context('/'):
+            session['user_id'] = self.USER_ID
+            perms = get_current_user()['permissions']
+        self.assertTrue(perms['members_view'])
+        self.assertFalse(perms['crm_view'])
+
+    def test_04_shared_with_crm(self):
+        self.assertIs(crm_permissions.get_current_user, get_current_user)
+        self.assertIs(core_app.get_current_user, get_current_user)
+
+    def test_05_crm_page_reads_users_once(self):
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = self.USER_ID
+            sess['username'] = 'current_user_test'
+        with query_budget() as budget:
+            response = self.client.get('/crm/')
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(self._user_queries(budget)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+"""
+test_dashboard_snapshot.py
+
+Tests for the consolidated dashboard aggregates (system_app.dashboard.DashboardSnapshot).
+
+Coverage:
+  - A cold snapshot takes two queries
+  - Member buckets match the shared status / expiry predicates
+  - This / last month revenue and the per-package rows come from one renewal_logs pass
+  - get_common_template_context serves the cached snapshot but keeps pending approvals live
+"""
+
+import unittest
+from datetime import timedelta
+from flask import session
+from system_app.cache import app_cache
+from system_app.app import app, get_common_template_context
+from system_app.dashboard import DashboardSnapshot, _month_start
+from system_app.func import get_cairo_date
+from system_app.membership_status import active_predicate, expired_predicate, expiring_within_predicate
+from system_app.queries import query_db, get_monthly_total, _direct_connect
+from system_app.query_stats import query_budget
+
+
+class TestDashboardSnapshot(unittest.TestCase):
+
+    MEMBER_IDS = [90301, 90302, 90303]
+    PACKAGE = 'Snapshot Test Package'
+
+    def setUp(self):
+        self.today = get_cairo_date()
+        self._cleanup()
+        app_cache.delete(f'dashboard_snapshot:{self.today}')
+        query_db(
+            """
+            INSERT INTO members (id, name, end_date) VALUES
+            (90301, 'Snapshot Urgent', %s),
+            (90302, 'Snapshot Upcoming', %s),
+            (90303, 'Snapshot Expired', %s)
+            """,
+            ((self.today + timedelta(days=3)).isoformat(), (self.today + timedelta(days=20)).isoformat(),
+             (self.today - timedelta(days=3)).isoformat()),
+            commit=True,
+        )
+        last_month = _month_start(self.today.year, self.today.month - 1)
+        query_db(
+            """
+            INSERT INTO renewal_logs (member_id, package_name, renewal_date, fees, edited_by) VALUES
+            (90301, %s, %s, 1000000, 'snapshot_test'),
+            (90302, %s, %s, 500000, 'snapshot_test'),
+            (90303, %s, %s, 250000, 'snapshot_test')
+            """,
+            (self.PACKAGE, self.today, self.PACKAGE, self.today, self.PACKAGE, last_month),
+            commit=True,
+        )
+
+    def tearDown(self):
+        self._cleanup()
+        app_cache.delete(f'dashboard_snapshot:{self.today}')
+
+    def _cleanup(self):
+        query_db("DELETE FROM pending_member_edits WHERE requested_by = 'snapshot_test'", commit=True)
+        query_db("DELETE FROM renewal_logs WHERE edited_by = 'snapshot_test'", commit=True)
+        query_db("DELETE FROM members WHERE id = ANY(%s)", (self.MEMBER_IDS,), commit=True)
+
+    def _count(self, where):
+        return query_db(f"SELECT COUNT(*) AS count FROM members WHERE {where}", one=True)['count']
+
+    def test_01_cold_snapshot_takes_two_queries(self):
+        with query_budget(2):
+            DashboardSnapshot.load(self.today)
+
+    def test_02_member_buckets(self):
+        snapshot = DashboardSnapshot.load(self.today)
+        for days in (7, 14, 30):
+            self.assertEqual(snapshot.expiring[days], self._count(expiring_within_predicate(days)))
+        self.assertEqual(snapshot.active_count, self._count(active_predicate()))
+        self.assertEqual(snapshot.expired_count, self._count(expired_predicate(include_unknown=True)))
+        self.assertGreaterEqual(snapshot.expiring[7], 1)
+        self.assertGreaterEqual(snapshot.expiring[30], 1)
+
+    def test_03_revenue(self):
+        snapshot = DashboardSnapshot.load(self.today)
+        last_month = _month_start(self.today.year, self.today.month - 1)
+        self.assertAlmostEqual(snapshot.revenue_this_month, get_monthly_total(self.today.year, self.today.month))
+        self.assertAlmostEqual(snapshot.revenue_last_month, get_monthly_total(last_month.year, last_month.month))
+
+        top = snapshot.revenue_by_package[0]
+        self.assertEqual(top['package_name'], self.PACKAGE)
+        self.assertEqual(top['count'], 2)
+        self.assertAlmostEqual(top['total_revenue'], 1500000)
+
+    def test_04_context_keeps_pending_live(self):
+        with app.test_request_context('/'):
+            session['username'] = 'rino'
+            first = get_common_template_context()
+            self.assertEqual(first['expiring_7_days'], self._count(expiring_within_predicate(7)))
+            self.assertEqual(first['total_active_members'], first['active_count'])
+
+            # Written by another worker: this process's snapshot stays cached
+            conn = _direct_connect()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        INSERT INTO pending_member_edits (member_id, requested_by, old_data, new_data)
+                        VALUES (90301, 'snapshot_test', '{}', '{}')
+                    """)
+                conn.commit()
+            finally:
+                conn.close()
+            with query_budget(1):
+                second = get_common_template_context()
+            self.assertEqual(second['pending_approvals_count'], first['pending_approvals_count'] + 1)
+            self.assertEqual(second['pending_edits_count'], second['pending_approvals_count'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+"""
+test_keyset_pagination.py
+
+Tests for keyset (cursor) pagination of member, log and CRM listings.
+
+Coverage:
+  - encode_cursor / decode_cursor round trip; bad or foreign-scope tokens decode to None
+  - /filtered_members JSON: walking next_cursor returns every row once, in order
+  - /all_members JSON: cursor walk on a nullable sort column with id tie-breaker
+  - /all_members JSON: a fractional REAL fee tied across page boundaries is listed once, both directions
+  - /logs JSON: cursor walk; an invalid cursor falls back to the first page
+  - /crm/leads and lead activities: cursor walk skips the COUNT (total is None)
+"""
+
+import unittest
+from datetime import datetime, timedelta, timezone
+from system_app.app import app
+from system_app.queries import query_db
+from system_app.pagination import encode_cursor, decode_cursor
+
+
+class TestKeysetPagination(unittest.TestCase):
+
+    FIRST_ID = 88901
+    MEMBER_COUNT = 230
+    USER_ID = 88901
+    LEAD_IDS = list(range(88901, 88906))
+
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        self._cleanup()
+        query_db(
+            """
+            INSERT INTO users (id, username, email, password, is_approved, permissions)
+            VALUES (%s, 'keyset_user', 'keyset@test.com', 'pwd', TRUE, '{"super_admin": true}')
+            ON CONFLICT (id) DO NOTHING
+            """,
+            (self.USER_ID,),
+            commit=True,
+        )
+        # Every third member has no age, so the age sort has long runs of tied keys
+        query_db(
+            """
+            INSERT INTO members (id, name, phone, age, end_date)
+            SELECT g, 'Keyset Member ' || LPAD(g::text, 6, '0'), '0100' || g,
+                   CASE WHEN g %% 3 = 0 THEN NULL ELSE g %% 7 END, '2030-01-01'
+            FROM generate_series(%s, %s) AS g
+            """,
+            (self.FIRST_ID, self.FIRST_ID + self.MEMBER_COUNT - 1),
+            commit=True,
+        )
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = self.USER_ID
+            sess['username'] = 'keyset_user'
+
+    def tearDown(self):
+        self._cleanup()
+        query_db("DELETE FROM users WHERE id = %s", (self.USER_ID,), commit=True)
+
+    def _cleanup(self):
+        query_db("DELETE FROM crm_activities WHERE lead_id = ANY(%s)", (self.LEAD_IDS,), commit=True)
+        query_db("DELETE FROM crm_leads WHERE id = ANY(%s)", (self.LEAD_IDS,), commit=True)
+        query_db("DELETE FROM members WHERE name LIKE 'Keyset Member %%'", commit=True)
+
+    def _walk(self, url, key, params=None):
+        """Follows next_cursor until has_more is False; returns (pages, rows)."""
+        params = dict(params or {}, format='json')
+        response = self.client.get(url, query_string=params)
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        pages, rows = [data], list(data[key])
+        while data['has_more']:
+            self.assertLess(len(pages), 200, 'cursor walk is not advancing')
+            response = self.client.get(url, query_string=dict(params, cursor=data['next_cursor']))
+            self.assertEqual(response.status_code, 200)
+            data = response.get_json()
+            pages.append(data)
+            rows.extend(data[key])
+        return pages, rows
+
+    def test_01_cursor_round_trip(self):
+        token = encode_cursor([datetime(2026, 1, 2, 3, 4, 5), 7], 'scope')
+        self.assertEqual(decode_cursor(token, 'scope'), ['2026-01-02T03:04:05', 7])
+        self.assertIsNone(decode_cursor(token, 'other'))
+        self.assertIsNone(decode_cursor(token, 'scope', size=1))
+        self.assertIsNone(decode_cursor('not-a-token!', 'scope'))
+        self.assertIsNone(decode_cursor('', 'scope'))
+
+    def test_02_filtered_members_cursor_walk(self):
+        pages, rows = self._walk('/filtered_members', 'members', {'search_name': 'Keyset Member'})
+        ids = [row['id'] for row in rows]
+        self.assertEqual(ids, list(range(self.FIRST_ID, self.FIRST_ID + self.MEMBER_COUNT)))
+        self.assertGreater(len(pages), 2)
+        self.assertEqual(pages[0]['total_count'], self.MEMBER_COUNT)
+        self.assertIsNone(pages[1]['total_count'])
+        self.assertIsNone(pages[-1]['next_cursor'])
+
+    def test_03_all_members_cursor_walk_with_ties(self):
+        _, rows = self._walk('/all_members', 'members', {'sort_by': 'age', 'sort_dir': 'desc'})
+        ours = [row for row in rows if row['name'].startswith('Keyset Member')]
+        self.assertEqual(len(ours), self.MEMBER_COUNT)
+        self.assertEqual(len({row['id'] for row in rows}), len(rows))
+        keys = [(-1 if row['age'] is None else row['age'], row['id']) for row in rows]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+
+    def test_03b_all_members_cursor_walk_on_real_fees(self):
+        # 12.3 has no exact float4 form: the cursor must compare as REAL, not double precision
+        query_db("UPDATE members SET membership_fees = 12.3 WHERE name LIKE 'Keyset Member %%'", commit=True)
+        for sort_dir in ('asc', 'desc'):
+            pages, rows = self._walk('/all_members', 'members', {'sort_by': 'membership_fees', 'sort_dir': sort_dir})
+            ours = [row['id'] for row in rows if row['name'].startswith('Keyset Member')]
+            self.assertGreater(len(pages), 2)
+            self.assertEqual(sorted(ours), list(range(self.FIRST_ID, self.FIRST_ID + self.MEMBER_COUNT)))
+            self.assertEqual(len({row['id'] for row in rows}), len(rows))
+
+    def test_04_logs_cursor_walk_and_invalid_cursor(self):
+        query_db(
+            """
+            INSERT INTO member_logs (member_id, member_name, field_name, old_value, new_value, edited_by)
+            SELECT %s, 'Keyset Member', 'phone', g::text, (g + 1)::text, 'keyset_user'
+            FROM generate_series(1, 120) AS g
+            """,
+            (self.FIRST_ID,),
+            commit=True,
+        )
+        _, rows = self._walk('/logs', 'logs', {'member_id': self.FIRST_ID})
+        self.assertEqual([row['old_value'] for row in rows], [str(i) for i in range(1, 121)])
+
+        first = self.client.get('/logs', query_string={'member_id': self.FIRST_ID, 'format': 'json'}).get_json()
+        bogus = self.client.get('/logs', query_string={
+            'member_id': self.FIRST_ID, 'format': 'json',
+            'cursor': encode_cursor([0], 'filtered_members'),
+        }).get_json()
+        self.assertEqual([row['id'] for row in bogus['logs']], [row['id'] for row in first['logs']])
+
+    def test_05_crm_leads_and_activities_cursor(self):
+        base = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        for offset, lead_id in enumerate(self.LEAD_IDS):
+            # Two leads share a created_at so the id tie-breaker is exercised
+            created_at = base + timedelta(minutes=min(offset, 3))
+            query_db(
+                """
+                INSERT INTO crm_leads (id, name, phone, source, stage, created_by_user_id, created_at)
+                VALUES (%s, %s, %s, 'WALK_IN', 'NEW', %s, %s)
+                """,
+                (lead_id, f'Keyset Lead {lead_id}', f'0111{lead_id}', self.USER_ID, created_at),
+                commit=True,
+            )
+        for minute in range(5):
+            query_db(
+                """
+                INSERT INTO crm_activities (lead_id, user_id, activity_type, note, created_at)
+                VALUES (%s, %s, 'NOTE', %s, %s)
+                """,
+                (self.LEAD_IDS[0], self.USER_ID, f'note {minute}', base + timedelta(minutes=minute)),
+                commit=True,
+            )
+
+        seen, cursor = [], None
+        while True:
+            params = {'search': 'Keyset Lead', 'per_page': 2}
+            if cursor:
+                params['cursor'] = cursor
+            data = self.client.get('/crm/leads', query_string=params).get_json()
+            if cursor:
+                self.assertIsNone(data['total'])
+            seen.extend(row['id'] for row in data['items'])
+            cursor = data['next_cursor']
+            if not data['has_more']:
+                break
+        self.assertEqual(seen, sorted(self.LEAD_IDS, key=lambda i: (min(i - self.LEAD_IDS[0], 3), i), reverse=True))
+
+        url = f'/crm/leads/{self.LEAD_IDS[0]}/activities'
+        first = self.client.get(url, query_string={'per_page': 3}).get_json()
+        second = self.client.get(url, query_string={'per_page': 3, 'cursor': first['next_cursor']}).get_json()
+        notes = [row['note'] for row in first['items'] + second['items']]
+        self.assertEqual(notes, [f'note {minute}' for minute in range(4, -1, -1)])
+        self.assertFalse(second['has_more'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+"""
+test_member_typed_dates.py
+
+Regression tests for the typed DATE mirrors of the member date columns.
+
+Coverage:
+  - Trigger derives end_date_d / starting_date_d / actual_starting_date_d / birthdate_d on insert
+  - Typed columns follow legacy TEXT updates (add_member, update_member, raw UPDATE)
+  - Malformed, blank and impossible dates map to NULL instead of failing the write
+  - Active / expired filters on filtered_members use the typed column
+"""
+
+import unittest
+from datetime import date, timedelta
+from system_app.app import app
+from system_app.queries import query_db, add_member, update_member
+from system_app.func import get_cairo_date
+
+
+def _typed_row(member_id):
+    return query_db(
+        "SELECT end_date_d, starting_date_d, actual_starting_date_d, birthdate_d FROM members WHERE id = %s",
+        (member_id,),
+        one=True,
+    )
+
+
+class TestMemberTypedDates(unittest.TestCase):
+
+    MEMBER_IDS = [88101, 88102, 88103, 88104]
+
+    def setUp(self):
+        self.app = app
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        self._cleanup()
+        query_db(
+            """
+            INSERT INTO users (id, username, email, password, is_approved, permissions)
+            VALUES (88001, 'typed_dates_user', 'typed_dates@test.com', 'pwd', TRUE,
+                    '{"super_admin": true}')
+            ON CONFLICT (id) DO NOTHING
+            """,
+            commit=True,
+        )
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = 88001
+            sess['username'] = 'typed_dates_user'
+
+    def tearDown(self):
+        self._cleanup()
+        query_db("DELETE FROM users WHERE id = 88001", commit=True)
+
+    def _cleanup(self):
+        query_db("DELETE FROM member_logs WHERE member_id = ANY(%s)", (self.MEMBER_IDS,), commit=True)
+        query_db("DELETE FROM members WHERE id = ANY(%s)", (self.MEMBER_IDS,), commit=True)
+
+    def test_01_add_member_populates_typed_columns(self):
+        add_member(
+            'Typed Dates One', None, '0100088101', 30, 'male', '1995-04-02',
+            '2026-01-05', '2026-01-05', '2026-02-05 00:00:00', '1 Month', 500.0, 'VAL',
+            custom_id=88101,
+        )
+        row = _typed_row(88101)
+        self.assertEqual(row['end_date_d'], date(2026, 2, 5))
+        self.assertEqual(row['starting_date_d'], date(2026, 1, 5))
+        self.assertEqual(row['actual_starting_date_d'], date(2026, 1, 5))
+        self.assertEqual(row['birthdate_d'], date(1995, 4, 2))
+
+    def test_02_update_member_keeps_typed_columns_in_sync(self):
+        add_member(
+            'Typed Dates Two', None, '0100088102', 30, 'male', None,
+            '2026-01-05', '2026-01-05', '2026-02-05', '1 Month', 500.0, 'VAL',
+            custom_id=88102,
+        )
+        update_member(88102, end_date='2026-03-10', edited_by='typed_dates_user')
+        self.assertEqual(_typed_row(88102)['end_date_d'], date(2026, 3, 10))
+
+        query_db("UPDATE members SET end_date = %s WHERE id = %s", ('2027-01-01', 88102), commit=True)
+        self.assertEqual(_typed_row(88102)['end_date_d'], date(2027, 1, 1))
+
+    def test_03_invalid_dates_map_to_null(self):
+        for member_id, end_date in ((88103, 'not-a-date'), (88104, '2026-13-45')):
+            query_db(
+                "INSERT INTO members (id, name, phone, end_date, birthdate) VALUES (%s, %s, %s, %s, %s)",
+                (member_id, f'Typed Invalid {member_id}', f'01000{member_id}', end_date, '   '),
+                commit=True,
+            )
+            row = _typed_row(member_id)
+            self.assertIsNone(row['end_date_d'])
+            self.assertIsNone(row['birthdate_d'])
+
+    def test_04_direct_typed_writes_are_rederived(self):
+        query_db(
+            "INSERT INTO members (id, name, phone, end_date) VALUES (88101, 'Typed Direct', '0100088101', '2026-05-01')",
+            commit=True,
+        )
+        query_db("UPDATE members SET end_date_d = '1999-01-01' WHERE id = 88101", commit=True)
+        self.assertEqual(_typed_row(88101)['end_date_d'], date(2026, 5, 1))
+
+    def test_05_filtered_members_views_use_typed_column(self):
+        today = get_cairo_date()
+        query_db(
+            "INSERT INTO members (id, name, phone, end_date) VALUES (%s, 'Typed Active', '0100088101', %s)",
+            (88101, (today + timedelta(days=3)).strftime('%Y-%m-%d')),
+            commit=True,
+        )
+        query_db(
+            "INSERT INTO members (id, name, phone, end_date) VALUES (%s, 'Typed Expired', '0100088102', %s)",
+            (88102, (today - timedelta(days=3)).strftime('%Y-%m-%d')),
+            commit=True,
+        )
+
+        active = self.client.get('/filtered_members?view=active&search_name=Typed&format=json').get_json()
+        expired = self.client.get('/filtered_members?view=expired&search_name=Typed&format=json').get_json()
+        self.assertEqual({m['id'] for m in active['members']}, {88101})
+        self.assertEqual({m['id'] for m in expired['members']}, {88102})
+
+
+if __name__ == '__main__':
+    unittest.main()
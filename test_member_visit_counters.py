@@ -0,0 +1,175 @@
+"""
+test_member_visit_counters.py
+
+Tests for the denormalized members.last_visit_at / visits_30d / visits_90d columns.
+
+Coverage:
+  - Single and batch check-ins bump last_visit_at and both counters
+  - The nightly refresh recounts the rolling windows from the archive
+  - The refresh walks last_visit_at back when the latest visit was deleted
+  - no_visit_days / min_visits_30d filter the members page and the CRM bulk selection
+  - "Active with no visit in N days" is served by the last_visit_at index
+  - A check-in drops cached counts and page data built from members
+"""
+
+import unittest
+from datetime import timedelta
+from system_app.app import app
+from system_app.cache import app_cache
+from system_app.counts import count_rows
+from system_app.attendance_services import (
+    check_in_member, ingest_attendance_batch, refresh_member_visit_stats, INGEST_ACCEPTED, reset_checked_in_today,
+)
+from system_app.crm.queries import get_member_ids_by_filters
+from system_app.crm.validators import validate_bulk_member_filters
+from system_app.func import get_cairo_now
+from system_app.membership_status import active_predicate, no_visit_predicate
+from system_app.queries import query_db, transaction
+
+
+class TestMemberVisitCounters(unittest.TestCase):
+
+    MEMBER_IDS = [90201, 90202, 90203]
+
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        self._cleanup()
+        query_db(
+            """
+            INSERT INTO users (id, username, email, password, is_approved, permissions)
+            VALUES (90201, 'visit_counters_user', 'visit_counters@test.com', 'pwd', TRUE, '{"super_admin": true}')
+            ON CONFLICT (id) DO NOTHING
+            """,
+            commit=True,
+        )
+        query_db(
+            """
+            INSERT INTO members (id, name, end_date) VALUES
+            (90201, 'Counter Regular', '2099-01-01'),
+            (90202, 'Counter Lapsed', '2099-01-01'),
+            (90203, 'Counter Never', '2099-01-01')
+            """,
+            commit=True,
+        )
+
+    def tearDown(self):
+        self._cleanup()
+        query_db("DELETE FROM users WHERE id = 90201", commit=True)
+
+    def _cleanup(self):
+        query_db("DELETE FROM attendance_ingest_events WHERE client_event_id LIKE 'visit-counters-%%'", commit=True)
+        query_db("DELETE FROM attendance_backup WHERE member_id = ANY(%s)", (self.MEMBER_IDS,), commit=True)
+        query_db("DELETE FROM action_logs WHERE member_id = ANY(%s)", (self.MEMBER_IDS,), commit=True)
+        query_db("DELETE FROM attendance WHERE member_id = ANY(%s)", (self.MEMBER_IDS,), commit=True)
+        query_db("DELETE FROM members WHERE id = ANY(%s)", (self.MEMBER_IDS,), commit=True)
+
+    def _member(self, member_id):
+        return query_db("SELECT last_visit_at, visits_30d, visits_90d FROM members WHERE id = %s",
+                        (member_id,), one=True)
+
+    def _archive_visits(self, member_id, days_ago):
+        """Files visits `days_ago` days back straight into the archive partitions."""
+        now = get_cairo_now()
+        for days in days_ago:
+            at = now - timedelta(days=days)
+            query_db("SELECT ensure_attendance_backup_partition(%s)", (at.date().replace(day=1),), commit=True)
+            query_db(
+                """
+                INSERT INTO attendance_backup (member_id, name, attendance_date, attendance_time, attendance_day, checked_in_at)
+                VALUES (%s, 'Counter', %s, %s, %s, %s)
+                """,
+                (member_id, at.strftime('%Y-%m-%d'), at.strftime('%H:%M:%S'), at.date(), at),
+                commit=True,
+            )
+
+    def test_01_check_ins_bump_counters(self):
+        self.assertEqual(self._member(90201), {'last_visit_at': None, 'visits_30d': 0, 'visits_90d': 0})
+
+        check_in_member(90201, performed_by='test')
+        member = self._member(90201)
+        self.assertEqual((member['visits_30d'], member['visits_90d']), (1, 1))
+        self.assertLess(abs((member['last_visit_at'] - get_cairo_now()).total_seconds()), 60)
+
+        scanned_at = get_cairo_now().replace(tzinfo=None).isoformat(timespec='seconds')
+        result = ingest_attendance_batch(
+            [{'event_id': 'visit-counters-1', 'member_id': 90202, 'scanned_at': scanned_at}],
+            performed_by='test',
+        )
+        self.assertEqual(result[0]['status'], INGEST_ACCEPTED)
+        self.assertEqual(self._member(90202)['visits_30d'], 1)
+
+    def test_02_nightly_refresh_recounts_windows(self):
+        self._archive_visits(90201, [2, 10, 45, 120])
+        query_db("UPDATE members SET visits_30d = 99, visits_90d = 99, last_visit_at = NULL WHERE id = 90201",
+                 commit=True)
+
+        refresh_member_visit_stats()
+        member = self._member(90201)
+        self.assertEqual((member['visits_30d'], member['visits_90d']), (2, 3))
+        self.assertEqual(member['last_visit_at'].date(), (get_cairo_now() - timedelta(days=2)).date())
+
+        # Nothing left to change on a second run for this member
+        refresh_member_visit_stats()
+        self.assertEqual(self._member(90201), member)
+
+    def test_03_refresh_after_deleted_visit(self):
+        self._archive_visits(90201, [5, 120])
+        refresh_member_visit_stats()
+        query_db("DELETE FROM attendance_backup WHERE member_id = 90201 AND attendance_day > %s",
+                 ((get_cairo_now() - timedelta(days=30)).date(),), commit=True)
+
+        refresh_member_visit_stats()
+        member = self._member(90201)
+        self.assertEqual((member['visits_30d'], member['visits_90d']), (0, 0))
+        self.assertEqual(member['last_visit_at'].date(), (get_cairo_now() - timedelta(days=120)).date())
+
+    def test_04_member_filters(self):
+        self._archive_visits(90201, [1, 3, 5])
+        self._archive_visits(90202, [40])
+        refresh_member_visit_stats()
+
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = 90201
+            sess['username'] = 'visit_counters_user'
+        response = self.client.get('/filtered_members?view=active&no_visit_days=14&search_name=Counter&format=json')
+        ids = [m['id'] for m in response.get_json()['members']]
+        self.assertEqual(ids, [90202, 90203])
+
+        response = self.client.get('/filtered_members?min_visits_30d=3&search_name=Counter&format=json')
+        self.assertEqual([m['id'] for m in response.get_json()['members']], [90201])
+
+        filters = validate_bulk_member_filters({'view': 'active', 'no_visit_days': '14', 'search_name': 'Counter'})
+        self.assertEqual(get_member_ids_by_filters(filters), [90202, 90203])
+        filters = validate_bulk_member_filters({'min_visits_90d': 1, 'search_name': 'Counter'})
+        self.assertEqual(get_member_ids_by_filters(filters), [90201, 90202])
+
+        with self.assertRaises(ValueError):
+            validate_bulk_member_filters({'no_visit_days': '0'})
+        with self.assertRaises(ValueError):
+            validate_bulk_member_filters({'min_visits_30d': 'many'})
+
+    def _plan(self, where):
+        with transaction() as cur:
+            cur.execute("SET LOCAL enable_seqscan = off")
+            cur.execute(f"EXPLAIN SELECT id FROM members WHERE {where}")
+            return '\n'.join(row['QUERY PLAN'] for row in cur.fetchall())
+
+    def test_05_inactive_filter_uses_index(self):
+        self.assertIn('idx_members_last_visit_at', self._plan(no_visit_predicate(14)))
+        self.assertNotIn('Seq Scan', self._plan(f"{active_predicate()} AND {no_visit_predicate(14)}"))
+
+    def test_06_check_in_invalidates_member_caches(self):
+        where = f"id BETWEEN 90201 AND 90203 AND {no_visit_predicate(30)}"
+        self.assertEqual(count_rows('members', where, exact=True)['count'], 3)
+        app_cache.set('visit_counters_page', 'cached', ttl=60, tags=['members'])
+
+        # The trigger writes members, though the statement only names attendance
+        reset_checked_in_today()  # test_01 already checked 90201 in within this process
+        check_in_member(90201, performed_by='visit_counters_user')
+        self.assertEqual(count_rows('members', where, exact=True)['count'], 2)
+        self.assertIsNone(app_cache.get('visit_counters_page'))
+
+
+if __name__ == '__main__':
+    unittest.main()
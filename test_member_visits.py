@@ -0,0 +1,138 @@
+"""
+test_member_visits.py
+
+Tests for the member visit history (get_member_visits, get_member_visit_heatmap, /member_visits).
+
+Coverage:
+  - Visits from today's table and the archive are merged newest first
+  - Keyset pages walk the whole history without gaps or repeats, one statement per page
+  - from / to limit the history to a date range
+  - The heatmap bitmap has one bit per visited day
+  - The page renders and the JSON API pages with cursors and rejects bad dates
+"""
+
+import base64
+import unittest
+from datetime import date, datetime, timedelta
+from system_app.app import app
+from system_app.attendance_services import check_in_member, get_member_visits, get_member_visit_heatmap
+from system_app.queries import query_db
+from system_app.query_stats import query_budget
+
+
+class TestMemberVisits(unittest.TestCase):
+
+    MEMBER_ID = 90101
+    FIRST_DAY = date(1995, 1, 1)
+    LAST_DAY = date(1996, 12, 31)
+
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        self._cleanup()
+        query_db(
+            """
+            INSERT INTO users (id, username, email, password, is_approved, permissions)
+            VALUES (90101, 'visits_user', 'visits@test.com', 'pwd', TRUE, '{"super_admin": true}')
+            ON CONFLICT (id) DO NOTHING
+            """,
+            commit=True,
+        )
+        query_db("INSERT INTO members (id, name, end_date) VALUES (90101, 'Visits Member', '2030-01-01')",
+                 commit=True)
+        query_db(
+            """
+            SELECT ensure_attendance_backup_partition(month::DATE)
+            FROM generate_series(%s::DATE, %s::DATE, INTERVAL '1 month') AS month
+            """,
+            (self.FIRST_DAY, self.LAST_DAY),
+            commit=True,
+        )
+        # A visit every third day for two years, archived
+        query_db(
+            """
+            INSERT INTO attendance_backup (member_id, name, attendance_date, attendance_time, day, attendance_day)
+            SELECT %s, 'Visits Member', to_char(d, 'YYYY-MM-DD'), '07:00:00', to_char(d, 'FMDay'), d::DATE
+            FROM generate_series(%s::DATE, %s::DATE, INTERVAL '3 days') AS d
+            """,
+            (self.MEMBER_ID, self.FIRST_DAY, self.LAST_DAY),
+            commit=True,
+        )
+        self.archived_days = [self.FIRST_DAY + timedelta(days=i)
+                              for i in range(0, (self.LAST_DAY - self.FIRST_DAY).days + 1, 3)]
+        # ...and one in today's table
+        check_in_member(self.MEMBER_ID, now=datetime(1997, 1, 5, 9, 0))
+
+    def tearDown(self):
+        self._cleanup()
+        query_db("DELETE FROM users WHERE id = 90101", commit=True)
+
+    def _cleanup(self):
+        query_db("DELETE FROM attendance_backup WHERE member_id = %s", (self.MEMBER_ID,), commit=True)
+        partitions = query_db(
+            """
+            SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'attendance_backup'::regclass
+              AND (c.relname LIKE 'attendance_backup_y1995%%' OR c.relname LIKE 'attendance_backup_y1996%%')
+            """
+        ) or []
+        for partition in partitions:
+            query_db(f'DROP TABLE "{partition["relname"]}"', commit=True)
+        query_db("DELETE FROM action_logs WHERE member_id = %s", (self.MEMBER_ID,), commit=True)
+        query_db("DELETE FROM attendance WHERE member_id = %s", (self.MEMBER_ID,), commit=True)
+        query_db("DELETE FROM members WHERE id = %s", (self.MEMBER_ID,), commit=True)
+
+    def test_01_pages_walk_full_history(self):
+        seen, cursor, pages = [], None, 0
+        while True:
+            with query_budget(1):
+                page = get_member_visits(self.MEMBER_ID, cursor=cursor, limit=50)
+            seen.extend(page['visits'])
+            pages += 1
+            if not page['has_more']:
+                break
+            cursor = page['next_cursor']
+
+        self.assertEqual(pages, (len(self.archived_days) + 1 + 49) // 50)
+        self.assertEqual(seen[0]['source'], 'today')
+        self.assertEqual(seen[0]['visit_day'], '1997-01-05')
+        archived = [visit['visit_day'] for visit in seen[1:]]
+        self.assertEqual(archived, [day.isoformat() for day in reversed(self.archived_days)])
+
+    def test_02_date_range(self):
+        page = get_member_visits(self.MEMBER_ID, date_from=date(1996, 3, 1), date_to=date(1996, 3, 31), limit=200)
+        expected = [d.isoformat() for d in reversed(self.archived_days) if d.year == 1996 and d.month == 3]
+        self.assertEqual([visit['visit_day'] for visit in page['visits']], expected)
+        self.assertFalse(page['has_more'])
+
+    def test_03_heatmap_bitmap(self):
+        heatmap = get_member_visit_heatmap(self.MEMBER_ID, end=self.LAST_DAY, days=365)
+        start = date.fromisoformat(heatmap['start'])
+        bits = base64.b64decode(heatmap['bitmap'])
+        self.assertEqual(len(bits), 46)
+        visited = [start + timedelta(days=i) for i in range(365) if bits[i // 8] & (1 << (i % 8))]
+        self.assertEqual(visited, [d for d in self.archived_days if d >= start])
+        self.assertEqual(heatmap['visit_days'], len(visited))
+
+    def test_04_page_and_api(self):
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = 90101
+            sess['username'] = 'visits_user'
+
+        html = self.client.get(f'/member_visits/{self.MEMBER_ID}').get_data(as_text=True)
+        self.assertIn('visit-heatmap', html)
+        self.assertIn('1997-01-05', html)
+
+        first = self.client.get(f'/api/member_visits/{self.MEMBER_ID}?limit=10').get_json()
+        self.assertEqual(len(first['visits']), 10)
+        self.assertIn('heatmap', first)
+        second = self.client.get(
+            f"/api/member_visits/{self.MEMBER_ID}?limit=10&cursor={first['next_cursor']}").get_json()
+        self.assertNotIn('heatmap', second)
+        self.assertLess(second['visits'][0]['visit_day'], first['visits'][-1]['visit_day'])
+
+        self.assertEqual(self.client.get(f'/api/member_visits/{self.MEMBER_ID}?from=bad').status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
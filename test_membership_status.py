@@ -0,0 +1,79 @@
+"""
+test_membership_status.py
+
+Regression tests for the shared membership status SQL predicates.
+
+Coverage:
+  - Expiry buckets are disjoint and cover today..today+30
+  - Active / expired(+unknown) partition every member
+  - CRM bulk filters and filtered_members use the identical predicate text
+  - Partial status indexes exist
+"""
+
+import unittest
+from datetime import timedelta
+from system_app.app import app
+from system_app.queries import query_db
+from system_app.func import get_cairo_date
+from system_app.membership_status import (
+    active_predicate, expired_predicate, view_predicate, expiring_within_predicate
+)
+from system_app.crm.queries import _build_member_bulk_filter_components
+
+
+class TestMembershipStatusPredicates(unittest.TestCase):
+
+    OFFSETS = {88201: -1, 88202: 0, 88203: 7, 88204: 8, 88205: 14, 88206: 15, 88207: 30, 88208: 31}
+
+    def setUp(self):
+        self.app = app
+        self._cleanup()
+        today = get_cairo_date()
+        for member_id, offset in self.OFFSETS.items():
+            query_db(
+                "INSERT INTO members (id, name, phone, end_date) VALUES (%s, %s, %s, %s)",
+                (member_id, f'Status Pred {member_id}', f'0100{member_id}', (today + timedelta(days=offset)).strftime('%Y-%m-%d')),
+                commit=True,
+            )
+        query_db(
+            "INSERT INTO members (id, name, phone, end_date) VALUES (88209, 'Status Pred Blank', '010088209', '')",
+            commit=True,
+        )
+
+    def tearDown(self):
+        self._cleanup()
+
+    def _cleanup(self):
+        query_db("DELETE FROM members WHERE id BETWEEN 88201 AND 88209", commit=True)
+
+    def _ids(self, predicate):
+        rows = query_db(f"SELECT id FROM members WHERE id BETWEEN 88201 AND 88209 AND {predicate} ORDER BY id")
+        return [row['id'] for row in rows]
+
+    def test_01_expiry_buckets_are_disjoint(self):
+        self.assertEqual(self._ids(expiring_within_predicate(7)), [88202, 88203])
+        self.assertEqual(self._ids(expiring_within_predicate(14)), [88204, 88205])
+        self.assertEqual(self._ids(expiring_within_predicate(30)), [88206, 88207])
+
+    def test_02_active_and_expired_partition_members(self):
+        active = self._ids(active_predicate())
+        expired = self._ids(expired_predicate(include_unknown=True))
+        self.assertEqual(sorted(active + expired), list(range(88201, 88210)))
+        self.assertEqual(self._ids(expired_predicate()), [88201])
+
+    def test_03_crm_filters_share_predicate_text(self):
+        clause, args = _build_member_bulk_filter_components({'view': 'active', 'expires_within': 14})
+        self.assertIn(view_predicate('active'), clause)
+        self.assertIn(expiring_within_predicate(14), clause)
+        self.assertEqual(args, ())
+        self.assertIsNone(view_predicate('all'))
+
+    def test_04_partial_status_indexes_exist(self):
+        rows = query_db("SELECT indexname FROM pg_indexes WHERE tablename = 'members'")
+        names = {row['indexname'] for row in rows}
+        self.assertIn('idx_members_status_end_date', names)
+        self.assertIn('idx_members_status_unknown', names)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+test_membership_status_engine.py
+
+Regression tests for the set-based nightly membership status engine.
+
+Coverage:
+  - Dry run reports the diff without writing
+  - Apply run flips VAL/EX from the typed end date, including legacy formats
+  - Members without a parseable end date are left untouched
+  - Small chunk sizes give the same result as one chunk
+  - The chunk count follows the number of members, not the id span
+  - Admin route dry-run flag does not write
+"""
+
+import unittest
+from datetime import timedelta
+from system_app.app import app
+from system_app.queries import query_db
+from system_app.func import get_cairo_date
+from system_app.status_engine import run_membership_status_engine
+
+
+class TestMembershipStatusEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.app = app
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        self._cleanup()
+        today = get_cairo_date()
+        rows = [
+            (88301, (today + timedelta(days=5)).strftime('%Y-%m-%d'), 'EX'),
+            (88302, (today - timedelta(days=5)).strftime('%Y-%m-%d'), 'VAL'),
+            (88303, (today + timedelta(days=5)).strftime('%Y-%m-%d'), 'VAL'),
+            (88304, '31/12/2020', 'VAL'),
+            (88305, 'not-a-date', 'VAL'),
+        ]
+        for member_id, end_date, status in rows:
+            query_db(
+                "INSERT INTO members (id, name, phone, end_date, membership_status) VALUES (%s, %s, %s, %s, %s)",
+                (member_id, f'Engine {member_id}', f'0100{member_id}', end_date, status),
+                commit=True,
+            )
+
+    def tearDown(self):
+        self._cleanup()
+
+    def _cleanup(self):
+        query_db("DELETE FROM members WHERE id BETWEEN 88301 AND 88305 OR id = 900000000", commit=True)
+
+    def _statuses(self):
+        rows = query_db("SELECT id, membership_status FROM members WHERE id BETWEEN 88301 AND 88305 ORDER BY id")
+        return {row['id']: row['membership_status'] for row in rows}
+
+    def test_01_dry_run_does_not_write(self):
+        before = self._statuses()
+        result = run_membership_status_engine(dry_run=True)
+        self.assertTrue(result['dry_run'])
+        self.assertGreaterEqual(result['transitions'].get('EX->VAL', 0), 1)
+        self.assertGreaterEqual(result['transitions'].get('VAL->EX', 0), 2)
+        self.assertIn('elapsed_ms', result)
+        self.assertEqual(self._statuses(), before)
+
+    def test_02_apply_flips_statuses(self):
+        result = run_membership_status_engine()
+        self.assertFalse(result['dry_run'])
+        self.assertGreaterEqual(result['updated'], 3)
+        self.assertEqual(self._statuses(), {88301: 'VAL', 88302: 'EX', 88303: 'VAL', 88304: 'EX', 88305: 'VAL'})
+        self.assertEqual(sum(result['deltas'].values()), 0)
+
+        rerun = run_membership_status_engine(dry_run=True)
+        self.assertEqual(self._statuses(), {88301: 'VAL', 88302: 'EX', 88303: 'VAL', 88304: 'EX', 88305: 'VAL'})
+        self.assertEqual(rerun['updated'], 0)
+
+    def test_03_small_chunks_match_single_chunk(self):
+        result = run_membership_status_engine(chunk_size=2)
+        self.assertGreater(result['chunks'], 1)
+        self.assertEqual(self._statuses()[88302], 'EX')
+
+    def test_04_admin_route_dry_run(self):
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = 88002
+            sess['username'] = 'rino'
+        before = self._statuses()
+        resp = self.client.get('/admin/update_all_statuses?dry_run=1')
+        self.assertEqual(resp.status_code, 302)
+        self.assertIn('/all_members', resp.headers['Location'])
+        self.assertEqual(self._statuses(), before)
+
+    def test_05_chunks_follow_row_count(self):
+        # A 9-digit custom id (bulk import) must not stretch the walk over the whole id span
+        query_db(
+            "INSERT INTO members (id, name, phone, end_date, membership_status) VALUES (900000000, 'Engine Far', '0100900000000', %s, 'VAL')",
+            ((get_cairo_date() - timedelta(days=5)).strftime('%Y-%m-%d'),),
+            commit=True,
+        )
+        rows = query_db("SELECT COUNT(*) AS count FROM members WHERE end_date_d IS NOT NULL", one=True)['count']
+        result = run_membership_status_engine(chunk_size=1000)
+        self.assertLessEqual(result['chunks'], rows // 1000 + 2)
+        status = query_db("SELECT membership_status FROM members WHERE id = 900000000", one=True)
+        self.assertEqual(status['membership_status'], 'EX')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+"""
+test_query_stats.py
+
+Regression tests for per-query timing and per-request DB accounting.
+
+Coverage:
+  - Fingerprints collapse literals, placeholders, IN lists and whitespace
+  - query_db and run_in_transaction record timed statements
+  - X-DB-Time / X-DB-Queries headers sit next to X-Response-Time
+  - Slow statements are logged with the request ID
+  - Repeated fingerprints are flagged as likely N+1 patterns
+  - query_budget fails on too many statements or repeats
+  - update_member writes its field logs in one statement
+"""
+
+import unittest
+from system_app.app import app
+from system_app.queries import query_db, update_member
+from system_app.crm.queries import run_in_transaction
+from system_app import query_stats
+from system_app.query_stats import (
+    fingerprint, get_request_db_stats, get_top_queries, get_request_repeated_queries,
+    query_budget, QueryBudgetExceeded
+)
+
+
+class TestQueryStats(unittest.TestCase):
+
+    def setUp(self):
+        self.app = app
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+
+    def test_01_fingerprint_normalization(self):
+        a = fingerprint("SELECT * FROM members WHERE id = %s AND name = 'Ali'")
+        b = fingerprint("SELECT *   FROM members\n WHERE id = 42 AND name = 'Omar'")
+        self.assertEqual(a, b)
+        self.assertEqual(a, "SELECT * FROM members WHERE id = ? AND name = ?")
+        self.assertEqual(
+            fingerprint("SELECT id FROM members WHERE id IN (%s, %s, %s)"),
+            fingerprint("SELECT id FROM members WHERE id IN (1, 2)")
+        )
+
+    def test_02_request_accounting(self):
+        # The table is process-wide and stops taking new statements once full,
+        # which a long test run reaches before this test
+        original = query_stats.MAX_TRACKED_FINGERPRINTS
+        query_stats.MAX_TRACKED_FINGERPRINTS = len(get_top_queries(limit=None)) + 10
+        try:
+            with self.app.test_request_context('/'):
+                query_db('SELECT 1 AS one', one=True)
+                run_in_transaction(lambda cur: cur.execute('SELECT 2 AS two'))
+                db_time_ms, count = get_request_db_stats()
+                self.assertEqual(count, 2)
+                self.assertGreaterEqual(db_time_ms, 0.0)
+            fingerprints = [item['fingerprint'] for item in get_top_queries(limit=None)]
+            self.assertIn('SELECT ? AS one', fingerprints)
+        finally:
+            query_stats.MAX_TRACKED_FINGERPRINTS = original
+
+    def test_03_headers_next_to_response_time(self):
+        resp = self.client.get('/login')
+        self.assertIn('X-Response-Time', resp.headers)
+        self.assertIn('X-DB-Time', resp.headers)
+        self.assertIn('X-DB-Queries', resp.headers)
+        self.assertTrue(resp.headers['X-DB-Time'].endswith('s'))
+
+    def test_04_slow_query_logged_with_request_id(self):
+        original = query_stats.SLOW_QUERY_MS
+        query_stats.SLOW_QUERY_MS = 0
+        try:
+            with self.app.test_request_context('/'):
+                from flask import g
+                g.request_id = 'slowtest'
+                with self.assertLogs('system_app.app', level='WARNING') as logs:
+                    query_db('SELECT pg_sleep(0.01)')
+            self.assertTrue(any('req=slowtest' in line and 'pg_sleep' in line for line in logs.output))
+        finally:
+            query_stats.SLOW_QUERY_MS = original
+
+    def test_05_repeated_fingerprint_flagged(self):
+        with self.app.test_request_context('/'):
+            with self.assertLogs('system_app.app', level='WARNING') as logs:
+                for i in range(query_stats.N_PLUS_ONE_THRESHOLD + 1):
+                    query_db('SELECT %s AS n', (i,), one=True)
+            self.assertEqual(get_request_repeated_queries(), ['SELECT ? AS n'])
+        self.assertTrue(any('Possible N+1' in line for line in logs.output))
+
+    def test_06_query_budget(self):
+        with query_budget(max_queries=2) as budget:
+            query_db('SELECT 1', one=True)
+            query_db('SELECT 2', one=True)
+        self.assertEqual(budget.count, 2)
+
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget(max_queries=1):
+                query_db('SELECT 1', one=True)
+                query_db('SELECT 2', one=True)
+
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget(max_repeats=1):
+                query_db('SELECT %s', (1,), one=True)
+                query_db('SELECT %s', (2,), one=True)
+
+    def test_07_update_member_logs_in_one_statement(self):
+        query_db("DELETE FROM member_logs WHERE member_id = 88401", commit=True)
+        query_db("DELETE FROM members WHERE id = 88401", commit=True)
+        query_db(
+            "INSERT INTO members (id, name, phone, end_date, comment) VALUES (88401, 'Budget Member', '010088401', '2026-01-01', 'a')",
+            commit=True,
+        )
+        try:
+            with query_budget(max_queries=3, max_repeats=1):
+                update_member(88401, phone='010088499', end_date='2026-02-01', comment='b', edited_by='tester')
+            logs = query_db("SELECT field_name FROM member_logs WHERE member_id = 88401 ORDER BY id")
+            self.assertEqual([row['field_name'] for row in logs], ['phone', 'end_date', 'comment'])
+        finally:
+            query_db("DELETE FROM member_logs WHERE member_id = 88401", commit=True)
+            query_db("DELETE FROM members WHERE id = 88401", commit=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+test_stream_query.py
+
+Tests for the server-side streaming cursor and the streamed CSV exports.
+
+Coverage:
+  - stream_query yields every row across several itersize batches
+  - Closing a stream early returns its connection to the pool
+  - stream=True variants of the list helpers match their list results
+  - Renewal fee total is summed in SQL
+  - /renewal_log/export.csv streams a CSV with a header and one line per row
+"""
+
+import csv
+import io
+import unittest
+from system_app.app import app
+from system_app.queries import (
+    query_db, stream_query, get_pool_stats, get_renewal_logs, get_renewal_fees_total,
+)
+
+
+class TestStreamQuery(unittest.TestCase):
+
+    MEMBER_ID = 88501
+
+    def setUp(self):
+        self.app = app
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        self._cleanup()
+        query_db(
+            """
+            INSERT INTO users (id, username, email, password, is_approved, permissions)
+            VALUES (88501, 'stream_user', 'stream_user@test.com', 'pwd', TRUE,
+                    '{"super_admin": true}')
+            ON CONFLICT (id) DO NOTHING
+            """,
+            commit=True,
+        )
+        query_db(
+            "INSERT INTO members (id, name, phone, end_date) VALUES (%s, 'Stream Member', '0100088501', '2030-01-01')",
+            (self.MEMBER_ID,),
+            commit=True,
+        )
+        query_db(
+            """
+            INSERT INTO renewal_logs (member_id, package_name, renewal_date, fees, edited_by)
+            SELECT %s, 'Stream Pkg ' || n, DATE '2026-01-01', 10, 'stream_user'
+            FROM generate_series(1, 25) AS n
+            """,
+            (self.MEMBER_ID,),
+            commit=True,
+        )
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = 88501
+            sess['username'] = 'stream_user'
+
+    def tearDown(self):
+        self._cleanup()
+        query_db("DELETE FROM users WHERE id = 88501", commit=True)
+
+    def _cleanup(self):
+        query_db("DELETE FROM renewal_logs WHERE member_id = %s", (self.MEMBER_ID,), commit=True)
+        query_db("DELETE FROM members WHERE id = %s", (self.MEMBER_ID,), commit=True)
+
+    def test_01_stream_yields_all_rows_in_batches(self):
+        rows = list(stream_query(
+            "SELECT id, package_name FROM renewal_logs WHERE member_id = %s ORDER BY id",
+            (self.MEMBER_ID,),
+            itersize=4,
+        ))
+        self.assertEqual(len(rows), 25)
+        self.assertEqual(rows[0]['package_name'], 'Stream Pkg 1')
+
+    def test_02_early_close_releases_connection(self):
+        in_use_before = get_pool_stats().get('in_use', 0)
+        stream = stream_query("SELECT * FROM renewal_logs WHERE member_id = %s", (self.MEMBER_ID,), itersize=2)
+        next(stream)
+        stream.close()
+        self.assertEqual(get_pool_stats().get('in_use', 0), in_use_before)
+        # The connection is usable again after the named cursor's transaction ended
+        self.assertIsNotNone(query_db("SELECT 1 AS ok", one=True))
+
+    def test_03_stream_variant_matches_list(self):
+        listed = [r['id'] for r in get_renewal_logs() if r['member_id'] == self.MEMBER_ID]
+        streamed = [r['id'] for r in get_renewal_logs(stream=True) if r['member_id'] == self.MEMBER_ID]
+        self.assertEqual(listed, streamed)
+
+    def test_04_renewal_fees_total_in_sql(self):
+        expected = query_db("SELECT COALESCE(SUM(fees), 0) AS total FROM renewal_logs", one=True)['total']
+        self.assertAlmostEqual(get_renewal_fees_total(), float(expected))
+
+    def test_05_renewal_log_csv_export(self):
+        response = self.client.get('/renewal_log/export.csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+        ours = [r for r in rows if r['member_id'] == str(self.MEMBER_ID)]
+        self.assertEqual(len(ours), 25)
+        self.assertIn('package_name', rows[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
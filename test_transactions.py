@@ -0,0 +1,99 @@
+"""
+test_transactions.py
+
+Tests for the pooled transaction() / savepoint() API.
+
+Coverage:
+  - transaction() commits on success and rolls back on error
+  - savepoint() undoes only its block and keeps the transaction usable
+  - Nested transaction() reuses the outer connection as a savepoint
+  - bulk_add_members keeps good rows when one row fails, in one transaction
+  - perform_attendance_backup_and_clear moves rows on one pooled connection
+"""
+
+import unittest
+from system_app.app import app, perform_attendance_backup_and_clear
+from system_app.queries import query_db, transaction, savepoint, bulk_add_members, get_pool_stats
+
+
+def _member_ids(ids):
+    rows = query_db("SELECT id FROM members WHERE id = ANY(%s) ORDER BY id", (list(ids),))
+    return [row['id'] for row in rows]
+
+
+class TestTransactions(unittest.TestCase):
+
+    MEMBER_IDS = [88701, 88702, 88703, 88704]
+
+    def setUp(self):
+        app.config['TESTING'] = True
+        self._cleanup()
+
+    def tearDown(self):
+        self._cleanup()
+
+    def _cleanup(self):
+        query_db("DELETE FROM attendance_backup WHERE member_id = ANY(%s)", (self.MEMBER_IDS,), commit=True)
+        query_db("DELETE FROM attendance WHERE member_id = ANY(%s)", (self.MEMBER_IDS,), commit=True)
+        query_db("DELETE FROM members WHERE id = ANY(%s)", (self.MEMBER_IDS,), commit=True)
+
+    def test_01_commit_and_rollback(self):
+        with transaction() as cur:
+            cur.execute("INSERT INTO members (id, name) VALUES (88701, 'Tx Commit')")
+        self.assertEqual(_member_ids(self.MEMBER_IDS), [88701])
+
+        with self.assertRaises(RuntimeError):
+            with transaction() as cur:
+                cur.execute("INSERT INTO members (id, name) VALUES (88702, 'Tx Rollback')")
+                raise RuntimeError("boom")
+        self.assertEqual(_member_ids(self.MEMBER_IDS), [88701])
+
+    def test_02_savepoint_isolates_failure(self):
+        with transaction() as cur:
+            cur.execute("INSERT INTO members (id, name) VALUES (88701, 'Tx Savepoint')")
+            with self.assertRaises(Exception):
+                with savepoint(cur):
+                    cur.execute("INSERT INTO members (id, name) VALUES (88702, 'Tx Undone')")
+                    cur.execute("INSERT INTO members (id, name) VALUES (88701, 'Tx Duplicate')")
+            cur.execute("INSERT INTO members (id, name) VALUES (88703, 'Tx After')")
+        self.assertEqual(_member_ids(self.MEMBER_IDS), [88701, 88703])
+
+    def test_03_nested_transaction_is_savepoint(self):
+        checkouts_before = (get_pool_stats() or {}).get('checkouts', 0)
+        with transaction() as outer:
+            outer.execute("INSERT INTO members (id, name) VALUES (88701, 'Tx Outer')")
+            with self.assertRaises(RuntimeError):
+                with transaction() as inner:
+                    self.assertIs(inner, outer)
+                    inner.execute("INSERT INTO members (id, name) VALUES (88702, 'Tx Inner')")
+                    raise RuntimeError("inner failure")
+        self.assertEqual(_member_ids(self.MEMBER_IDS), [88701])
+        if get_pool_stats():
+            self.assertEqual(get_pool_stats()['checkouts'] - checkouts_before, 2)
+
+    def test_04_bulk_add_members_partial_failure(self):
+        row = lambda member_id, name: (member_id, name, None, '01000', 30, 'male', None, None, None,
+                                       '2030-01-01', '1 Month', 100.0, 'VAL', 0, None, None)
+        inserted = bulk_add_members([row(88701, 'Bulk A'), row(88701, 'Bulk Dup'), row(88702, 'Bulk B')])
+        self.assertEqual(inserted, 2)
+        self.assertEqual(_member_ids(self.MEMBER_IDS), [88701, 88702])
+
+    def test_05_attendance_backup_uses_one_transaction(self):
+        existing = query_db("SELECT COUNT(*) AS count FROM attendance", one=True)['count']
+        if existing:
+            self.skipTest("attendance table is not empty")
+        query_db("INSERT INTO members (id, name) VALUES (88704, 'Tx Backup')", commit=True)
+        query_db(
+            "INSERT INTO attendance (member_id, name, attendance_date) VALUES (88704, 'Tx Backup', CURRENT_DATE)",
+            commit=True,
+        )
+        success, rows_moved, error = perform_attendance_backup_and_clear(performed_by='test')
+        self.assertTrue(success, error)
+        self.assertEqual(rows_moved, 1)
+        self.assertEqual(query_db("SELECT COUNT(*) AS count FROM attendance", one=True)['count'], 0)
+        backup = query_db("SELECT COUNT(*) AS count FROM attendance_backup WHERE member_id = 88704", one=True)
+        self.assertEqual(backup['count'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
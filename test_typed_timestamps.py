@@ -0,0 +1,120 @@
+"""
+test_typed_timestamps.py
+
+Tests for attendance.checked_in_at, sargable sales windows and BRIN indexes.
+
+Coverage:
+  - Check-ins store the exact gym-local instant in checked_in_at
+  - Other inserts get checked_in_at from the text date / time columns
+  - The archive move carries checked_in_at into attendance_backup
+  - Supplement day windows count by timestamp range (not ::date)
+  - Time-window predicates use the sale_date btree and the BRIN indexes
+"""
+
+import unittest
+from datetime import datetime, timedelta
+import pytz
+from system_app.app import perform_attendance_backup_and_clear
+from system_app.attendance_services import check_in_member
+from system_app.queries import query_db, transaction, get_supplement_statistics
+
+CAIRO = pytz.timezone("Africa/Cairo")
+
+
+class TestTypedTimestamps(unittest.TestCase):
+
+    MEMBER_IDS = [90001, 90002]
+    SUPPLEMENT_NAME = 'Typed TS Test'
+
+    def setUp(self):
+        self._cleanup()
+        query_db("INSERT INTO members (id, name) VALUES (90001, 'Typed One'), (90002, 'Typed Two')", commit=True)
+
+    def tearDown(self):
+        self._cleanup()
+
+    def _cleanup(self):
+        query_db("DELETE FROM supplement_sales WHERE supplement_name = %s", (self.SUPPLEMENT_NAME,), commit=True)
+        query_db("DELETE FROM attendance_backup WHERE member_id = ANY(%s)", (self.MEMBER_IDS,), commit=True)
+        query_db('DROP TABLE IF EXISTS "attendance_backup_y1990m04"', commit=True)
+        query_db("DELETE FROM action_logs WHERE member_id = ANY(%s)", (self.MEMBER_IDS,), commit=True)
+        query_db("DELETE FROM attendance WHERE member_id = ANY(%s)", (self.MEMBER_IDS,), commit=True)
+        query_db("DELETE FROM members WHERE id = ANY(%s)", (self.MEMBER_IDS,), commit=True)
+
+    def _plan(self, sql, params):
+        with transaction() as cur:
+            cur.execute("SET LOCAL enable_seqscan = off")
+            cur.execute(f"EXPLAIN {sql}", params)
+            return '\n'.join(row['QUERY PLAN'] for row in cur.fetchall())
+
+    def test_01_check_in_stores_instant(self):
+        now = datetime(2026, 4, 6, 7, 45, 10)
+        check_in_member(90001, now=now)
+        row = query_db("SELECT checked_in_at, attendance_time FROM attendance WHERE member_id = 90001", one=True)
+        self.assertEqual(row['checked_in_at'], CAIRO.localize(now))
+        self.assertEqual(row['attendance_time'], '07:45:10')
+
+    def test_02_trigger_fills_from_text(self):
+        query_db(
+            """
+            INSERT INTO attendance (member_id, name, attendance_date, attendance_time)
+            VALUES (90001, 'Typed One', '1990-04-02', '18:30:00'), (90002, 'Typed Two', NULL, NULL)
+            """,
+            commit=True,
+        )
+        rows = {r['member_id']: r['checked_in_at'] for r in
+                query_db("SELECT member_id, checked_in_at FROM attendance WHERE member_id = ANY(%s)",
+                         (self.MEMBER_IDS,))}
+        self.assertEqual(rows[90001], CAIRO.localize(datetime(1990, 4, 2, 18, 30)))
+        self.assertIsNotNone(rows[90002])
+
+    def test_03_archive_keeps_checked_in_at(self):
+        if query_db("SELECT COUNT(*) AS count FROM attendance", one=True)['count']:
+            self.skipTest("attendance table is not empty")
+        query_db(
+            "INSERT INTO attendance (member_id, name, attendance_date, attendance_time) "
+            "VALUES (90001, 'Typed One', '1990-04-03', '06:00:00')",
+            commit=True,
+        )
+        success, _, error = perform_attendance_backup_and_clear(performed_by='test')
+        self.assertTrue(success, error)
+        row = query_db("SELECT checked_in_at FROM attendance_backup WHERE member_id = 90001", one=True)
+        self.assertEqual(row['checked_in_at'], CAIRO.localize(datetime(1990, 4, 3, 6, 0)))
+
+    def test_04_sales_day_window(self):
+        before = get_supplement_statistics()
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        query_db(
+            """
+            INSERT INTO supplement_sales (supplement_name, quantity, unit_price, total_price, sale_date, payment_method, sold_by)
+            VALUES (%s, 1, 12.5, 12.5, %s, 'cash', 'typed_ts'),
+                   (%s, 1, 100, 100, %s, 'cash', 'typed_ts')
+            """,
+            (self.SUPPLEMENT_NAME, today + timedelta(hours=23, minutes=59),
+             self.SUPPLEMENT_NAME, today - timedelta(seconds=1)),
+            commit=True,
+        )
+        after = get_supplement_statistics()
+        self.assertAlmostEqual(after['today_sales'] - before['today_sales'], 12.5)
+        self.assertAlmostEqual(after['cash_sales_today'] - before['cash_sales_today'], 12.5)
+        sellers = {r['sold_by']: r for r in after['user_sales_today']}
+        self.assertEqual(sellers['typed_ts']['sales_count'], 1)
+
+    def test_05_time_windows_use_indexes(self):
+        start = datetime(2026, 1, 1)
+        end = start + timedelta(days=1)
+        self.assertIn('idx_supplement_sales_date',
+                      self._plan("SELECT SUM(total_price) FROM supplement_sales WHERE sale_date >= %s AND sale_date < %s",
+                                 (start, end)))
+        self.assertIn('idx_member_logs_edit_time_brin',
+                      self._plan("SELECT COUNT(*) FROM member_logs WHERE edit_time >= %s", (start,)))
+
+        query_db("SELECT ensure_attendance_backup_partition(%s)", (datetime(1990, 4, 1).date(),), commit=True)
+        plan = self._plan("SELECT COUNT(*) FROM attendance_backup WHERE checked_in_at >= %s AND checked_in_at < %s",
+                          (CAIRO.localize(datetime(1990, 4, 1)), CAIRO.localize(datetime(1990, 4, 2))))
+        self.assertIn('Bitmap Index Scan', plan)
+        self.assertIn('checked_in_at_idx', plan)
+
+
+if __name__ == '__main__':
+    unittest.main()